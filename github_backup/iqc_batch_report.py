@@ -0,0 +1,215 @@
+"""
+IQC 效率管理系統 - 批次報表產生器
+不開啟瀏覽器、不啟動 Streamlit 服務，直接讀取資料夾中的 Excel 檔案，
+以與介面相同的計算核心 (iqc_engine：檔案解析 → 指標計算 → 匯出) 產生報表，適合排程 (cron / 工作排程器) 使用。
+
+範例:
+    # 每週一產生上週 (週一至週日) 的效率報表
+    python iqc_batch_report.py --iqc-dir data/iqc --pcb-spec-dir data/pcb_spec \
+        --pcb-std-dir data/pcb_std --tasks-dir data/tasks --last-week --output reports/
+    
+    # 四種檔案放在同一資料夾時自動分類
+    python iqc_batch_report.py --input-dir data/ --start-date 2025-01-01 --end-date 2025-01-31
+"""
+
+import argparse
+import glob
+import io
+import logging
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# 匯出格式與副檔名
+OUTPUT_EXTENSIONS = {'xlsx': '.xlsx', 'csv': '.zip', 'parquet': '.zip'}
+
+# 程式結束代碼
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_NO_IQC_REPORT = 2
+
+def load_engine(verbose=False):
+    """
+    載入計算核心 (iqc_engine，不依賴 Streamlit)
+    
+    參數:
+    verbose - 是否輸出處理日誌
+    
+    返回:
+    計算核心模組
+    """
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    if base_path not in sys.path:
+        sys.path.insert(0, base_path)
+    
+    # 計算核心的日誌寫入 logging (logger 名稱 iqc_engine)
+    logging.basicConfig(format="[%(asctime)s][%(levelname)s] %(message)s", datefmt="%H:%M:%S")
+    logging.getLogger("iqc_engine").setLevel(logging.DEBUG if verbose else logging.ERROR)
+    
+    import iqc_engine
+    return iqc_engine
+
+def list_excel_files(folder):
+    """列出資料夾中的 Excel 檔案 (略過 Excel 開啟中產生的 ~$ 暫存檔)"""
+    if not folder:
+        return []
+    paths = glob.glob(os.path.join(folder, '*.xlsx')) + glob.glob(os.path.join(folder, '*.xls'))
+    return sorted(path for path in paths if not os.path.basename(path).startswith('~$'))
+
+class ExcelInput(io.BytesIO):
+    """
+    讓本機檔案具有與上傳檔案相同的介面 (name、read、seek、getvalue)
+    
+    name 只保留檔名，與上傳檔案一致，檔案分類規則才能正確比對。
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            super().__init__(f.read())
+        self.path = path
+        self.name = os.path.basename(path)
+
+def resolve_date_range(args):
+    """
+    依參數決定日期範圍
+    
+    返回:
+    (開始日期, 結束日期)，未指定時為 None (不篩選)
+    """
+    if args.last_week:
+        today = date.today()
+        this_monday = today - timedelta(days=today.weekday())
+        return this_monday - timedelta(days=7), this_monday - timedelta(days=1)
+    
+    start_date = datetime.strptime(args.start_date, '%Y-%m-%d').date() if args.start_date else None
+    end_date = datetime.strptime(args.end_date, '%Y-%m-%d').date() if args.end_date else None
+    return start_date, end_date
+
+def resolve_output_path(output, start_date, end_date, export_format):
+    """
+    決定輸出檔案路徑；output 為資料夾 (或以路徑分隔符號結尾) 時自動命名
+    """
+    extension = OUTPUT_EXTENSIONS[export_format]
+    if output and not output.endswith(('/', '\\')) and not os.path.isdir(output):
+        return output
+    
+    period = f"{start_date or '全部'}_{end_date or '全部'}"
+    return os.path.join(output or 'reports', f"IQC完整數據報告_{period}{extension}")
+
+def classify_inputs(engine, args):
+    """
+    讀取輸入檔案並依類型分組
+    
+    返回:
+    (IQC Report, PCB建檔明細, PCB標準工時對應表, IQC額外任務紀錄清單) 四組檔案
+    """
+    if args.input_dir:
+        files = [ExcelInput(path) for path in list_excel_files(args.input_dir)]
+        return engine.classify_files(files)
+    
+    return tuple(
+        [ExcelInput(path) for path in list_excel_files(folder)]
+        for folder in (args.iqc_dir, args.pcb_spec_dir, args.pcb_std_dir, args.tasks_dir)
+    )
+
+def run_batch(args):
+    """
+    執行與介面相同的處理流程並寫出報表
+    
+    返回:
+    程式結束代碼
+    """
+    timings = []
+    stage_start = time.perf_counter()
+    
+    def finish_stage(name):
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings.append((name, now - stage_start))
+        print(f"   ✔ {name} ({now - stage_start:.2f} 秒)")
+        stage_start = now
+    
+    engine = load_engine(args.verbose)
+    finish_stage("載入處理模組")
+    
+    start_date, end_date = resolve_date_range(args)
+    print(f"📅 日期範圍: {start_date or '不限'} ~ {end_date or '不限'}")
+    
+    iqc_files, pcb_spec_files, pcb_std_files, task_files = classify_inputs(engine, args)
+    print(f"📂 IQC Report({len(iqc_files)}), PCB建檔明細({len(pcb_spec_files)}), "
+          f"PCB標準工時對應表({len(pcb_std_files)}), IQC額外任務紀錄清單({len(task_files)})")
+    if not iqc_files:
+        print("❌ 錯誤: 找不到 IQC Report 檔案")
+        return EXIT_NO_IQC_REPORT
+    
+    # 1. 解析檔案 (與 process_files_button_click 相同的處理函數)
+    iqc_report_data = engine.process_multiple_iqc_reports_optimized(iqc_files)
+    if iqc_report_data is None:
+        print("❌ 錯誤: 無法處理IQC Report數據，請檢查檔案")
+        return EXIT_FAILED
+    pcb_spec_data = engine.process_multiple_pcb_specs(pcb_spec_files) if pcb_spec_files else None
+    pcb_standard_time_data = engine.process_multiple_pcb_standard_times(pcb_std_files) if pcb_std_files else None
+    additional_tasks_data = engine.process_multiple_additional_tasks(task_files) if task_files else None
+    finish_stage("解析檔案")
+    
+    # 2. 計算指標
+    metrics = engine.calculate_all_metrics(
+        iqc_report_data, pcb_spec_data, pcb_standard_time_data, additional_tasks_data,
+        start_date, end_date
+    )
+    if not metrics or metrics.get('processed_data') is None:
+        print("❌ 錯誤: 指標計算失敗")
+        return EXIT_FAILED
+    finish_stage("計算指標")
+    
+    # 3. 匯出 (與介面匯出相同的工作表)
+    output_path = resolve_output_path(args.output, start_date, end_date, args.format)
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    
+    sheets = engine.collect_export_sheets(metrics)
+    if args.format == 'xlsx':
+        engine.write_streaming_workbook(sheets, output_path)
+    else:
+        engine.write_zip_export(sheets, output_path, args.format)
+    finish_stage("寫出報表")
+    
+    total_time = sum(seconds for _, seconds in timings)
+    print(f"✅ 報表已產生: {output_path} ({len(metrics['processed_data'])} 筆檢驗資料，總耗時 {total_time:.2f} 秒)")
+    return EXIT_OK
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="IQC 效率管理系統 - 批次報表產生器 (不需瀏覽器)")
+    parser.add_argument('--input-dir', help="四種檔案放在同一資料夾時使用，依檔名自動分類")
+    parser.add_argument('--iqc-dir', help="IQC Report 資料夾")
+    parser.add_argument('--pcb-spec-dir', help="PCB建檔明細資料夾")
+    parser.add_argument('--pcb-std-dir', help="PCB標準工時對應表資料夾")
+    parser.add_argument('--tasks-dir', help="IQC額外任務紀錄清單資料夾")
+    parser.add_argument('--start-date', help="開始日期 (YYYY-MM-DD)")
+    parser.add_argument('--end-date', help="結束日期 (YYYY-MM-DD)")
+    parser.add_argument('--last-week', action='store_true', help="使用上週一至上週日 (覆蓋開始/結束日期)")
+    parser.add_argument('--output', default='reports', help="輸出檔案或資料夾 (預設 reports/)")
+    parser.add_argument('--format', choices=sorted(OUTPUT_EXTENSIONS), default='xlsx', help="匯出格式 (預設 xlsx)")
+    parser.add_argument('--verbose', action='store_true', help="處理過程中即時輸出處理日誌")
+    args = parser.parse_args(argv)
+    
+    if not args.input_dir and not args.iqc_dir:
+        parser.error("請指定 --input-dir 或 --iqc-dir")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("=" * 60)
+    print("📊 IQC 效率管理系統 - 批次報表產生")
+    print("=" * 60)
+    try:
+        return run_batch(args)
+    except Exception as e:
+        print(f"\n❌ 報表產生失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return EXIT_FAILED
+
+if __name__ == '__main__':
+    sys.exit(main())
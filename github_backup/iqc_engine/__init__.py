@@ -0,0 +1,105 @@
+"""
+IQC 效率管理系統 - 計算核心
+
+檔案解析 (ingest) → 資料合併 (join) → 指標計算 (metrics) → 匯出 (export)，
+計算程序工作 (jobs) 由磁碟快取 (cache) 讀取資料集；
+不依賴 Streamlit，可在介面、批次報表與背景工作程序中共用。
+
+範例:
+    import iqc_engine
+
+    iqc_df = iqc_engine.process_multiple_iqc_reports_optimized(iqc_files)
+    metrics = iqc_engine.calculate_all_metrics(iqc_df, None, None, None, start_date, end_date)
+    iqc_engine.write_streaming_workbook(iqc_engine.collect_export_sheets(metrics), "report.xlsx")
+"""
+
+from .logs import (
+    ReportedError,
+    debug_log,
+    is_background_thread,
+    report_error,
+    report_warning,
+    run_with_reported_errors,
+    set_background_thread,
+    set_handlers,
+)
+from .ingest import (
+    FIELD_MAPPING,
+    check_is_mrb,
+    classify_files,
+    compute_data_version,
+    find_column_by_mapping,
+    parse_area_range,
+    parse_excel_date,
+    process_multiple_additional_tasks,
+    process_multiple_iqc_reports_optimized,
+    process_multiple_pcb_specs,
+    process_multiple_pcb_standard_times,
+)
+from .join import calculate_pcb_standard_time, map_hole_count_to_range
+from .metrics import (
+    EXCLUDED_INSPECTORS,
+    MRB_FLAG_COLUMN,
+    MRB_RAW_TEXT_COLUMNS,
+    MRB_TRUE_VALUES,
+    TASK_RATIO_PREFIX,
+    calculate_additional_tasks_metrics,
+    calculate_all_metrics,
+    calculate_efficiency_metrics,
+    calculate_time_allocation_metrics,
+    calculate_workload_metrics,
+    derive_mrb_flag,
+    ensure_mrb_flag,
+    filter_by_date_range,
+    filter_excluded_inspectors,
+    get_task_ratio_table,
+)
+from .cache import (
+    DATASET_CACHE_ENV,
+    ensure_cached_dataset,
+    get_dataset_cache_dir,
+    load_cached_dataset,
+    prepare_dataset_cache_dir,
+    save_cached_dataset,
+)
+from .export import (
+    EXPORT_CHUNK_ROWS,
+    EXPORT_FORMATS,
+    EXPORT_MAX_WORKERS,
+    EXPORT_PROCESSED_COLUMNS,
+    collect_export_sheets,
+    parquet_available,
+    prepare_export_processed_frame,
+    write_export_file,
+    write_streaming_workbook,
+    write_zip_export,
+)
+from .jobs import calculate_cached_dataset_metrics, write_cached_dataset_export
+
+__all__ = [
+    # logs
+    'ReportedError', 'debug_log', 'is_background_thread', 'report_error', 'report_warning',
+    'run_with_reported_errors', 'set_background_thread', 'set_handlers',
+    # ingest
+    'FIELD_MAPPING', 'check_is_mrb', 'classify_files', 'compute_data_version',
+    'find_column_by_mapping', 'parse_area_range', 'parse_excel_date',
+    'process_multiple_additional_tasks', 'process_multiple_iqc_reports_optimized',
+    'process_multiple_pcb_specs', 'process_multiple_pcb_standard_times',
+    # join
+    'calculate_pcb_standard_time', 'map_hole_count_to_range',
+    # metrics
+    'EXCLUDED_INSPECTORS', 'MRB_FLAG_COLUMN', 'MRB_RAW_TEXT_COLUMNS', 'MRB_TRUE_VALUES',
+    'TASK_RATIO_PREFIX', 'calculate_additional_tasks_metrics', 'calculate_all_metrics',
+    'calculate_efficiency_metrics', 'calculate_time_allocation_metrics',
+    'calculate_workload_metrics', 'derive_mrb_flag', 'ensure_mrb_flag', 'filter_by_date_range',
+    'filter_excluded_inspectors', 'get_task_ratio_table',
+    # cache
+    'DATASET_CACHE_ENV', 'ensure_cached_dataset', 'get_dataset_cache_dir', 'load_cached_dataset',
+    'prepare_dataset_cache_dir', 'save_cached_dataset',
+    # export
+    'EXPORT_CHUNK_ROWS', 'EXPORT_FORMATS', 'EXPORT_MAX_WORKERS', 'EXPORT_PROCESSED_COLUMNS',
+    'collect_export_sheets', 'parquet_available', 'prepare_export_processed_frame',
+    'write_export_file', 'write_streaming_workbook', 'write_zip_export',
+    # jobs
+    'calculate_cached_dataset_metrics', 'write_cached_dataset_export',
+]
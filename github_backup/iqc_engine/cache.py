@@ -0,0 +1,160 @@
+"""
+共用資料集磁碟快取 (cache)：多個介面工作程序 (run_app.py --workers) 共用檔案解析結果
+
+以上傳檔案內容的雜湊為鍵，相同的一組檔案只需任一工作程序解析一次，
+其他工作程序直接讀取。快取目錄由環境變數 IQC_DATASET_CACHE_DIR 指定，未設定時不使用。
+
+快取檔案以 pickle 儲存，讀取時會執行檔案中的內容，因此快取目錄必須只有執行本系統的使用者可以寫入：
+目錄以擁有者專用權限 (0700) 建立；POSIX 系統上目錄或檔案不屬於目前使用者、或群組/其他使用者可寫入時
+不讀取也不寫入。Windows 不檢查權限，請將快取目錄放在使用者自己的資料夾內。
+"""
+
+import os
+import pickle
+import stat
+import tempfile
+
+from .logs import debug_log
+
+# 指定快取目錄的環境變數
+DATASET_CACHE_ENV = 'IQC_DATASET_CACHE_DIR'
+
+# 保留的資料集數量，超過時刪除最久未使用的檔案
+DATASET_CACHE_MAX_FILES = 8
+
+def get_dataset_cache_dir():
+    """取得磁碟快取目錄，未設定時返回 None"""
+    return os.environ.get(DATASET_CACHE_ENV) or None
+
+def _dataset_cache_path(cache_dir, fingerprint):
+    return os.path.join(cache_dir, f"dataset_{fingerprint}.pkl")
+
+def _is_private_path(path):
+    """路徑是否屬於目前使用者且群組/其他使用者無法寫入 (沒有 getuid 的平台不檢查)"""
+    if not hasattr(os, 'getuid'):
+        return True
+    try:
+        info = os.stat(path)
+    except OSError:
+        return False
+    return info.st_uid == os.getuid() and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+def prepare_dataset_cache_dir(cache_dir):
+    """
+    建立快取目錄 (只有擁有者可存取) 並確認可以信任
+    
+    參數:
+    cache_dir - 快取目錄
+    
+    返回:
+    可以讀寫快取時為 True；目錄無法建立或其他使用者可寫入時為 False
+    """
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        if hasattr(os, 'getuid') and os.stat(cache_dir).st_uid == os.getuid():
+            # 舊版建立的目錄 (預設權限) 也收緊為擁有者專用
+            os.chmod(cache_dir, 0o700)
+    except OSError as e:
+        debug_log(f"無法建立磁碟快取目錄 {cache_dir}: {e}", level="WARNING")
+        return False
+    
+    if not _is_private_path(cache_dir):
+        debug_log(f"磁碟快取目錄 {cache_dir} 不屬於目前使用者或其他使用者可寫入，不使用磁碟快取", level="WARNING")
+        return False
+    return True
+
+def load_cached_dataset(cache_dir, fingerprint):
+    """
+    讀取磁碟快取的資料集
+    
+    參數:
+    cache_dir - 快取目錄
+    fingerprint - 上傳檔案內容雜湊
+    
+    返回:
+    資料集 dict，沒有快取或無法讀取時為 None
+    """
+    path = _dataset_cache_path(cache_dir, fingerprint)
+    if not os.path.exists(path):
+        return None
+    
+    # pickle 讀取時會執行檔案內容，只讀取目前使用者專用目錄中自己寫入的檔案
+    if not _is_private_path(cache_dir) or not _is_private_path(path):
+        debug_log(f"磁碟快取 {path} 不屬於目前使用者或其他使用者可寫入，略過", level="WARNING")
+        return None
+    
+    try:
+        with open(path, 'rb') as f:
+            dataset = pickle.load(f)
+        # 更新修改時間，作為最近使用的依據
+        os.utime(path)
+        debug_log(f"從磁碟快取讀取資料集 {fingerprint}", level="INFO")
+        return dataset
+    except Exception as e:
+        debug_log(f"讀取磁碟快取 {path} 失敗: {e}", level="WARNING")
+        return None
+
+def save_cached_dataset(cache_dir, fingerprint, dataset):
+    """
+    將資料集寫入磁碟快取 (先寫暫存檔再改名，其他工作程序不會讀到寫到一半的檔案)
+    
+    參數:
+    cache_dir - 快取目錄
+    fingerprint - 上傳檔案內容雜湊
+    dataset - 資料集 dict
+    """
+    if not prepare_dataset_cache_dir(cache_dir):
+        return
+    
+    try:
+        fd, partial_path = tempfile.mkstemp(dir=cache_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(dataset, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(partial_path, _dataset_cache_path(cache_dir, fingerprint))
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        debug_log(f"資料集 {fingerprint} 已寫入磁碟快取", level="INFO")
+    except Exception as e:
+        debug_log(f"寫入磁碟快取失敗: {e}", level="WARNING")
+        return
+    
+    _evict_cached_datasets(cache_dir)
+
+def ensure_cached_dataset(cache_dir, fingerprint, dataset):
+    """
+    確認資料集已在磁碟快取中 (已存在時更新修改時間避免被清理，不存在時寫入)，供計算程序讀取
+    
+    參數:
+    cache_dir - 快取目錄
+    fingerprint - 上傳檔案內容雜湊
+    dataset - 資料集 dict
+    
+    返回:
+    磁碟快取可供讀取時為 True
+    """
+    path = _dataset_cache_path(cache_dir, fingerprint)
+    if os.path.exists(path) and _is_private_path(cache_dir) and _is_private_path(path):
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            pass
+    
+    save_cached_dataset(cache_dir, fingerprint, dataset)
+    return os.path.exists(path)
+
+def _evict_cached_datasets(cache_dir):
+    """只保留最近使用的 DATASET_CACHE_MAX_FILES 個資料集"""
+    try:
+        paths = [
+            os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+            if name.startswith('dataset_') and name.endswith('.pkl')
+        ]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[DATASET_CACHE_MAX_FILES:]:
+            os.remove(path)
+    except OSError as e:
+        debug_log(f"清理磁碟快取失敗: {e}", level="WARNING")
@@ -0,0 +1,332 @@
+"""
+資料匯出 (export)：收集匯出工作表，串流寫出 Excel 或以執行緒池產生 CSV/Parquet 壓縮檔
+"""
+
+import io
+import os
+import re
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .logs import debug_log
+from .metrics import get_task_ratio_table
+
+# 串流寫入Excel時每批轉換的列數
+EXPORT_CHUNK_ROWS = 5000
+
+# 匯出格式：代碼 -> (顯示名稱, 副檔名, MIME)
+EXPORT_FORMATS = {
+    'xlsx': ("Excel 活頁簿 (.xlsx)", '.xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'csv': ("各工作表 CSV 壓縮檔 (.zip)", '.zip', "application/zip"),
+    'parquet': ("各工作表 Parquet 壓縮檔 (.zip)", '.zip', "application/zip"),
+}
+
+# 平行產生各工作表檔案的執行緒數
+EXPORT_MAX_WORKERS = 4
+
+# 處理後資料工作表的欄位 (依序，不存在的欄位略過)
+EXPORT_PROCESSED_COLUMNS = [
+    '處理後檢驗員', '料號', '類別', '抽樣數量', '檢驗日期',
+    '處理後檢驗標準工時', '檢驗耗時', '效率比值', '抽樣狀態', 
+    '檢驗開始時間', '是否為MRB', 'MRB狀態', 'MRB訊息',
+    '基礎標準工時', 'MRB加時', 'M'
+]
+
+def prepare_export_processed_frame(processed_data):
+    """
+    產生「處理後資料」工作表：先挑出需要的欄位，再以向量運算修正MRB狀態
+
+    只複製匯出需要的欄位一次，不再複製整份 processed_data。
+    MRB狀態一律以 MRB加時 > 0 判斷。
+
+    參數:
+    processed_data - 處理後的檢驗資料
+
+    返回:
+    匯出用的DataFrame
+    """
+    derived_columns = ['是否為MRB', 'MRB狀態', 'MRB訊息']
+    source_columns = [
+        col for col in EXPORT_PROCESSED_COLUMNS
+        if col in processed_data.columns and col not in derived_columns
+    ]
+    export_df = processed_data[source_columns].copy()
+    
+    if 'MRB加時' in processed_data.columns:
+        is_mrb = pd.to_numeric(processed_data['MRB加時'], errors='coerce').fillna(0).to_numpy() > 0
+        export_df['是否為MRB'] = np.where(is_mrb, "TRUE", "FALSE")
+        export_df['MRB狀態'] = np.where(is_mrb, "MRB", "Normal inspection")
+        
+        # 確保MRB訊息也與狀態一致
+        original_message = processed_data['MRB訊息'] if 'MRB訊息' in processed_data.columns else pd.Series(np.nan, index=processed_data.index)
+        export_df['MRB訊息'] = original_message.where(~is_mrb, "有MRB標記")
+        
+        debug_log(f"匯出前MRB狀態檢查: MRB加時>0: {int(is_mrb.sum())}", level="INFO")
+    else:
+        for col in derived_columns:
+            if col in processed_data.columns:
+                export_df[col] = processed_data[col]
+    
+    ordered_columns = [col for col in EXPORT_PROCESSED_COLUMNS if col in export_df.columns]
+    return export_df[ordered_columns]
+
+def collect_export_sheets(state):
+    """
+    收集所有要匯出的資料表
+
+    參數:
+    state - 含 processed_data 等資料的 mapping (介面傳入 st.session_state；
+            背景工作與批次報表傳入資料快照或 calculate_all_metrics 的結果)
+
+    返回:
+    OrderedDict {工作表名稱: DataFrame}，順序即工作表順序
+    """
+    sheets = OrderedDict()
+    
+    # 1. 處理後的原始資料並修正MRB狀態
+    processed_df = prepare_export_processed_frame(state['processed_data'])
+    sheets['處理後資料'] = processed_df
+    
+    efficiency_columns = {
+        'inspector': '檢驗員',
+        'efficiency': '效率指標',
+        'total_standard_time': '標準工時總和(分鐘)',
+        'total_actual_time': '實際耗時總和(分鐘)',
+        'record_count': '記錄筆數'
+    }
+    
+    # 2. 效率数据
+    efficiency_data = state.get('efficiency_data') or {}
+    efficiency_df = efficiency_data.get('overall_efficiency_ranking')
+    if efficiency_df is not None and not efficiency_df.empty:
+        sheets['整體效率排名'] = efficiency_df.rename(columns=efficiency_columns)
+    
+    # 3. 物料类别效率数据
+    for category, data in (efficiency_data.get('category_efficiency_data') or {}).items():
+        if data:  # 确保有数据
+            # 确保工作表名称有效（最多31个字符）
+            sheet_name = f"類別效率_{category}"
+            if len(sheet_name) > 31:
+                sheet_name = sheet_name[:28] + "..."
+            sheets[sheet_name] = pd.DataFrame(data).rename(columns=efficiency_columns)
+    
+    # 4. 工作负载数据
+    workload_df = state.get('workload_data')
+    if workload_df is not None and not workload_df.empty:
+        sheets['工作負載數據'] = workload_df.rename(columns={
+            'date': '日期',
+            'inspector': '檢驗員',
+            'inspection_time': '檢驗時間(分鐘)',
+            'additional_task_time': '額外任務時間(分鐘)',
+            'total_time': '總時間(分鐘)',
+            'workload_index': '工作負載指數',
+            'work_period': '工作時段',
+            'inspection_count': '檢驗次數'
+        })
+    
+    # 5. 时间分配数据
+    time_allocation_df = state.get('time_allocation_data')
+    if time_allocation_df is not None and not time_allocation_df.empty:
+        # 任務細項比例已是寬表欄位；舊版字典欄位則一次展開後移除
+        if 'task_detail_ratios' in time_allocation_df.columns:
+            task_ratio_table = get_task_ratio_table(time_allocation_df)
+            time_allocation_df = time_allocation_df.drop(columns=['task_detail_ratios'] + list(task_ratio_table.columns), errors='ignore')
+            time_allocation_df = time_allocation_df.join(task_ratio_table)
+        
+        sheets['時間分配數據'] = time_allocation_df.rename(columns={
+            'inspector': '檢驗員',
+            'inspection_time': '檢驗時間(分鐘)',
+            'additional_task_time': '額外任務時間(分鐘)',
+            'total_time': '總時間(分鐘)',
+            'inspection_ratio': '檢驗時間比例',
+            'additional_task_ratio': '額外任務時間比例'
+        })
+    
+    # 6. 额外任务数据
+    additional_tasks_df = state.get('additional_tasks_monitor_data')
+    if additional_tasks_df is not None and not additional_tasks_df.empty:
+        sheets['額外任務數據'] = additional_tasks_df.rename(columns={
+            'inspector': '檢驗員',
+            'task_type': '任務類型',
+            'total_time': '總時間(分鐘)'
+        })
+    
+    # 7. MRB 相關欄位
+    mrb_cols = [col for col in ['MRB狀態', 'MRB訊息', '基礎標準工時', 'MRB加時'] if col in processed_df.columns]
+    if 'MRB狀態' in mrb_cols and 'MRB訊息' in mrb_cols:
+        sheets['MRB數據'] = processed_df[mrb_cols]
+    
+    return sheets
+
+def _write_sheet_rows(worksheet, df, header_format, on_chunk=None):
+    """
+    依序逐列寫入工作表 (constant_memory 模式只能由上而下寫入)
+
+    每次只把 EXPORT_CHUNK_ROWS 列轉為 Python 物件，缺值寫為空白；
+    每寫完一批以寫入列數呼叫 on_chunk。
+    """
+    worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+    
+    row_number = 1
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        for values in chunk.itertuples(index=False, name=None):
+            worksheet.write_row(row_number, 0, values)
+            row_number += 1
+        if on_chunk is not None:
+            on_chunk(len(chunk))
+
+def write_streaming_workbook(sheets, path, progress=None):
+    """
+    以 xlsxwriter constant_memory 模式串流寫出Excel，記憶體用量不隨列數增加
+
+    參數:
+    sheets - collect_export_sheets() 的結果
+    path - 輸出檔案路徑
+    progress - 進度回呼 progress(完成比例, 目前階段)，可省略
+    """
+    import xlsxwriter
+    from xlsxwriter.utility import xl_col_to_name
+    
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        'nan_inf_to_errors': True
+    })
+    total_rows = max(1, sum(len(df) for df in sheets.values()))
+    rows_written = [0]
+    try:
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        mrb_highlight = workbook.add_format({'bg_color': '#FFC7CE'})
+        
+        for sheet_name, df in sheets.items():
+            worksheet = workbook.add_worksheet(sheet_name)
+            
+            def on_chunk(row_count, sheet_name=sheet_name):
+                rows_written[0] += row_count
+                if progress is not None:
+                    progress(0.9 * rows_written[0] / total_rows, f"寫入 {sheet_name}")
+            
+            if sheet_name == '處理後資料':
+                columns = list(df.columns)
+                # 設置列寬，特別是MRB相關列
+                worksheet.set_column('A:Z', 15)  # 默認列寬
+                if 'MRB訊息' in columns:
+                    col_letter = xl_col_to_name(columns.index('MRB訊息'))
+                    worksheet.set_column(f"{col_letter}:{col_letter}", 40)  # 更寬的列寬
+                
+                # 设置条件格式以高亮MRB记录
+                if '是否為MRB' in columns and len(df) > 0:
+                    col_letter = xl_col_to_name(columns.index('是否為MRB'))
+                    worksheet.conditional_format(f"{col_letter}2:{col_letter}{len(df)+1}", {
+                        'type': 'cell',
+                        'criteria': 'equal to',
+                        'value': '"TRUE"',
+                        'format': mrb_highlight
+                    })
+            
+            _write_sheet_rows(worksheet, df, header_format, on_chunk)
+            debug_log(f"匯出工作表 {sheet_name}: {len(df)} 筆")
+        
+        if progress is not None:
+            progress(0.9, "壓縮活頁簿")
+    finally:
+        workbook.close()
+
+def parquet_available():
+    """檢查是否安裝 Parquet 引擎 (pyarrow 或 fastparquet)"""
+    for package in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(package)
+            return True
+        except ImportError:
+            continue
+    return False
+
+def _serialize_sheet(df, export_format):
+    """
+    將單一工作表轉為 CSV 或 Parquet 位元組
+
+    CSV 使用 utf-8-sig 編碼，Excel 直接開啟時中文不會亂碼；
+    Parquet 遇到混合型別的文字欄位時，改以字串型別寫出。
+    """
+    buffer = io.BytesIO()
+    if export_format == 'csv':
+        df.to_csv(buffer, index=False, encoding='utf-8-sig')
+    else:
+        try:
+            df.to_parquet(buffer, index=False)
+        except Exception:
+            object_columns = df.select_dtypes(include='object').columns
+            buffer = io.BytesIO()
+            df.astype({col: 'string' for col in object_columns}).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+def write_zip_export(sheets, path, export_format, max_workers=EXPORT_MAX_WORKERS, progress=None):
+    """
+    以執行緒池平行產生各工作表的 CSV/Parquet 檔，再依工作表順序寫入 zip
+
+    參數:
+    sheets - collect_export_sheets() 的結果
+    path - 輸出 zip 路徑
+    export_format - 'csv' 或 'parquet'
+    max_workers - 執行緒數
+    progress - 進度回呼 progress(完成比例, 目前階段)，可省略
+    """
+    extension = '.csv' if export_format == 'csv' else '.parquet'
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = OrderedDict(
+            (sheet_name, executor.submit(_serialize_sheet, df, export_format))
+            for sheet_name, df in sheets.items()
+        )
+        # Parquet 本身已壓縮，不再重複壓縮
+        compression = zipfile.ZIP_DEFLATED if export_format == 'csv' else zipfile.ZIP_STORED
+        with zipfile.ZipFile(path, 'w', compression=compression) as archive:
+            for sheet_number, (sheet_name, future) in enumerate(futures.items(), start=1):
+                file_name = re.sub(r'[\\/:*?"<>|]', '_', sheet_name) + extension
+                archive.writestr(file_name, future.result())
+                debug_log(f"匯出檔案 {file_name}")
+                if progress is not None:
+                    progress(sheet_number / len(futures), f"寫入 {file_name}")
+
+def write_export_file(state, path, export_format, progress_state=None):
+    """
+    收集工作表並產生完整匯出檔案，可在背景計算程序中執行
+    
+    先寫入 path + '.part'，完成後才改名為 path，不會讀到寫到一半的檔案。
+    
+    參數:
+    state - 含 processed_data 等項目的 dict (見 collect_export_sheets)
+    path - 成品路徑
+    export_format - EXPORT_FORMATS 的鍵
+    progress_state - 寫入 'progress' (0~1) 與 'stage' 的 dict，跨程序時使用 Manager().dict()，可省略
+    
+    返回:
+    path
+    """
+    def report(fraction, stage):
+        if progress_state is not None:
+            progress_state.update(progress=min(max(float(fraction), 0.0), 1.0), stage=stage)
+    
+    partial_path = path + '.part'
+    try:
+        report(0.0, "整理匯出資料")
+        sheets = collect_export_sheets(state)
+        if export_format == 'xlsx':
+            write_streaming_workbook(sheets, partial_path, progress=report)
+        else:
+            write_zip_export(sheets, partial_path, export_format, progress=report)
+        os.replace(partial_path, path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    
+    report(1.0, "完成")
+    return path
@@ -0,0 +1,1127 @@
+"""
+檔案解析 (ingest)：讀取 IQC Report、PCB建檔明細、PCB標準工時對應表、IQC額外任務紀錄清單
+
+不依賴 Streamlit；介面另以 st.cache_data 包裝 process_multiple_* 函數。
+"""
+
+import functools
+import hashlib
+import traceback
+from datetime import datetime
+
+import pandas as pd
+
+from .logs import debug_log, report_error
+
+# ==================== 欄位映射 ====================
+FIELD_MAPPING = {
+    # IQC Report 欄位映射
+    'IQC_REPORT': {
+        '檢驗員': ['檢驗員', 'Inspector', '檢驗人員', '操作員'],
+        '檢驗日期': ['檢驗日期', 'Inspection Date', '日期', 'Date'],
+        '料號': ['料號', 'Part No.', 'Part No', 'PartNo', 'Part Number'],
+        '類別': ['類別', 'Category', 'Type'],
+        '抽樣狀態': ['抽樣狀態', 'Sampling Status', 'Status'],
+        '抽樣數量': ['抽樣數量', 'Sampling Qty', 'Sample Qty', 'Quantity'],
+        'MRB': ['MRB', 'MRB狀態', 'MRB Status'],
+        '檢驗標準工時': ['檢驗標準工時', 'Standard Time', '標準工時'],
+        '檢驗耗時（調整後）': ['檢驗耗時（調整後）', '檢驗耗時(調整後)', '檢驗耗時', 'Actual Time', '實際耗時'],
+        '檢驗開始時間': ['檢驗開始時間', 'AO', 'Start Time', '開始時間']
+    },
+    # PCB建檔明細欄位映射 - 壓合孔數從L欄改為N欄
+    'PCB_SPECS': {
+        '料號': ['料號', 'Part No.', 'Part No', 'PartNo', 'Part Number'],
+        '壓合孔數': ['壓合孔數', 'Hole Count', '孔數'],  # 用於名稱映射
+        '版長': ['版長', 'Length', '長度'],
+        '版寬': ['版寬', 'Width', '寬度']
+    },
+    # PCB標準工時對應表欄位映射
+    'PCB_STANDARD_TIME': {
+        '面積範圍': ['面積範圍', 'Area Range', '面積'],
+        '壓合總孔數': ['壓合總孔數', 'Total Hole Count', '孔數'],
+        'PCB標準工時': ['PCB標準工時', 'Standard Time', '標準工時']
+    },
+    # IQC額外任務紀錄清單欄位映射
+    'ADDITIONAL_TASKS': {
+        '姓名': ['姓名', 'Name', '下拉式選單', '人員', 'B'],
+        '日期': ['日期', 'Date', '手key', 'A'],
+        '工作事項分類': ['工作事項分類', 'Task Type', '下拉式選單_1', '任務類型', 'C'],
+        '用時(分鐘)': ['用時(分鐘)', '用時（分鐘）', 'Time(min)', '時間', '手key_3', 'H']
+    }
+}
+
+
+# ==================== 檔案解析 ====================
+@functools.lru_cache(maxsize=4096)
+def parse_excel_date(date_val):
+    """
+    解析各種Excel日期格式，支持多種日期格式
+    
+    參數:
+    date_val: 任意格式的日期值(數字、字符串、datetime對象等)
+    
+    返回:
+    datetime對象或None(如果無法解析)
+    """
+    if pd.isna(date_val):
+        return None
+    
+    try:
+        # 如果是數字（Excel日期），轉換為datetime
+        if isinstance(date_val, (int, float)):
+            try:
+                # Excel日期從1900年1月1日開始，但有個bug，會多算一天(1900年不是閏年)
+                return datetime.fromordinal(datetime(1900, 1, 1).toordinal() + int(date_val) - 2)
+            except:
+                pass
+        
+        # 如果是字符串，嘗試多種格式
+        if isinstance(date_val, str):
+            # 嘗試各種日期格式
+            formats = [
+                '%Y-%m-%d', '%Y/%m/%d', '%m/%d/%Y', '%d/%m/%Y', 
+                '%Y年%m月%d日', '%m-%d-%Y', '%d-%m-%Y',
+                '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S',
+                '%m/%d', '%Y-%m', '%m月%d日'
+            ]
+            
+            for fmt in formats:
+                try:
+                    return datetime.strptime(date_val, fmt)
+                except:
+                    continue
+            
+            # 嘗試從日期字符串中提取數字
+            import re
+            date_match = re.search(r'(\d{1,4})[-/年](\d{1,2})[-/月](\d{1,2})', date_val)
+            if date_match:
+                try:
+                    year, month, day = map(int, date_match.groups())
+                    if year < 100:  # 兩位數年份
+                        year += 2000
+                    return datetime(year, month, day)
+                except:
+                    pass
+        
+        # 如果已經是datetime，直接返回
+        if isinstance(date_val, datetime):
+            return date_val
+        
+        # 最後嘗試pandas的通用解析
+        return pd.to_datetime(date_val)
+    
+    except Exception as e:
+        debug_log(f"日期解析錯誤: {e}", date_val)
+        return None
+
+def check_is_mrb(row, mrb_cache={}):
+    """
+    MRB檢測函數，支援單行和DataFrame處理
+    """
+    # 檢查輸入是否為DataFrame
+    if isinstance(row, pd.DataFrame):
+        # 創建結果列
+        is_mrb = pd.Series(False, index=row.index)
+        mrb_messages = pd.Series("無MRB標記", index=row.index)
+        
+        # 可能的MRB欄位
+        mrb_columns = ['M', '異常問題匯總', 'Abnormal Summary']
+        
+        # 檢查所有可能的MRB欄位
+        for col in mrb_columns:
+            if col in row.columns:
+                # 使用向量化操作而非逐行判斷
+                col_mask = row[col].notna() & row[col].astype(str).str.strip().ne('')
+                is_mrb = is_mrb | col_mask
+                mrb_messages = mrb_messages.mask(col_mask, f"異常問題欄位({col})有內容")
+        
+        # 檢查Excel的M欄位位置 (第13個欄位)
+        if len(row.columns) >= 13:
+            m_col = row.columns[12]  # 第13個欄位 (0-based indexing)
+            if m_col not in mrb_columns and m_col in row.columns:
+                col_mask = row[m_col].notna() & row[m_col].astype(str).str.strip().ne('')
+                is_mrb = is_mrb | col_mask
+                mrb_messages = mrb_messages.mask(col_mask, f"M欄位({m_col})有內容")
+        
+        return pd.DataFrame({'是否為MRB': is_mrb, 'MRB訊息': mrb_messages})
+    
+    # 處理單行數據
+    else:
+        # 可能的MRB欄位
+        mrb_columns = ['M', '異常問題匯總', 'Abnormal Summary']
+        
+        # 檢查所有可能的MRB欄位
+        for col in mrb_columns:
+            if col in row and pd.notna(row[col]) and str(row[col]).strip() != '':
+                return (True, f"異常問題欄位({col})有內容: {row[col]}")
+        
+        # 嘗試直接檢查M欄位 (如果存在)
+        if 'M' in row and pd.notna(row['M']) and str(row['M']).strip() != '':
+            return (True, f"M欄位有內容: {row['M']}")
+        
+        return (False, "無MRB標記")
+
+def process_multiple_iqc_reports_optimized(files):
+    try:
+        debug_log(f"開始處理{len(files)}個IQC Report檔案")
+        all_data_frames = []
+        
+        # 特殊檢驗員名稱對應字典
+        special_inspectors = {
+            'Cindy': '謝芷馨',
+            'Joanne': '許碧琦',
+            'Susu': '蘇育珍',
+            'Wen': '許雅雯',
+            'Flora': '毛凡甫',
+            'ya-wen': '張雅雯'
+        }
+        
+        for file_idx, file in enumerate(files):
+            debug_log(f"處理第{file_idx+1}個IQC Report檔案: {file.name}")
+            
+            # 讀取Excel檔案
+            xls = pd.ExcelFile(file)
+            sheets = xls.sheet_names
+            
+            # 找到最可能的工作表
+            target_sheet = next((sheet for sheet in sheets 
+                                if any(keyword in sheet.lower() for keyword in 
+                                      ['report', 'data', '資料', '報告', 'iqc'])), 
+                              sheets[0])
+            
+            debug_log(f"使用工作表: {target_sheet}")
+            df = pd.read_excel(file, sheet_name=target_sheet)
+            debug_log(f"原始資料讀取完成，資料列數: {len(df)}")
+            
+            # 獲取欄位映射
+            field_mapping = FIELD_MAPPING['IQC_REPORT']
+            
+            # 找出所有可能的M欄位（用於MRB判斷）
+            m_column = df.columns[12] if len(df.columns) >= 13 else None
+            possible_mrb_columns = [col for col in df.columns if 
+                                   isinstance(col, str) and 
+                                   ('異常問題' in col or 'Abnormal' in col or col.upper() == 'M')]
+            if m_column and m_column not in possible_mrb_columns:
+                possible_mrb_columns.append(m_column)
+                
+            debug_log(f"可能的MRB欄位: {possible_mrb_columns}")
+            
+            # 批量處理檢驗員名稱
+            inspector_name_col = find_column_by_mapping(df, '檢驗員', field_mapping)
+            if inspector_name_col:
+                inspector_series = df[inspector_name_col].astype(str)
+                df['處理後檢驗員'] = inspector_series
+                
+                # 提取括號內容
+                bracket_pattern = r'\((.*?)\)'
+                df['處理後檢驗員'] = df['處理後檢驗員'].str.extract(bracket_pattern, expand=False)
+                
+                # 檢查WYLZ標記
+                df['包含WYLZ'] = df['處理後檢驗員'].str.contains('WYLZ', na=False)
+                
+                # 處理特殊案例
+                df['處理後檢驗員'] = df['處理後檢驗員'].map(
+                    lambda x: special_inspectors.get(x, x) if pd.notna(x) else x)
+            else:
+                df['處理後檢驗員'] = 'Unknown'
+                df['包含WYLZ'] = False
+            
+            # 批量處理檢驗開始時間
+            start_time_col = find_column_by_mapping(df, '檢驗開始時間', field_mapping)
+            if start_time_col:
+                df['檢驗開始時間'] = pd.to_datetime(df[start_time_col], errors='coerce')
+            
+            # ===== MRB狀態處理修正 =====
+            # 重要：使用字符串類型進行存儲，避免後續轉換問題
+            df['是否為MRB'] = "FALSE"
+            df['MRB狀態'] = "Normal inspection"
+            df['MRB訊息'] = "無MRB標記"
+            df['MRB內容'] = None
+            df['MRB加時'] = 0
+            
+            # 檢查所有可能的MRB欄位
+            mrb_found = False
+            for mrb_col in possible_mrb_columns:
+                if mrb_col in df.columns:
+                    # 創建掩碼標記非空值的MRB
+                    mrb_mask = df[mrb_col].notna() & (df[mrb_col].astype(str).str.strip() != '')
+                    if mrb_mask.any():
+                        # 明確使用字符串"TRUE"而非布爾值True
+                        df.loc[mrb_mask, '是否為MRB'] = "TRUE"
+                        df.loc[mrb_mask, 'MRB狀態'] = "MRB"
+                        df.loc[mrb_mask, 'MRB訊息'] = f"異常問題欄位({mrb_col})有內容"
+                        df.loc[mrb_mask, 'MRB內容'] = df.loc[mrb_mask, mrb_col]
+                        df.loc[mrb_mask, 'MRB加時'] = 30
+                        mrb_found = True
+                        debug_log(f"在欄位 {mrb_col} 找到 {mrb_mask.sum()} 筆MRB記錄")
+            
+            # 批量處理標準工時和檢驗耗時
+            std_time_col = find_column_by_mapping(df, '檢驗標準工時', field_mapping)
+            insp_time_col = find_column_by_mapping(df, '檢驗耗時（調整後）', field_mapping)
+            
+            # 向量化處理標準工時
+            if std_time_col:
+                df['處理後檢驗標準工時'] = pd.to_numeric(df[std_time_col], errors='coerce').fillna(0)
+            else:
+                df['處理後檢驗標準工時'] = 0
+            
+            # 向量化處理檢驗耗時
+            if insp_time_col:
+                df['檢驗耗時'] = pd.to_numeric(df[insp_time_col], errors='coerce').fillna(0)
+            else:
+                df['檢驗耗時'] = 0
+            
+            # 批量處理MRB加時 - 使用字符串比較
+            mrb_mask = df['是否為MRB'] == "TRUE"
+            df.loc[mrb_mask, '處理後檢驗標準工時'] += 30
+            
+            # 批量計算效率比值 - 向量化操作
+            df['效率比值'] = 0
+            
+            # 處理不同情況
+            zero_std_mask = df['處理後檢驗標準工時'] == 0
+            zero_insp_mask = df['檢驗耗時'] <= 0.1
+            
+            # 標準工時為0的情況
+            df.loc[zero_std_mask, '效率比值'] = 1
+            
+            # 檢驗耗時極小的情況
+            df.loc[~zero_std_mask & zero_insp_mask, '效率比值'] = 0
+            
+            # 正常計算的情況
+            normal_calc_mask = ~zero_std_mask & ~zero_insp_mask
+            df.loc[normal_calc_mask, '效率比值'] = df.loc[normal_calc_mask, '處理後檢驗標準工時'] / df.loc[normal_calc_mask, '檢驗耗時']
+            
+            # 限制最大效率比值
+            df.loc[df['效率比值'] > 20, '效率比值'] = 20
+            
+            # 批量處理其他欄位
+            category_col = find_column_by_mapping(df, '類別', field_mapping)
+            sample_status_col = find_column_by_mapping(df, '抽樣狀態', field_mapping)
+            part_no_col = find_column_by_mapping(df, '料號', field_mapping)
+            sample_qty_col = find_column_by_mapping(df, '抽樣數量', field_mapping)
+            date_col = find_column_by_mapping(df, '檢驗日期', field_mapping)
+            
+            # 使用向量化操作處理各欄位
+            df['類別'] = df[category_col] if category_col in df.columns else 'Unknown'
+            df['抽樣狀態'] = df[sample_status_col] if sample_status_col in df.columns else ''
+            df['料號'] = df[part_no_col] if part_no_col in df.columns else ''
+            
+            # 處理抽樣數量
+            if sample_qty_col in df.columns:
+                df['抽樣數量'] = pd.to_numeric(df[sample_qty_col], errors='coerce').fillna(1).astype(int)
+            else:
+                df['抽樣數量'] = 1
+            
+            # 處理檢驗日期
+            if date_col in df.columns:
+                df['檢驗日期'] = pd.to_datetime(df[date_col], errors='coerce')
+            
+            # 添加索引和檔案來源標記
+            df['_index'] = range(len(df))
+            df['檔案來源'] = file.name
+            
+            # 過濾掉抽樣狀態為 STS 的資料和包含 WYLZ 的資料
+            filtered_df = df[(df['抽樣狀態'] != 'STS') & (~df['包含WYLZ'])]
+            
+            # 選取需要的欄位
+            required_columns = [
+                '處理後檢驗員', '處理後檢驗標準工時', '檢驗耗時', '效率比值', 
+                '類別', '抽樣狀態', '料號', '抽樣數量', '檢驗日期', '檢驗開始時間',
+                '包含WYLZ', '是否為MRB', 'MRB狀態', 'MRB訊息', 'MRB內容', 'MRB加時', '_index', '檔案來源'
+            ]
+            
+            # 確保所有需要的欄位都存在
+            for col in required_columns:
+                if col not in filtered_df.columns:
+                    filtered_df[col] = None
+            
+            # 檢查MRB狀態是否正確存在
+            if mrb_found:
+                mrb_check = filtered_df['是否為MRB'] == "TRUE"
+                debug_log(f"過濾後仍有 {mrb_check.sum()} 筆MRB記錄", level="INFO")
+            
+            # 輸出表格前20行的MRB狀態統計以便調試
+            status_counts = filtered_df.head(20)['MRB狀態'].value_counts()
+            debug_log(f"頭20行MRB狀態統計: {status_counts.to_dict()}", level="INFO")
+            
+            all_data_frames.append(filtered_df[required_columns])
+        
+        # 合併所有資料框
+        if all_data_frames:
+            processed_df = pd.concat(all_data_frames, ignore_index=True)
+            debug_log(f"所有IQC Report檔案處理完成，總資料列數: {len(processed_df)}")
+            
+            # 檢查合併後MRB狀態
+            mrb_counts = processed_df['MRB狀態'].value_counts()
+            debug_log(f"合併後MRB狀態統計: {mrb_counts.to_dict()}", level="INFO")
+            
+            # 檢查合併後結果的欄位名是否正確
+            debug_log(f"合併後結果欄位名: {processed_df.columns.tolist()}")
+            
+            # 確保是否為MRB欄位為字符串類型，避免後續轉換問題
+            processed_df['是否為MRB'] = processed_df['是否為MRB'].astype(str)
+            
+            # 最後檢查資料
+            true_count = (processed_df['是否為MRB'] == "TRUE").sum()
+            mrb_status_count = (processed_df['MRB狀態'] == "MRB").sum()
+            
+            debug_log(f"最終結果: 是否為MRB=TRUE的記錄數: {true_count}", level="INFO")
+            debug_log(f"最終結果: MRB狀態=MRB的記錄數: {mrb_status_count}", level="INFO")
+            
+            return processed_df
+        else:
+            return pd.DataFrame()
+    
+    except Exception as e:
+        error_msg = f"處理 IQC Report 時出錯: {str(e)}\n{traceback.format_exc()}"
+        debug_log(error_msg)
+        report_error(error_msg)
+        raise e
+
+# 輔助函數：根據映射尋找相應欄位
+def find_column_by_mapping(df, field_name, mapping):
+    """
+    根據映射表尋找DataFrame中對應的欄位名稱
+    
+    參數:
+    df - DataFrame
+    field_name - 要尋找的欄位標準名稱
+    mapping - 欄位映射字典
+    
+    返回:
+    找到的欄位名稱或None
+    """
+    if field_name in mapping:
+        possible_names = mapping[field_name]
+        for name in possible_names:
+            if name in df.columns:
+                return name
+                
+        # 不區分大小寫嘗試
+        for col in df.columns:
+            if isinstance(col, str):
+                for name in possible_names:
+                    if name.lower() == col.lower():
+                        return col
+    return None
+
+def process_multiple_pcb_specs(files):
+    try:
+        debug_log(f"開始處理{len(files)}個PCB建檔明細檔案", level="INFO")
+        all_data = []
+        
+        for file_idx, file in enumerate(files):
+            debug_log(f"處理第{file_idx+1}個PCB建檔明細檔案: {file.name}", level="INFO")
+            
+            # 讀取Excel檔案，尋找目標工作表
+            try:
+                xls = pd.ExcelFile(file)
+                sheets = xls.sheet_names
+                
+                # 智能工作表選擇 - 優先選擇包含關鍵字的工作表
+                target_sheet = None
+                
+                # 按優先順序尋找工作表
+                for keyword in ["建立規格_總表", "建立規格", "總表", "規格"]:
+                    matches = [sheet for sheet in sheets if keyword in sheet]
+                    if matches:
+                        target_sheet = matches[0]
+                        break
+                
+                # 如果沒找到，使用第一個工作表
+                if not target_sheet:
+                    target_sheet = sheets[0]
+                
+                debug_log(f"使用工作表: {target_sheet}", level="INFO")
+                
+                # 直接讀取資料，不進行列名處理
+                df = pd.read_excel(file, sheet_name=target_sheet)
+                
+                # 快速定位關鍵欄位 - 不需要進行完整的列名轉換
+                key_columns = {
+                    'C': 'part_no',         # 料號 (C欄)
+                    'N': 'hole_count',      # 壓合孔數 (N欄)
+                    'L': 'hole_count_alt',  # 替代壓合孔數位置 (L欄)
+                    'AB': 'length',         # 版長 (AB欄)
+                    'AE': 'width'           # 版寬 (AE欄)
+                }
+                
+                # 創建結果資料框 - 只保留必要欄位
+                result_df = pd.DataFrame()
+                
+                # 提取料號 (C欄) - 必要欄位
+                if 2 < df.shape[1]:  # 確保C欄存在
+                    result_df['料號'] = df.iloc[:, 2].copy()
+                    result_df['C'] = df.iloc[:, 2].copy()
+                else:
+                    debug_log("找不到C欄 (料號)，跳過此檔案", level="WARNING")
+                    continue
+                
+                # 提取壓合孔數 (嘗試N欄，如果不存在則使用L欄)
+                if 13 < df.shape[1]:  # N欄 (第14列)
+                    result_df['壓合孔數'] = df.iloc[:, 13].copy()
+                    result_df['N'] = df.iloc[:, 13].copy()
+                    debug_log(f"使用N欄位獲取壓合孔數", level="INFO")
+                elif 11 < df.shape[1]:  # L欄 (第12列)
+                    result_df['壓合孔數'] = df.iloc[:, 11].copy()
+                    result_df['N'] = df.iloc[:, 11].copy()
+                    debug_log(f"N欄位不存在，使用L欄位獲取壓合孔數", level="INFO")
+                else:
+                    result_df['壓合孔數'] = 'NA'
+                    result_df['N'] = 'NA'
+                
+                # 提取版長 (AB欄，第28列)
+                if 27 < df.shape[1]:
+                    result_df['版長'] = df.iloc[:, 27].copy()
+                    result_df['AB'] = df.iloc[:, 27].copy()
+                else:
+                    result_df['版長'] = 0
+                    result_df['AB'] = 0
+                
+                # 提取版寬 (AE欄，第31列)
+                if 30 < df.shape[1]:
+                    result_df['版寬'] = df.iloc[:, 30].copy()
+                    result_df['AE'] = df.iloc[:, 30].copy()
+                else:
+                    result_df['版寬'] = 0
+                    result_df['AE'] = 0
+                
+                # 添加檔案來源標記
+                result_df['檔案來源'] = file.name
+                
+                # 過濾掉料號為空的資料 - 向量化操作
+                result_df = result_df[result_df['料號'].notna()].copy()
+                
+                # 壓合孔數處理 - 向量化處理NA值
+                result_df['壓合孔數'] = result_df['壓合孔數'].apply(
+                    lambda x: 'NA' if pd.isna(x) or x == 'NA' else x
+                )
+                
+                # 添加到總結果
+                all_data.append(result_df)
+                debug_log(f"第{file_idx+1}個檔案處理完成，資料列數: {len(result_df)}", level="INFO")
+            
+            except Exception as e:
+                error_msg = f"處理檔案 {file.name} 時出錯: {str(e)}"
+                debug_log(error_msg, level="ERROR")
+                continue
+        
+        # 合併所有處理後的資料
+        if all_data:
+            processed_df = pd.concat(all_data, ignore_index=True)
+            debug_log(f"所有PCB建檔明細檔案處理完成，總資料列數: {len(processed_df)}", level="INFO")
+            
+            # 檢查關鍵欄位
+            key_fields = ['C', 'N', 'AB', 'AE']
+            missing_cols = [col for col in key_fields if col not in processed_df.columns]
+            
+            if missing_cols:
+                debug_log(f"警告: 缺少關鍵Excel欄位: {missing_cols}", level="WARNING")
+            else:
+                debug_log("成功提取所有關鍵Excel欄位", level="INFO")
+                
+                # 只顯示少量樣本數據，減少日誌量
+                sample_size = min(5, len(processed_df))
+                for i in range(sample_size):
+                    debug_log(f"樣本 {i+1}: 料號={processed_df.iloc[i]['C']}, 壓合孔數={processed_df.iloc[i]['N']}, " +
+                             f"版長={processed_df.iloc[i]['AB']}, 版寬={processed_df.iloc[i]['AE']}")
+            
+            return processed_df
+        else:
+            debug_log("沒有成功處理任何PCB建檔明細檔案", level="WARNING")
+            return pd.DataFrame()
+    
+    except Exception as e:
+        error_msg = f"處理 PCB建檔明細 時出錯: {str(e)}\n{traceback.format_exc()}"
+        debug_log(error_msg, level="ERROR")
+        report_error(error_msg)
+        raise e
+
+# 優化的面積範圍解析函數，從PCBDEBUG4_WORK整合
+@functools.lru_cache(maxsize=4096)
+def parse_area_range(area_range_str):
+    """將面積範圍字符串解析為最小值和最大值"""
+    try:
+        area_range_str = str(area_range_str) if pd.notna(area_range_str) else ""
+        
+        min_area = 0
+        max_area = float('inf')
+        
+        if "小於" in area_range_str:
+            # 例如: "小於100000"
+            max_area = float(''.join(filter(str.isdigit, area_range_str)))
+        elif "超過" in area_range_str:
+            # 例如: "超過250000"
+            min_area = float(''.join(filter(str.isdigit, area_range_str)))
+        elif "到" in area_range_str:
+            # 例如: "100000到150000"
+            parts = area_range_str.split("到")
+            if len(parts) == 2:
+                min_area = float(''.join(filter(str.isdigit, parts[0].strip())))
+                max_area = float(''.join(filter(str.isdigit, parts[1].strip())))
+        
+        return min_area, max_area, area_range_str
+    except Exception as e:
+        debug_log(f"解析面積範圍時出錯: {e}, 原始值: {area_range_str}", level="ERROR")
+        return 0, float('inf'), area_range_str
+
+def process_multiple_pcb_standard_times(files):
+    try:
+        debug_log(f"開始處理{len(files)}個PCB標準工時對應表檔案")
+        all_data = []
+        
+        for file_idx, file in enumerate(files):
+            debug_log(f"處理第{file_idx+1}個PCB標準工時對應表檔案: {file.name}")
+            
+            # 讀取Excel檔案
+            xls = pd.ExcelFile(file)
+            sheets = xls.sheet_names
+            debug_log(f"Excel檔案包含以下工作表: {sheets}")
+            
+            # 使用第一個工作表
+            sheet_name = sheets[0]
+            debug_log(f"使用工作表: {sheet_name}")
+            
+            # 讀取所有欄位，不轉換列名
+            df = pd.read_excel(file, sheet_name=sheet_name, header=0)
+            debug_log(f"原始資料讀取完成，資料列數: {len(df)}")
+            
+            # 檢查並顯示一些欄位名稱進行調試
+            debug_log(f"資料欄位名稱: {list(df.columns)[:10]}...")
+            
+            # 保留原始列索引 (A, B, C, ...)
+            alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+            excel_cols = {}
+            
+            for i, col in enumerate(df.columns):
+                # 生成Excel列名 (A, B, ..., Z, AA, AB, ...)
+                if i < 26:
+                    excel_col = alphabet[i]
+                else:
+                    excel_col = alphabet[i // 26 - 1] + alphabet[i % 26]
+                
+                excel_cols[col] = excel_col
+                debug_log(f"列 {i}: {col} -> {excel_col}")
+            
+            # 將DataFrame的列重命名為Excel列名
+            new_columns = {}
+            for i, col in enumerate(df.columns):
+                if i < 26:
+                    new_columns[col] = alphabet[i]
+                else:
+                    new_columns[col] = alphabet[i // 26 - 1] + alphabet[i % 26]
+            
+            df = df.rename(columns=new_columns)
+            
+            # 準備處理後的數據
+            processed_data = []
+            
+            # 將DataFrame轉換為字典列表
+            records = df.to_dict('records')
+            
+            for idx, row in enumerate(records):
+                # 只處理前幾筆進行調試
+                if idx < 5:
+                    debug_log(f"處理第 {idx+1} 筆資料: {row}")
+                
+                # 面積範圍處理 - 使用B欄
+                area_range = row.get('B', '')
+                
+                # 抽樣數量處理 - 使用C欄
+                sample_qty = row.get('C', '')
+                
+                # 壓合總孔數處理 - 使用D欄
+                hole_count = row.get('D', '')
+                
+                # PCB標準工時處理 - 使用G欄 "檢驗工時_AI預測值 (1203版)"
+                standard_time_field = row.get('G', 120)
+                try:
+                    standard_time = float(standard_time_field) if standard_time_field else 120
+                    # 檢查標準工時單位，確保是分鐘
+                    if standard_time < 10:  # 假設如果值小於10，可能是小時單位
+                        debug_log(f"標準工時疑似為小時單位: {standard_time}，轉換為分鐘: {standard_time * 60}")
+                        standard_time *= 60  # 轉換為分鐘
+                except (ValueError, TypeError):
+                    debug_log(f"無法轉換PCB標準工時值: {standard_time_field}，設置為120分鐘")
+                    standard_time = 120
+                
+                processed_row = {
+                    '面積範圍': area_range,
+                    '抽樣數量': sample_qty,
+                    '壓合總孔數': hole_count,
+                    'PCB標準工時': standard_time,
+                    'B': area_range,  # 保存原始Excel欄位數據
+                    'C': sample_qty,
+                    'D': hole_count,
+                    'G': standard_time,
+                    '檔案來源': file.name  # 添加檔案來源標記
+                }
+                
+                # 合併原始資料和處理後的資料，保留所有Excel欄位
+                for key, value in row.items():
+                    if key not in processed_row:
+                        processed_row[key] = value
+                
+                processed_data.append(processed_row)
+            
+            # 將當前檔案的處理結果添加到總結果中
+            all_data.extend(processed_data)
+            debug_log(f"第{file_idx+1}個檔案處理完成，累計資料筆數: {len(all_data)}")
+        
+        # 轉換為DataFrame
+        processed_df = pd.DataFrame(all_data)
+        debug_log(f"所有PCB標準工時對應表檔案處理完成，總資料列數: {len(processed_df)}")
+        
+        # 檢查是否成功提取了關鍵欄位
+        if 'B' in processed_df.columns and 'D' in processed_df.columns and 'G' in processed_df.columns:
+            debug_log("成功提取所有關鍵Excel欄位")
+            
+            # 顯示幾個樣本檢查數據
+            for i in range(min(5, len(processed_df))):
+                debug_log(f"樣本 {i+1}: 面積範圍={processed_df.iloc[i]['B']}, 壓合總孔數={processed_df.iloc[i]['D']}, " +
+                         f"標準工時={processed_df.iloc[i]['G']}")
+        else:
+            missing_cols = []
+            if 'B' not in processed_df.columns: missing_cols.append('B')
+            if 'D' not in processed_df.columns: missing_cols.append('D')
+            if 'G' not in processed_df.columns: missing_cols.append('G')
+            debug_log(f"警告: 缺少關鍵Excel欄位: {missing_cols}")
+        
+        return processed_df
+    
+    except Exception as e:
+        error_msg = f"處理 PCB標準工時對應表 時出錯: {str(e)}\n{traceback.format_exc()}"
+        debug_log(error_msg)
+        report_error(error_msg)
+        raise e
+
+def process_multiple_additional_tasks(files):
+    try:
+        debug_log(f"開始處理{len(files)}個IQC額外任務紀錄清單檔案")
+        all_data = []
+        
+        for file_idx, file in enumerate(files):
+            debug_log(f"處理第{file_idx+1}個IQC額外任務紀錄清單檔案: {file.name}")
+            
+            # 读取Excel文件
+            xls = pd.ExcelFile(file)
+            sheets = xls.sheet_names
+            debug_log(f"Excel檔案包含以下工作表: {sheets}")
+            
+            # 使用第一个工作表
+            sheet_name = sheets[0]
+            debug_log(f"使用工作表: {sheet_name}")
+            
+            # 嘗試不同的讀取方法
+            try:
+                # 先完全不指定header，得到原始數據
+                raw_df = pd.read_excel(file, sheet_name=sheet_name, header=None)
+                debug_log(f"原始數據前5行:\n{raw_df.head()}")
+                
+                # 嘗試偵測標題行 - 檢查前5行
+                header_row = None
+                for i in range(min(5, len(raw_df))):
+                    row_str = ' '.join([str(x) for x in raw_df.iloc[i].values])
+                    debug_log(f"第{i}行內容: {row_str}")
+                    
+                    # 如果該行包含關鍵字，可能是標題行
+                    if '姓名' in row_str or '工作事項分類' in row_str or '用時' in row_str:
+                        header_row = i
+                        debug_log(f"偵測到第{i}行可能是標題行: {row_str}")
+                        break
+                
+                # 使用偵測到的標題行或預設使用第0行
+                if header_row is not None:
+                    df = pd.read_excel(file, sheet_name=sheet_name, header=header_row)
+                    debug_log(f"使用第{header_row}行作為標題")
+                else:
+                    df = pd.read_excel(file, sheet_name=sheet_name)
+                    debug_log("使用預設標題行")
+                
+                debug_log(f"處理後資料欄位: {list(df.columns)}")
+                
+            except Exception as e:
+                debug_log(f"標題偵測失敗，使用預設方式讀取: {e}")
+                df = pd.read_excel(file, sheet_name=sheet_name)
+            
+            debug_log(f"原始資料讀取完成，資料列數: {len(df)}")
+            
+            # 使用更多的欄位名稱備選方案
+            field_mapping = {
+                '姓名': ['姓名', 'Name', '下拉式選單', '人員', 'B', '檢驗員', 'Inspector', '檢驗人員'],
+                '日期': ['日期', 'Date', '手key', 'A', '檢驗日期', '任務日期', '記錄日期'],
+                '工作事項分類': ['工作事項分類', 'Task Type', '下拉式選單_1', '任務類型', 'C', '工作項目', '事項分類'],
+                '用時(分鐘)': ['用時(分鐘)', '用時（分鐘）', 'Time(min)', '時間', '手key_3', 'H', '工時', '分鐘']
+            }
+            
+            # 準備處理後的數據
+            processed_data = []
+            
+            # 轉換為字典列表
+            records = df.to_dict('records')
+            
+            # 檢查是否使用Excel列標識（A, B, C...）
+            excel_columns_map = {
+                'A': '日期',
+                'B': '姓名',
+                'C': '工作事項分類',
+                'H': '用時(分鐘)'
+            }
+            has_excel_columns = any(col in df.columns for col in ['A', 'B', 'C', 'H'])
+            debug_log(f"是否含有Excel欄位標識: {has_excel_columns}")
+            
+            for idx, row in enumerate(records):
+                # 只處理前幾筆進行調試
+                if idx < 5:
+                    debug_log(f"處理第 {idx+1} 筆資料: {row}")
+                
+                # 嘗試從不同來源獲取資料
+                name = None
+                date_value = None
+                task_type = None
+                time_value = None
+                
+                # 1. 直接使用欄位名稱
+                for field, possible_names in field_mapping.items():
+                    for possible_name in possible_names:
+                        if possible_name in row and pd.notna(row[possible_name]):
+                            if field == '姓名' and name is None:
+                                name = row[possible_name]
+                            elif field == '日期' and date_value is None:
+                                date_value = row[possible_name]
+                            elif field == '工作事項分類' and task_type is None:
+                                task_type = row[possible_name]
+                            elif field == '用時(分鐘)' and time_value is None:
+                                time_value = row[possible_name]
+                
+                # 2. 使用Excel欄位標識
+                if has_excel_columns:
+                    if name is None and 'B' in row and pd.notna(row['B']):
+                        name = row['B']
+                    if date_value is None and 'A' in row and pd.notna(row['A']):
+                        date_value = row['A']
+                    if task_type is None and 'C' in row and pd.notna(row['C']):
+                        task_type = row['C']
+                    if time_value is None and 'H' in row and pd.notna(row['H']):
+                        time_value = row['H']
+                
+                # 3. 使用數字索引（如果沒有名稱）
+                if name is None and 1 in row and pd.notna(row[1]):
+                    name = row[1]
+                if date_value is None and 0 in row and pd.notna(row[0]):
+                    date_value = row[0]
+                if task_type is None and 2 in row and pd.notna(row[2]):
+                    task_type = row[2]
+                if time_value is None and 7 in row and pd.notna(row[7]):
+                    time_value = row[7]
+                
+                # 檢查是否獲取到了有效資訊
+                if name is None or pd.isna(name) or name == '姓名' or name == '下拉式選單':
+                    continue
+                    
+                # 處理日期
+                parsed_date = None
+                if date_value is not None:
+                    parsed_date = parse_excel_date(date_value)
+                    if parsed_date is None:
+                        debug_log(f"無法解析日期: {date_value}")
+                        # 嘗試使用文件名稱中的日期
+                        import re
+                        date_match = re.search(r'(\d{1,2}[-/]\d{1,2})', file.name)
+                        if date_match:
+                            date_str = date_match.group(1)
+                            try:
+                                # 假設格式為月/日或月-日
+                                current_year = datetime.now().year
+                                if '/' in date_str:
+                                    month, day = map(int, date_str.split('/'))
+                                else:
+                                    month, day = map(int, date_str.split('-'))
+                                parsed_date = datetime(current_year, month, day)
+                                debug_log(f"從檔名取得日期: {parsed_date}")
+                            except:
+                                debug_log("從檔名取得日期失敗")
+                
+                # 處理時間值
+                try:
+                    time_minutes = 0
+                    if time_value is not None and pd.notna(time_value):
+                        # 處理不同格式的時間值
+                        if isinstance(time_value, str):
+                            # 移除非數字字符
+                            time_value = ''.join(c for c in time_value if c.isdigit() or c == '.')
+                            if time_value:
+                                time_minutes = float(time_value)
+                        else:
+                            time_minutes = float(time_value)
+                except (ValueError, TypeError) as e:
+                    debug_log(f"處理時間值出錯: {e}, 原始值: {time_value}")
+                    time_minutes = 0
+                
+                # 整合資料
+                processed_row = {
+                    '姓名': name,
+                    '日期': parsed_date,
+                    '工作事項分類': task_type if task_type is not None else 'Other',
+                    '用時(分鐘)': time_minutes,
+                    '_index': idx,
+                    '檔案來源': file.name
+                }
+                
+                processed_data.append(processed_row)
+                
+                if idx < 5:
+                    debug_log(f"處理結果: {processed_row}")
+            
+            # 將當前檔案的處理結果添加到總結果中
+            all_data.extend(processed_data)
+            debug_log(f"第{file_idx+1}個檔案處理完成，累計資料筆數: {len(all_data)}")
+        
+        # 轉換為DataFrame
+        df_processed = pd.DataFrame(all_data)
+        debug_log(f"所有IQC額外任務紀錄清單檔案處理完成，總資料列數: {len(df_processed)}")
+        
+        # 過濾掉無效的數據
+        if not df_processed.empty:
+            df_filtered = df_processed[(df_processed['姓名'] != 'Unknown') & 
+                                      (df_processed['姓名'] != '姓名') & 
+                                      (df_processed['姓名'] != '下拉式選單')]
+            
+            debug_log(f"過濾後資料列數: {len(df_filtered)}")
+            
+            # 確保所有日期都是datetime格式
+            if '日期' in df_filtered.columns:
+                df_filtered['日期'] = pd.to_datetime(df_filtered['日期'], errors='coerce')
+                
+                # 調試日期範圍
+                if not df_filtered.empty:
+                    min_date = df_filtered['日期'].min()
+                    max_date = df_filtered['日期'].max()
+                    debug_log(f"額外任務數據日期範圍: {min_date} 到 {max_date}")
+            
+            return df_filtered
+        else:
+            debug_log("處理後沒有有效資料")
+            return pd.DataFrame()
+    
+    except Exception as e:
+        error_msg = f"處理 IQC額外任務紀錄清單 時出錯: {str(e)}\n{traceback.format_exc()}"
+        debug_log(error_msg)
+        report_error(error_msg)
+        return pd.DataFrame()  # 返回空DataFrame而不是拋出異常，避免中斷程序
+
+
+# ==================== 檔案分類與資料版本 ====================
+# 改进后的文件分类函数
+def classify_files(files):
+    """
+    根据文件名和内容智能分类上传的文件
+    返回四组文件：IQC Report, PCB建檔明細, PCB標準工時對應表, IQC額外任務紀錄清單
+    """
+    debug_log(f"开始分类 {len(files)} 个文件")
+    
+    iqc_report_files = []
+    pcb_specs_files = []
+    pcb_standard_time_files = []
+    additional_tasks_files = []
+    
+    # 打印所有上传的文件名，便于调试
+    file_names = [f.name for f in files]
+    debug_log(f"所有上传文件: {file_names}")
+    
+    # 更完整的关键词匹配规则
+    iqc_report_keywords = ['iqc', 'report', '報告', '檢驗報告', '檢驗', 'inspector']
+    pcb_specs_keywords = ['pcb', '建檔', '明細', 'spec', '建立規格']
+    pcb_std_time_keywords = ['標準工時', 'standard', 'time', '對應表', '工時']
+    additional_tasks_keywords = ['額外', '任務', 'task', '清單', '紀錄', '工作事項']
+    
+    # 精确匹配特定文件名
+    pcb_std_time_exact = ['pcb標準工時對應表.xlsx', 'pcb標準工時對應表.xls']
+    additional_tasks_exact = ['iqc額外任務紀錄清單.xlsx', 'iqc額外任務紀錄清單.xls']
+    
+    for file in files:
+        # 保存原始文件指针位置
+        file_position = file.tell()
+        
+        filename = file.name
+        filename_lower = filename.lower()
+        file_classified = False
+        
+        # 1. 首先尝试精确匹配文件名
+        if any(exact_name.lower() == filename_lower for exact_name in pcb_std_time_exact):
+            pcb_standard_time_files.append(file)
+            debug_log(f"文件 {filename} 通过精确匹配被识别为 PCB標準工時對應表")
+            file_classified = True
+        
+        elif any(exact_name.lower() == filename_lower for exact_name in additional_tasks_exact):
+            additional_tasks_files.append(file)
+            debug_log(f"文件 {filename} 通过精确匹配被识别为 IQC額外任務紀錄清單")
+            file_classified = True
+            
+        # 2. 如果没有精确匹配成功，尝试关键词匹配
+        elif not file_classified:
+            # PCB标准工时关键词优先级高于其他类型
+            if any(keyword in filename_lower for keyword in pcb_std_time_keywords):
+                pcb_standard_time_files.append(file)
+                debug_log(f"文件 {filename} 通过关键词被识别为 PCB標準工時對應表")
+                file_classified = True
+                
+            elif any(keyword in filename_lower for keyword in additional_tasks_keywords):
+                additional_tasks_files.append(file)
+                debug_log(f"文件 {filename} 通过关键词被识别为 IQC額外任務紀錄清單")
+                file_classified = True
+                
+            elif any(keyword in filename_lower for keyword in pcb_specs_keywords):
+                pcb_specs_files.append(file)
+                debug_log(f"文件 {filename} 通过关键词被识别为 PCB建檔明細")
+                file_classified = True
+                
+            elif any(keyword in filename_lower for keyword in iqc_report_keywords) or 'iqc report' in filename_lower:
+                iqc_report_files.append(file)
+                debug_log(f"文件 {filename} 通过关键词被识别为 IQC Report")
+                file_classified = True
+        
+        # 3. 如果仍然未识别，尝试读取内容
+        if not file_classified:
+            try:
+                # 重置文件指针
+                file.seek(0)
+                
+                # 读取Excel文件的表头来识别文件类型
+                df = pd.read_excel(file, nrows=5)
+                columns = [str(col).lower() for col in df.columns]
+                debug_log(f"文件 {filename} 的表头: {columns[:10]}")
+                
+                # 判断是否为PCB标准工时对应表
+                if any(keyword in ','.join(columns) for keyword in ['面積範圍', '面积范围', '壓合總孔數', '压合总孔数', 'pcb標準工時']):
+                    pcb_standard_time_files.append(file)
+                    debug_log(f"文件 {filename} 通过内容被识别为 PCB標準工時對應表")
+                
+                # 判断是否为IQC额外任务记录清单
+                elif any(keyword in ','.join(columns) for keyword in ['姓名', '用時(分鐘)', '用时(分钟)', '工作事項分類', '工作事项分类']):
+                    additional_tasks_files.append(file)
+                    debug_log(f"文件 {filename} 通过内容被识别为 IQC額外任務紀錄清單")
+                
+                # 判断是否为PCB建档明细
+                elif any(keyword in ','.join(columns) for keyword in ['料號', '料号', '壓合孔數', '压合孔数', '版長', '版长', '版寬', '版宽']):
+                    pcb_specs_files.append(file)
+                    debug_log(f"文件 {filename} 通过内容被识别为 PCB建檔明細")
+                
+                # 判断是否为IQC Report
+                elif any(keyword in ','.join(columns) for keyword in ['inspector', '檢驗員', '检验员', '檢驗人員', '检验人员', 'mrb']):
+                    iqc_report_files.append(file)
+                    debug_log(f"文件 {filename} 通过内容被识别为 IQC Report")
+                
+                else:
+                    # 如果仍然无法识别，根据特定线索进一步判断
+                    if '工時' in filename_lower or '工时' in filename_lower or 'time' in filename_lower:
+                        pcb_standard_time_files.append(file)
+                        debug_log(f"文件 {filename} 通过额外规则被识别为 PCB標準工時對應表")
+                    elif '任務' in filename_lower or '任务' in filename_lower or 'task' in filename_lower:
+                        additional_tasks_files.append(file)
+                        debug_log(f"文件 {filename} 通过额外规则被识别为 IQC額外任務紀錄清單")
+                    else:
+                        # 最后的默认分类
+                        iqc_report_files.append(file)
+                        debug_log(f"文件 {filename} 无法确定类型，默认识别为 IQC Report")
+                
+            except Exception as e:
+                debug_log(f"尝试读取文件 {filename} 内容时出错: {str(e)}")
+                # 如果读取失败，尝试最后一次通过文件名判断
+                if any(term in filename_lower for term in ['工時', '工时', 'time']):
+                    pcb_standard_time_files.append(file)
+                    debug_log(f"文件 {filename} 读取失败，通过文件名判断为 PCB標準工時對應表")
+                elif any(term in filename_lower for term in ['任務', '任务', 'task']):
+                    additional_tasks_files.append(file)
+                    debug_log(f"文件 {filename} 读取失败，通过文件名判断为 IQC額外任務紀錄清單")
+                else:
+                    # 如果还是不能确定，默认为IQC Report
+                    iqc_report_files.append(file)
+                    debug_log(f"文件 {filename} 读取失败，默认识别为 IQC Report")
+            
+        # 重置文件指针回原位置
+        file.seek(file_position)
+    
+    # 检查特定类型文件是否缺失，如果用户明确上传了文件但未被正确识别，强制分类
+    if not pcb_standard_time_files and any('工時' in f.name.lower() or '工时' in f.name.lower() or 'time' in f.name.lower() for f in files):
+        for file in files:
+            if ('工時' in file.name.lower() or '工时' in file.name.lower() or 'time' in file.name.lower()) and file not in pcb_standard_time_files:
+                pcb_standard_time_files.append(file)
+                debug_log(f"强制将文件 {file.name} 识别为 PCB標準工時對應表")
+                # 从其他类别中移除(如果存在)
+                if file in iqc_report_files: iqc_report_files.remove(file)
+                if file in pcb_specs_files: pcb_specs_files.remove(file)
+                if file in additional_tasks_files: additional_tasks_files.remove(file)
+    
+    if not additional_tasks_files and any('任務' in f.name.lower() or '任务' in f.name.lower() or 'task' in f.name.lower() for f in files):
+        for file in files:
+            if ('任務' in file.name.lower() or '任务' in file.name.lower() or 'task' in file.name.lower()) and file not in additional_tasks_files:
+                additional_tasks_files.append(file)
+                debug_log(f"强制将文件 {file.name} 识别为 IQC額外任務紀錄清單")
+                # 从其他类别中移除(如果存在)
+                if file in iqc_report_files: iqc_report_files.remove(file)
+                if file in pcb_specs_files: pcb_specs_files.remove(file)
+                if file in pcb_standard_time_files: pcb_standard_time_files.remove(file)
+    
+    # 再次检查，如果仍然缺少特定类型，尝试从未分类文件或多余的IQC Report文件中找出可能的匹配
+    remaining_files = [f for f in files if f not in iqc_report_files and f not in pcb_specs_files and 
+                       f not in pcb_standard_time_files and f not in additional_tasks_files]
+    
+    if not pcb_standard_time_files and remaining_files:
+        # 从剩余文件中添加第一个作为PCB标准工时对应表
+        pcb_standard_time_files.append(remaining_files[0])
+        debug_log(f"未找到PCB標準工時對應表，强制将文件 {remaining_files[0].name} 识别为此类型")
+        remaining_files.pop(0)
+    
+    if not additional_tasks_files and remaining_files:
+        # 从剩余文件中添加第一个作为IQC额外任务记录清单
+        additional_tasks_files.append(remaining_files[0])
+        debug_log(f"未找到IQC額外任務紀錄清單，强制将文件 {remaining_files[0].name} 识别为此类型")
+        remaining_files.pop(0)
+    
+    # 最后一次检查，如果仍然缺少，且IQC Report有多个，则将其中一个重新分类
+    if not pcb_standard_time_files and len(iqc_report_files) > 1:
+        file = iqc_report_files.pop() # 移除最后一个IQC Report
+        pcb_standard_time_files.append(file)
+        debug_log(f"未找到PCB標準工時對應表，从IQC Report中重新分类文件 {file.name}")
+    
+    if not additional_tasks_files and len(iqc_report_files) > 1:
+        file = iqc_report_files.pop() # 移除最后一个IQC Report
+        additional_tasks_files.append(file)
+        debug_log(f"未找到IQC額外任務紀錄清單，从IQC Report中重新分类文件 {file.name}")
+    
+    # 输出最终分类结果
+    debug_log(f"文件分类完成: IQC Report({len(iqc_report_files)}), PCB建檔明細({len(pcb_specs_files)}), " +
+             f"PCB標準工時對應表({len(pcb_standard_time_files)}), IQC額外任務紀錄清單({len(additional_tasks_files)})")
+    
+    debug_log(f"PCB標準工時對應表: {[f.name for f in pcb_standard_time_files]}")
+    debug_log(f"IQC額外任務紀錄清單: {[f.name for f in additional_tasks_files]}")
+    
+    return iqc_report_files, pcb_specs_files, pcb_standard_time_files, additional_tasks_files
+
+def compute_data_version(*frames):
+    """
+    計算資料內容的版本代碼，於檔案處理 (ingest) 時計算一次
+
+    之後的指標快取以此代碼作為鍵，不必每次呼叫都對整個 DataFrame 做雜湊。
+
+    參數:
+    frames - 任意數量的 DataFrame (可為 None)
+
+    返回:
+    16 字元的十六進位版本代碼
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for frame in frames:
+        if frame is None:
+            digest.update(b'<none>')
+            continue
+        digest.update(repr((frame.shape, list(frame.columns))).encode('utf-8'))
+        try:
+            row_hashes = pd.util.hash_pandas_object(frame, index=False)
+        except TypeError:
+            # 含 list/dict 等不可雜湊的儲存格時，以字串內容計算
+            row_hashes = pd.util.hash_pandas_object(frame.astype(str), index=False)
+        digest.update(row_hashes.to_numpy().tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,62 @@
+"""
+計算程序工作 (jobs)：介面交給計算程序池執行的指標計算與匯出
+
+工作只接收磁碟快取目錄與上傳檔案雜湊，由計算程序自行讀取資料集，
+提交工作時不必把整份資料 pickle 傳給計算程序 (介面程序不產生序列化副本)。
+"""
+
+from .cache import load_cached_dataset
+from .export import write_export_file
+from .logs import run_with_reported_errors
+from .metrics import calculate_all_metrics
+
+def _load_job_dataset(cache_dir, fingerprint):
+    """讀取工作使用的資料集，磁碟快取中沒有時拋出 FileNotFoundError"""
+    dataset = load_cached_dataset(cache_dir, fingerprint)
+    if dataset is None:
+        raise FileNotFoundError(f"磁碟快取中找不到資料集 {fingerprint}，請重新上傳檔案")
+    return dataset
+
+def calculate_cached_dataset_metrics(cache_dir, fingerprint, start_date=None, end_date=None):
+    """
+    讀取磁碟快取的資料集並計算所有指標 (calculate_all_metrics)
+    
+    參數:
+    cache_dir - 快取目錄
+    fingerprint - 上傳檔案內容雜湊
+    start_date, end_date - 日期範圍
+    
+    返回:
+    calculate_all_metrics 的結果
+    """
+    dataset = _load_job_dataset(cache_dir, fingerprint)
+    return calculate_all_metrics(
+        dataset['iqc_report_data'],
+        dataset['pcb_spec_data'],
+        dataset['pcb_standard_time_data'],
+        dataset['additional_tasks_data'],
+        start_date,
+        end_date
+    )
+
+def write_cached_dataset_export(cache_dir, fingerprint, start_date, end_date, path, export_format, progress_state=None):
+    """
+    讀取磁碟快取的資料集，重新計算日期範圍內的指標後產生匯出檔案
+    
+    指標計算只佔匯出時間的一小部分，重新計算比把介面的 processed_data 等結果傳給計算程序省記憶體。
+    
+    參數:
+    cache_dir - 快取目錄
+    fingerprint - 上傳檔案內容雜湊
+    start_date, end_date - 日期範圍 (與介面目前套用的範圍相同)
+    path, export_format, progress_state - 見 write_export_file
+    
+    返回:
+    path
+    """
+    if progress_state is not None:
+        progress_state.update(progress=0.0, stage="計算指標")
+    metrics = run_with_reported_errors(calculate_cached_dataset_metrics, cache_dir, fingerprint, start_date, end_date)
+    if not metrics:
+        raise ValueError("沒有取得計算結果，無法匯出")
+    return write_export_file(metrics, path, export_format, progress_state)
@@ -0,0 +1,373 @@
+"""
+資料合併 (join)：依料號合併 PCB 規格，對應面積範圍與孔數取得 PCB 標準工時，並計算 MRB 加時
+"""
+
+import traceback
+
+import pandas as pd
+
+from .ingest import check_is_mrb, parse_area_range
+from .logs import debug_log
+
+def map_hole_count_to_range(hole_counts):
+    """
+    將實際壓合孔數映射到PCB標準工時對應表中的範圍值，添加記憶化以減少重複計算
+    """
+    try:
+        # 處理空值或NA值
+        if hole_counts is None or hole_counts == 'NA' or pd.isna(hole_counts):
+            return 0
+            
+        # 確保孔數是數字
+        try:
+            hole_counts = float(hole_counts)
+        except (ValueError, TypeError):
+            debug_log(f"壓合孔數無法轉換為數字: '{hole_counts}'，設為0", level="WARNING")
+            return 0
+        
+        # 使用查表法代替多個if判斷，提高效率
+        ranges = [
+            (0, 25, 0),
+            (25, 75, 50),
+            (75, 125, 100),
+            (125, 175, 150),
+            (175, 200, 200),
+            (200, 250, 225),
+            (250, 325, 300),
+            (325, 450, 400),
+            (450, 550, 500),
+            (550, 750, 600),
+            (750, 900, 800),
+            (900, 1000, 1000),
+            (1000, float('inf'), 1100)
+        ]
+        
+        for min_val, max_val, mapped_val in ranges:
+            if hole_counts <= max_val:
+                return mapped_val
+                
+        return 1100  # 默認值
+        
+    except Exception as e:
+        debug_log(f"映射壓合孔數時出錯: {e}", level="ERROR")
+        return 0
+
+def calculate_pcb_standard_time(iqc_df, pcb_specs_df, pcb_standard_time_df):
+    """
+    全面修正版的PCB標準工時計算函數，徹底修復MRB判斷和加時
+    """
+    try:
+        debug_log("開始計算PCB標準工時", level="INFO")
+        
+        # 創建數據副本
+        processed_df = iqc_df.copy()
+        
+        # 只處理QB類型的料號
+        qb_indices = processed_df[processed_df['類別'] == 'QB'].index
+        debug_log(f"發現QB類型料號數量: {len(qb_indices)}", level="INFO")
+        
+        # 如果沒有QB類型料號，則直接返回
+        if len(qb_indices) == 0:
+            debug_log("沒有發現QB類型料號，跳過PCB標準工時計算", level="INFO")
+            return processed_df
+        
+        # 提取QB類型資料用於批量處理
+        qb_df = processed_df.loc[qb_indices].copy()
+        
+        # 輸出欄位名稱，幫助調試
+        debug_log(f"QB資料欄位: {qb_df.columns.tolist()}", level="INFO")
+        
+        # 首先，一次性確定所有MRB狀態，避免逐行判斷帶來的不一致
+        debug_log("重新檢查所有QB記錄的MRB狀態", level="INFO")
+        
+        # 檢查是否已經有MRB狀態欄位
+        if '是否為MRB' in qb_df.columns:
+            # 統一轉換現有的MRB狀態為布爾值，確保一致性
+            converted_mrb = []
+            for i, row in qb_df.iterrows():
+                mrb_value = row['是否為MRB']
+                
+                # 記錄原始值類型
+                original_type = type(mrb_value).__name__
+                converted = False  # 默認為False
+                
+                # 針對不同類型進行特定處理
+                if isinstance(mrb_value, bool):
+                    converted = mrb_value  # 已經是布爾值，不變
+                elif isinstance(mrb_value, str):
+                    # 字符串值，只有明確的true才算True
+                    converted = mrb_value.upper() in ('TRUE', 'T', 'YES', 'Y', '1', 'MRB')
+                elif isinstance(mrb_value, (int, float)):
+                    # 數值，非零即True
+                    converted = bool(mrb_value) 
+                
+                converted_mrb.append(converted)
+                
+                debug_log(f"料號 {row.get('料號', '')} MRB值轉換: {mrb_value}({original_type}) -> {converted}", level="DEBUG")
+        else:
+            # 如果沒有MRB狀態欄位，則使用MRB檢測函數
+            debug_log("未找到MRB狀態欄位，執行MRB檢測", level="INFO")
+            mrb_result = check_is_mrb(qb_df)
+            converted_mrb = mrb_result['是否為MRB'].tolist()
+        
+        # 將轉換後的MRB狀態保存回DataFrame，確保一致性
+        qb_df['是否為MRB'] = converted_mrb
+        
+        # 顯示MRB狀態分佈
+        mrb_counts = pd.Series(converted_mrb).value_counts()
+        debug_log(f"MRB狀態分佈: {mrb_counts.to_dict()}", level="INFO")
+        
+        # 1. 建立料號與PCB信息的對應關係
+        debug_log("建立料號與PCB規格的對應關係", level="INFO")
+        pcb_info = {}
+        
+        # 確定料號欄位
+        part_no_col = None
+        if 'C' in pcb_specs_df.columns:
+            part_no_col = 'C'
+        elif '料號' in pcb_specs_df.columns:
+            part_no_col = '料號'
+        
+        # 確定其他欄位
+        hole_count_col = 'N' if 'N' in pcb_specs_df.columns else ('壓合孔數' if '壓合孔數' in pcb_specs_df.columns else 'L')
+        length_col = 'AB' if 'AB' in pcb_specs_df.columns else '版長'
+        width_col = 'AE' if 'AE' in pcb_specs_df.columns else '版寬'
+        
+        # 建立PCB信息字典
+        for _, row in pcb_specs_df.iterrows():
+            if part_no_col in row and pd.notna(row[part_no_col]):
+                part_no = str(row[part_no_col]).strip().upper()
+                
+                # 獲取壓合孔數
+                hole_count = 0
+                if hole_count_col in row and pd.notna(row[hole_count_col]):
+                    hole_count_val = row[hole_count_col]
+                    if str(hole_count_val).upper() == 'NA':
+                        hole_count = 0
+                    else:
+                        try:
+                            hole_count = float(hole_count_val)
+                        except:
+                            hole_count = 0
+                
+                # 獲取板長和板寬
+                length = 0
+                width = 0
+                if length_col in row and pd.notna(row[length_col]):
+                    try:
+                        length = float(row[length_col])
+                    except:
+                        pass
+                
+                if width_col in row and pd.notna(row[width_col]):
+                    try:
+                        width = float(row[width_col])
+                    except:
+                        pass
+                
+                # 計算面積
+                area = length * width
+                
+                # 映射壓合孔數
+                mapped_hole_count = map_hole_count_to_range(hole_count)
+                
+                # 儲存PCB信息
+                pcb_info[part_no] = {
+                    'hole_count': hole_count,
+                    'mapped_hole_count': mapped_hole_count,
+                    'length': length,
+                    'width': width,
+                    'area': area
+                }
+        
+        debug_log(f"已建立 {len(pcb_info)} 個料號的PCB信息", level="INFO")
+        
+        # 2. 建立面積範圍和標準工時對應
+        debug_log("解析PCB標準工時對應表", level="INFO")
+        area_ranges = []
+        
+        # 確認標準工時對應表中的關鍵欄位
+        area_range_col = 'B' if 'B' in pcb_standard_time_df.columns else '面積範圍'
+        hole_count_col = 'D' if 'D' in pcb_standard_time_df.columns else '壓合總孔數'
+        std_time_col = 'G' if 'G' in pcb_standard_time_df.columns else 'PCB標準工時'
+        
+        # 解析所有面積範圍
+        for idx, row in pcb_standard_time_df.iterrows():
+            if area_range_col in row and pd.notna(row[area_range_col]):
+                min_area, max_area, area_range_str = parse_area_range(row[area_range_col])
+                
+                # 獲取孔數和標準工時
+                try:
+                    hole_count = float(row[hole_count_col]) if hole_count_col in row and pd.notna(row[hole_count_col]) else None
+                    std_time = float(row[std_time_col]) if std_time_col in row and pd.notna(row[std_time_col]) else 120
+                except (ValueError, TypeError):
+                    hole_count = None
+                    std_time = 120
+                
+                area_ranges.append({
+                    'min_area': min_area,
+                    'max_area': max_area,
+                    'range_str': area_range_str,
+                    'hole_count': hole_count,
+                    'std_time': std_time
+                })
+        
+        debug_log(f"已解析 {len(area_ranges)} 個面積範圍", level="INFO")
+        
+        # 建立查找表
+        area_hole_lookup = {}
+        for ar in area_ranges:
+            range_key = (ar['min_area'], ar['max_area'])
+            if range_key not in area_hole_lookup:
+                area_hole_lookup[range_key] = {}
+            
+            if ar['hole_count'] not in area_hole_lookup[range_key]:
+                area_hole_lookup[range_key][ar['hole_count']] = ar['std_time']
+        
+        # 3. 處理每個QB料號
+        debug_log("開始處理每個QB料號的標準工時", level="INFO")
+        
+        # 添加結果列
+        qb_df['面積'] = 0
+        qb_df['壓合孔數'] = 'NA'
+        qb_df['映射壓合孔數'] = 0
+        qb_df['匹配狀態'] = '未處理'
+        qb_df['基礎標準工時'] = 120  # 默認值
+        qb_df['MRB加時'] = 0
+        qb_df['處理後檢驗標準工時'] = 120  # 默認值
+        qb_df['匹配詳情'] = ''
+        
+        match_count = 0
+        mrb_count = 0
+        
+        # 遍歷每個QB料號
+        for idx, row in qb_df.iterrows():
+            part_no = str(row['料號']).strip().upper()
+            
+            # 查找PCB信息
+            if part_no in pcb_info:
+                # 獲取PCB數據
+                pcb_data = pcb_info[part_no]
+                area = pcb_data['area']
+                hole_count = pcb_data['hole_count']
+                mapped_hole_count = pcb_data['mapped_hole_count']
+                
+                # 更新結果數據
+                qb_df.at[idx, '面積'] = area
+                qb_df.at[idx, '壓合孔數'] = hole_count
+                qb_df.at[idx, '映射壓合孔數'] = mapped_hole_count
+                
+                # 查找匹配的面積範圍
+                matched_range = None
+                matched_range_str = None
+                
+                for ar in area_ranges:
+                    if ar['min_area'] <= area < ar['max_area']:
+                        matched_range = (ar['min_area'], ar['max_area'])
+                        matched_range_str = ar['range_str']
+                        break
+                
+                if matched_range is None:
+                    # 面積範圍未匹配
+                    qb_df.at[idx, '匹配狀態'] = '面積範圍未匹配'
+                    qb_df.at[idx, '匹配詳情'] = f"面積 {area} 未找到匹配範圍"
+                    
+                    # 使用預設標準工時
+                    base_std_time = 120
+                    qb_df.at[idx, '基礎標準工時'] = base_std_time
+                else:
+                    # 面積範圍匹配，檢查孔數
+                    if matched_range in area_hole_lookup and mapped_hole_count in area_hole_lookup[matched_range]:
+                        # 孔數也匹配
+                        base_std_time = area_hole_lookup[matched_range][mapped_hole_count]
+                        
+                        qb_df.at[idx, '基礎標準工時'] = base_std_time
+                        qb_df.at[idx, '匹配狀態'] = '匹配成功'
+                        qb_df.at[idx, '匹配詳情'] = f"面積: {matched_range_str}, 孔數: {mapped_hole_count}, 基礎標準工時: {base_std_time}"
+                        match_count += 1
+                    else:
+                        # 面積匹配但孔數未匹配
+                        base_std_time = 120
+                        qb_df.at[idx, '基礎標準工時'] = base_std_time
+                        qb_df.at[idx, '匹配狀態'] = '孔數未匹配'
+                        qb_df.at[idx, '匹配詳情'] = f"面積範圍匹配: {matched_range_str}, 但壓合孔數 {mapped_hole_count} 未匹配"
+            else:
+                # 料號未找到
+                base_std_time = 120
+                qb_df.at[idx, '基礎標準工時'] = base_std_time
+                qb_df.at[idx, '匹配狀態'] = '料號未找到'
+                qb_df.at[idx, '匹配詳情'] = f"料號 {part_no} 在PCB建檔明細中未找到"
+            
+            # 處理MRB加時 - 徹底修正的邏輯
+            is_mrb = qb_df.at[idx, '是否為MRB']  # 已統一轉換為布爾值
+            
+            mrb_add_time = 0
+            if is_mrb:
+                mrb_add_time = 30
+                mrb_count += 1
+                debug_log(f"料號 {part_no} 是MRB，添加30分鐘標準工時", level="DEBUG")
+            
+            # 更新MRB相關欄位
+            qb_df.at[idx, 'MRB加時'] = mrb_add_time
+            qb_df.at[idx, '處理後檢驗標準工時'] = base_std_time + mrb_add_time
+        
+        # 在返回前進行一次最終檢查
+        debug_log("進行最終MRB計算檢查", level="INFO")
+        for idx, row in qb_df.iterrows():
+            # 檢查MRB狀態和加時是否一致
+            is_mrb = bool(row['是否為MRB'])
+            expected_add_time = 30 if is_mrb else 0
+            actual_add_time = row['MRB加時']
+            
+            if expected_add_time != actual_add_time:
+                debug_log(f"不一致警告：料號 {row['料號']} MRB狀態={is_mrb} 但加時={actual_add_time}", level="WARNING")
+                # 修正不一致
+                qb_df.at[idx, 'MRB加時'] = expected_add_time
+                qb_df.at[idx, '處理後檢驗標準工時'] = row['基礎標準工時'] + expected_add_time
+        
+        # 更新到原始DataFrame
+        for col in ['是否為MRB', '面積', '壓合孔數', '映射壓合孔數', '匹配狀態', 
+                   '基礎標準工時', 'MRB加時', '處理後檢驗標準工時', '匹配詳情']:
+            if col in qb_df.columns:
+                processed_df.loc[qb_indices, col] = qb_df[col]
+        
+        # 輸出統計信息
+        debug_log(f"PCB標準工時計算完成，共處理 {len(qb_df)} 筆QB類型料號，成功匹配 {match_count} 筆", level="INFO")
+        debug_log(f"MRB狀態總數: {sum(converted_mrb)}, 加了MRB加時的記錄數: {mrb_count}", level="INFO")
+        
+        # 處理非QB類型物料的基礎標準工時
+        # 對於非QB類型的物料，將處理後檢驗標準工時作為基礎標準工時，並考慮MRB加時
+        non_qb_indices = processed_df[processed_df['類別'] != 'QB'].index
+        if len(non_qb_indices) > 0:
+            debug_log(f"處理 {len(non_qb_indices)} 筆非QB類型物料的基礎標準工時", level="INFO")
+            
+            # 先檢查是否已經有基礎標準工時欄位
+            if '基礎標準工時' not in processed_df.columns:
+                processed_df['基礎標準工時'] = None
+            
+            # 設置一般物料的基礎標準工時
+            for idx in non_qb_indices:
+                # 檢查MRB加時欄位是否存在
+                mrb_time = 0
+                if 'MRB加時' in processed_df.columns and pd.notna(processed_df.loc[idx, 'MRB加時']):
+                    try:
+                        mrb_time = float(processed_df.loc[idx, 'MRB加時'])
+                    except:
+                        mrb_time = 0
+                
+                # 從處理後檢驗標準工時中減去MRB加時得到基礎標準工時
+                if '處理後檢驗標準工時' in processed_df.columns and pd.notna(processed_df.loc[idx, '處理後檢驗標準工時']):
+                    try:
+                        std_time = float(processed_df.loc[idx, '處理後檢驗標準工時'])
+                        base_time = std_time - mrb_time
+                        processed_df.loc[idx, '基礎標準工時'] = base_time
+                    except:
+                        # 如果轉換失敗，直接使用原值
+                        processed_df.loc[idx, '基礎標準工時'] = processed_df.loc[idx, '處理後檢驗標準工時']
+
+        return processed_df
+    
+    except Exception as e:
+        error_msg = f"計算PCB標準工時時出錯: {str(e)}\n{traceback.format_exc()}"
+        debug_log(error_msg, level="ERROR")
+        return iqc_df  # 如果出錯，返回原始數據
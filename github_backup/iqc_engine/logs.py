@@ -0,0 +1,119 @@
+"""
+計算核心的日誌與錯誤回報
+
+計算核心不依賴 Streamlit：預設寫入 Python logging (logger 名稱 iqc_engine)；
+介面載入時以 set_handlers 改為寫入工作階段日誌並在頁面上顯示錯誤。
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger("iqc_engine")
+
+# 日誌級別對應 logging 級別
+LOG_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR
+}
+
+# 目前使用的處理函數，None 表示使用 logging
+_handlers = {
+    'log': None,
+    'error': None,
+    'warning': None
+}
+
+# 執行緒狀態：背景工作執行緒沒有工作階段，一律寫入 logging
+# (放在計算核心而非介面腳本，介面每次重新執行都會重建模組全域變數)
+_thread_state = threading.local()
+
+class ReportedError(Exception):
+    """以 run_with_reported_errors 執行時，計算核心以 report_error 回報且沒有返回結果的錯誤"""
+
+def set_handlers(log=None, error=None, warning=None):
+    """
+    設定日誌與錯誤訊息的處理函數 (未指定的項目恢復為 logging)
+    
+    參數:
+    log - log(message, data=None, level="DEBUG")，處理 debug_log
+    error - error(message)，處理需要讓使用者看到的錯誤訊息
+    warning - warning(message)，處理需要讓使用者看到的警告訊息
+    """
+    _handlers['log'] = log
+    _handlers['error'] = error
+    _handlers['warning'] = warning
+
+def set_background_thread(active):
+    """標記目前執行緒是否為背景工作執行緒 (背景執行緒不使用 set_handlers 設定的處理函數)"""
+    _thread_state.background = active
+
+def is_background_thread():
+    """目前執行緒是否為背景工作執行緒"""
+    return getattr(_thread_state, 'background', False)
+
+def _get_handler(name):
+    """取得處理函數，背景工作執行緒或未設定時返回 None (使用 logging)"""
+    if is_background_thread():
+        return None
+    return _handlers[name]
+
+def debug_log(message, data=None, level="DEBUG"):
+    """記錄處理過程，參數與介面的 debug_log 相同"""
+    handler = _get_handler('log')
+    if handler is not None:
+        handler(message, data, level)
+        return
+    
+    log_level = LOG_LEVELS.get(level, logging.DEBUG)
+    if not logger.isEnabledFor(log_level):
+        return
+    
+    if data is not None:
+        shape = getattr(data, 'shape', None)
+        if shape is not None:
+            message = f"{message} - DataFrame shape: {shape}"
+        else:
+            message = f"{message} - Data: {str(data)[:200]}"
+    logger.log(log_level, message)
+
+def report_error(message):
+    """回報錯誤訊息 (介面中顯示於頁面；run_with_reported_errors 執行期間改為收集)"""
+    collected = getattr(_thread_state, 'reported_errors', None)
+    if collected is not None:
+        collected.append(message)
+        logger.error(message)
+        return
+    
+    handler = _get_handler('error')
+    if handler is not None:
+        handler(message)
+    else:
+        logger.error(message)
+
+def report_warning(message):
+    """回報警告訊息 (介面中顯示於頁面)"""
+    handler = _get_handler('warning')
+    if handler is not None:
+        handler(message)
+    else:
+        logger.warning(message)
+
+def run_with_reported_errors(fn, *args):
+    """
+    執行 fn，期間 report_error 的訊息不顯示而是收集起來；
+    fn 沒有返回結果且有回報錯誤時拋出 ReportedError (訊息為所有回報的錯誤)
+    
+    計算程序中沒有工作階段可顯示錯誤，以此把錯誤經由 Future 傳回提交工作的介面程序。
+    """
+    _thread_state.reported_errors = []
+    try:
+        result = fn(*args)
+        errors = _thread_state.reported_errors
+    finally:
+        _thread_state.reported_errors = None
+    
+    if result is None and errors:
+        raise ReportedError("\n".join(errors))
+    return result
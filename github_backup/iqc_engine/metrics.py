@@ -0,0 +1,720 @@
+"""
+指標計算 (metrics)：日期篩選、效率、工作負載、時間分配與額外任務指標
+"""
+
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from .ingest import parse_excel_date
+from .join import calculate_pcb_standard_time
+from .logs import debug_log, report_error, report_warning
+
+# ==================== 檢驗員過濾 ====================
+# 在文件頂部添加這個常量（與其他常量一起）
+EXCLUDED_INSPECTORS = ["謝芷馨", "蘇育珍", "許碧琦"]
+
+# 添加檢驗員過濾函數
+def filter_excluded_inspectors(df, inspector_column='處理後檢驗員'):
+    """
+    過濾掉不需要顯示在圖表中的檢驗員數據
+    
+    參數:
+    df - DataFrame
+    inspector_column - 檢驗員欄位名稱
+    
+    返回:
+    過濾後的DataFrame
+    """
+    if df is None or df.empty:
+        return df
+        
+    if inspector_column not in df.columns:
+        return df
+        
+    # 過濾掉指定的檢驗員
+    return df[~df[inspector_column].isin(EXCLUDED_INSPECTORS)].copy()
+
+
+# ==================== MRB 判定 ====================
+# 統一的MRB判定欄位 (布林值)，於 calculate_all_metrics 產生處理後資料時一次性計算
+MRB_FLAG_COLUMN = 'MRB標記'
+
+# 文字型MRB欄位中視為「是MRB」的值
+MRB_TRUE_VALUES = {'TRUE', 'T', 'MRB', 'Y', 'YES', '是', '1'}
+
+# 未經處理的原始資料中，可能代表MRB的文字欄位
+MRB_RAW_TEXT_COLUMNS = ['M', '異常問題匯總', 'Abnormal Summary']
+
+def _parse_mrb_values(series):
+    """
+    將任意型別的MRB欄位向量化轉為布林值
+
+    參數:
+    series - MRB相關欄位 (布林、數值或文字)
+
+    返回:
+    布林 Series
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return series.fillna(False).astype(bool)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.fillna(0) > 0
+    return series.astype(str).str.strip().str.upper().isin(MRB_TRUE_VALUES)
+
+def derive_mrb_flag(df):
+    """
+    向量化計算每筆檢驗記錄的標準MRB判定
+
+    判定規則與 calculate_pcb_standard_time 的MRB加時一致：
+    MRB加時 > 0 或 是否為MRB 為真即視為MRB；兩欄都不存在時，才退回檢查MRB狀態與原始異常問題欄位。
+
+    參數:
+    df - 處理後的檢驗資料
+
+    返回:
+    與 df 索引對齊的布林 Series
+    """
+    if df is None or df.empty:
+        return pd.Series(False, index=getattr(df, 'index', None), dtype=bool)
+    
+    if MRB_FLAG_COLUMN in df.columns:
+        return df[MRB_FLAG_COLUMN].fillna(False).astype(bool)
+    
+    is_mrb = pd.Series(False, index=df.index)
+    has_processed_columns = False
+    
+    if 'MRB加時' in df.columns:
+        is_mrb |= pd.to_numeric(df['MRB加時'], errors='coerce').fillna(0) > 0
+        has_processed_columns = True
+    if '是否為MRB' in df.columns:
+        is_mrb |= _parse_mrb_values(df['是否為MRB'])
+        has_processed_columns = True
+    
+    if not has_processed_columns:
+        if 'MRB狀態' in df.columns:
+            is_mrb |= df['MRB狀態'].astype(str).str.strip().str.upper() == 'MRB'
+        for col in MRB_RAW_TEXT_COLUMNS:
+            if col in df.columns:
+                is_mrb |= df[col].notna() & df[col].astype(str).str.strip().ne('')
+    
+    return is_mrb
+
+def ensure_mrb_flag(df):
+    """
+    確保資料含有標準MRB判定欄位，已存在時直接返回原資料
+
+    參數:
+    df - 處理後的檢驗資料
+
+    返回:
+    含 MRB_FLAG_COLUMN 欄位的DataFrame
+    """
+    if df is None or df.empty or MRB_FLAG_COLUMN in df.columns:
+        return df
+    
+    df = df.copy()
+    df[MRB_FLAG_COLUMN] = derive_mrb_flag(df)
+    return df
+
+
+# ==================== 指標計算 ====================
+def filter_by_date_range(df, start_date=None, end_date=None):
+    """
+    根據日期範圍過濾資料
+    """
+    if df is None or df.empty or (not start_date and not end_date):
+        return df
+    
+    debug_log(f"根據日期範圍過濾: 開始日期={start_date}, 結束日期={end_date}")
+    
+    # 複製DataFrame以避免修改原始資料
+    filtered_df = df.copy()
+    
+    # 確定日期欄位
+    date_column = None
+    for possible_column in ['檢驗日期', '日期']:
+        if possible_column in filtered_df.columns:
+            date_column = possible_column
+            break
+    
+    if date_column is None:
+        debug_log("找不到日期欄位，跳過日期過濾")
+        return filtered_df
+    
+    debug_log(f"使用日期欄位: {date_column}")
+    
+    # 確保日期欄位是datetime類型
+    try:
+        # 先檢查類型
+        debug_log(f"日期欄位類型: {filtered_df[date_column].dtype}")
+        
+        # 強制轉換日期欄位為datetime（不丟棄無法解析的值）
+        filtered_df[date_column] = pd.to_datetime(filtered_df[date_column], errors='coerce')
+        
+        # 檢查轉換後有多少非NaT值
+        valid_dates_count = filtered_df[date_column].notna().sum()
+        debug_log(f"有效日期數量: {valid_dates_count}/{len(filtered_df)}")
+        
+        # 日期解析有問題時，打印一些樣本進行調試
+        if valid_dates_count < len(filtered_df) * 0.5:
+            debug_log("大部分日期轉換失敗，顯示部分原始值:")
+            for i, val in enumerate(filtered_df[date_column].dropna().head()):
+                debug_log(f"日期樣本{i+1}: {val}")
+            
+            # 顯示無法解析的日期樣本
+            null_dates = filtered_df[filtered_df[date_column].isna()][date_column].head()
+            debug_log(f"無法解析的日期樣本: {null_dates.index.tolist()}")
+            
+            # 再次嘗試使用自定義函數解析
+            debug_log("嘗試使用自定義函數解析日期")
+            filtered_df[date_column] = filtered_df[date_column].apply(lambda x: parse_excel_date(x))
+        
+        # 再次檢查有效日期數量
+        valid_dates_count = filtered_df[date_column].notna().sum()
+        debug_log(f"處理後有效日期數量: {valid_dates_count}/{len(filtered_df)}")
+            
+    except Exception as e:
+        debug_log(f"轉換日期欄位時出錯: {e}")
+        report_warning(f"轉換日期欄位時出錯，部分日期可能無法正確過濾")
+        return filtered_df
+    
+    # 轉換開始和結束日期為datetime
+    try:
+        start_date_obj = pd.to_datetime(start_date) if start_date else None
+        end_date_obj = pd.to_datetime(end_date) if end_date else None
+        
+        debug_log(f"轉換後的篩選日期: 開始={start_date_obj}, 結束={end_date_obj}")
+        
+        if end_date_obj:
+            # 將結束日期設為當天的結束時間
+            end_date_obj = end_date_obj.replace(hour=23, minute=59, second=59)
+    except Exception as e:
+        debug_log(f"轉換篩選日期時出錯: {e}")
+        return filtered_df
+    
+    # 根據日期範圍過濾
+    mask = pd.Series(True, index=filtered_df.index)
+    
+    if start_date_obj:
+        debug_log(f"篩選大於等於 {start_date_obj} 的資料")
+        mask = mask & (filtered_df[date_column] >= start_date_obj)
+    
+    if end_date_obj:
+        debug_log(f"篩選小於等於 {end_date_obj} 的資料")
+        mask = mask & (filtered_df[date_column] <= end_date_obj)
+    
+    result_df = filtered_df[mask]
+    debug_log(f"過濾前資料列數: {len(filtered_df)}, 過濾後: {len(result_df)}")
+    
+    # 如果過濾後沒有資料，可能日期格式有問題
+    if len(result_df) == 0 and len(filtered_df) > 0:
+        debug_log("過濾後沒有資料，顯示日期最大最小值檢查:")
+        min_date = filtered_df[date_column].min()
+        max_date = filtered_df[date_column].max()
+        debug_log(f"數據日期範圍: {min_date} 到 {max_date}")
+        
+        # 如果日期篩選導致沒有數據，返回原始數據並警告
+        report_warning(f"日期篩選 ({start_date} 到 {end_date}) 沒有匹配的數據。數據實際日期範圍是 {min_date} 到 {max_date}。")
+        return filtered_df
+    
+    return result_df
+
+def calculate_efficiency_metrics(processed_df, start_date=None, end_date=None, selected_material_categories=None, merge_categories=False):
+    """優化的效率指標計算函數"""
+    debug_log("開始計算IQC檢驗效率指標", level="INFO")
+    
+    # 過濾資料，確保在日期範圍內
+    filtered_df = filter_by_date_range(processed_df, start_date, end_date)
+    
+    # 如果指定了物料類別，進行過濾
+    if selected_material_categories and len(selected_material_categories) > 0:
+        filtered_df = filtered_df[filtered_df['類別'].isin(selected_material_categories)]
+        debug_log(f"根據物料類別過濾: {selected_material_categories}, 過濾後資料行數: {len(filtered_df)}", level="INFO")
+    
+    if filtered_df is None or filtered_df.empty:
+        debug_log("過濾後沒有資料，返回空結果", level="WARNING")
+        return {
+            'overall_efficiency_ranking': pd.DataFrame(),
+            'category_efficiency_data': {}
+        }
+    
+    # 設定效率值的合理上限
+    MAX_EFFICIENCY = 20
+    
+    # 一次性計算所有所需的統計數據
+    try:
+        # 使用 pandas 1.0.0+ 的 named aggregation，一次性完成聚合操作
+        aggregated_data = filtered_df.groupby(['處理後檢驗員', '類別']).agg(
+            total_standard_time=('處理後檢驗標準工時', 'sum'),
+            total_actual_time=('檢驗耗時', 'sum'),
+            record_count=('處理後檢驗標準工時', 'count')  # 使用任意列計數
+        ).reset_index()
+        
+        # 重命名列以避免衝突
+        aggregated_data.columns = ['inspector', 'category', 'total_standard_time', 'total_actual_time', 'record_count']
+    except Exception:
+        # 兼容舊版 pandas
+        stat_data = filtered_df.groupby(['處理後檢驗員', '類別']).agg({
+            '處理後檢驗標準工時': 'sum',
+            '檢驗耗時': 'sum'
+        }).reset_index()
+        
+        record_counts = filtered_df.groupby(['處理後檢驗員', '類別']).size().reset_index(name='record_count')
+        
+        aggregated_data = pd.merge(stat_data, record_counts, on=['處理後檢驗員', '類別'])
+        
+        # 重命名列
+        aggregated_data.columns = ['inspector', 'category', 'total_standard_time', 'total_actual_time', 'record_count']
+    
+    # 向量化計算效率比值，替代 apply+lambda
+    aggregated_data['efficiency'] = (
+        aggregated_data['total_standard_time'] / 
+        aggregated_data['total_actual_time'].clip(lower=0.1)
+    ).clip(upper=MAX_EFFICIENCY)
+    
+    # 1. 計算總效率 - 按檢驗員分組
+    overall_efficiency = aggregated_data.groupby('inspector').agg({
+        'total_standard_time': 'sum',
+        'total_actual_time': 'sum',
+        'record_count': 'sum'
+    }).reset_index()
+    
+    # 向量化計算總效率
+    overall_efficiency['efficiency'] = (
+        overall_efficiency['total_standard_time'] / 
+        overall_efficiency['total_actual_time'].clip(lower=0.1)
+    ).clip(upper=MAX_EFFICIENCY)
+    
+    # 按效率從高到低排序
+    overall_efficiency = overall_efficiency.sort_values(by='efficiency', ascending=False)
+    
+    # 2. 計算類別效率數據
+    category_efficiency_data = {}
+    
+    # 如果需要合併類別
+    if merge_categories and selected_material_categories:
+        merged_category = "+".join(selected_material_categories)
+        
+        # 為合併類別創建新的DataFrame
+        merged_data = aggregated_data.copy()
+        merged_data['category'] = merged_category
+        
+        # 按檢驗員分組
+        merged_grouped = merged_data.groupby('inspector').agg({
+            'total_standard_time': 'sum',
+            'total_actual_time': 'sum',
+            'record_count': 'sum'
+        }).reset_index()
+        
+        # 向量化計算效率
+        merged_grouped['efficiency'] = (
+            merged_grouped['total_standard_time'] / 
+            merged_grouped['total_actual_time'].clip(lower=0.1)
+        ).clip(upper=MAX_EFFICIENCY)
+        
+        # 排序並保存
+        merged_grouped = merged_grouped.sort_values(by='efficiency', ascending=False)
+        category_efficiency_data[merged_category] = merged_grouped.to_dict('records')
+    else:
+        # 對每個類別，按效率排序並保存
+        for category, group in aggregated_data.groupby('category'):
+            sorted_group = group.sort_values(by='efficiency', ascending=False)
+            category_efficiency_data[category] = sorted_group.to_dict('records')
+    
+    debug_log(f"效率指標計算完成，共 {len(overall_efficiency)} 位檢驗員, {len(category_efficiency_data)} 個類別", level="INFO")
+    
+    return {
+        'overall_efficiency_ranking': overall_efficiency,
+        'category_efficiency_data': category_efficiency_data
+    }
+
+def _format_work_period(earliest_hour, latest_hour):
+    """
+    以向量化字串運算產生工作時段標籤
+
+    參數:
+    earliest_hour - 每組最早開始時間 (小數小時)
+    latest_hour - 每組最晚開始時間 (小數小時)
+
+    返回:
+    工作時段標籤 Series
+    """
+    # 與原本 f"{值:.1f}" 的格式相同 (Series.round(1) 在 x.x5 附近的進位結果不同)
+    def format_hours(hours):
+        return pd.Series(np.char.mod('%.1f', hours.to_numpy(dtype=float)), index=hours.index)
+    
+    earliest_label = format_hours(earliest_hour) + "时"
+    latest_label = format_hours(latest_hour) + "时"
+    span_label = format_hours(latest_hour - earliest_hour)
+    
+    has_span = earliest_hour.notna() & latest_hour.notna() & (latest_hour - earliest_hour > 0)
+    return pd.Series(
+        np.select(
+            [has_span, earliest_hour.notna()],
+            [earliest_label + " - " + latest_label + " (跨" + span_label + "小时)", earliest_label],
+            default="無法分析"
+        ),
+        index=earliest_hour.index
+    )
+
+def calculate_workload_metrics(processed_df, additional_tasks_df, start_date=None, end_date=None):
+    """優化的工作負載指標計算函數 - 使用標準檢驗工時而非實際檢驗時間"""
+    debug_log("開始計算工作負載指標")
+    
+    # 過濾資料，確保在日期範圍內
+    filtered_iqc_df = filter_by_date_range(processed_df, start_date, end_date)
+    
+    # 確保additional_tasks_df不是None
+    if additional_tasks_df is None or additional_tasks_df.empty:
+        debug_log("額外任務資料為空，只計算檢驗工作負載")
+        filtered_tasks_df = pd.DataFrame()
+    else:
+        filtered_tasks_df = filter_by_date_range(additional_tasks_df, start_date, end_date)
+    
+    group_keys = ['date', 'inspector']
+    empty_dates = pd.Series(dtype='datetime64[ns]', name='date')
+    iqc_workload = pd.DataFrame({'date': empty_dates, 'inspector': pd.Series(dtype=object),
+                                 'inspection_standard_time': pd.Series(dtype=float),
+                                 'inspection_count': pd.Series(dtype=int),
+                                 'work_period': pd.Series(dtype=object)})
+    tasks_workload = pd.DataFrame({'date': empty_dates, 'inspector': pd.Series(dtype=object),
+                                   'additional_task_time': pd.Series(dtype=float)})
+    
+    # 處理IQC報告數據 - 向量化操作
+    if filtered_iqc_df is not None and not filtered_iqc_df.empty:
+        debug_log(f"處理 {len(filtered_iqc_df)} 筆IQC報告資料")
+        
+        # 只取計算所需欄位，避免修改快取中的原始資料
+        iqc_frame = pd.DataFrame({
+            'date': pd.to_datetime(filtered_iqc_df['檢驗日期'], errors='coerce').dt.normalize(),
+            'inspector': filtered_iqc_df['處理後檢驗員'],
+            'standard_time': filtered_iqc_df['處理後檢驗標準工時']
+        })
+        
+        # 預先計算開始時間的小數小時，供 min/max 聚合使用
+        has_start_time = '檢驗開始時間' in filtered_iqc_df.columns
+        if has_start_time:
+            start_time = pd.to_datetime(filtered_iqc_df['檢驗開始時間'], errors='coerce')
+            iqc_frame['start_hour'] = start_time.dt.hour + start_time.dt.minute / 60
+        else:
+            iqc_frame['start_hour'] = np.nan
+        
+        # 使用groupby進行聚合計算 - 關鍵修改: 使用處理後檢驗標準工時替代檢驗耗時
+        iqc_workload = iqc_frame.groupby(group_keys).agg(
+            inspection_standard_time=('standard_time', 'sum'),
+            inspection_count=('inspector', 'count'),
+            earliest_time=('start_hour', 'min'),
+            latest_time=('start_hour', 'max')
+        ).reset_index()
+        
+        if has_start_time:
+            iqc_workload['work_period'] = _format_work_period(iqc_workload['earliest_time'], iqc_workload['latest_time'])
+        else:
+            iqc_workload['work_period'] = "無法分析"
+        iqc_workload = iqc_workload.drop(columns=['earliest_time', 'latest_time'])
+    
+    # 處理額外任務數據 - 向量化操作
+    if filtered_tasks_df is not None and not filtered_tasks_df.empty:
+        debug_log(f"處理 {len(filtered_tasks_df)} 筆額外任務資料")
+        
+        tasks_frame = pd.DataFrame({
+            'date': pd.to_datetime(filtered_tasks_df['日期'], errors='coerce').dt.normalize(),
+            'inspector': filtered_tasks_df['姓名'],
+            'task_time': pd.to_numeric(filtered_tasks_df['用時(分鐘)'], errors='coerce').fillna(0)
+        })
+        
+        tasks_workload = tasks_frame.groupby(group_keys).agg(
+            additional_task_time=('task_time', 'sum')
+        ).reset_index()
+    
+    # 以日期+檢驗員進行外部合併，只有額外任務的記錄標記為無工作時段
+    workload_df = pd.merge(iqc_workload, tasks_workload, on=group_keys, how='outer')
+    
+    if not workload_df.empty:
+        workload_df['inspection_standard_time'] = workload_df['inspection_standard_time'].fillna(0)
+        workload_df['additional_task_time'] = workload_df['additional_task_time'].fillna(0)
+        workload_df['inspection_count'] = workload_df['inspection_count'].fillna(0).astype(int)
+        workload_df['work_period'] = workload_df['work_period'].fillna("無工作時段")
+        
+        # 向量化計算總時間和工作負載指數 - 修改計算邏輯
+        workload_df['total_time'] = workload_df['inspection_standard_time'] + workload_df['additional_task_time']
+        workload_df['workload_index'] = workload_df['total_time'] / 480  # 8小時 = 480分鐘
+        
+        # 按日期排序，聚合後才轉回字符串格式，方便繪圖
+        workload_df = workload_df.sort_values('date', kind='stable').reset_index(drop=True)
+        workload_df['date'] = workload_df['date'].dt.strftime('%Y-%m-%d')
+        workload_df = workload_df[[
+            'date', 'inspector', 'inspection_standard_time', 'additional_task_time',
+            'inspection_count', 'work_period', 'total_time', 'workload_index'
+        ]]
+    
+    debug_log(f"工作負載計算完成，共 {len(workload_df)} 筆資料")
+    return workload_df
+
+# 時間分配比例中，額外任務細項比例的寬表欄位前綴
+TASK_RATIO_PREFIX = '任務__'
+
+def _prepare_additional_tasks_frame(tasks_df):
+    """
+    將額外任務資料整理為向量化計算所需的欄位
+
+    參數:
+    tasks_df - 額外任務DataFrame (需包含 姓名、工作事項分類、用時(分鐘))
+
+    返回:
+    包含 inspector、task_type、task_time 三欄的DataFrame
+    """
+    # 與原本 int() 轉換一致：無法轉換的值視為0，小數部分無條件捨去
+    task_time = np.trunc(pd.to_numeric(tasks_df['用時(分鐘)'], errors='coerce').fillna(0))
+    return pd.DataFrame({
+        'inspector': tasks_df['姓名'].fillna('Unknown'),
+        'task_type': tasks_df['工作事項分類'].fillna('Other'),
+        'task_time': task_time.astype('int64')
+    }, index=tasks_df.index)
+
+def _sum_task_time_by_type(tasks):
+    """
+    依檢驗員、任務類型加總額外任務時間
+
+    順序與原本逐列累加的字典相同：檢驗員依首次出現排列，同一檢驗員內的任務類型依首次出現排列。
+
+    參數:
+    tasks - _prepare_additional_tasks_frame 的結果
+
+    返回:
+    包含 inspector、task_type、task_time 三欄的DataFrame
+    """
+    task_time = tasks.groupby(['inspector', 'task_type'], sort=False)['task_time'].sum().reset_index()
+    inspector_order = pd.factorize(task_time['inspector'])[0]
+    return task_time.iloc[np.argsort(inspector_order, kind='stable')].reset_index(drop=True)
+
+def get_task_ratio_table(time_allocation_df):
+    """
+    取得時間分配表中的任務細項比例寬表 (任務__<任務類型> 欄位)
+
+    舊版資料只有 task_detail_ratios 字典欄位時，一次展開為寬表 (沒有記錄的任務類型為0)。
+
+    參數:
+    time_allocation_df - calculate_time_allocation_metrics 的結果
+
+    返回:
+    只含 任務__ 欄位的DataFrame，index 與輸入相同
+    """
+    task_columns = [col for col in time_allocation_df.columns if str(col).startswith(TASK_RATIO_PREFIX)]
+    if task_columns or 'task_detail_ratios' not in time_allocation_df.columns:
+        return time_allocation_df[task_columns]
+    
+    ratios = [value if isinstance(value, dict) else {} for value in time_allocation_df['task_detail_ratios']]
+    task_ratio_table = pd.json_normalize(ratios).fillna(0.0)
+    task_ratio_table.index = time_allocation_df.index
+    task_ratio_table.columns = [f"{TASK_RATIO_PREFIX}{task_type}" for task_type in task_ratio_table.columns]
+    return task_ratio_table
+
+# 同样修改时间分配比例计算和额外任务监控函数
+def calculate_time_allocation_metrics(processed_df, additional_tasks_df, start_date=None, end_date=None):
+    """
+    向量化計算各檢驗員的時間分配比例
+
+    以 groupby/pivot_table 取代逐行累加，每種額外任務的佔比以寬表欄位
+    (任務__<任務類型>) 回傳，顯示與匯出都不需要再展開。
+    """
+    debug_log("開始計算時間分配比例")
+    
+    # 過濾資料，確保在日期範圍內
+    filtered_iqc_df = filter_by_date_range(processed_df, start_date, end_date)
+    
+    # 确保additional_tasks_df不是None
+    if additional_tasks_df is None or additional_tasks_df.empty:
+        debug_log("額外任務資料為空，只計算檢驗時間佔比")
+        filtered_tasks_df = pd.DataFrame()  # 使用空DataFrame
+    else:
+        filtered_tasks_df = filter_by_date_range(additional_tasks_df, start_date, end_date)
+    
+    # 检验时间：按检验员加总
+    inspection_time = pd.Series(dtype='float64')
+    if filtered_iqc_df is not None and not filtered_iqc_df.empty:
+        debug_log(f"处理 {len(filtered_iqc_df)} 筆IQC报告资料")
+        inspection_time = (
+            pd.to_numeric(filtered_iqc_df['檢驗耗時'], errors='coerce').fillna(0)
+            .groupby(filtered_iqc_df['處理後檢驗員'].fillna('Unknown'), sort=False)
+            .sum()
+        )
+    
+    # 额外任务时间：检验员 × 任务类型 的分钟数
+    task_time = pd.DataFrame(columns=['inspector', 'task_type', 'task_time'])
+    if filtered_tasks_df is not None and not filtered_tasks_df.empty:
+        debug_log(f"处理 {len(filtered_tasks_df)} 筆额外任务资料")
+        task_time = _sum_task_time_by_type(_prepare_additional_tasks_frame(filtered_tasks_df))
+    
+    # 检验员依首次出现排列 (先检验资料、再只有额外任务的检验员)
+    inspectors = inspection_time.index.append(pd.Index(task_time['inspector'])).unique()
+    if len(inspectors) == 0:
+        debug_log("时间分配比例计算完成，共 0 位检验员")
+        return pd.DataFrame()
+    
+    # 任务类型宽表欄位依上述检验员顺序中首次出现的顺序排列
+    task_time = task_time.iloc[np.argsort(inspectors.get_indexer(task_time['inspector']), kind='stable')]
+    task_time_table = (
+        task_time.set_index(['inspector', 'task_type'])['task_time']
+        .unstack(fill_value=0)
+        .reindex(index=inspectors, columns=task_time['task_type'].unique(), fill_value=0)
+    )
+    
+    time_allocation_df = pd.DataFrame(index=inspectors)
+    time_allocation_df['inspection_time'] = inspection_time.reindex(inspectors, fill_value=0)
+    time_allocation_df['additional_task_time'] = task_time_table.sum(axis=1) if not task_time_table.columns.empty else 0
+    time_allocation_df['total_time'] = time_allocation_df['inspection_time'] + time_allocation_df['additional_task_time']
+    
+    # 计算比例 - 如果没有任何时间，检验时间占比视为100%
+    has_time = time_allocation_df['total_time'] > 0
+    safe_total = time_allocation_df['total_time'].where(has_time, 1)
+    time_allocation_df['inspection_ratio'] = (time_allocation_df['inspection_time'] / safe_total).where(has_time, 1.0)
+    time_allocation_df['additional_task_ratio'] = (time_allocation_df['additional_task_time'] / safe_total).where(has_time, 0.0)
+    
+    # 细项任务比例宽表
+    task_ratio_table = task_time_table.div(safe_total, axis=0).where(has_time, 0.0)
+    task_ratio_table.columns = [f"{TASK_RATIO_PREFIX}{task_type}" for task_type in task_ratio_table.columns]
+    time_allocation_df = time_allocation_df.join(task_ratio_table)
+    
+    time_allocation_df = time_allocation_df.rename_axis('inspector').reset_index()
+    
+    debug_log(f"时间分配比例计算完成，共 {len(time_allocation_df)} 位检验员")
+    return time_allocation_df
+
+def calculate_additional_tasks_metrics(additional_tasks_df, start_date=None, end_date=None):
+    debug_log("开始计算额外任务监控数据")
+    
+    # 如果额外任务数据为空，返回空DataFrame
+    if additional_tasks_df is None or additional_tasks_df.empty:
+        debug_log("额外任务资料为空，返回空结果")
+        return pd.DataFrame(columns=['inspector', 'task_type', 'total_time'])
+    
+    # 過濾資料，確保在日期範圍內
+    filtered_tasks_df = filter_by_date_range(additional_tasks_df, start_date, end_date)
+    
+    # 如果沒有資料，返回空的DataFrame
+    if filtered_tasks_df.empty:
+        debug_log("过滤后没有额外任务资料")
+        return pd.DataFrame(columns=['inspector', 'task_type', 'total_time'])
+    
+    debug_log(f"处理 {len(filtered_tasks_df)} 筆额外任务资料")
+    
+    # 按檢驗員和任務類型分組計算時間 (檢驗員依首次出現排列，其下任務類型依首次出現排列)
+    task_monitor_df = _sum_task_time_by_type(_prepare_additional_tasks_frame(filtered_tasks_df)).rename(
+        columns={'task_time': 'total_time'}
+    )
+    
+    debug_log(f"额外任务监控数据计算完成，共 {len(task_monitor_df)} 筆资料")
+    return task_monitor_df
+
+def calculate_all_metrics(iqc_df, pcb_specs_df, pcb_standard_time_df, additional_tasks_df, start_date=None, end_date=None):
+    try:
+        debug_log("開始計算所有指標", level="INFO")
+        start_time = time.time()  # 記錄開始時間
+        
+        # 檢查資料是否為空
+        if iqc_df is None or iqc_df.empty:
+            debug_log("IQC報告資料為空，無法計算指標", level="ERROR")
+            report_error("IQC報告資料為空，請上傳有效的資料檔案。")
+            return None
+        
+        # 使用優化後的PCB標準工時計算
+        iqc_data_with_pcb_time = calculate_pcb_standard_time(iqc_df, pcb_specs_df, pcb_standard_time_df)
+        debug_log(f"PCB標準工時計算完成，資料筆數: {len(iqc_data_with_pcb_time)}", level="INFO")
+        pcb_time_end = time.time()
+        debug_log(f"PCB標準工時計算用時: {pcb_time_end - start_time:.2f}秒", level="INFO")
+        
+        # 一次性計算標準MRB判定欄位，供所有MRB儀表板共用
+        iqc_data_with_pcb_time = ensure_mrb_flag(iqc_data_with_pcb_time)
+        
+        # 重要修改: 先進行日期篩選，確保後續所有計算都使用篩選後的數據
+        filtered_data = filter_by_date_range(iqc_data_with_pcb_time, start_date, end_date)
+        debug_log(f"日期篩選完成，從 {len(iqc_data_with_pcb_time)} 筆資料篩選出 {len(filtered_data)} 筆", level="INFO")
+        
+        # 使用日期篩選後的資料進行效率計算
+        efficiency_start = time.time()
+        efficiency_data = calculate_efficiency_metrics(
+            filtered_data,  # 使用篩選後的資料 
+            start_date, 
+            end_date
+        )
+        efficiency_end = time.time()
+        debug_log(f"效率指標計算用時: {efficiency_end - efficiency_start:.2f}秒", level="INFO")
+        
+        # 計算工作負載指標
+        workload_start = time.time()
+        if additional_tasks_df is None:
+            debug_log("IQC額外任務紀錄清單数据不存在，將使用空數據計算相關指標", level="WARNING")
+            additional_tasks_df = pd.DataFrame()
+        
+        # 使用篩選後的資料計算工作負載
+        workload_data = calculate_workload_metrics(filtered_data, additional_tasks_df, start_date, end_date)
+        workload_end = time.time()
+        debug_log(f"工作負載指標計算用時: {workload_end - workload_start:.2f}秒", level="INFO")
+        
+        # 計算時間分配和額外任務指標
+        time_allocation_start = time.time()
+        time_allocation_data = calculate_time_allocation_metrics(filtered_data, additional_tasks_df, start_date, end_date)
+        additional_tasks_monitor_data = calculate_additional_tasks_metrics(additional_tasks_df, start_date, end_date)
+        time_allocation_end = time.time()
+        debug_log(f"時間分配與額外任務指標計算用時: {time_allocation_end - time_allocation_start:.2f}秒", level="INFO")
+        
+        # 總計算時間
+        total_time = time.time() - start_time
+        debug_log(f"所有指標計算完成，總用時: {total_time:.2f}秒", level="INFO")
+        
+        # 創建返回的指標結果字典
+        metrics = {
+            'processed_data': filtered_data,  # 這裡改為使用日期篩選後的資料
+            'efficiency_data': efficiency_data,
+            'workload_data': workload_data,
+            'time_allocation_data': time_allocation_data,
+            'additional_tasks_monitor_data': additional_tasks_monitor_data
+        }
+        
+        # 在返回結果前過濾指定檢驗員
+        if metrics:
+            # 過濾processed_data
+            if 'processed_data' in metrics and metrics['processed_data'] is not None:
+                metrics['processed_data'] = filter_excluded_inspectors(metrics['processed_data'])
+                
+            # 過濾efficiency_data中的overall_efficiency_ranking
+            if 'efficiency_data' in metrics and 'overall_efficiency_ranking' in metrics['efficiency_data']:
+                metrics['efficiency_data']['overall_efficiency_ranking'] = filter_excluded_inspectors(
+                    metrics['efficiency_data']['overall_efficiency_ranking'], 
+                    inspector_column='inspector'
+                )
+                
+            # 過濾efficiency_data中的category_efficiency_data
+            if 'efficiency_data' in metrics and 'category_efficiency_data' in metrics['efficiency_data']:
+                category_data = metrics['efficiency_data']['category_efficiency_data']
+                for category in category_data:
+                    if isinstance(category_data[category], list):
+                        # 如果是列表格式，過濾每個項目
+                        category_data[category] = [
+                            item for item in category_data[category] 
+                            if item.get('inspector') not in EXCLUDED_INSPECTORS
+                        ]
+                
+            # 過濾workload_data
+            if 'workload_data' in metrics and metrics['workload_data'] is not None:
+                metrics['workload_data'] = filter_excluded_inspectors(metrics['workload_data'], inspector_column='inspector')
+                
+            # 過濾time_allocation_data
+            if 'time_allocation_data' in metrics and metrics['time_allocation_data'] is not None:
+                metrics['time_allocation_data'] = filter_excluded_inspectors(metrics['time_allocation_data'], inspector_column='inspector')
+                
+            # 過濾additional_tasks_monitor_data
+            if 'additional_tasks_monitor_data' in metrics and metrics['additional_tasks_monitor_data'] is not None:
+                metrics['additional_tasks_monitor_data'] = filter_excluded_inspectors(metrics['additional_tasks_monitor_data'], inspector_column='inspector')
+        
+        return metrics
+    
+    except Exception as e:
+        error_msg = f"計算指標時出錯: {str(e)}\n{traceback.format_exc()}"
+        debug_log(error_msg, level="ERROR")
+        report_error(error_msg)
+        return None
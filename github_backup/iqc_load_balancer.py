@@ -0,0 +1,218 @@
+"""
+IQC 效率管理系統 - 本機負載平衡器
+將瀏覽器連線分配到多個 Streamlit 工作程序 (run_app.py --workers N 使用)，
+以 cookie 固定同一瀏覽器的所有連線 (頁面、WebSocket、上傳與媒體檔案) 到同一個工作程序。
+
+Streamlit 的工作階段狀態、上傳檔案與媒體檔案都只存在於單一程序中，
+因此必須使用固定工作階段 (sticky session)；新瀏覽器分配到目前連線數最少的工作程序。
+
+範例:
+    python iqc_load_balancer.py --port 8501 --backend 8502 --backend 8503
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+import time
+
+# 記錄分配結果的 cookie 名稱
+WORKER_COOKIE = 'iqc_worker'
+
+# HTTP 標頭區塊的長度上限 (位元組)
+MAX_HEADER_BYTES = 64 * 1024
+
+# 轉送資料時每次讀取的位元組數
+PIPE_CHUNK_BYTES = 64 * 1024
+
+# 連線失敗的工作程序暫停分配的秒數，之後重新嘗試連線 (工作程序重新啟動後可再使用)
+BACKEND_RETRY_SECONDS = 5
+
+def new_balancer_state(backends):
+    """
+    建立負載平衡狀態
+    
+    參數:
+    backends - [(主機, 端口), ...] 工作程序列表
+    
+    返回:
+    {'backends', 'connections' (各工作程序目前連線數), 'down' ({工作程序編號: 連線失敗時間}), 'next'}
+    """
+    return {
+        'backends': list(backends),
+        'connections': [0] * len(backends),
+        'down': {},
+        'next': 0
+    }
+
+def get_worker_cookie(header_block):
+    """從請求標頭取得已分配的工作程序編號，沒有或格式不符時返回 None"""
+    for line in header_block.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() != b'cookie':
+            continue
+        match = re.search(rb'(?:^|;)\s*' + WORKER_COOKIE.encode() + rb'=(\d+)', value)
+        if match:
+            return int(match.group(1))
+    return None
+
+def is_backend_down(state, index, now=None):
+    """工作程序是否在連線失敗後的暫停期間 (BACKEND_RETRY_SECONDS) 內"""
+    failed_at = state['down'].get(index)
+    if failed_at is None:
+        return False
+    now = time.monotonic() if now is None else now
+    return now - failed_at < BACKEND_RETRY_SECONDS
+
+def choose_backend(state, preferred=None):
+    """
+    選擇工作程序：cookie 指定的工作程序可用時沿用，否則選目前連線數最少者 (同數時輪流)
+    連線失敗的工作程序暫停 BACKEND_RETRY_SECONDS 秒後重新列入候選
+    
+    返回:
+    工作程序編號，全部無法連線時為 None
+    """
+    count = len(state['backends'])
+    now = time.monotonic()
+    if preferred is not None and 0 <= preferred < count and not is_backend_down(state, preferred, now):
+        return preferred
+    
+    candidates = [index for index in range(count) if not is_backend_down(state, index, now)]
+    if not candidates:
+        return None
+    
+    start = state['next']
+    state['next'] = (start + 1) % count
+    return min(candidates, key=lambda index: (state['connections'][index], (index - start) % count))
+
+def add_set_cookie(header_block, worker_index):
+    """在回應標頭區塊 (不含結尾空行) 加入分配結果的 Set-Cookie"""
+    cookie = f"Set-Cookie: {WORKER_COOKIE}={worker_index}; Path=/; SameSite=Lax".encode()
+    return header_block + b'\r\n' + cookie
+
+async def _read_header_block(reader):
+    """讀取到 HTTP 標頭結尾 (空行) 為止，返回不含結尾空行的標頭區塊；連線結束時返回 None"""
+    try:
+        data = await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        return None
+    return data[:-4]
+
+async def _pipe(reader, writer):
+    """單向轉送資料直到任一端關閉"""
+    try:
+        while True:
+            data = await reader.read(PIPE_CHUNK_BYTES)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+async def _open_backend(state, preferred):
+    """
+    連線到工作程序；連線失敗的工作程序暫停分配並改選其他工作程序，重新連線成功後恢復
+    
+    返回:
+    (工作程序編號, reader, writer)，全部無法連線時為 (None, None, None)
+    """
+    while True:
+        index = choose_backend(state, preferred)
+        if index is None:
+            return None, None, None
+        host, port = state['backends'][index]
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            print(f"⚠️ 工作程序 {host}:{port} 無法連線，{BACKEND_RETRY_SECONDS} 秒內改由其他工作程序處理")
+            state['down'][index] = time.monotonic()
+            preferred = None
+            continue
+        if state['down'].pop(index, None) is not None:
+            print(f"✅ 工作程序 {host}:{port} 已恢復連線")
+        return index, reader, writer
+
+async def _handle_client(client_reader, client_writer, state):
+    """處理一條瀏覽器連線：依 cookie 選擇工作程序，之後雙向轉送 (含 WebSocket)"""
+    request_header = await _read_header_block(client_reader)
+    if request_header is None:
+        client_writer.close()
+        return
+    
+    preferred = get_worker_cookie(request_header)
+    index, backend_reader, backend_writer = await _open_backend(state, preferred)
+    if index is None:
+        client_writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        await client_writer.drain()
+        client_writer.close()
+        return
+    
+    state['connections'][index] += 1
+    upstream = None
+    try:
+        backend_writer.write(request_header + b'\r\n\r\n')
+        await backend_writer.drain()
+        
+        # 請求內容 (例如上傳檔案) 需先開始轉送，工作程序才會回應
+        upstream = asyncio.ensure_future(_pipe(client_reader, backend_writer))
+        
+        # 新分配 (或原工作程序無法使用) 時，在第一個回應加上 Set-Cookie
+        if preferred != index:
+            response_header = await _read_header_block(backend_reader)
+            if response_header is None:
+                return
+            client_writer.write(add_set_cookie(response_header, index) + b'\r\n\r\n')
+            await client_writer.drain()
+        
+        await asyncio.gather(upstream, _pipe(backend_reader, client_writer))
+    finally:
+        if upstream is not None and not upstream.done():
+            upstream.cancel()
+        state['connections'][index] -= 1
+        backend_writer.close()
+        client_writer.close()
+
+async def serve(host, port, backends):
+    """啟動負載平衡器並持續執行"""
+    state = new_balancer_state(backends)
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_client(reader, writer, state),
+        host, port, limit=MAX_HEADER_BYTES
+    )
+    async with server:
+        await server.serve_forever()
+
+def run_proxy(host, port, backends):
+    """以阻塞方式執行負載平衡器 (run_app.py 於背景執行緒呼叫)"""
+    asyncio.run(serve(host, port, backends))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="IQC 效率管理系統 - 本機負載平衡器")
+    parser.add_argument('--address', default='localhost', help="監聽位址 (預設 localhost)")
+    parser.add_argument('--port', type=int, default=8501, help="監聽端口 (預設 8501)")
+    parser.add_argument('--backend', action='append', required=True, metavar='[HOST:]PORT',
+                        help="Streamlit 工作程序，可重複指定")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    backends = []
+    for backend in args.backend:
+        host, _, port = backend.rpartition(':')
+        backends.append((host or 'localhost', int(port)))
+    
+    print(f"🔀 負載平衡器: http://{args.address}:{args.port} → " + ", ".join(f"{host}:{port}" for host, port in backends))
+    try:
+        run_proxy(args.address, args.port, backends)
+    except KeyboardInterrupt:
+        print("\n🛑 負載平衡器已停止")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,14 +2,31 @@
 import streamlit as st
 import pandas as pd
 import numpy as np  # 只保留一次
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
-import altair as alt
-from PIL import Image
 import base64  
-import re, os, io, warnings, traceback, subprocess, sys, time
+import re, os, io, warnings, traceback, subprocess, sys, time, threading
 import pathlib
+import atexit
+import shutil
+import tempfile
+import hashlib
+import functools
+import importlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import iqc_engine
+from iqc_engine import (
+    EXCLUDED_INSPECTORS, EXPORT_FORMATS, MRB_FLAG_COLUMN, TASK_RATIO_PREFIX,
+    calculate_all_metrics, check_is_mrb, classify_files, compute_data_version,
+    derive_mrb_flag, filter_by_date_range, filter_excluded_inspectors, get_task_ratio_table,
+    parquet_available
+)
+
+# 每次重新執行腳本的起始時間，用於量測整頁重新執行耗時
+SCRIPT_RUN_START = time.perf_counter()
 
 def resource_path(rel):
     """開發階段與 PyInstaller 打包後皆能取資源檔"""
@@ -17,13 +34,43 @@ def resource_path(rel):
         return pathlib.Path(sys._MEIPASS) / rel
     return pathlib.Path(__file__).parent / rel
 
+# 頁面圖示縮小後的邊長 (像素)；原始 IQC2.png 約 0.9MB，直接傳檔名時每次重新執行都會重新讀取並傳給瀏覽器
+PAGE_ICON_SIZE = 64
+
+@st.cache_resource(show_spinner=False)
+def load_page_icon():
+    """
+    讀取頁面圖示並縮小為 PAGE_ICON_SIZE 的 PNG，整個服務只處理一次
+    
+    返回:
+    PNG 位元組；找不到圖示檔或無法讀取時返回原本的檔名
+    """
+    for path in ("IQC2.png", resource_path("IQC2.png"), resource_path("assets/IQC2.png")):
+        if not os.path.isfile(path):
+            continue
+        try:
+            from PIL import Image
+            with Image.open(path) as image:
+                image.thumbnail((PAGE_ICON_SIZE, PAGE_ICON_SIZE))
+                buffer = io.BytesIO()
+                image.save(buffer, format='PNG')
+            return buffer.getvalue()
+        except Exception as e:
+            print(f"讀取頁面圖示失敗: {e}")
+            break
+    return "IQC2.png"
+
 # 設置頁面配置
-st.set_page_config(
-    page_title="IQC 效率管理系統",
-    page_icon="IQC2.png",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+# 產生頁面或工作階段狀態的程式碼只在 Streamlit 執行腳本 (__name__ == "__main__") 時執行。
+# 計算程序以 spawn 建立，會以 __mp_main__ 名稱匯入本腳本 (multiprocessing「安全匯入主模組」規則)，
+# 匯入時只定義函數與常數，不重新執行介面 (tests/test_compute_spawn.py 檢查)。
+if __name__ == "__main__":
+    st.set_page_config(
+        page_title="IQC 效率管理系統",
+        page_icon=load_page_icon(),
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
 
 # 其他Streamlit命令和初始化
 warnings.filterwarnings('ignore')
@@ -37,7 +84,8 @@ for package in required_packages:
         print(f"安裝所需套件: {package}")
 
 # 添加現代無襯線字體設定
-st.markdown("""
+if __name__ == "__main__":
+    st.markdown("""
 <style>
     /* IQC 效率管理系統設計更新 - 淺灰色設計方案 */
 
@@ -310,30 +358,31 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # 初始化session_state中的關鍵變量 - 確保在使用前進行初始化
-if 'show_cover' not in st.session_state:
-    st.session_state['show_cover'] = True  # 初始顯示封面頁
-if 'debug_info' not in st.session_state:
-    st.session_state.debug_info = {'logs': []}
-if 'log_level' not in st.session_state:
-    st.session_state.log_level = "INFO"
-if 'performance_mode' not in st.session_state:
-    st.session_state.performance_mode = False
-if 'iqc_report_data' not in st.session_state:
-    st.session_state.iqc_report_data = None
-if 'pcb_spec_data' not in st.session_state:
-    st.session_state.pcb_spec_data = None
-if 'pcb_standard_time_data' not in st.session_state:
-    st.session_state.pcb_standard_time_data = None
-if 'additional_tasks_data' not in st.session_state:
-    st.session_state.additional_tasks_data = None
-if 'processed_data' not in st.session_state:
-    st.session_state.processed_data = None
-if 'files_uploaded' not in st.session_state:
-    st.session_state.files_uploaded = False
-if 'processing_error' not in st.session_state:
-    st.session_state.processing_error = None
-if 'selected_categories' not in st.session_state:
-    st.session_state.selected_categories = []
+if __name__ == "__main__":
+    if 'show_cover' not in st.session_state:
+        st.session_state['show_cover'] = True  # 初始顯示封面頁
+    if 'debug_info' not in st.session_state:
+        st.session_state.debug_info = {'logs': []}
+    if 'log_level' not in st.session_state:
+        st.session_state.log_level = "INFO"
+    if 'performance_mode' not in st.session_state:
+        st.session_state.performance_mode = False
+    if 'iqc_report_data' not in st.session_state:
+        st.session_state.iqc_report_data = None
+    if 'pcb_spec_data' not in st.session_state:
+        st.session_state.pcb_spec_data = None
+    if 'pcb_standard_time_data' not in st.session_state:
+        st.session_state.pcb_standard_time_data = None
+    if 'additional_tasks_data' not in st.session_state:
+        st.session_state.additional_tasks_data = None
+    if 'processed_data' not in st.session_state:
+        st.session_state.processed_data = None
+    if 'files_uploaded' not in st.session_state:
+        st.session_state.files_uploaded = False
+    if 'processing_error' not in st.session_state:
+        st.session_state.processing_error = None
+    if 'selected_categories' not in st.session_state:
+        st.session_state.selected_categories = []
 
 
 # 設定是否啟用調試模式
@@ -927,6 +976,10 @@ def get_guide_html():
 def debug_log(message, data=None, level="DEBUG"):
     """優化版的日誌功能，添加日誌級別控制與性能模式"""
     
+    # 背景工作執行緒不寫入工作階段日誌 (背景執行緒沒有工作階段，不能存取 session_state)
+    if iqc_engine.is_background_thread():
+        return
+    
     # 如果處於高性能模式，只記錄WARNING及更高級別的日誌
     if st.session_state.get('performance_mode', False) and level not in ["WARNING", "ERROR"]:
         return
@@ -976,69 +1029,27 @@ def debug_log(message, data=None, level="DEBUG"):
         if level == "ERROR" or (not st.session_state.get('performance_mode', False) and level in ["WARNING", "ERROR"]):
             print(log_message)
 
-FIELD_MAPPING = {
-    # IQC Report 欄位映射
-    'IQC_REPORT': {
-        '檢驗員': ['檢驗員', 'Inspector', '檢驗人員', '操作員'],
-        '檢驗日期': ['檢驗日期', 'Inspection Date', '日期', 'Date'],
-        '料號': ['料號', 'Part No.', 'Part No', 'PartNo', 'Part Number'],
-        '類別': ['類別', 'Category', 'Type'],
-        '抽樣狀態': ['抽樣狀態', 'Sampling Status', 'Status'],
-        '抽樣數量': ['抽樣數量', 'Sampling Qty', 'Sample Qty', 'Quantity'],
-        'MRB': ['MRB', 'MRB狀態', 'MRB Status'],
-        '檢驗標準工時': ['檢驗標準工時', 'Standard Time', '標準工時'],
-        '檢驗耗時（調整後）': ['檢驗耗時（調整後）', '檢驗耗時(調整後)', '檢驗耗時', 'Actual Time', '實際耗時'],
-        '檢驗開始時間': ['檢驗開始時間', 'AO', 'Start Time', '開始時間']
-    },
-    # PCB建檔明細欄位映射 - 壓合孔數從L欄改為N欄
-    'PCB_SPECS': {
-        '料號': ['料號', 'Part No.', 'Part No', 'PartNo', 'Part Number'],
-        '壓合孔數': ['壓合孔數', 'Hole Count', '孔數'],  # 用於名稱映射
-        '版長': ['版長', 'Length', '長度'],
-        '版寬': ['版寬', 'Width', '寬度']
-    },
-    # PCB標準工時對應表欄位映射
-    'PCB_STANDARD_TIME': {
-        '面積範圍': ['面積範圍', 'Area Range', '面積'],
-        '壓合總孔數': ['壓合總孔數', 'Total Hole Count', '孔數'],
-        'PCB標準工時': ['PCB標準工時', 'Standard Time', '標準工時']
-    },
-    # IQC額外任務紀錄清單欄位映射
-    'ADDITIONAL_TASKS': {
-        '姓名': ['姓名', 'Name', '下拉式選單', '人員', 'B'],
-        '日期': ['日期', 'Date', '手key', 'A'],
-        '工作事項分類': ['工作事項分類', 'Task Type', '下拉式選單_1', '任務類型', 'C'],
-        '用時(分鐘)': ['用時(分鐘)', '用時（分鐘）', 'Time(min)', '時間', '手key_3', 'H']
-    }
-}
-
-# 在文件頂部添加這個常量（與其他常量一起）
-EXCLUDED_INSPECTORS = ["謝芷馨", "蘇育珍", "許碧琦"]
+# ==================== 計算核心 ====================
+# 計算核心 (iqc_engine) 不依賴 Streamlit：介面執行時，日誌寫入工作階段，錯誤與警告顯示於頁面
+if __name__ == "__main__":
+    iqc_engine.set_handlers(log=debug_log, error=st.error, warning=st.warning)
 
-# 添加檢驗員過濾函數
-def filter_excluded_inspectors(df, inspector_column='處理後檢驗員'):
-    """
-    過濾掉不需要顯示在圖表中的檢驗員數據
-    
-    參數:
-    df - DataFrame
-    inspector_column - 檢驗員欄位名稱
-    
-    返回:
-    過濾後的DataFrame
-    """
-    if df is None or df.empty:
-        return df
-        
-    if inspector_column not in df.columns:
-        return df
-        
-    # 過濾掉指定的檢驗員
-    return df[~df[inspector_column].isin(EXCLUDED_INSPECTORS)].copy()
+# 檔案解析結果在介面層快取 (計算核心本身不快取，批次報表與工作程序直接呼叫)
+process_multiple_iqc_reports_optimized = st.cache_data(ttl=3600, max_entries=10, show_spinner=False)(
+    iqc_engine.process_multiple_iqc_reports_optimized
+)
+process_multiple_pcb_specs = st.cache_data(ttl=3600, max_entries=5, show_spinner=False)(
+    iqc_engine.process_multiple_pcb_specs
+)
+process_multiple_pcb_standard_times = st.cache_data(ttl=3600, max_entries=5, show_spinner=False)(
+    iqc_engine.process_multiple_pcb_standard_times
+)
+process_multiple_additional_tasks = st.cache_data(ttl=3600, max_entries=5, show_spinner=False)(
+    iqc_engine.process_multiple_additional_tasks
+)
 
 def update_field_mapping():
-    global FIELD_MAPPING
-    return FIELD_MAPPING
+    return iqc_engine.FIELD_MAPPING
 
 # 首先定义物料类别映射字典 - 在主函数开始前添加
 MATERIAL_CATEGORY_MAPPING = {
@@ -1053,6 +1064,30 @@ MATERIAL_CATEGORY_MAPPING = {
     "PCB-QB": ["QB"]
 }
 
+# 子類別 -> 大類別的反查表，供向量化 map 使用
+SUBCATEGORY_TO_MAIN_CATEGORY = {
+    sub_cat: main_cat
+    for main_cat, sub_cats in MATERIAL_CATEGORY_MAPPING.items()
+    for sub_cat in sub_cats
+}
+
+def map_main_category(categories, unknown_label='Unknown', keep_unmapped=True):
+    """
+    將子類別欄位向量化對應到大類別
+
+    參數:
+    categories - 子類別 Series
+    unknown_label - 空值 (或 keep_unmapped=False 時找不到對應) 使用的標籤
+    keep_unmapped - 找不到對應時是否保留原子類別
+
+    返回:
+    大類別 Series
+    """
+    main_categories = categories.map(SUBCATEGORY_TO_MAIN_CATEGORY)
+    if keep_unmapped:
+        main_categories = main_categories.fillna(categories)
+    return main_categories.fillna(unknown_label)
+
 @st.cache_data(ttl=3600, max_entries=50)
 def get_field_value(row, field_name, mapping, default_value=None):
     """
@@ -1103,1337 +1138,531 @@ def get_field_value(row, field_name, mapping, default_value=None):
     
     return default_value
 
-@st.cache_data(ttl=3600, max_entries=100)
-def parse_excel_date(date_val):
+
+# ==================== 資料版本與指標快取 ====================
+# 指標快取的記憶體上限 (位元組)，超過時淘汰最久未使用的項目
+METRIC_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def _estimate_nbytes(value):
+    """估算快取值佔用的記憶體 (位元組)，DataFrame/Series 使用 deep memory_usage"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_estimate_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_estimate_nbytes(item) for item in value)
+    if hasattr(value, 'to_plotly_json'):
+        return _estimate_nbytes(value.to_plotly_json())
+    return sys.getsizeof(value)
+
+def _get_metric_cache():
+    """取得本工作階段的指標快取 (LRU，依位元組大小淘汰)"""
+    if 'metric_cache' not in st.session_state:
+        st.session_state.metric_cache = {
+            'entries': OrderedDict(),
+            'total_bytes': 0,
+            'max_bytes': METRIC_CACHE_MAX_BYTES,
+            'hits': 0,
+            'misses': 0
+        }
+    return st.session_state.metric_cache
+
+def get_versioned_metric(name, data_version, params, compute):
     """
-    解析各種Excel日期格式，支持多種日期格式
-    
+    以 (名稱, 資料版本, 參數) 為鍵取得指標，未命中時計算並放入 LRU 快取
+
     參數:
-    date_val: 任意格式的日期值(數字、字符串、datetime對象等)
-    
+    name - 指標名稱
+    data_version - 資料版本代碼，None 時不使用快取
+    params - 可雜湊的參數 tuple (例如日期範圍、類別、極值剔除比例)
+    compute - 無參數的計算函數
+
     返回:
-    datetime對象或None(如果無法解析)
+    compute() 的結果
     """
-    if pd.isna(date_val):
-        return None
+    if data_version is None:
+        return compute()
     
-    try:
-        # 如果是數字（Excel日期），轉換為datetime
-        if isinstance(date_val, (int, float)):
-            try:
-                # Excel日期從1900年1月1日開始，但有個bug，會多算一天(1900年不是閏年)
-                return datetime.fromordinal(datetime(1900, 1, 1).toordinal() + int(date_val) - 2)
-            except:
-                pass
-        
-        # 如果是字符串，嘗試多種格式
-        if isinstance(date_val, str):
-            # 嘗試各種日期格式
-            formats = [
-                '%Y-%m-%d', '%Y/%m/%d', '%m/%d/%Y', '%d/%m/%Y', 
-                '%Y年%m月%d日', '%m-%d-%Y', '%d-%m-%Y',
-                '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S',
-                '%m/%d', '%Y-%m', '%m月%d日'
-            ]
-            
-            for fmt in formats:
-                try:
-                    return datetime.strptime(date_val, fmt)
-                except:
-                    continue
-            
-            # 嘗試從日期字符串中提取數字
-            import re
-            date_match = re.search(r'(\d{1,4})[-/年](\d{1,2})[-/月](\d{1,2})', date_val)
-            if date_match:
-                try:
-                    year, month, day = map(int, date_match.groups())
-                    if year < 100:  # 兩位數年份
-                        year += 2000
-                    return datetime(year, month, day)
-                except:
-                    pass
-        
-        # 如果已經是datetime，直接返回
-        if isinstance(date_val, datetime):
-            return date_val
-        
-        # 最後嘗試pandas的通用解析
-        return pd.to_datetime(date_val)
+    cache = _get_metric_cache()
+    entries = cache['entries']
+    cache_key = (name, data_version, params)
     
-    except Exception as e:
-        debug_log(f"日期解析錯誤: {e}", date_val)
-        return None
+    if cache_key in entries:
+        entries.move_to_end(cache_key)
+        cache['hits'] += 1
+        return entries[cache_key]['value']
+    
+    cache['misses'] += 1
+    value = compute()
+    nbytes = _estimate_nbytes(value)
+    
+    # 單一項目超過上限時不快取
+    if nbytes > cache['max_bytes']:
+        debug_log(f"指標 {name} 大小 {nbytes / 1024 / 1024:.1f}MB 超過快取上限，不快取", level="WARNING")
+        return value
+    
+    entries[cache_key] = {'value': value, 'nbytes': nbytes}
+    cache['total_bytes'] += nbytes
+    while cache['total_bytes'] > cache['max_bytes']:
+        _, evicted = entries.popitem(last=False)
+        cache['total_bytes'] -= evicted['nbytes']
+    
+    return value
+
+def get_processed_data_version():
+    """取得目前 processed_data 的版本代碼 (資料版本 + 日期範圍)，尚未處理資料時為 None"""
+    return st.session_state.get('processed_data_version')
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def check_is_mrb(row, mrb_cache={}):
+def apply_metrics_result(kind, metrics, data_version, start_date, end_date):
     """
-    MRB檢測函數，支援單行和DataFrame處理
+    將 calculate_all_metrics 的結果寫入 session_state，並記錄 processed_data 的版本代碼供後續指標快取使用
+
+    參數:
+    kind - 'process' (處理上傳檔案後的首次計算) 或 'filter' (應用日期篩選)
+    metrics - calculate_all_metrics 的結果
+    data_version - 資料版本代碼
+    start_date, end_date - 日期範圍
     """
-    # 檢查輸入是否為DataFrame
-    if isinstance(row, pd.DataFrame):
-        # 創建結果列
-        is_mrb = pd.Series(False, index=row.index)
-        mrb_messages = pd.Series("無MRB標記", index=row.index)
-        
-        # 可能的MRB欄位
-        mrb_columns = ['M', '異常問題匯總', 'Abnormal Summary']
-        
-        # 檢查所有可能的MRB欄位
-        for col in mrb_columns:
-            if col in row.columns:
-                # 使用向量化操作而非逐行判斷
-                col_mask = row[col].notna() & row[col].astype(str).str.strip().ne('')
-                is_mrb = is_mrb | col_mask
-                mrb_messages = mrb_messages.mask(col_mask, f"異常問題欄位({col})有內容")
-        
-        # 檢查Excel的M欄位位置 (第13個欄位)
-        if len(row.columns) >= 13:
-            m_col = row.columns[12]  # 第13個欄位 (0-based indexing)
-            if m_col not in mrb_columns and m_col in row.columns:
-                col_mask = row[m_col].notna() & row[m_col].astype(str).str.strip().ne('')
-                is_mrb = is_mrb | col_mask
-                mrb_messages = mrb_messages.mask(col_mask, f"M欄位({m_col})有內容")
-        
-        return pd.DataFrame({'是否為MRB': is_mrb, 'MRB訊息': mrb_messages})
+    if kind == 'filter':
+        # 清除所有與分析相關的緩存結果 (計算期間仍顯示舊數據，套用新數據時才清除)
+        cache_keys = [
+            'mrb_analysis_results',       # MRB分析結果
+            'trimmed_avg_efficiency',     # 剔除極值後的效率
+            'trimmed_record_stats',       # 剔除記錄統計
+            'category_efficiency_data',   # 類別效率數據
+            'has_applied_selection'       # 應用選擇標記
+        ]
+        for key in cache_keys:
+            if key in st.session_state:
+                del st.session_state[key]
+                debug_log(f"已清除緩存：{key}", level="INFO")
+    
+    st.session_state.processed_data = metrics['processed_data']
+    st.session_state.efficiency_data = metrics['efficiency_data']
+    st.session_state.workload_data = metrics['workload_data']
+    st.session_state.time_allocation_data = metrics['time_allocation_data']
+    st.session_state.additional_tasks_monitor_data = metrics['additional_tasks_monitor_data']
+    
+    date_params = (str(start_date), str(end_date))
+    st.session_state.filtered_start_date = start_date
+    st.session_state.filtered_end_date = end_date
+    st.session_state.processed_data_version = (
+        f"{data_version}:{date_params[0]}:{date_params[1]}" if data_version is not None else None
+    )
     
-    # 處理單行數據
-    else:
-        # 可能的MRB欄位
-        mrb_columns = ['M', '異常問題匯總', 'Abnormal Summary']
-        
-        # 檢查所有可能的MRB欄位
-        for col in mrb_columns:
-            if col in row and pd.notna(row[col]) and str(row[col]).strip() != '':
-                return (True, f"異常問題欄位({col})有內容: {row[col]}")
-        
-        # 嘗試直接檢查M欄位 (如果存在)
-        if 'M' in row and pd.notna(row['M']) and str(row['M']).strip() != '':
-            return (True, f"M欄位有內容: {row['M']}")
-        
-        return (False, "無MRB標記")
+    if kind == 'process':
+        st.session_state.files_uploaded = True
+        # 確保初始沒有選擇的物料類別
+        st.session_state.selected_material_categories = []
 
-@st.cache_data(ttl=3600, max_entries=10, show_spinner=False)
-def process_multiple_iqc_reports_optimized(files):
-    try:
-        debug_log(f"開始處理{len(files)}個IQC Report檔案")
-        all_data_frames = []
-        
-        # 特殊檢驗員名稱對應字典
-        special_inspectors = {
-            'Cindy': '謝芷馨',
-            'Joanne': '許碧琦',
-            'Susu': '蘇育珍',
-            'Wen': '許雅雯',
-            'Flora': '毛凡甫',
-            'ya-wen': '張雅雯'
-        }
-        
-        for file_idx, file in enumerate(files):
-            debug_log(f"處理第{file_idx+1}個IQC Report檔案: {file.name}")
-            
-            # 讀取Excel檔案
-            xls = pd.ExcelFile(file)
-            sheets = xls.sheet_names
-            
-            # 找到最可能的工作表
-            target_sheet = next((sheet for sheet in sheets 
-                                if any(keyword in sheet.lower() for keyword in 
-                                      ['report', 'data', '資料', '報告', 'iqc'])), 
-                              sheets[0])
-            
-            debug_log(f"使用工作表: {target_sheet}")
-            df = pd.read_excel(file, sheet_name=target_sheet)
-            debug_log(f"原始資料讀取完成，資料列數: {len(df)}")
-            
-            # 獲取欄位映射
-            field_mapping = FIELD_MAPPING['IQC_REPORT']
-            
-            # 找出所有可能的M欄位（用於MRB判斷）
-            m_column = df.columns[12] if len(df.columns) >= 13 else None
-            possible_mrb_columns = [col for col in df.columns if 
-                                   isinstance(col, str) and 
-                                   ('異常問題' in col or 'Abnormal' in col or col.upper() == 'M')]
-            if m_column and m_column not in possible_mrb_columns:
-                possible_mrb_columns.append(m_column)
-                
-            debug_log(f"可能的MRB欄位: {possible_mrb_columns}")
-            
-            # 批量處理檢驗員名稱
-            inspector_name_col = find_column_by_mapping(df, '檢驗員', field_mapping)
-            if inspector_name_col:
-                inspector_series = df[inspector_name_col].astype(str)
-                df['處理後檢驗員'] = inspector_series
-                
-                # 提取括號內容
-                bracket_pattern = r'\((.*?)\)'
-                df['處理後檢驗員'] = df['處理後檢驗員'].str.extract(bracket_pattern, expand=False)
-                
-                # 檢查WYLZ標記
-                df['包含WYLZ'] = df['處理後檢驗員'].str.contains('WYLZ', na=False)
-                
-                # 處理特殊案例
-                df['處理後檢驗員'] = df['處理後檢驗員'].map(
-                    lambda x: special_inspectors.get(x, x) if pd.notna(x) else x)
-            else:
-                df['處理後檢驗員'] = 'Unknown'
-                df['包含WYLZ'] = False
-            
-            # 批量處理檢驗開始時間
-            start_time_col = find_column_by_mapping(df, '檢驗開始時間', field_mapping)
-            if start_time_col:
-                df['檢驗開始時間'] = pd.to_datetime(df[start_time_col], errors='coerce')
-            
-            # ===== MRB狀態處理修正 =====
-            # 重要：使用字符串類型進行存儲，避免後續轉換問題
-            df['是否為MRB'] = "FALSE"
-            df['MRB狀態'] = "Normal inspection"
-            df['MRB訊息'] = "無MRB標記"
-            df['MRB內容'] = None
-            df['MRB加時'] = 0
-            
-            # 檢查所有可能的MRB欄位
-            mrb_found = False
-            for mrb_col in possible_mrb_columns:
-                if mrb_col in df.columns:
-                    # 創建掩碼標記非空值的MRB
-                    mrb_mask = df[mrb_col].notna() & (df[mrb_col].astype(str).str.strip() != '')
-                    if mrb_mask.any():
-                        # 明確使用字符串"TRUE"而非布爾值True
-                        df.loc[mrb_mask, '是否為MRB'] = "TRUE"
-                        df.loc[mrb_mask, 'MRB狀態'] = "MRB"
-                        df.loc[mrb_mask, 'MRB訊息'] = f"異常問題欄位({mrb_col})有內容"
-                        df.loc[mrb_mask, 'MRB內容'] = df.loc[mrb_mask, mrb_col]
-                        df.loc[mrb_mask, 'MRB加時'] = 30
-                        mrb_found = True
-                        debug_log(f"在欄位 {mrb_col} 找到 {mrb_mask.sum()} 筆MRB記錄")
-            
-            # 批量處理標準工時和檢驗耗時
-            std_time_col = find_column_by_mapping(df, '檢驗標準工時', field_mapping)
-            insp_time_col = find_column_by_mapping(df, '檢驗耗時（調整後）', field_mapping)
-            
-            # 向量化處理標準工時
-            if std_time_col:
-                df['處理後檢驗標準工時'] = pd.to_numeric(df[std_time_col], errors='coerce').fillna(0)
-            else:
-                df['處理後檢驗標準工時'] = 0
-            
-            # 向量化處理檢驗耗時
-            if insp_time_col:
-                df['檢驗耗時'] = pd.to_numeric(df[insp_time_col], errors='coerce').fillna(0)
-            else:
-                df['檢驗耗時'] = 0
-            
-            # 批量處理MRB加時 - 使用字符串比較
-            mrb_mask = df['是否為MRB'] == "TRUE"
-            df.loc[mrb_mask, '處理後檢驗標準工時'] += 30
-            
-            # 批量計算效率比值 - 向量化操作
-            df['效率比值'] = 0
-            
-            # 處理不同情況
-            zero_std_mask = df['處理後檢驗標準工時'] == 0
-            zero_insp_mask = df['檢驗耗時'] <= 0.1
-            
-            # 標準工時為0的情況
-            df.loc[zero_std_mask, '效率比值'] = 1
-            
-            # 檢驗耗時極小的情況
-            df.loc[~zero_std_mask & zero_insp_mask, '效率比值'] = 0
-            
-            # 正常計算的情況
-            normal_calc_mask = ~zero_std_mask & ~zero_insp_mask
-            df.loc[normal_calc_mask, '效率比值'] = df.loc[normal_calc_mask, '處理後檢驗標準工時'] / df.loc[normal_calc_mask, '檢驗耗時']
-            
-            # 限制最大效率比值
-            df.loc[df['效率比值'] > 20, '效率比值'] = 20
-            
-            # 批量處理其他欄位
-            category_col = find_column_by_mapping(df, '類別', field_mapping)
-            sample_status_col = find_column_by_mapping(df, '抽樣狀態', field_mapping)
-            part_no_col = find_column_by_mapping(df, '料號', field_mapping)
-            sample_qty_col = find_column_by_mapping(df, '抽樣數量', field_mapping)
-            date_col = find_column_by_mapping(df, '檢驗日期', field_mapping)
-            
-            # 使用向量化操作處理各欄位
-            df['類別'] = df[category_col] if category_col in df.columns else 'Unknown'
-            df['抽樣狀態'] = df[sample_status_col] if sample_status_col in df.columns else ''
-            df['料號'] = df[part_no_col] if part_no_col in df.columns else ''
-            
-            # 處理抽樣數量
-            if sample_qty_col in df.columns:
-                df['抽樣數量'] = pd.to_numeric(df[sample_qty_col], errors='coerce').fillna(1).astype(int)
-            else:
-                df['抽樣數量'] = 1
-            
-            # 處理檢驗日期
-            if date_col in df.columns:
-                df['檢驗日期'] = pd.to_datetime(df[date_col], errors='coerce')
-            
-            # 添加索引和檔案來源標記
-            df['_index'] = range(len(df))
-            df['檔案來源'] = file.name
-            
-            # 過濾掉抽樣狀態為 STS 的資料和包含 WYLZ 的資料
-            filtered_df = df[(df['抽樣狀態'] != 'STS') & (~df['包含WYLZ'])]
-            
-            # 選取需要的欄位
-            required_columns = [
-                '處理後檢驗員', '處理後檢驗標準工時', '檢驗耗時', '效率比值', 
-                '類別', '抽樣狀態', '料號', '抽樣數量', '檢驗日期', '檢驗開始時間',
-                '包含WYLZ', '是否為MRB', 'MRB狀態', 'MRB訊息', 'MRB內容', 'MRB加時', '_index', '檔案來源'
-            ]
-            
-            # 確保所有需要的欄位都存在
-            for col in required_columns:
-                if col not in filtered_df.columns:
-                    filtered_df[col] = None
-            
-            # 檢查MRB狀態是否正確存在
-            if mrb_found:
-                mrb_check = filtered_df['是否為MRB'] == "TRUE"
-                debug_log(f"過濾後仍有 {mrb_check.sum()} 筆MRB記錄", level="INFO")
-            
-            # 輸出表格前20行的MRB狀態統計以便調試
-            status_counts = filtered_df.head(20)['MRB狀態'].value_counts()
-            debug_log(f"頭20行MRB狀態統計: {status_counts.to_dict()}", level="INFO")
-            
-            all_data_frames.append(filtered_df[required_columns])
-        
-        # 合併所有資料框
-        if all_data_frames:
-            processed_df = pd.concat(all_data_frames, ignore_index=True)
-            debug_log(f"所有IQC Report檔案處理完成，總資料列數: {len(processed_df)}")
-            
-            # 檢查合併後MRB狀態
-            mrb_counts = processed_df['MRB狀態'].value_counts()
-            debug_log(f"合併後MRB狀態統計: {mrb_counts.to_dict()}", level="INFO")
-            
-            # 檢查合併後結果的欄位名是否正確
-            debug_log(f"合併後結果欄位名: {processed_df.columns.tolist()}")
-            
-            # 確保是否為MRB欄位為字符串類型，避免後續轉換問題
-            processed_df['是否為MRB'] = processed_df['是否為MRB'].astype(str)
-            
-            # 最後檢查資料
-            true_count = (processed_df['是否為MRB'] == "TRUE").sum()
-            mrb_status_count = (processed_df['MRB狀態'] == "MRB").sum()
-            
-            debug_log(f"最終結果: 是否為MRB=TRUE的記錄數: {true_count}", level="INFO")
-            debug_log(f"最終結果: MRB狀態=MRB的記錄數: {mrb_status_count}", level="INFO")
-            
-            return processed_df
-        else:
-            return pd.DataFrame()
-    
-    except Exception as e:
-        error_msg = f"處理 IQC Report 時出錯: {str(e)}\n{traceback.format_exc()}"
-        debug_log(error_msg)
-        st.error(error_msg)
-        raise e
 
-# 輔助函數：根據映射尋找相應欄位
-def find_column_by_mapping(df, field_name, mapping):
+# ==================== 圖表快取 ====================
+def get_cached_figure(chart_id, params, build):
     """
-    根據映射表尋找DataFrame中對應的欄位名稱
-    
+    以 (圖表代碼, 資料版本, 參數) 快取圖表，頁面其他地方觸發的重新執行不必重建圖表
+
+    與指標共用同一個 LRU 快取 (依位元組大小淘汰)，尚未處理資料時直接建立圖表。
+
     參數:
-    df - DataFrame
-    field_name - 要尋找的欄位標準名稱
-    mapping - 欄位映射字典
-    
+    chart_id - 圖表代碼
+    params - 影響圖表內容的參數 tuple
+    build - 無參數的建圖函數
+
     返回:
-    找到的欄位名稱或None
+    build() 的結果
     """
-    if field_name in mapping:
-        possible_names = mapping[field_name]
-        for name in possible_names:
-            if name in df.columns:
-                return name
-                
-        # 不區分大小寫嘗試
-        for col in df.columns:
-            if isinstance(col, str):
-                for name in possible_names:
-                    if name.lower() == col.lower():
-                        return col
-    return None
-
-@st.cache_data(ttl=3600, max_entries=5, show_spinner=False)
-def process_multiple_pcb_specs(files):
-    try:
-        debug_log(f"開始處理{len(files)}個PCB建檔明細檔案", level="INFO")
-        all_data = []
-        
-        for file_idx, file in enumerate(files):
-            debug_log(f"處理第{file_idx+1}個PCB建檔明細檔案: {file.name}", level="INFO")
-            
-            # 讀取Excel檔案，尋找目標工作表
-            try:
-                xls = pd.ExcelFile(file)
-                sheets = xls.sheet_names
-                
-                # 智能工作表選擇 - 優先選擇包含關鍵字的工作表
-                target_sheet = None
-                
-                # 按優先順序尋找工作表
-                for keyword in ["建立規格_總表", "建立規格", "總表", "規格"]:
-                    matches = [sheet for sheet in sheets if keyword in sheet]
-                    if matches:
-                        target_sheet = matches[0]
-                        break
-                
-                # 如果沒找到，使用第一個工作表
-                if not target_sheet:
-                    target_sheet = sheets[0]
-                
-                debug_log(f"使用工作表: {target_sheet}", level="INFO")
-                
-                # 直接讀取資料，不進行列名處理
-                df = pd.read_excel(file, sheet_name=target_sheet)
-                
-                # 快速定位關鍵欄位 - 不需要進行完整的列名轉換
-                key_columns = {
-                    'C': 'part_no',         # 料號 (C欄)
-                    'N': 'hole_count',      # 壓合孔數 (N欄)
-                    'L': 'hole_count_alt',  # 替代壓合孔數位置 (L欄)
-                    'AB': 'length',         # 版長 (AB欄)
-                    'AE': 'width'           # 版寬 (AE欄)
-                }
-                
-                # 創建結果資料框 - 只保留必要欄位
-                result_df = pd.DataFrame()
-                
-                # 提取料號 (C欄) - 必要欄位
-                if 2 < df.shape[1]:  # 確保C欄存在
-                    result_df['料號'] = df.iloc[:, 2].copy()
-                    result_df['C'] = df.iloc[:, 2].copy()
-                else:
-                    debug_log("找不到C欄 (料號)，跳過此檔案", level="WARNING")
-                    continue
-                
-                # 提取壓合孔數 (嘗試N欄，如果不存在則使用L欄)
-                if 13 < df.shape[1]:  # N欄 (第14列)
-                    result_df['壓合孔數'] = df.iloc[:, 13].copy()
-                    result_df['N'] = df.iloc[:, 13].copy()
-                    debug_log(f"使用N欄位獲取壓合孔數", level="INFO")
-                elif 11 < df.shape[1]:  # L欄 (第12列)
-                    result_df['壓合孔數'] = df.iloc[:, 11].copy()
-                    result_df['N'] = df.iloc[:, 11].copy()
-                    debug_log(f"N欄位不存在，使用L欄位獲取壓合孔數", level="INFO")
-                else:
-                    result_df['壓合孔數'] = 'NA'
-                    result_df['N'] = 'NA'
-                
-                # 提取版長 (AB欄，第28列)
-                if 27 < df.shape[1]:
-                    result_df['版長'] = df.iloc[:, 27].copy()
-                    result_df['AB'] = df.iloc[:, 27].copy()
-                else:
-                    result_df['版長'] = 0
-                    result_df['AB'] = 0
-                
-                # 提取版寬 (AE欄，第31列)
-                if 30 < df.shape[1]:
-                    result_df['版寬'] = df.iloc[:, 30].copy()
-                    result_df['AE'] = df.iloc[:, 30].copy()
-                else:
-                    result_df['版寬'] = 0
-                    result_df['AE'] = 0
-                
-                # 添加檔案來源標記
-                result_df['檔案來源'] = file.name
-                
-                # 過濾掉料號為空的資料 - 向量化操作
-                result_df = result_df[result_df['料號'].notna()].copy()
-                
-                # 壓合孔數處理 - 向量化處理NA值
-                result_df['壓合孔數'] = result_df['壓合孔數'].apply(
-                    lambda x: 'NA' if pd.isna(x) or x == 'NA' else x
-                )
-                
-                # 添加到總結果
-                all_data.append(result_df)
-                debug_log(f"第{file_idx+1}個檔案處理完成，資料列數: {len(result_df)}", level="INFO")
-            
-            except Exception as e:
-                error_msg = f"處理檔案 {file.name} 時出錯: {str(e)}"
-                debug_log(error_msg, level="ERROR")
-                continue
-        
-        # 合併所有處理後的資料
-        if all_data:
-            processed_df = pd.concat(all_data, ignore_index=True)
-            debug_log(f"所有PCB建檔明細檔案處理完成，總資料列數: {len(processed_df)}", level="INFO")
-            
-            # 檢查關鍵欄位
-            key_fields = ['C', 'N', 'AB', 'AE']
-            missing_cols = [col for col in key_fields if col not in processed_df.columns]
-            
-            if missing_cols:
-                debug_log(f"警告: 缺少關鍵Excel欄位: {missing_cols}", level="WARNING")
-            else:
-                debug_log("成功提取所有關鍵Excel欄位", level="INFO")
-                
-                # 只顯示少量樣本數據，減少日誌量
-                sample_size = min(5, len(processed_df))
-                for i in range(sample_size):
-                    debug_log(f"樣本 {i+1}: 料號={processed_df.iloc[i]['C']}, 壓合孔數={processed_df.iloc[i]['N']}, " +
-                             f"版長={processed_df.iloc[i]['AB']}, 版寬={processed_df.iloc[i]['AE']}")
-            
-            return processed_df
-        else:
-            debug_log("沒有成功處理任何PCB建檔明細檔案", level="WARNING")
-            return pd.DataFrame()
-    
-    except Exception as e:
-        error_msg = f"處理 PCB建檔明細 時出錯: {str(e)}\n{traceback.format_exc()}"
-        debug_log(error_msg, level="ERROR")
-        st.error(error_msg)
-        raise e
+    return get_versioned_metric(f'figure:{chart_id}', get_processed_data_version(), params, build)
 
-# 優化的面積範圍解析函數，從PCBDEBUG4_WORK整合
-@st.cache_data(ttl=3600, max_entries=100)
-def parse_area_range(area_range_str):
-    """將面積範圍字符串解析為最小值和最大值"""
-    try:
-        area_range_str = str(area_range_str) if pd.notna(area_range_str) else ""
-        
-        min_area = 0
-        max_area = float('inf')
-        
-        if "小於" in area_range_str:
-            # 例如: "小於100000"
-            max_area = float(''.join(filter(str.isdigit, area_range_str)))
-        elif "超過" in area_range_str:
-            # 例如: "超過250000"
-            min_area = float(''.join(filter(str.isdigit, area_range_str)))
-        elif "到" in area_range_str:
-            # 例如: "100000到150000"
-            parts = area_range_str.split("到")
-            if len(parts) == 2:
-                min_area = float(''.join(filter(str.isdigit, parts[0].strip())))
-                max_area = float(''.join(filter(str.isdigit, parts[1].strip())))
-        
-        return min_area, max_area, area_range_str
-    except Exception as e:
-        debug_log(f"解析面積範圍時出錯: {e}, 原始值: {area_range_str}", level="ERROR")
-        return 0, float('inf'), area_range_str
+def plot_cached_plotly(chart_id, params, build, **kwargs):
+    """顯示快取的 Plotly 圖表"""
+    st.plotly_chart(get_cached_figure(chart_id, params, build), **kwargs)
 
-@st.cache_data(ttl=3600, max_entries=5, show_spinner=False)
-def process_multiple_pcb_standard_times(files):
-    try:
-        debug_log(f"開始處理{len(files)}個PCB標準工時對應表檔案")
-        all_data = []
-        
-        for file_idx, file in enumerate(files):
-            debug_log(f"處理第{file_idx+1}個PCB標準工時對應表檔案: {file.name}")
-            
-            # 讀取Excel檔案
-            xls = pd.ExcelFile(file)
-            sheets = xls.sheet_names
-            debug_log(f"Excel檔案包含以下工作表: {sheets}")
-            
-            # 使用第一個工作表
-            sheet_name = sheets[0]
-            debug_log(f"使用工作表: {sheet_name}")
-            
-            # 讀取所有欄位，不轉換列名
-            df = pd.read_excel(file, sheet_name=sheet_name, header=0)
-            debug_log(f"原始資料讀取完成，資料列數: {len(df)}")
-            
-            # 檢查並顯示一些欄位名稱進行調試
-            debug_log(f"資料欄位名稱: {list(df.columns)[:10]}...")
-            
-            # 保留原始列索引 (A, B, C, ...)
-            alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-            excel_cols = {}
-            
-            for i, col in enumerate(df.columns):
-                # 生成Excel列名 (A, B, ..., Z, AA, AB, ...)
-                if i < 26:
-                    excel_col = alphabet[i]
-                else:
-                    excel_col = alphabet[i // 26 - 1] + alphabet[i % 26]
-                
-                excel_cols[col] = excel_col
-                debug_log(f"列 {i}: {col} -> {excel_col}")
-            
-            # 將DataFrame的列重命名為Excel列名
-            new_columns = {}
-            for i, col in enumerate(df.columns):
-                if i < 26:
-                    new_columns[col] = alphabet[i]
-                else:
-                    new_columns[col] = alphabet[i // 26 - 1] + alphabet[i % 26]
-            
-            df = df.rename(columns=new_columns)
-            
-            # 準備處理後的數據
-            processed_data = []
-            
-            # 將DataFrame轉換為字典列表
-            records = df.to_dict('records')
-            
-            for idx, row in enumerate(records):
-                # 只處理前幾筆進行調試
-                if idx < 5:
-                    debug_log(f"處理第 {idx+1} 筆資料: {row}")
-                
-                # 面積範圍處理 - 使用B欄
-                area_range = row.get('B', '')
-                
-                # 抽樣數量處理 - 使用C欄
-                sample_qty = row.get('C', '')
-                
-                # 壓合總孔數處理 - 使用D欄
-                hole_count = row.get('D', '')
-                
-                # PCB標準工時處理 - 使用G欄 "檢驗工時_AI預測值 (1203版)"
-                standard_time_field = row.get('G', 120)
-                try:
-                    standard_time = float(standard_time_field) if standard_time_field else 120
-                    # 檢查標準工時單位，確保是分鐘
-                    if standard_time < 10:  # 假設如果值小於10，可能是小時單位
-                        debug_log(f"標準工時疑似為小時單位: {standard_time}，轉換為分鐘: {standard_time * 60}")
-                        standard_time *= 60  # 轉換為分鐘
-                except (ValueError, TypeError):
-                    debug_log(f"無法轉換PCB標準工時值: {standard_time_field}，設置為120分鐘")
-                    standard_time = 120
-                
-                processed_row = {
-                    '面積範圍': area_range,
-                    '抽樣數量': sample_qty,
-                    '壓合總孔數': hole_count,
-                    'PCB標準工時': standard_time,
-                    'B': area_range,  # 保存原始Excel欄位數據
-                    'C': sample_qty,
-                    'D': hole_count,
-                    'G': standard_time,
-                    '檔案來源': file.name  # 添加檔案來源標記
-                }
-                
-                # 合併原始資料和處理後的資料，保留所有Excel欄位
-                for key, value in row.items():
-                    if key not in processed_row:
-                        processed_row[key] = value
-                
-                processed_data.append(processed_row)
-            
-            # 將當前檔案的處理結果添加到總結果中
-            all_data.extend(processed_data)
-            debug_log(f"第{file_idx+1}個檔案處理完成，累計資料筆數: {len(all_data)}")
-        
-        # 轉換為DataFrame
-        processed_df = pd.DataFrame(all_data)
-        debug_log(f"所有PCB標準工時對應表檔案處理完成，總資料列數: {len(processed_df)}")
-        
-        # 檢查是否成功提取了關鍵欄位
-        if 'B' in processed_df.columns and 'D' in processed_df.columns and 'G' in processed_df.columns:
-            debug_log("成功提取所有關鍵Excel欄位")
-            
-            # 顯示幾個樣本檢查數據
-            for i in range(min(5, len(processed_df))):
-                debug_log(f"樣本 {i+1}: 面積範圍={processed_df.iloc[i]['B']}, 壓合總孔數={processed_df.iloc[i]['D']}, " +
-                         f"標準工時={processed_df.iloc[i]['G']}")
-        else:
-            missing_cols = []
-            if 'B' not in processed_df.columns: missing_cols.append('B')
-            if 'D' not in processed_df.columns: missing_cols.append('D')
-            if 'G' not in processed_df.columns: missing_cols.append('G')
-            debug_log(f"警告: 缺少關鍵Excel欄位: {missing_cols}")
-        
-        return processed_df
-    
-    except Exception as e:
-        error_msg = f"處理 PCB標準工時對應表 時出錯: {str(e)}\n{traceback.format_exc()}"
-        debug_log(error_msg)
-        st.error(error_msg)
-        raise e
+def plot_cached_altair(chart_id, params, build, **kwargs):
+    """
+    顯示快取的 Altair 圖表
 
-@st.cache_data(ttl=3600, max_entries=5, show_spinner=False)
-def process_multiple_additional_tasks(files):
-    try:
-        debug_log(f"開始處理{len(files)}個IQC額外任務紀錄清單檔案")
-        all_data = []
-        
-        for file_idx, file in enumerate(files):
-            debug_log(f"處理第{file_idx+1}個IQC額外任務紀錄清單檔案: {file.name}")
-            
-            # 读取Excel文件
-            xls = pd.ExcelFile(file)
-            sheets = xls.sheet_names
-            debug_log(f"Excel檔案包含以下工作表: {sheets}")
-            
-            # 使用第一个工作表
-            sheet_name = sheets[0]
-            debug_log(f"使用工作表: {sheet_name}")
-            
-            # 嘗試不同的讀取方法
-            try:
-                # 先完全不指定header，得到原始數據
-                raw_df = pd.read_excel(file, sheet_name=sheet_name, header=None)
-                debug_log(f"原始數據前5行:\n{raw_df.head()}")
-                
-                # 嘗試偵測標題行 - 檢查前5行
-                header_row = None
-                for i in range(min(5, len(raw_df))):
-                    row_str = ' '.join([str(x) for x in raw_df.iloc[i].values])
-                    debug_log(f"第{i}行內容: {row_str}")
-                    
-                    # 如果該行包含關鍵字，可能是標題行
-                    if '姓名' in row_str or '工作事項分類' in row_str or '用時' in row_str:
-                        header_row = i
-                        debug_log(f"偵測到第{i}行可能是標題行: {row_str}")
-                        break
-                
-                # 使用偵測到的標題行或預設使用第0行
-                if header_row is not None:
-                    df = pd.read_excel(file, sheet_name=sheet_name, header=header_row)
-                    debug_log(f"使用第{header_row}行作為標題")
-                else:
-                    df = pd.read_excel(file, sheet_name=sheet_name)
-                    debug_log("使用預設標題行")
-                
-                debug_log(f"處理後資料欄位: {list(df.columns)}")
-                
-            except Exception as e:
-                debug_log(f"標題偵測失敗，使用預設方式讀取: {e}")
-                df = pd.read_excel(file, sheet_name=sheet_name)
-            
-            debug_log(f"原始資料讀取完成，資料列數: {len(df)}")
-            
-            # 使用更多的欄位名稱備選方案
-            field_mapping = {
-                '姓名': ['姓名', 'Name', '下拉式選單', '人員', 'B', '檢驗員', 'Inspector', '檢驗人員'],
-                '日期': ['日期', 'Date', '手key', 'A', '檢驗日期', '任務日期', '記錄日期'],
-                '工作事項分類': ['工作事項分類', 'Task Type', '下拉式選單_1', '任務類型', 'C', '工作項目', '事項分類'],
-                '用時(分鐘)': ['用時(分鐘)', '用時（分鐘）', 'Time(min)', '時間', '手key_3', 'H', '工時', '分鐘']
-            }
-            
-            # 準備處理後的數據
-            processed_data = []
-            
-            # 轉換為字典列表
-            records = df.to_dict('records')
-            
-            # 檢查是否使用Excel列標識（A, B, C...）
-            excel_columns_map = {
-                'A': '日期',
-                'B': '姓名',
-                'C': '工作事項分類',
-                'H': '用時(分鐘)'
-            }
-            has_excel_columns = any(col in df.columns for col in ['A', 'B', 'C', 'H'])
-            debug_log(f"是否含有Excel欄位標識: {has_excel_columns}")
-            
-            for idx, row in enumerate(records):
-                # 只處理前幾筆進行調試
-                if idx < 5:
-                    debug_log(f"處理第 {idx+1} 筆資料: {row}")
-                
-                # 嘗試從不同來源獲取資料
-                name = None
-                date_value = None
-                task_type = None
-                time_value = None
-                
-                # 1. 直接使用欄位名稱
-                for field, possible_names in field_mapping.items():
-                    for possible_name in possible_names:
-                        if possible_name in row and pd.notna(row[possible_name]):
-                            if field == '姓名' and name is None:
-                                name = row[possible_name]
-                            elif field == '日期' and date_value is None:
-                                date_value = row[possible_name]
-                            elif field == '工作事項分類' and task_type is None:
-                                task_type = row[possible_name]
-                            elif field == '用時(分鐘)' and time_value is None:
-                                time_value = row[possible_name]
-                
-                # 2. 使用Excel欄位標識
-                if has_excel_columns:
-                    if name is None and 'B' in row and pd.notna(row['B']):
-                        name = row['B']
-                    if date_value is None and 'A' in row and pd.notna(row['A']):
-                        date_value = row['A']
-                    if task_type is None and 'C' in row and pd.notna(row['C']):
-                        task_type = row['C']
-                    if time_value is None and 'H' in row and pd.notna(row['H']):
-                        time_value = row['H']
-                
-                # 3. 使用數字索引（如果沒有名稱）
-                if name is None and 1 in row and pd.notna(row[1]):
-                    name = row[1]
-                if date_value is None and 0 in row and pd.notna(row[0]):
-                    date_value = row[0]
-                if task_type is None and 2 in row and pd.notna(row[2]):
-                    task_type = row[2]
-                if time_value is None and 7 in row and pd.notna(row[7]):
-                    time_value = row[7]
-                
-                # 檢查是否獲取到了有效資訊
-                if name is None or pd.isna(name) or name == '姓名' or name == '下拉式選單':
-                    continue
-                    
-                # 處理日期
-                parsed_date = None
-                if date_value is not None:
-                    parsed_date = parse_excel_date(date_value)
-                    if parsed_date is None:
-                        debug_log(f"無法解析日期: {date_value}")
-                        # 嘗試使用文件名稱中的日期
-                        import re
-                        date_match = re.search(r'(\d{1,2}[-/]\d{1,2})', file.name)
-                        if date_match:
-                            date_str = date_match.group(1)
-                            try:
-                                # 假設格式為月/日或月-日
-                                current_year = datetime.now().year
-                                if '/' in date_str:
-                                    month, day = map(int, date_str.split('/'))
-                                else:
-                                    month, day = map(int, date_str.split('-'))
-                                parsed_date = datetime(current_year, month, day)
-                                debug_log(f"從檔名取得日期: {parsed_date}")
-                            except:
-                                debug_log("從檔名取得日期失敗")
-                
-                # 處理時間值
-                try:
-                    time_minutes = 0
-                    if time_value is not None and pd.notna(time_value):
-                        # 處理不同格式的時間值
-                        if isinstance(time_value, str):
-                            # 移除非數字字符
-                            time_value = ''.join(c for c in time_value if c.isdigit() or c == '.')
-                            if time_value:
-                                time_minutes = float(time_value)
-                        else:
-                            time_minutes = float(time_value)
-                except (ValueError, TypeError) as e:
-                    debug_log(f"處理時間值出錯: {e}, 原始值: {time_value}")
-                    time_minutes = 0
-                
-                # 整合資料
-                processed_row = {
-                    '姓名': name,
-                    '日期': parsed_date,
-                    '工作事項分類': task_type if task_type is not None else 'Other',
-                    '用時(分鐘)': time_minutes,
-                    '_index': idx,
-                    '檔案來源': file.name
-                }
-                
-                processed_data.append(processed_row)
-                
-                if idx < 5:
-                    debug_log(f"處理結果: {processed_row}")
-            
-            # 將當前檔案的處理結果添加到總結果中
-            all_data.extend(processed_data)
-            debug_log(f"第{file_idx+1}個檔案處理完成，累計資料筆數: {len(all_data)}")
-        
-        # 轉換為DataFrame
-        df_processed = pd.DataFrame(all_data)
-        debug_log(f"所有IQC額外任務紀錄清單檔案處理完成，總資料列數: {len(df_processed)}")
-        
-        # 過濾掉無效的數據
-        if not df_processed.empty:
-            df_filtered = df_processed[(df_processed['姓名'] != 'Unknown') & 
-                                      (df_processed['姓名'] != '姓名') & 
-                                      (df_processed['姓名'] != '下拉式選單')]
-            
-            debug_log(f"過濾後資料列數: {len(df_filtered)}")
-            
-            # 確保所有日期都是datetime格式
-            if '日期' in df_filtered.columns:
-                df_filtered['日期'] = pd.to_datetime(df_filtered['日期'], errors='coerce')
-                
-                # 調試日期範圍
-                if not df_filtered.empty:
-                    min_date = df_filtered['日期'].min()
-                    max_date = df_filtered['日期'].max()
-                    debug_log(f"額外任務數據日期範圍: {min_date} 到 {max_date}")
-            
-            return df_filtered
-        else:
-            debug_log("處理後沒有有效資料")
-            return pd.DataFrame()
-    
-    except Exception as e:
-        error_msg = f"處理 IQC額外任務紀錄清單 時出錯: {str(e)}\n{traceback.format_exc()}"
-        debug_log(error_msg)
-        st.error(error_msg)
-        return pd.DataFrame()  # 返回空DataFrame而不是拋出異常，避免中斷程序
+    快取的是已序列化的 Vega-Lite 規格 (chart.to_dict())，以 st.vega_lite_chart 顯示，
+    重新執行時不必再建立與驗證 Altair 物件。
+    """
+    spec = get_cached_figure(chart_id, params, lambda: build().to_dict())
+    st.vega_lite_chart(spec=spec, **kwargs)
+
+
+# ==================== 圖表降採樣與表格分頁 ====================
+# 單一折線送到瀏覽器的最大點數，超過時以 LTTB 降採樣
+MAX_CHART_POINTS = 200
+# 依資料跨度自動選擇時間粒度：(最大天數, 週期)，超過所有上限時改用月
+TIME_BUCKET_RULES = [(60, 'D'), (366, 'W')]
+TIME_BUCKET_LABELS = {'D': '日', 'W': '週', 'M': '月'}
+# 表格每頁顯示筆數
+TABLE_PAGE_SIZE = 200
 
-def map_hole_count_to_range(hole_counts):
+def choose_time_bucket(dates):
     """
-    將實際壓合孔數映射到PCB標準工時對應表中的範圍值，添加記憶化以減少重複計算
+    依日期跨度選擇時間粒度 (日→週→月)
+
+    參數:
+    dates - 日期 Series
+
+    返回:
+    'D'、'W' 或 'M'
     """
-    try:
-        # 處理空值或NA值
-        if hole_counts is None or hole_counts == 'NA' or pd.isna(hole_counts):
-            return 0
-            
-        # 確保孔數是數字
+    dates = pd.to_datetime(dates, errors='coerce').dropna()
+    span_days = (dates.max() - dates.min()).days if not dates.empty else 0
+    for max_days, period in TIME_BUCKET_RULES:
+        if span_days <= max_days:
+            return period
+    return 'M'
+
+def lttb_downsample(x, y, threshold=MAX_CHART_POINTS):
+    """
+    Largest-Triangle-Three-Buckets 降採樣，保留折線的峰谷形狀
+
+    第一點與最後一點固定保留，其餘點平均分桶，每桶保留與前一保留點及下一桶平均點
+    構成最大三角形面積的點。
+
+    參數:
+    x - 數值或日期序列 (需已排序)
+    y - 數值序列
+    threshold - 保留的點數
+
+    返回:
+    保留點的位置索引 (numpy array)
+    """
+    n = len(y)
+    if threshold < 3 or n <= threshold:
+        return np.arange(n)
+
+    x = pd.Series(x)
+    if pd.api.types.is_datetime64_any_dtype(x):
+        x = x.astype('int64')
+    x = x.to_numpy(dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+
+    # 中間 n-2 點分成 threshold-2 桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    anchor = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[anchor] - avg_x) * (y[start:end] - y[anchor])
+            - (x[anchor] - x[start:end]) * (avg_y - y[anchor])
+        )
+        anchor = start + int(np.argmax(areas))
+        selected[i + 1] = anchor
+
+    return selected
+
+def select_page(total_rows, key, page_size=TABLE_PAGE_SIZE):
+    """
+    顯示頁碼元件並返回目前頁的列範圍
+
+    參數:
+    total_rows - 總筆數
+    key - 頁碼元件的 key
+    page_size - 每頁筆數
+
+    返回:
+    目前頁的 slice (位置索引)
+    """
+    page_count = max(1, -(-total_rows // page_size))
+    if page_count == 1:
+        return slice(0, total_rows)
+
+    page_key = f"{key}_page"
+    # 頁碼只由 session_state 控制 (元件不另設 value)；篩選條件改變後總頁數可能變少，先把頁碼拉回範圍內
+    if st.session_state.get(page_key, 1) > page_count:
+        st.session_state[page_key] = page_count
+    else:
+        st.session_state.setdefault(page_key, 1)
+
+    col_page, col_info = st.columns([1, 3])
+    with col_page:
+        page = st.number_input("頁碼", min_value=1, max_value=page_count, step=1, key=page_key)
+    with col_info:
+        start = (int(page) - 1) * page_size
+        st.caption(f"共 {total_rows} 筆，顯示第 {start + 1}-{min(start + page_size, total_rows)} 筆 (每頁 {page_size} 筆，共 {page_count} 頁)")
+
+    return slice(start, start + page_size)
+
+def paginate_dataframe(df, key, page_size=TABLE_PAGE_SIZE):
+    """
+    伺服器端分頁：只把目前頁的資料送到瀏覽器
+
+    參數:
+    df - 要顯示的DataFrame
+    key - 頁碼元件的 key
+    page_size - 每頁筆數
+
+    返回:
+    目前頁的DataFrame
+    """
+    return df.iloc[select_page(len(df), key, page_size)]
+
+def render_paginated_dataframe(df, key, page_size=TABLE_PAGE_SIZE, **kwargs):
+    """以伺服器端分頁顯示DataFrame，其餘參數傳給 st.dataframe"""
+    st.dataframe(paginate_dataframe(df, key, page_size), **kwargs)
+
+def filter_sort_positions(df, filters=None, sort_by=None, ascending=True):
+    """
+    在不複製資料的情況下篩選並排序，只返回符合列的位置索引
+
+    參數:
+    df - 原始DataFrame
+    filters - {欄位: 值} 等值篩選，值為 None 表示該欄不篩選
+    sort_by - 排序欄位 (None 表示保持原順序)
+    ascending - 是否遞增排序
+
+    返回:
+    符合條件列的位置索引 (numpy array，已依排序欄位排列)
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, value in (filters or {}).items():
+        if value is not None and column in df.columns:
+            mask &= (df[column] == value).to_numpy()
+    positions = np.flatnonzero(mask)
+
+    if sort_by is not None and sort_by in df.columns and len(positions) > 1:
+        keys = df[sort_by].iloc[positions].reset_index(drop=True)
         try:
-            hole_counts = float(hole_counts)
-        except (ValueError, TypeError):
-            debug_log(f"壓合孔數無法轉換為數字: '{hole_counts}'，設為0", level="WARNING")
-            return 0
-        
-        # 使用查表法代替多個if判斷，提高效率
-        ranges = [
-            (0, 25, 0),
-            (25, 75, 50),
-            (75, 125, 100),
-            (125, 175, 150),
-            (175, 200, 200),
-            (200, 250, 225),
-            (250, 325, 300),
-            (325, 450, 400),
-            (450, 550, 500),
-            (550, 750, 600),
-            (750, 900, 800),
-            (900, 1000, 1000),
-            (1000, float('inf'), 1100)
-        ]
-        
-        for min_val, max_val, mapped_val in ranges:
-            if hole_counts <= max_val:
-                return mapped_val
-                
-        return 1100  # 默認值
-        
-    except Exception as e:
-        debug_log(f"映射壓合孔數時出錯: {e}", level="ERROR")
-        return 0
+            order = keys.sort_values(ascending=ascending, kind='stable', na_position='last').index
+        except TypeError:
+            # 混合型別的欄位改以字串排序
+            order = keys.astype(str).sort_values(ascending=ascending, kind='stable').index
+        positions = positions[order.to_numpy()]
 
-# 完整替換calculate_pcb_standard_time函數中的MRB處理邏輯
+    return positions
 
-def calculate_pcb_standard_time(iqc_df, pcb_specs_df, pcb_standard_time_df):
+def render_data_explorer(df, key, default_columns=None, filter_columns=None):
     """
-    全面修正版的PCB標準工時計算函數，徹底修復MRB判斷和加時
+    分頁資料瀏覽器：篩選、排序、欄位選擇都在伺服器端完成，每次只送出一頁
+
+    參數:
+    df - 要瀏覽的DataFrame (不會被複製)
+    key - 元件 key 的前綴
+    default_columns - 預設顯示的欄位
+    filter_columns - {欄位: 顯示名稱}，提供等值篩選的欄位
+
+    返回:
+    符合篩選條件列的位置索引，供呼叫端計算摘要
     """
-    try:
-        debug_log("開始計算PCB標準工時", level="INFO")
-        
-        # 創建數據副本
-        processed_df = iqc_df.copy()
-        
-        # 只處理QB類型的料號
-        qb_indices = processed_df[processed_df['類別'] == 'QB'].index
-        debug_log(f"發現QB類型料號數量: {len(qb_indices)}", level="INFO")
-        
-        # 如果沒有QB類型料號，則直接返回
-        if len(qb_indices) == 0:
-            debug_log("沒有發現QB類型料號，跳過PCB標準工時計算", level="INFO")
-            return processed_df
-        
-        # 提取QB類型資料用於批量處理
-        qb_df = processed_df.loc[qb_indices].copy()
-        
-        # 輸出欄位名稱，幫助調試
-        debug_log(f"QB資料欄位: {qb_df.columns.tolist()}", level="INFO")
-        
-        # 首先，一次性確定所有MRB狀態，避免逐行判斷帶來的不一致
-        debug_log("重新檢查所有QB記錄的MRB狀態", level="INFO")
-        
-        # 檢查是否已經有MRB狀態欄位
-        if '是否為MRB' in qb_df.columns:
-            # 統一轉換現有的MRB狀態為布爾值，確保一致性
-            converted_mrb = []
-            for i, row in qb_df.iterrows():
-                mrb_value = row['是否為MRB']
-                
-                # 記錄原始值類型
-                original_type = type(mrb_value).__name__
-                converted = False  # 默認為False
-                
-                # 針對不同類型進行特定處理
-                if isinstance(mrb_value, bool):
-                    converted = mrb_value  # 已經是布爾值，不變
-                elif isinstance(mrb_value, str):
-                    # 字符串值，只有明確的true才算True
-                    converted = mrb_value.upper() in ('TRUE', 'T', 'YES', 'Y', '1', 'MRB')
-                elif isinstance(mrb_value, (int, float)):
-                    # 數值，非零即True
-                    converted = bool(mrb_value) 
-                
-                converted_mrb.append(converted)
-                
-                debug_log(f"料號 {row.get('料號', '')} MRB值轉換: {mrb_value}({original_type}) -> {converted}", level="DEBUG")
-        else:
-            # 如果沒有MRB狀態欄位，則使用MRB檢測函數
-            debug_log("未找到MRB狀態欄位，執行MRB檢測", level="INFO")
-            mrb_result = check_is_mrb(qb_df)
-            converted_mrb = mrb_result['是否為MRB'].tolist()
-        
-        # 將轉換後的MRB狀態保存回DataFrame，確保一致性
-        qb_df['是否為MRB'] = converted_mrb
-        
-        # 顯示MRB狀態分佈
-        mrb_counts = pd.Series(converted_mrb).value_counts()
-        debug_log(f"MRB狀態分佈: {mrb_counts.to_dict()}", level="INFO")
-        
-        # 1. 建立料號與PCB信息的對應關係
-        debug_log("建立料號與PCB規格的對應關係", level="INFO")
-        pcb_info = {}
-        
-        # 確定料號欄位
-        part_no_col = None
-        if 'C' in pcb_specs_df.columns:
-            part_no_col = 'C'
-        elif '料號' in pcb_specs_df.columns:
-            part_no_col = '料號'
-        
-        # 確定其他欄位
-        hole_count_col = 'N' if 'N' in pcb_specs_df.columns else ('壓合孔數' if '壓合孔數' in pcb_specs_df.columns else 'L')
-        length_col = 'AB' if 'AB' in pcb_specs_df.columns else '版長'
-        width_col = 'AE' if 'AE' in pcb_specs_df.columns else '版寬'
-        
-        # 建立PCB信息字典
-        for _, row in pcb_specs_df.iterrows():
-            if part_no_col in row and pd.notna(row[part_no_col]):
-                part_no = str(row[part_no_col]).strip().upper()
-                
-                # 獲取壓合孔數
-                hole_count = 0
-                if hole_count_col in row and pd.notna(row[hole_count_col]):
-                    hole_count_val = row[hole_count_col]
-                    if str(hole_count_val).upper() == 'NA':
-                        hole_count = 0
-                    else:
-                        try:
-                            hole_count = float(hole_count_val)
-                        except:
-                            hole_count = 0
-                
-                # 獲取板長和板寬
-                length = 0
-                width = 0
-                if length_col in row and pd.notna(row[length_col]):
-                    try:
-                        length = float(row[length_col])
-                    except:
-                        pass
-                
-                if width_col in row and pd.notna(row[width_col]):
-                    try:
-                        width = float(row[width_col])
-                    except:
-                        pass
-                
-                # 計算面積
-                area = length * width
-                
-                # 映射壓合孔數
-                mapped_hole_count = map_hole_count_to_range(hole_count)
-                
-                # 儲存PCB信息
-                pcb_info[part_no] = {
-                    'hole_count': hole_count,
-                    'mapped_hole_count': mapped_hole_count,
-                    'length': length,
-                    'width': width,
-                    'area': area
-                }
-        
-        debug_log(f"已建立 {len(pcb_info)} 個料號的PCB信息", level="INFO")
-        
-        # 2. 建立面積範圍和標準工時對應
-        debug_log("解析PCB標準工時對應表", level="INFO")
-        area_ranges = []
-        
-        # 確認標準工時對應表中的關鍵欄位
-        area_range_col = 'B' if 'B' in pcb_standard_time_df.columns else '面積範圍'
-        hole_count_col = 'D' if 'D' in pcb_standard_time_df.columns else '壓合總孔數'
-        std_time_col = 'G' if 'G' in pcb_standard_time_df.columns else 'PCB標準工時'
-        
-        # 解析所有面積範圍
-        for idx, row in pcb_standard_time_df.iterrows():
-            if area_range_col in row and pd.notna(row[area_range_col]):
-                min_area, max_area, area_range_str = parse_area_range(row[area_range_col])
-                
-                # 獲取孔數和標準工時
-                try:
-                    hole_count = float(row[hole_count_col]) if hole_count_col in row and pd.notna(row[hole_count_col]) else None
-                    std_time = float(row[std_time_col]) if std_time_col in row and pd.notna(row[std_time_col]) else 120
-                except (ValueError, TypeError):
-                    hole_count = None
-                    std_time = 120
-                
-                area_ranges.append({
-                    'min_area': min_area,
-                    'max_area': max_area,
-                    'range_str': area_range_str,
-                    'hole_count': hole_count,
-                    'std_time': std_time
-                })
-        
-        debug_log(f"已解析 {len(area_ranges)} 個面積範圍", level="INFO")
-        
-        # 建立查找表
-        area_hole_lookup = {}
-        for ar in area_ranges:
-            range_key = (ar['min_area'], ar['max_area'])
-            if range_key not in area_hole_lookup:
-                area_hole_lookup[range_key] = {}
-            
-            if ar['hole_count'] not in area_hole_lookup[range_key]:
-                area_hole_lookup[range_key][ar['hole_count']] = ar['std_time']
-        
-        # 3. 處理每個QB料號
-        debug_log("開始處理每個QB料號的標準工時", level="INFO")
-        
-        # 添加結果列
-        qb_df['面積'] = 0
-        qb_df['壓合孔數'] = 'NA'
-        qb_df['映射壓合孔數'] = 0
-        qb_df['匹配狀態'] = '未處理'
-        qb_df['基礎標準工時'] = 120  # 默認值
-        qb_df['MRB加時'] = 0
-        qb_df['處理後檢驗標準工時'] = 120  # 默認值
-        qb_df['匹配詳情'] = ''
-        
-        match_count = 0
-        mrb_count = 0
-        
-        # 遍歷每個QB料號
-        for idx, row in qb_df.iterrows():
-            part_no = str(row['料號']).strip().upper()
-            
-            # 查找PCB信息
-            if part_no in pcb_info:
-                # 獲取PCB數據
-                pcb_data = pcb_info[part_no]
-                area = pcb_data['area']
-                hole_count = pcb_data['hole_count']
-                mapped_hole_count = pcb_data['mapped_hole_count']
-                
-                # 更新結果數據
-                qb_df.at[idx, '面積'] = area
-                qb_df.at[idx, '壓合孔數'] = hole_count
-                qb_df.at[idx, '映射壓合孔數'] = mapped_hole_count
-                
-                # 查找匹配的面積範圍
-                matched_range = None
-                matched_range_str = None
-                
-                for ar in area_ranges:
-                    if ar['min_area'] <= area < ar['max_area']:
-                        matched_range = (ar['min_area'], ar['max_area'])
-                        matched_range_str = ar['range_str']
-                        break
-                
-                if matched_range is None:
-                    # 面積範圍未匹配
-                    qb_df.at[idx, '匹配狀態'] = '面積範圍未匹配'
-                    qb_df.at[idx, '匹配詳情'] = f"面積 {area} 未找到匹配範圍"
-                    
-                    # 使用預設標準工時
-                    base_std_time = 120
-                    qb_df.at[idx, '基礎標準工時'] = base_std_time
-                else:
-                    # 面積範圍匹配，檢查孔數
-                    if matched_range in area_hole_lookup and mapped_hole_count in area_hole_lookup[matched_range]:
-                        # 孔數也匹配
-                        base_std_time = area_hole_lookup[matched_range][mapped_hole_count]
-                        
-                        qb_df.at[idx, '基礎標準工時'] = base_std_time
-                        qb_df.at[idx, '匹配狀態'] = '匹配成功'
-                        qb_df.at[idx, '匹配詳情'] = f"面積: {matched_range_str}, 孔數: {mapped_hole_count}, 基礎標準工時: {base_std_time}"
-                        match_count += 1
-                    else:
-                        # 面積匹配但孔數未匹配
-                        base_std_time = 120
-                        qb_df.at[idx, '基礎標準工時'] = base_std_time
-                        qb_df.at[idx, '匹配狀態'] = '孔數未匹配'
-                        qb_df.at[idx, '匹配詳情'] = f"面積範圍匹配: {matched_range_str}, 但壓合孔數 {mapped_hole_count} 未匹配"
-            else:
-                # 料號未找到
-                base_std_time = 120
-                qb_df.at[idx, '基礎標準工時'] = base_std_time
-                qb_df.at[idx, '匹配狀態'] = '料號未找到'
-                qb_df.at[idx, '匹配詳情'] = f"料號 {part_no} 在PCB建檔明細中未找到"
-            
-            # 處理MRB加時 - 徹底修正的邏輯
-            is_mrb = qb_df.at[idx, '是否為MRB']  # 已統一轉換為布爾值
-            
-            mrb_add_time = 0
-            if is_mrb:
-                mrb_add_time = 30
-                mrb_count += 1
-                debug_log(f"料號 {part_no} 是MRB，添加30分鐘標準工時", level="DEBUG")
-            
-            # 更新MRB相關欄位
-            qb_df.at[idx, 'MRB加時'] = mrb_add_time
-            qb_df.at[idx, '處理後檢驗標準工時'] = base_std_time + mrb_add_time
-        
-        # 在返回前進行一次最終檢查
-        debug_log("進行最終MRB計算檢查", level="INFO")
-        for idx, row in qb_df.iterrows():
-            # 檢查MRB狀態和加時是否一致
-            is_mrb = bool(row['是否為MRB'])
-            expected_add_time = 30 if is_mrb else 0
-            actual_add_time = row['MRB加時']
-            
-            if expected_add_time != actual_add_time:
-                debug_log(f"不一致警告：料號 {row['料號']} MRB狀態={is_mrb} 但加時={actual_add_time}", level="WARNING")
-                # 修正不一致
-                qb_df.at[idx, 'MRB加時'] = expected_add_time
-                qb_df.at[idx, '處理後檢驗標準工時'] = row['基礎標準工時'] + expected_add_time
-        
-        # 更新到原始DataFrame
-        for col in ['是否為MRB', '面積', '壓合孔數', '映射壓合孔數', '匹配狀態', 
-                   '基礎標準工時', 'MRB加時', '處理後檢驗標準工時', '匹配詳情']:
-            if col in qb_df.columns:
-                processed_df.loc[qb_indices, col] = qb_df[col]
-        
-        # 輸出統計信息
-        debug_log(f"PCB標準工時計算完成，共處理 {len(qb_df)} 筆QB類型料號，成功匹配 {match_count} 筆", level="INFO")
-        debug_log(f"MRB狀態總數: {sum(converted_mrb)}, 加了MRB加時的記錄數: {mrb_count}", level="INFO")
-        
-        # 處理非QB類型物料的基礎標準工時
-        # 對於非QB類型的物料，將處理後檢驗標準工時作為基礎標準工時，並考慮MRB加時
-        non_qb_indices = processed_df[processed_df['類別'] != 'QB'].index
-        if len(non_qb_indices) > 0:
-            debug_log(f"處理 {len(non_qb_indices)} 筆非QB類型物料的基礎標準工時", level="INFO")
-            
-            # 先檢查是否已經有基礎標準工時欄位
-            if '基礎標準工時' not in processed_df.columns:
-                processed_df['基礎標準工時'] = None
-            
-            # 設置一般物料的基礎標準工時
-            for idx in non_qb_indices:
-                # 檢查MRB加時欄位是否存在
-                mrb_time = 0
-                if 'MRB加時' in processed_df.columns and pd.notna(processed_df.loc[idx, 'MRB加時']):
-                    try:
-                        mrb_time = float(processed_df.loc[idx, 'MRB加時'])
-                    except:
-                        mrb_time = 0
-                
-                # 從處理後檢驗標準工時中減去MRB加時得到基礎標準工時
-                if '處理後檢驗標準工時' in processed_df.columns and pd.notna(processed_df.loc[idx, '處理後檢驗標準工時']):
-                    try:
-                        std_time = float(processed_df.loc[idx, '處理後檢驗標準工時'])
-                        base_time = std_time - mrb_time
-                        processed_df.loc[idx, '基礎標準工時'] = base_time
-                    except:
-                        # 如果轉換失敗，直接使用原值
-                        processed_df.loc[idx, '基礎標準工時'] = processed_df.loc[idx, '處理後檢驗標準工時']
-
-        return processed_df
-    
-    except Exception as e:
-        error_msg = f"計算PCB標準工時時出錯: {str(e)}\n{traceback.format_exc()}"
-        debug_log(error_msg, level="ERROR")
-        return iqc_df  # 如果出錯，返回原始數據
+    filter_columns = {col: label for col, label in (filter_columns or {}).items() if col in df.columns}
+    default_columns = [col for col in (default_columns or df.columns) if col in df.columns]
+
+    # 篩選選項依資料物件快取，換頁或排序時不必重新計算 unique
+    filters = {}
+    filter_cols = st.columns(max(1, len(filter_columns)))
+    for filter_col, (column, label) in zip(filter_cols, filter_columns.items()):
+        options = get_session_cached(
+            'data_explorer_options', (key, column), df,
+            lambda column=column: sorted(df[column].dropna().unique().tolist())
+        )
+        with filter_col:
+            selected = st.selectbox(f"選擇{label}", options=["全部"] + options, index=0, key=f"{key}_filter_{column}")
+        filters[column] = None if selected == "全部" else selected
 
+    columns = st.multiselect("顯示欄位", options=list(df.columns), default=default_columns, key=f"{key}_columns")
+    if not columns:
+        columns = default_columns
 
-@st.cache_data(ttl=1800, show_spinner=False)
-def filter_by_date_range(df, start_date=None, end_date=None):
+    col_sort, col_order = st.columns([3, 1])
+    with col_sort:
+        sort_by = st.selectbox("排序欄位", options=["不排序"] + columns, index=0, key=f"{key}_sort")
+    with col_order:
+        ascending = st.radio("排序方向", ["遞增", "遞減"], horizontal=True, key=f"{key}_order") == "遞增"
+
+    positions = filter_sort_positions(df, filters, None if sort_by == "不排序" else sort_by, ascending)
+
+    # 只取出目前頁的列與所選欄位
+    page_positions = positions[select_page(len(positions), key)]
+    st.dataframe(df.iloc[page_positions][columns])
+
+    return positions
+
+
+# ==================== 跨工作階段共用資料集 ====================
+# 工作階段超過此秒數未重新執行時視為已關閉，不再保留其共用資料集
+SHARED_SESSION_IDLE_SECONDS = 3600
+# 每個共用資料集保留的日期範圍指標數，超過時淘汰最久未使用的日期範圍
+SHARED_METRICS_MAX_RANGES = 8
+
+@st.cache_resource(show_spinner=False)
+def _get_shared_dataset_registry():
     """
-    根據日期範圍過濾資料
+    程序層級的共用資料集登錄表，所有工作階段共用同一個物件
+
+    entries 以上傳檔案內容雜湊為鍵，每筆記錄解析後的資料集、依日期範圍計算的指標 (LRU)，
+    以及正在使用此資料集的工作階段與其最後執行時間。沒有工作階段使用時即移除。
     """
-    if df is None or df.empty or (not start_date and not end_date):
-        return df
-    
-    debug_log(f"根據日期範圍過濾: 開始日期={start_date}, 結束日期={end_date}")
-    
-    # 複製DataFrame以避免修改原始資料
-    filtered_df = df.copy()
-    
-    # 確定日期欄位
-    date_column = None
-    for possible_column in ['檢驗日期', '日期']:
-        if possible_column in filtered_df.columns:
-            date_column = possible_column
-            break
-    
-    if date_column is None:
-        debug_log("找不到日期欄位，跳過日期過濾")
-        return filtered_df
-    
-    debug_log(f"使用日期欄位: {date_column}")
-    
-    # 確保日期欄位是datetime類型
-    try:
-        # 先檢查類型
-        debug_log(f"日期欄位類型: {filtered_df[date_column].dtype}")
-        
-        # 強制轉換日期欄位為datetime（不丟棄無法解析的值）
-        filtered_df[date_column] = pd.to_datetime(filtered_df[date_column], errors='coerce')
-        
-        # 檢查轉換後有多少非NaT值
-        valid_dates_count = filtered_df[date_column].notna().sum()
-        debug_log(f"有效日期數量: {valid_dates_count}/{len(filtered_df)}")
-        
-        # 日期解析有問題時，打印一些樣本進行調試
-        if valid_dates_count < len(filtered_df) * 0.5:
-            debug_log("大部分日期轉換失敗，顯示部分原始值:")
-            for i, val in enumerate(filtered_df[date_column].dropna().head()):
-                debug_log(f"日期樣本{i+1}: {val}")
-            
-            # 顯示無法解析的日期樣本
-            null_dates = filtered_df[filtered_df[date_column].isna()][date_column].head()
-            debug_log(f"無法解析的日期樣本: {null_dates.index.tolist()}")
-            
-            # 再次嘗試使用自定義函數解析
-            debug_log("嘗試使用自定義函數解析日期")
-            filtered_df[date_column] = filtered_df[date_column].apply(lambda x: parse_excel_date(x))
-        
-        # 再次檢查有效日期數量
-        valid_dates_count = filtered_df[date_column].notna().sum()
-        debug_log(f"處理後有效日期數量: {valid_dates_count}/{len(filtered_df)}")
-            
-    except Exception as e:
-        debug_log(f"轉換日期欄位時出錯: {e}")
-        st.warning(f"轉換日期欄位時出錯，部分日期可能無法正確過濾")
-        return filtered_df
-    
-    # 轉換開始和結束日期為datetime
+    return {'entries': {}, 'lock': threading.Lock()}
+
+def compute_upload_fingerprint(uploaded_files):
+    """
+    以上傳檔案的名稱與內容計算雜湊，相同的一組檔案得到相同的代碼
+
+    參數:
+    uploaded_files - Streamlit 上傳檔案列表
+
+    返回:
+    32 字元的十六進位代碼
+    """
+    digest = hashlib.sha256()
+    for uploaded_file in uploaded_files:
+        digest.update(uploaded_file.name.encode('utf-8'))
+        digest.update(hashlib.sha256(uploaded_file.getvalue()).digest())
+    return digest.hexdigest()[:32]
+
+def _get_session_id():
+    """取得目前工作階段的識別碼"""
     try:
-        start_date_obj = pd.to_datetime(start_date) if start_date else None
-        end_date_obj = pd.to_datetime(end_date) if end_date else None
-        
-        debug_log(f"轉換後的篩選日期: 開始={start_date_obj}, 結束={end_date_obj}")
-        
-        if end_date_obj:
-            # 將結束日期設為當天的結束時間
-            end_date_obj = end_date_obj.replace(hour=23, minute=59, second=59)
-    except Exception as e:
-        debug_log(f"轉換篩選日期時出錯: {e}")
-        return filtered_df
-    
-    # 根據日期範圍過濾
-    mask = pd.Series(True, index=filtered_df.index)
-    
-    if start_date_obj:
-        debug_log(f"篩選大於等於 {start_date_obj} 的資料")
-        mask = mask & (filtered_df[date_column] >= start_date_obj)
-    
-    if end_date_obj:
-        debug_log(f"篩選小於等於 {end_date_obj} 的資料")
-        mask = mask & (filtered_df[date_column] <= end_date_obj)
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            return ctx.session_id
+    except Exception:
+        pass
+    if 'shared_session_token' not in st.session_state:
+        st.session_state.shared_session_token = os.urandom(8).hex()
+    return st.session_state.shared_session_token
+
+def _release_session_datasets(registry, session_id, keep_key=None):
+    """解除工作階段對其他資料集的引用，引用數歸零的資料集即釋放 (需持有鎖)"""
+    for key in list(registry['entries']):
+        entry = registry['entries'][key]
+        if key != keep_key and session_id in entry['sessions']:
+            del entry['sessions'][session_id]
+            if not entry['sessions']:
+                del registry['entries'][key]
+                debug_log(f"共用資料集 {key} 已無工作階段使用，釋放記憶體", level="INFO")
+
+def _prune_inactive_sessions(registry):
+    """移除超過 SHARED_SESSION_IDLE_SECONDS 未重新執行 (視為已關閉) 的工作階段引用 (需持有鎖)"""
+    expired_before = time.time() - SHARED_SESSION_IDLE_SECONDS
+    for key in list(registry['entries']):
+        sessions = registry['entries'][key]['sessions']
+        for session_id in [session_id for session_id, last_seen in sessions.items() if last_seen < expired_before]:
+            del sessions[session_id]
+        if not sessions:
+            del registry['entries'][key]
+            debug_log(f"共用資料集 {key} 已無工作階段使用，釋放記憶體", level="INFO")
+
+def touch_shared_dataset():
+    """記錄目前工作階段仍在使用共用資料集 (每次執行時呼叫)"""
+    fingerprint = st.session_state.get('shared_dataset_key')
+    if fingerprint is None:
+        return
+    registry = _get_shared_dataset_registry()
+    with registry['lock']:
+        entry = registry['entries'].get(fingerprint)
+        if entry is not None:
+            entry['sessions'][_get_session_id()] = time.time()
+
+def acquire_shared_dataset(fingerprint, build):
+    """
+    取得 (或建立) 與其他工作階段共用的資料集，並登記目前工作階段的引用
+
+    相同檔案內容只解析一次，所有工作階段拿到同一個物件，請視為唯讀。
+    多工作程序部署 (run_app.py --workers) 時，另以磁碟快取在工作程序之間共用解析結果。
+
+    參數:
+    fingerprint - compute_upload_fingerprint 的結果
+    build - 無參數的解析函數，返回資料集 dict 或 None
+
+    返回:
+    資料集 dict，解析失敗時為 None
+    """
+    registry = _get_shared_dataset_registry()
+    session_id = _get_session_id()
+    
+    with registry['lock']:
+        entry = registry['entries'].get(fingerprint)
+    
+    if entry is None:
+        # 其他工作程序已解析過相同檔案時，直接讀取磁碟快取
+        cache_dir = iqc_engine.get_dataset_cache_dir()
+        dataset = iqc_engine.load_cached_dataset(cache_dir, fingerprint) if cache_dir else None
+        
+        if dataset is None:
+            # 解析可能耗時較久，於鎖外進行；同時上傳相同檔案時以先完成者為準
+            dataset = build()
+            if dataset is None:
+                return None
+            if cache_dir:
+                iqc_engine.save_cached_dataset(cache_dir, fingerprint, dataset)
+        with registry['lock']:
+            entry = registry['entries'].setdefault(
+                fingerprint, {'dataset': dataset, 'metrics': OrderedDict(), 'sessions': {}}
+            )
+    else:
+        debug_log(f"使用其他工作階段已解析的共用資料集 {fingerprint}", level="INFO")
     
-    result_df = filtered_df[mask]
-    debug_log(f"過濾前資料列數: {len(filtered_df)}, 過濾後: {len(result_df)}")
+    with registry['lock']:
+        _release_session_datasets(registry, session_id, keep_key=fingerprint)
+        _prune_inactive_sessions(registry)
+        entry['sessions'][session_id] = time.time()
+        registry['entries'][fingerprint] = entry
     
-    # 如果過濾後沒有資料，可能日期格式有問題
-    if len(result_df) == 0 and len(filtered_df) > 0:
-        debug_log("過濾後沒有資料，顯示日期最大最小值檢查:")
-        min_date = filtered_df[date_column].min()
-        max_date = filtered_df[date_column].max()
-        debug_log(f"數據日期範圍: {min_date} 到 {max_date}")
-        
-        # 如果日期篩選導致沒有數據，返回原始數據並警告
-        st.warning(f"日期篩選 ({start_date} 到 {end_date}) 沒有匹配的數據。數據實際日期範圍是 {min_date} 到 {max_date}。")
-        return filtered_df
+    st.session_state.shared_dataset_key = fingerprint
+    return entry['dataset']
+
+def get_shared_metric(data_version, params, compute):
+    """
+    取得目前共用資料集上的指標，所有使用相同資料集的工作階段共用計算結果
+
+    目前工作階段沒有共用資料集 (或版本不符) 時，退回本工作階段的指標快取。
+    """
+    registry = _get_shared_dataset_registry()
+    fingerprint = st.session_state.get('shared_dataset_key')
+    
+    with registry['lock']:
+        entry = registry['entries'].get(fingerprint)
+    
+    if entry is None or entry['dataset'].get('data_version') != data_version:
+        return get_versioned_metric('all_metrics', data_version, params, compute)
+    
+    with registry['lock']:
+        if params in entry['metrics']:
+            entry['metrics'].move_to_end(params)
+            return entry['metrics'][params]
+    
+    value = compute()
+    if value:
+        with registry['lock']:
+            value = entry['metrics'].setdefault(params, value)
+            entry['metrics'].move_to_end(params)
+            while len(entry['metrics']) > SHARED_METRICS_MAX_RANGES:
+                entry['metrics'].popitem(last=False)
+    return value
+
+def peek_shared_metric(data_version, params):
+    """只查詢 get_shared_metric 的快取，不計算；未命中時返回 None"""
+    registry = _get_shared_dataset_registry()
+    fingerprint = st.session_state.get('shared_dataset_key')
+    
+    with registry['lock']:
+        entry = registry['entries'].get(fingerprint)
+    
+    if entry is None or entry['dataset'].get('data_version') != data_version:
+        if data_version is None:
+            return None
+        cached = _get_metric_cache()['entries'].get(('all_metrics', data_version, params))
+        return cached['value'] if cached is not None else None
     
-    return result_df
+    with registry['lock']:
+        if params not in entry['metrics']:
+            return None
+        entry['metrics'].move_to_end(params)
+        return entry['metrics'][params]
+
 
 # 修正: 計算效率並剔除極值的函數，確保正確處理0%剔除情況
 def calculate_efficiency_with_trimming(processed_df, trim_percentage=0):
@@ -2594,509 +1823,25 @@ def calculate_efficiency_with_trimming(processed_df, trim_percentage=0):
     
     return overall_efficiency_ranking
 
-@st.cache_data(ttl=1800, show_spinner=False)
-def calculate_efficiency_metrics(processed_df, start_date=None, end_date=None, selected_material_categories=None, merge_categories=False):
-    """優化的效率指標計算函數"""
-    debug_log("開始計算IQC檢驗效率指標", level="INFO")
-    
-    # 過濾資料，確保在日期範圍內
-    filtered_df = filter_by_date_range(processed_df, start_date, end_date)
-    
-    # 如果指定了物料類別，進行過濾
-    if selected_material_categories and len(selected_material_categories) > 0:
-        filtered_df = filtered_df[filtered_df['類別'].isin(selected_material_categories)]
-        debug_log(f"根據物料類別過濾: {selected_material_categories}, 過濾後資料行數: {len(filtered_df)}", level="INFO")
-    
-    if filtered_df is None or filtered_df.empty:
-        debug_log("過濾後沒有資料，返回空結果", level="WARNING")
-        return {
-            'overall_efficiency_ranking': pd.DataFrame(),
-            'category_efficiency_data': {}
-        }
-    
-    # 設定效率值的合理上限
-    MAX_EFFICIENCY = 20
-    
-    # 一次性計算所有所需的統計數據
-    try:
-        # 使用 pandas 1.0.0+ 的 named aggregation，一次性完成聚合操作
-        aggregated_data = filtered_df.groupby(['處理後檢驗員', '類別']).agg(
-            total_standard_time=('處理後檢驗標準工時', 'sum'),
-            total_actual_time=('檢驗耗時', 'sum'),
-            record_count=('處理後檢驗標準工時', 'count')  # 使用任意列計數
-        ).reset_index()
-        
-        # 重命名列以避免衝突
-        aggregated_data.columns = ['inspector', 'category', 'total_standard_time', 'total_actual_time', 'record_count']
-    except Exception:
-        # 兼容舊版 pandas
-        stat_data = filtered_df.groupby(['處理後檢驗員', '類別']).agg({
-            '處理後檢驗標準工時': 'sum',
-            '檢驗耗時': 'sum'
-        }).reset_index()
-        
-        record_counts = filtered_df.groupby(['處理後檢驗員', '類別']).size().reset_index(name='record_count')
-        
-        aggregated_data = pd.merge(stat_data, record_counts, on=['處理後檢驗員', '類別'])
-        
-        # 重命名列
-        aggregated_data.columns = ['inspector', 'category', 'total_standard_time', 'total_actual_time', 'record_count']
-    
-    # 向量化計算效率比值，替代 apply+lambda
-    aggregated_data['efficiency'] = (
-        aggregated_data['total_standard_time'] / 
-        aggregated_data['total_actual_time'].clip(lower=0.1)
-    ).clip(upper=MAX_EFFICIENCY)
-    
-    # 1. 計算總效率 - 按檢驗員分組
-    overall_efficiency = aggregated_data.groupby('inspector').agg({
-        'total_standard_time': 'sum',
-        'total_actual_time': 'sum',
-        'record_count': 'sum'
-    }).reset_index()
-    
-    # 向量化計算總效率
-    overall_efficiency['efficiency'] = (
-        overall_efficiency['total_standard_time'] / 
-        overall_efficiency['total_actual_time'].clip(lower=0.1)
-    ).clip(upper=MAX_EFFICIENCY)
-    
-    # 按效率從高到低排序
-    overall_efficiency = overall_efficiency.sort_values(by='efficiency', ascending=False)
-    
-    # 2. 計算類別效率數據
-    category_efficiency_data = {}
-    
-    # 如果需要合併類別
-    if merge_categories and selected_material_categories:
-        merged_category = "+".join(selected_material_categories)
-        
-        # 為合併類別創建新的DataFrame
-        merged_data = aggregated_data.copy()
-        merged_data['category'] = merged_category
-        
-        # 按檢驗員分組
-        merged_grouped = merged_data.groupby('inspector').agg({
-            'total_standard_time': 'sum',
-            'total_actual_time': 'sum',
-            'record_count': 'sum'
-        }).reset_index()
-        
-        # 向量化計算效率
-        merged_grouped['efficiency'] = (
-            merged_grouped['total_standard_time'] / 
-            merged_grouped['total_actual_time'].clip(lower=0.1)
-        ).clip(upper=MAX_EFFICIENCY)
-        
-        # 排序並保存
-        merged_grouped = merged_grouped.sort_values(by='efficiency', ascending=False)
-        category_efficiency_data[merged_category] = merged_grouped.to_dict('records')
-    else:
-        # 對每個類別，按效率排序並保存
-        for category, group in aggregated_data.groupby('category'):
-            sorted_group = group.sort_values(by='efficiency', ascending=False)
-            category_efficiency_data[category] = sorted_group.to_dict('records')
-    
-    debug_log(f"效率指標計算完成，共 {len(overall_efficiency)} 位檢驗員, {len(category_efficiency_data)} 個類別", level="INFO")
-    
-    return {
-        'overall_efficiency_ranking': overall_efficiency,
-        'category_efficiency_data': category_efficiency_data
-    }
 
-@st.cache_data(ttl=1800, show_spinner=False)
-def calculate_workload_metrics(processed_df, additional_tasks_df, start_date=None, end_date=None):
-    """優化的工作負載指標計算函數 - 使用標準檢驗工時而非實際檢驗時間"""
-    debug_log("開始計算工作負載指標")
-    
-    # 過濾資料，確保在日期範圍內
-    filtered_iqc_df = filter_by_date_range(processed_df, start_date, end_date)
-    
-    # 確保additional_tasks_df不是None
-    if additional_tasks_df is None or additional_tasks_df.empty:
-        debug_log("額外任務資料為空，只計算檢驗工作負載")
-        filtered_tasks_df = pd.DataFrame()
-    else:
-        filtered_tasks_df = filter_by_date_range(additional_tasks_df, start_date, end_date)
-    
-    # 一次性初始化結果DataFrame
-    result_data = []
-    
-    # 處理IQC報告數據 - 向量化操作
-    if filtered_iqc_df is not None and not filtered_iqc_df.empty:
-        debug_log(f"處理 {len(filtered_iqc_df)} 筆IQC報告資料")
-        
-        # 確保日期欄位是datetime類型並一次性處理
-        filtered_iqc_df['檢驗日期'] = pd.to_datetime(filtered_iqc_df['檢驗日期'], errors='coerce')
-        
-        # 使用格式化的日期作為索引
-        filtered_iqc_df['formatted_date'] = filtered_iqc_df['檢驗日期'].dt.strftime('%Y-%m-%d')
-        
-        # 使用groupby進行聚合計算 - 關鍵修改: 使用處理後檢驗標準工時替代檢驗耗時
-        iqc_workload = filtered_iqc_df.groupby(['formatted_date', '處理後檢驗員']).agg(
-            inspection_standard_time=('處理後檢驗標準工時', 'sum'),  # 修改這裡: 使用標準工時
-            inspection_count=('處理後檢驗員', 'count')
-        ).reset_index()
-        
-        # 添加工作時段分析 - 只為有檢驗開始時間的數據
-        if '檢驗開始時間' in filtered_iqc_df.columns:
-            # 計算每組的最早和最晚時間
-            time_analysis = filtered_iqc_df.dropna(subset=['檢驗開始時間']).groupby(
-                ['formatted_date', '處理後檢驗員']
-            ).agg(
-                earliest_time=('檢驗開始時間', lambda x: x.dt.hour.min() + x.dt.minute.min()/60 if not x.empty else None),
-                latest_time=('檢驗開始時間', lambda x: x.dt.hour.max() + x.dt.minute.max()/60 if not x.empty else None)
-            ).reset_index()
-            
-            # 合併時間分析結果
-            iqc_workload = pd.merge(
-                iqc_workload, 
-                time_analysis, 
-                on=['formatted_date', '處理後檢驗員'], 
-                how='left'
-            )
-            
-            # 向量化計算工作時段
-            iqc_workload['work_period'] = iqc_workload.apply(
-                lambda row: f"{row['earliest_time']:.1f}时 - {row['latest_time']:.1f}时 (跨{row['latest_time']-row['earliest_time']:.1f}小时)" 
-                if pd.notna(row['earliest_time']) and pd.notna(row['latest_time']) and row['latest_time'] - row['earliest_time'] > 0
-                else (f"{row['earliest_time']:.1f}时" if pd.notna(row['earliest_time']) else "無法分析"),
-                axis=1
-            )
-        else:
-            iqc_workload['work_period'] = "無法分析"
-        
-        # 初始化額外任務時間為0
-        iqc_workload['additional_task_time'] = 0
-        
-        # 將結果添加到結果清單
-        for _, row in iqc_workload.iterrows():
-            result_data.append({
-                'date': row['formatted_date'],
-                'inspector': row['處理後檢驗員'],
-                'inspection_standard_time': row['inspection_standard_time'],  # 修改這裡: 使用標準工時
-                'additional_task_time': 0,  # 將在後續與額外任務合併
-                'inspection_count': row['inspection_count'],
-                'work_period': row['work_period']
-            })
-    
-    # 處理額外任務數據 - 向量化操作
-    if filtered_tasks_df is not None and not filtered_tasks_df.empty:
-        debug_log(f"處理 {len(filtered_tasks_df)} 筆額外任務資料")
-        
-        # 確保日期欄位是datetime類型並一次性處理
-        filtered_tasks_df['日期'] = pd.to_datetime(filtered_tasks_df['日期'], errors='coerce')
-        
-        # 使用格式化的日期作為索引
-        filtered_tasks_df['formatted_date'] = filtered_tasks_df['日期'].dt.strftime('%Y-%m-%d')
-        
-        # 使用groupby進行聚合計算
-        tasks_workload = filtered_tasks_df.groupby(['formatted_date', '姓名']).agg(
-            additional_task_time=('用時(分鐘)', 'sum')
-        ).reset_index()
-        
-        # 添加任務數據到結果，首先創建索引
-        date_inspector_map = {}
-        for i, item in enumerate(result_data):
-            key = f"{item['date']}-{item['inspector']}"
-            date_inspector_map[key] = i
-        
-        # 將額外任務時間合併到結果中
-        for _, row in tasks_workload.iterrows():
-            key = f"{row['formatted_date']}-{row['姓名']}"
-            if key in date_inspector_map:
-                # 更新現有記錄
-                idx = date_inspector_map[key]
-                result_data[idx]['additional_task_time'] = row['additional_task_time']
-            else:
-                # 添加新記錄
-                result_data.append({
-                    'date': row['formatted_date'],
-                    'inspector': row['姓名'],
-                    'inspection_standard_time': 0,  # 修改這裡: 使用標準工時
-                    'additional_task_time': row['additional_task_time'],
-                    'inspection_count': 0,
-                    'work_period': "無工作時段"
-                })
-    
-    # 轉換為DataFrame並計算總時間和工作負載指數
-    workload_df = pd.DataFrame(result_data)
-    
-    if not workload_df.empty:
-        # 向量化計算總時間和工作負載指數 - 修改計算邏輯
-        workload_df['total_time'] = workload_df['inspection_standard_time'] + workload_df['additional_task_time']
-        workload_df['workload_index'] = workload_df['total_time'] / 480  # 8小時 = 480分鐘
-        
-        # 按日期排序
-        workload_df['date'] = pd.to_datetime(workload_df['date'])
-        workload_df = workload_df.sort_values('date')
-        workload_df['date'] = workload_df['date'].dt.strftime('%Y-%m-%d')  # 轉回字符串格式，方便繪圖
-    
-    debug_log(f"工作負載計算完成，共 {len(workload_df)} 筆資料")
-    return workload_df
-
-# 同样修改时间分配比例计算和额外任务监控函数
-def calculate_time_allocation_metrics(processed_df, additional_tasks_df, start_date=None, end_date=None):
-    debug_log("開始計算時間分配比例")
-    
-    # 過濾資料，確保在日期範圍內
-    filtered_iqc_df = filter_by_date_range(processed_df, start_date, end_date)
-    
-    # 确保additional_tasks_df不是None
-    if additional_tasks_df is None or additional_tasks_df.empty:
-        debug_log("額外任務資料為空，只計算檢驗時間佔比")
-        filtered_tasks_df = pd.DataFrame()  # 使用空DataFrame
-    else:
-        filtered_tasks_df = filter_by_date_range(additional_tasks_df, start_date, end_date)
-    
-    # 按檢驗員分組計算時間分配
-    time_allocation_by_inspector = {}
-    
-    # 处理IQC报告数据
-    if filtered_iqc_df is not None and not filtered_iqc_df.empty:
-        debug_log(f"处理 {len(filtered_iqc_df)} 筆IQC报告资料")
-        
-        for _, row in filtered_iqc_df.iterrows():
-            inspector = row['處理後檢驗員'] if pd.notna(row['處理後檢驗員']) else 'Unknown'
-            
-            if inspector not in time_allocation_by_inspector:
-                time_allocation_by_inspector[inspector] = {
-                    'inspector': inspector,
-                    'inspection_time': 0,
-                    'additional_task_time': 0,
-                    'additional_task_details': {}
-                }
-            
-            # 处理检验时间
-            try:
-                inspection_time = float(row['檢驗耗時']) if pd.notna(row['檢驗耗時']) else 0
-            except (ValueError, TypeError):
-                debug_log(f"无法转换检验耗时 {row['檢驗耗時']} 为浮点数，设为0")
-                inspection_time = 0
-            
-            time_allocation_by_inspector[inspector]['inspection_time'] += inspection_time
-    
-    # 处理额外任务数据
-    if filtered_tasks_df is not None and not filtered_tasks_df.empty:
-        debug_log(f"处理 {len(filtered_tasks_df)} 筆额外任务资料")
-        
-        for _, row in filtered_tasks_df.iterrows():
-            inspector = row['姓名'] if pd.notna(row['姓名']) else 'Unknown'
-            task_type = row['工作事項分類'] if pd.notna(row['工作事項分類']) else 'Other'
-            
-            # 处理任务时间
-            try:
-                task_time = int(row['用時(分鐘)']) if pd.notna(row['用時(分鐘)']) else 0
-            except (ValueError, TypeError):
-                debug_log(f"无法转换用时 {row['用時(分鐘)']} 为整数，设为0")
-                task_time = 0
-            
-            if inspector not in time_allocation_by_inspector:
-                time_allocation_by_inspector[inspector] = {
-                    'inspector': inspector,
-                    'inspection_time': 0,
-                    'additional_task_time': 0,
-                    'additional_task_details': {}
-                }
-            
-            time_allocation_by_inspector[inspector]['additional_task_time'] += task_time
-            
-            if task_type not in time_allocation_by_inspector[inspector]['additional_task_details']:
-                time_allocation_by_inspector[inspector]['additional_task_details'][task_type] = 0
-            
-            time_allocation_by_inspector[inspector]['additional_task_details'][task_type] += task_time
-    
-    # 计算比例
-    time_allocation_data = []
-    
-    for inspector, data in time_allocation_by_inspector.items():
-        total_time = data['inspection_time'] + data['additional_task_time']
-        inspection_ratio = data['inspection_time'] / total_time if total_time > 0 else 1.0  # 如果没有额外任务，检验时间占比为100%
-        additional_task_ratio = data['additional_task_time'] / total_time if total_time > 0 else 0.0
-        
-        # 计算细项任务的比例
-        task_detail_ratios = {}
-        for task_type, time in data['additional_task_details'].items():
-            task_detail_ratios[task_type] = time / total_time if total_time > 0 else 0
-        
-        time_allocation_data.append({
-            'inspector': inspector,
-            'inspection_time': data['inspection_time'],
-            'additional_task_time': data['additional_task_time'],
-            'total_time': total_time,
-            'inspection_ratio': inspection_ratio,
-            'additional_task_ratio': additional_task_ratio,
-            'task_detail_ratios': task_detail_ratios
-        })
-    
-    debug_log(f"时间分配比例计算完成，共 {len(time_allocation_data)} 位检验员")
-    return pd.DataFrame(time_allocation_data)
+def get_inspector_task_ratios(inspector_row):
+    """
+    將單一檢驗員的任務細項比例整理為長表，只保留佔比大於0的任務
 
-def calculate_additional_tasks_metrics(additional_tasks_df, start_date=None, end_date=None):
-    debug_log("开始计算额外任务监控数据")
-    
-    # 如果额外任务数据为空，返回空DataFrame
-    if additional_tasks_df is None or additional_tasks_df.empty:
-        debug_log("额外任务资料为空，返回空结果")
-        return pd.DataFrame(columns=['inspector', 'task_type', 'total_time'])
-    
-    # 過濾資料，確保在日期範圍內
-    filtered_tasks_df = filter_by_date_range(additional_tasks_df, start_date, end_date)
-    
-    # 如果沒有資料，返回空的DataFrame
-    if filtered_tasks_df.empty:
-        debug_log("过滤后没有额外任务资料")
-        return pd.DataFrame(columns=['inspector', 'task_type', 'total_time'])
-    
-    debug_log(f"处理 {len(filtered_tasks_df)} 筆额外任务资料")
-    
-    # 按檢驗員和任務類型分組計算時間
-    task_summary = {}
-    
-    for _, row in filtered_tasks_df.iterrows():
-        inspector = row['姓名'] if pd.notna(row['姓名']) else 'Unknown'
-        task_type = row['工作事項分類'] if pd.notna(row['工作事項分類']) else 'Other'
-        
-        # 处理任务时间
-        try:
-            task_time = int(row['用時(分鐘)']) if pd.notna(row['用時(分鐘)']) else 0
-        except (ValueError, TypeError):
-            debug_log(f"无法转换用时 {row['用時(分鐘)']} 为整数，设为0")
-            task_time = 0
-        
-        if inspector not in task_summary:
-            task_summary[inspector] = {}
-        
-        if task_type not in task_summary[inspector]:
-            task_summary[inspector][task_type] = 0
-        
-        task_summary[inspector][task_type] += task_time
-    
-    # 轉換為DataFrame格式
-    task_monitor_data = []
-    
-    for inspector, tasks in task_summary.items():
-        for task_type, total_time in tasks.items():
-            task_monitor_data.append({
-                'inspector': inspector,
-                'task_type': task_type,
-                'total_time': total_time
-            })
-    
-    debug_log(f"额外任务监控数据计算完成，共 {len(task_monitor_data)} 筆资料")
-    return pd.DataFrame(task_monitor_data)
+    參數:
+    inspector_row - 時間分配表的一列 (Series)
+
+    返回:
+    包含 task_type、ratio 的DataFrame
+    """
+    task_ratios = get_task_ratio_table(inspector_row.to_frame().T).iloc[0]
+    task_ratios = pd.to_numeric(task_ratios, errors='coerce')
+    task_ratios = task_ratios[task_ratios > 0]
+    return pd.DataFrame({
+        'task_type': task_ratios.index.str[len(TASK_RATIO_PREFIX):],
+        'ratio': task_ratios.to_numpy()
+    })
 
-@st.cache_data(ttl=86400, max_entries=5, show_spinner=False)
-def calculate_all_metrics(iqc_df, pcb_specs_df, pcb_standard_time_df, additional_tasks_df, start_date=None, end_date=None):
-    try:
-        debug_log("開始計算所有指標", level="INFO")
-        start_time = time.time()  # 記錄開始時間
-        
-        # 檢查資料是否為空
-        if iqc_df is None or iqc_df.empty:
-            debug_log("IQC報告資料為空，無法計算指標", level="ERROR")
-            st.error("IQC報告資料為空，請上傳有效的資料檔案。")
-            return None
-        
-        # 使用優化後的PCB標準工時計算
-        iqc_data_with_pcb_time = calculate_pcb_standard_time(iqc_df, pcb_specs_df, pcb_standard_time_df)
-        debug_log(f"PCB標準工時計算完成，資料筆數: {len(iqc_data_with_pcb_time)}", level="INFO")
-        pcb_time_end = time.time()
-        debug_log(f"PCB標準工時計算用時: {pcb_time_end - start_time:.2f}秒", level="INFO")
-        
-        # 重要修改: 先進行日期篩選，確保後續所有計算都使用篩選後的數據
-        filtered_data = filter_by_date_range(iqc_data_with_pcb_time, start_date, end_date)
-        debug_log(f"日期篩選完成，從 {len(iqc_data_with_pcb_time)} 筆資料篩選出 {len(filtered_data)} 筆", level="INFO")
-        
-        # 使用日期篩選後的資料進行效率計算
-        efficiency_start = time.time()
-        efficiency_data = calculate_efficiency_metrics(
-            filtered_data,  # 使用篩選後的資料 
-            start_date, 
-            end_date
-        )
-        efficiency_end = time.time()
-        debug_log(f"效率指標計算用時: {efficiency_end - efficiency_start:.2f}秒", level="INFO")
-        
-        # 計算工作負載指標
-        workload_start = time.time()
-        if additional_tasks_df is None:
-            debug_log("IQC額外任務紀錄清單数据不存在，將使用空數據計算相關指標", level="WARNING")
-            additional_tasks_df = pd.DataFrame()
-        
-        # 使用篩選後的資料計算工作負載
-        workload_data = calculate_workload_metrics(filtered_data, additional_tasks_df, start_date, end_date)
-        workload_end = time.time()
-        debug_log(f"工作負載指標計算用時: {workload_end - workload_start:.2f}秒", level="INFO")
-        
-        # 計算時間分配和額外任務指標
-        time_allocation_start = time.time()
-        time_allocation_data = calculate_time_allocation_metrics(filtered_data, additional_tasks_df, start_date, end_date)
-        additional_tasks_monitor_data = calculate_additional_tasks_metrics(additional_tasks_df, start_date, end_date)
-        time_allocation_end = time.time()
-        debug_log(f"時間分配與額外任務指標計算用時: {time_allocation_end - time_allocation_start:.2f}秒", level="INFO")
-        
-        # 總計算時間
-        total_time = time.time() - start_time
-        debug_log(f"所有指標計算完成，總用時: {total_time:.2f}秒", level="INFO")
-        
-        # 存儲日期篩選信息到session_state，供後續使用
-        st.session_state.filtered_start_date = start_date
-        st.session_state.filtered_end_date = end_date
-        
-        # 創建返回的指標結果字典
-        metrics = {
-            'processed_data': filtered_data,  # 這裡改為使用日期篩選後的資料
-            'efficiency_data': efficiency_data,
-            'workload_data': workload_data,
-            'time_allocation_data': time_allocation_data,
-            'additional_tasks_monitor_data': additional_tasks_monitor_data
-        }
-        
-        # 在返回結果前過濾指定檢驗員
-        if metrics:
-            # 過濾processed_data
-            if 'processed_data' in metrics and metrics['processed_data'] is not None:
-                metrics['processed_data'] = filter_excluded_inspectors(metrics['processed_data'])
-                
-            # 過濾efficiency_data中的overall_efficiency_ranking
-            if 'efficiency_data' in metrics and 'overall_efficiency_ranking' in metrics['efficiency_data']:
-                metrics['efficiency_data']['overall_efficiency_ranking'] = filter_excluded_inspectors(
-                    metrics['efficiency_data']['overall_efficiency_ranking'], 
-                    inspector_column='inspector'
-                )
-                
-            # 過濾efficiency_data中的category_efficiency_data
-            if 'efficiency_data' in metrics and 'category_efficiency_data' in metrics['efficiency_data']:
-                category_data = metrics['efficiency_data']['category_efficiency_data']
-                for category in category_data:
-                    if isinstance(category_data[category], list):
-                        # 如果是列表格式，過濾每個項目
-                        category_data[category] = [
-                            item for item in category_data[category] 
-                            if item.get('inspector') not in EXCLUDED_INSPECTORS
-                        ]
-                
-            # 過濾workload_data
-            if 'workload_data' in metrics and metrics['workload_data'] is not None:
-                metrics['workload_data'] = filter_excluded_inspectors(metrics['workload_data'], inspector_column='inspector')
-                
-            # 過濾time_allocation_data
-            if 'time_allocation_data' in metrics and metrics['time_allocation_data'] is not None:
-                metrics['time_allocation_data'] = filter_excluded_inspectors(metrics['time_allocation_data'], inspector_column='inspector')
-                
-            # 過濾additional_tasks_monitor_data
-            if 'additional_tasks_monitor_data' in metrics and metrics['additional_tasks_monitor_data'] is not None:
-                metrics['additional_tasks_monitor_data'] = filter_excluded_inspectors(metrics['additional_tasks_monitor_data'], inspector_column='inspector')
-        
-        return metrics
-    
-    except Exception as e:
-        error_msg = f"計算指標時出錯: {str(e)}\n{traceback.format_exc()}"
-        debug_log(error_msg, level="ERROR")
-        st.error(error_msg)
-        st.session_state.processing_error = error_msg
-        return None
 
 # 計算總效率指標的函數 (不受物料類別篩選影響)
 def calculate_overall_efficiency(filtered_df):
@@ -3406,199 +2151,262 @@ def calculate_inspector_category_efficiency(filtered_df, inspector_name, trim_pe
     return result
 
 
-def calculate_inspector_efficiency_trend(filtered_df, inspector_name, period='D'):
+# ==================== 效率趨勢引擎 ====================
+# 趨勢週期對應的 pandas Period 頻率 ('D' 直接取日期)
+TREND_PERIODS = {'D': None, 'W': 'W', 'M': 'M'}
+
+def _period_start(dates, period):
+    """將日期向量化對齊到所屬週期的起始日"""
+    freq = TREND_PERIODS.get(period)
+    if freq is None:
+        return dates.dt.normalize()
+    return dates.dt.to_period(freq).dt.start_time
+
+def calculate_efficiency_trend_table(filtered_df, period='D', by_category=False):
     """
-    計算單一檢驗員的效率時間趨勢
-    
+    一次 groupby 計算所有檢驗員 (及大類別) 的週期效率趨勢
+
     參數:
     filtered_df: 已篩選的資料DataFrame
-    inspector_name: 檢驗員姓名
     period: 時間週期 ('D'=日, 'W'=週, 'M'=月)
-    
+    by_category: 是否再依材料大類別分組
+
     返回:
-    包含日期和效率的DataFrame
+    包含 inspector、date、(category)、efficiency、record_count、
+    total_standard_time、total_actual_time、avg_efficiency_ratio 的DataFrame
     """
-    if filtered_df is None or filtered_df.empty or not inspector_name:
-        return None
-    
-    # 篩選該檢驗員的資料
-    inspector_data = filtered_df[filtered_df['處理後檢驗員'] == inspector_name].copy()
-    
-    if inspector_data.empty:
-        return None
-    
-    # 確保日期欄位存在並為 datetime 格式
-    date_column = '檢驗日期' if '檢驗日期' in inspector_data.columns else '日期'
-    if date_column not in inspector_data.columns:
-        return None
-    
-    inspector_data[date_column] = pd.to_datetime(inspector_data[date_column], errors='coerce')
-    inspector_data = inspector_data.dropna(subset=[date_column])
+    keys = ['inspector', 'date'] + (['category'] if by_category else [])
+    columns = keys + ['efficiency', 'record_count', 'total_standard_time', 'total_actual_time', 'avg_efficiency_ratio']
+    if filtered_df is None or filtered_df.empty:
+        return pd.DataFrame(columns=columns)
     
-    if inspector_data.empty:
-        return None
+    date_column = '檢驗日期' if '檢驗日期' in filtered_df.columns else '日期'
+    if date_column not in filtered_df.columns:
+        return pd.DataFrame(columns=columns)
     
     # 設定效率值的合理上限
     MAX_EFFICIENCY = 20
     
-    # 按日期分組計算效率
-    trend_data = []
-    
-    # 根據週期進行分組
-    if period == 'W':
-        inspector_data['period'] = inspector_data[date_column].dt.to_period('W').dt.start_time
-    elif period == 'M':
-        inspector_data['period'] = inspector_data[date_column].dt.to_period('M').dt.start_time
-    else:  # 預設為日
-        inspector_data['period'] = inspector_data[date_column].dt.date
-    
-    for period_val, group in inspector_data.groupby('period'):
-        total_standard = 0
-        total_actual = 0
-        record_count = len(group)
-        
-        for _, row in group.iterrows():
-            try:
-                standard_time = float(row['處理後檢驗標準工時']) if pd.notna(row['處理後檢驗標準工時']) else 0
-            except (ValueError, TypeError):
-                standard_time = 0
-            
-            try:
-                actual_time = float(row['檢驗耗時']) if pd.notna(row['檢驗耗時']) else 0
-            except (ValueError, TypeError):
-                actual_time = 0
-            
-            if actual_time < 0.1:
-                actual_time = 0.1
-            
-            total_standard += standard_time
-            total_actual += actual_time
-        
-        if total_actual > 0:
-            efficiency = min(total_standard / total_actual, MAX_EFFICIENCY)
-        else:
-            efficiency = 0
-        
-        trend_data.append({
-            'date': pd.Timestamp(period_val) if not isinstance(period_val, pd.Timestamp) else period_val,
-            'efficiency': efficiency,
-            'record_count': record_count,
-            'total_standard_time': total_standard,
-            'total_actual_time': total_actual
-        })
-    
-    if not trend_data:
-        return None
-    
-    result_df = pd.DataFrame(trend_data)
-    result_df = result_df.sort_values('date')
+    dates = pd.to_datetime(filtered_df[date_column], errors='coerce')
+    frame = pd.DataFrame({
+        'inspector': filtered_df['處理後檢驗員'],
+        'date': _period_start(dates, period),
+        'standard_time': pd.to_numeric(filtered_df['處理後檢驗標準工時'], errors='coerce').fillna(0),
+        # 單筆實際時間至少0.1分鐘，與逐筆計算時一致
+        'actual_time': pd.to_numeric(filtered_df['檢驗耗時'], errors='coerce').fillna(0).clip(lower=0.1),
+        'efficiency_ratio': (
+            pd.to_numeric(filtered_df['效率比值'], errors='coerce')
+            if '效率比值' in filtered_df.columns else np.nan
+        )
+    })
+    if by_category:
+        frame['category'] = map_main_category(filtered_df['類別'])
+    frame = frame.dropna(subset=['inspector', 'date'])
+    
+    if frame.empty:
+        return pd.DataFrame(columns=columns)
+    
+    trend_df = frame.groupby(keys).agg(
+        record_count=('standard_time', 'size'),
+        total_standard_time=('standard_time', 'sum'),
+        total_actual_time=('actual_time', 'sum'),
+        avg_efficiency_ratio=('efficiency_ratio', 'mean')
+    ).reset_index()
+    trend_df['efficiency'] = (trend_df['total_standard_time'] / trend_df['total_actual_time']).clip(upper=MAX_EFFICIENCY)
     
-    return result_df
+    return trend_df[columns]
+
+def get_session_cached(cache_name, cache_key, source, compute):
+    """
+    以來源資料物件為準的 session_state 快取，同一份資料只計算一次
 
+    處理新資料後 processed_data 為新物件，快取自動失效。
 
-def calculate_inspector_category_trend(filtered_df, inspector_name, period='W'):
+    參數:
+    cache_name - session_state 中的快取名稱
+    cache_key - 同一快取中區分不同參數的鍵
+    source - 計算所依據的資料物件
+    compute - 無參數的計算函數
+
+    返回:
+    compute() 的結果
     """
-    計算單一檢驗員各材料大類別的效率時間趨勢
+    cache = st.session_state.setdefault(cache_name, {})
+    entry = cache.get(cache_key)
+    if entry is not None and entry['source'] is source:
+        return entry['value']
     
+    value = compute()
+    cache[cache_key] = {'source': source, 'value': value}
+    return value
+
+def get_efficiency_trend_table(processed_df, period='D', by_category=False):
+    """
+    取得效率趨勢表，以 processed_data 的版本代碼快取，同一份資料與日期範圍只計算一次
+
+    processed_df 需由目前的 processed_data 決定 (例如排除特定檢驗員後的資料)，
+    每次重新執行產生的新物件仍可命中快取。
+    """
+    return get_versioned_metric(
+        'efficiency_trend', get_processed_data_version(), (period, by_category),
+        lambda: calculate_efficiency_trend_table(processed_df, period, by_category)
+    )
+
+# ==================== MRB 統計引擎 ====================
+# MRB判定欄位 (MRB_FLAG_COLUMN、derive_mrb_flag) 位於 iqc_engine.metrics，此處為各儀表板共用的MRB率統計
+def calculate_mrb_rate_table(df, group_column, label=None, is_mrb=None):
+    """
+    以單次 groupby 計算指定維度的MRB率表
+
     參數:
-    filtered_df: 已篩選的資料DataFrame
-    inspector_name: 檢驗員姓名
-    period: 時間週期 ('D'=日, 'W'=週, 'M'=月)
-    
+    df - 處理後的檢驗資料
+    group_column - 分組欄位名稱，或與 df 對齊的 Series (例如日期)
+    label - 輸出表中分組欄位的名稱，預設與分組欄位相同
+    is_mrb - 預先計算好的MRB判定，省略時使用 derive_mrb_flag
+
     返回:
-    包含日期、類別和效率的DataFrame
+    包含 [label, MRB數量, 總檢驗筆數, MRB率] 的DataFrame，依MRB率由高到低排序
     """
-    if filtered_df is None or filtered_df.empty or not inspector_name:
-        return None
-    
-    # 篩選該檢驗員的資料
-    inspector_data = filtered_df[filtered_df['處理後檢驗員'] == inspector_name].copy()
-    
-    if inspector_data.empty:
-        return None
+    if isinstance(group_column, pd.Series):
+        label = label or group_column.name
+    else:
+        label = label or group_column
     
-    # 確保日期欄位存在並為 datetime 格式
-    date_column = '檢驗日期' if '檢驗日期' in inspector_data.columns else '日期'
-    if date_column not in inspector_data.columns:
-        return None
+    columns = [label, 'MRB數量', '總檢驗筆數', 'MRB率']
+    if df is None or df.empty:
+        return pd.DataFrame(columns=columns)
     
-    inspector_data[date_column] = pd.to_datetime(inspector_data[date_column], errors='coerce')
-    inspector_data = inspector_data.dropna(subset=[date_column])
+    keys = group_column if isinstance(group_column, pd.Series) else df[group_column]
     
-    if inspector_data.empty:
-        return None
+    if is_mrb is None:
+        is_mrb = derive_mrb_flag(df)
     
-    # 設定效率值的合理上限
-    MAX_EFFICIENCY = 20
+    grouped = is_mrb.astype(int).groupby(keys.rename(label))
+    rate_df = grouped.agg(['sum', 'count']).reset_index()
+    rate_df.columns = [label, 'MRB數量', '總檢驗筆數']
+    rate_df['MRB率'] = rate_df['MRB數量'] / rate_df['總檢驗筆數']
     
-    # 根據週期進行分組
-    if period == 'W':
-        inspector_data['period'] = inspector_data[date_column].dt.to_period('W').dt.start_time
-    elif period == 'M':
-        inspector_data['period'] = inspector_data[date_column].dt.to_period('M').dt.start_time
-    else:  # 預設為日
-        inspector_data['period'] = inspector_data[date_column].dt.date
-    
-    # 為每筆資料找到對應的大類別
-    def get_main_category(subcategory):
-        if pd.isna(subcategory):
-            return 'Unknown'
-        for main_cat, sub_cats in MATERIAL_CATEGORY_MAPPING.items():
-            if subcategory in sub_cats:
-                return main_cat
-        return subcategory
+    return rate_df.sort_values('MRB率', ascending=False, kind='stable').reset_index(drop=True)
+
+def calculate_mrb_rate_tables(df):
+    """
+    一次計算所有MRB儀表板共用的統計表
+
+    參數:
+    df - 處理後的檢驗資料 (建議已依日期範圍過濾)
+
+    返回:
+    dict，包含 mrb_rate、mrb_count、total_count、
+    inspector (檢驗員MRB率表)、category (物料類別MRB率表)、daily (每日MRB率表，依日期排序)
+    """
+    is_mrb = derive_mrb_flag(df)
+    total_count = 0 if df is None else len(df)
+    mrb_count = int(is_mrb.sum())
     
-    inspector_data['main_category'] = inspector_data['類別'].apply(get_main_category)
+    tables = {
+        'mrb_rate': mrb_count / total_count if total_count > 0 else 0,
+        'mrb_count': mrb_count,
+        'total_count': total_count,
+        'inspector': pd.DataFrame(columns=['檢驗員', 'MRB數量', '總檢驗筆數', 'MRB率']),
+        'category': pd.DataFrame(columns=['物料類別', 'MRB數量', '總檢驗筆數', 'MRB率']),
+        'daily': pd.DataFrame(columns=['日期', 'MRB數量', '總檢驗筆數', 'MRB率'])
+    }
+    if total_count == 0:
+        return tables
     
-    # 按週期和類別分組計算效率
-    trend_data = []
+    inspector_column = '處理後檢驗員' if '處理後檢驗員' in df.columns else '檢驗員'
+    if inspector_column in df.columns:
+        tables['inspector'] = calculate_mrb_rate_table(df, inspector_column, '檢驗員', is_mrb)
     
-    for (period_val, category), group in inspector_data.groupby(['period', 'main_category']):
-        total_standard = 0
-        total_actual = 0
-        record_count = len(group)
-        
-        for _, row in group.iterrows():
-            try:
-                standard_time = float(row['處理後檢驗標準工時']) if pd.notna(row['處理後檢驗標準工時']) else 0
-            except (ValueError, TypeError):
-                standard_time = 0
-            
-            try:
-                actual_time = float(row['檢驗耗時']) if pd.notna(row['檢驗耗時']) else 0
-            except (ValueError, TypeError):
-                actual_time = 0
-            
-            if actual_time < 0.1:
-                actual_time = 0.1
-            
-            total_standard += standard_time
-            total_actual += actual_time
-        
-        if total_actual > 0:
-            efficiency = min(total_standard / total_actual, MAX_EFFICIENCY)
-        else:
-            efficiency = 0
-        
-        trend_data.append({
-            'date': pd.Timestamp(period_val) if not isinstance(period_val, pd.Timestamp) else period_val,
-            'category': category,
-            'efficiency': efficiency,
-            'record_count': record_count
-        })
+    if '類別' in df.columns:
+        valid_category = df['類別'].notna() & df['類別'].astype(str).ne('')
+        tables['category'] = calculate_mrb_rate_table(
+            df[valid_category], '類別', '物料類別', is_mrb[valid_category]
+        )
     
-    if not trend_data:
-        return None
+    date_column = '檢驗日期' if '檢驗日期' in df.columns else '日期'
+    if date_column in df.columns:
+        dates = pd.to_datetime(df[date_column], errors='coerce').dt.normalize()
+        tables['daily'] = calculate_mrb_rate_table(
+            df, dates.rename('日期'), '日期', is_mrb
+        ).sort_values('日期').reset_index(drop=True)
     
-    result_df = pd.DataFrame(trend_data)
-    result_df = result_df.sort_values(['category', 'date'])
+    return tables
+
+def bucket_mrb_trend(daily_df, period='auto'):
+    """
+    將每日MRB率表依時間粒度彙總，點數仍過多時以 LTTB 降採樣
+
+    週/月的MRB率以期間內 MRB數量合計 / 總筆數合計 重新計算，不是每日MRB率的平均。
+
+    參數:
+    daily_df - 每日MRB率表 (日期、MRB數量、總筆數、MRB率)
+    period - 'auto' 依日期跨度自動選擇，或 'D'/'W'/'M'
+
+    返回:
+    (趨勢表, 實際使用的週期)
+    """
+    trend_df = daily_df.copy()
+    trend_df['日期'] = pd.to_datetime(trend_df['日期'], errors='coerce')
+    trend_df = trend_df.dropna(subset=['日期']).sort_values('日期')
+
+    if period == 'auto':
+        period = choose_time_bucket(trend_df['日期'])
+
+    if period != 'D':
+        trend_df = trend_df.groupby(_period_start(trend_df['日期'], period))[['MRB數量', '總筆數']].sum().reset_index()
+        trend_df['MRB率'] = trend_df['MRB數量'] / trend_df['總筆數']
+
+    if len(trend_df) > MAX_CHART_POINTS:
+        trend_df = trend_df.iloc[lttb_downsample(trend_df['日期'], trend_df['MRB率'])]
+
+    return trend_df.reset_index(drop=True), period
+
+def build_mrb_trend_figure(trend_df, period):
+    """建立MRB率趨勢折線圖 (trend_df 為 bucket_mrb_trend 的結果)"""
+    import plotly.express as px
     
-    return result_df
+    label = TIME_BUCKET_LABELS.get(period, '日')
+    fig = px.line(
+        trend_df,
+        x='日期',
+        y='MRB率',
+        markers=True,
+        labels={'日期': '日期', 'MRB率': 'MRB率'},
+        title=f"每{label}MRB率趨勢",
+        height=400
+    )
+
+    # 添加MRB數量作為懸浮提示
+    fig.update_traces(
+        hovertemplate='日期: %{x}<br>MRB率: %{y:.2%}<br>MRB數量: %{customdata[0]}<br>總筆數: %{customdata[1]}',
+        customdata=trend_df[['MRB數量', '總筆數']].values
+    )
+
+    # 設置Y軸為百分比格式
+    fig.update_layout(
+        yaxis=dict(
+            tickformat=".0%",
+            title="MRB率"
+        ),
+        xaxis_title="日期" if period == 'D' else f"日期 (每{label})"
+    )
+    return fig
 
+def select_trend_granularity(key):
+    """顯示時間粒度選擇 (自動/日/週/月)，返回 'auto' 或週期代碼"""
+    options = ['auto', 'D', 'W', 'M']
+    return st.radio(
+        "時間粒度",
+        options,
+        format_func=lambda p: '自動' if p == 'auto' else TIME_BUCKET_LABELS[p],
+        horizontal=True,
+        key=key
+    )
 
 def calculate_mrb_rates(processed_df, start_date=None, end_date=None):
     """
-    計算每個IQC人員的MRB率 - 安全的方式
+    計算每個IQC人員的MRB率 - 使用MRB統計引擎的標準MRB判定
     """
     # 篩選日期範圍
     filtered_df = filter_by_date_range(processed_df, start_date, end_date)
@@ -3606,45 +2414,8 @@ def calculate_mrb_rates(processed_df, start_date=None, end_date=None):
     if filtered_df is None or filtered_df.empty:
         return pd.DataFrame(columns=['檢驗員', 'MRB數量', '總檢驗筆數', 'MRB率'])
     
-    # 初始化MRB掩碼
-    mrb_mask = pd.Series(False, index=filtered_df.index)
-    
-    # 安全檢查所有可能的MRB欄位
-    mrb_columns = ['M', '異常問題匯總', 'MRB', 'MRB狀態', 'MRB Status', '是否為MRB']
-    
-    for col in mrb_columns:
-        if col in filtered_df.columns:
-            if col == '是否為MRB':
-                # 直接使用布爾值
-                mrb_mask = mrb_mask | filtered_df[col]
-            else:
-                # 檢查非空值
-                col_mask = filtered_df[col].notna() & (filtered_df[col].astype(str).str.strip() != '')
-                mrb_mask = mrb_mask | col_mask
-    
-    # 使用標記
-    filtered_df['MRB標記'] = mrb_mask
-    
-    # 按檢驗員分組計算MRB率
-    mrb_stats = []
-    
-    for inspector, group in filtered_df.groupby('處理後檢驗員'):
-        total_count = len(group)
-        mrb_count = group['MRB標記'].sum()
-        mrb_rate = mrb_count / total_count if total_count > 0 else 0
-        
-        mrb_stats.append({
-            '檢驗員': inspector,
-            'MRB數量': mrb_count,
-            '總檢驗筆數': total_count,
-            'MRB率': mrb_rate
-        })
-    
-    # 轉換為DataFrame並按MRB率排序
-    mrb_rate_df = pd.DataFrame(mrb_stats)
-    mrb_rate_df = mrb_rate_df.sort_values('MRB率', ascending=False)
-    
-    return mrb_rate_df
+    # 按檢驗員分組計算MRB率，並按MRB率排序
+    return calculate_mrb_rate_table(filtered_df, '處理後檢驗員', '檢驗員')
 
 def render_mrb_rate_chart(efficiency_data, processed_data=None):
     """
@@ -3664,11 +2435,12 @@ def render_mrb_rate_chart(efficiency_data, processed_data=None):
         st.info("沒有可用的MRB率數據")
         return
     
-    # 使用Altair渲染圖表
-    chart = render_inspector_mrb_rate_chart(mrb_rate_df)
-    
-    # 顯示圖表
-    st.altair_chart(chart, use_container_width=True)
+    # 使用Altair渲染圖表 (快取序列化後的規格)
+    plot_cached_altair(
+        'inspector_mrb_rate', (),
+        lambda: render_inspector_mrb_rate_chart(mrb_rate_df),
+        use_container_width=True
+    )
     
     # 顯示詳細數據
     with st.expander("查看MRB率詳細數據"):
@@ -3676,7 +2448,61 @@ def render_mrb_rate_chart(efficiency_data, processed_data=None):
         detail_df['MRB率'] = detail_df['MRB率'].apply(lambda x: f"{x:.2%}")  # 格式化為百分比
         st.dataframe(detail_df, use_container_width=True)
 
+# ==================== 局部重新執行 (fragment) ====================
+# st.fragment 與 run_every 自動更新需要 Streamlit 1.37 以上 (requirements.txt 已指定)；
+# 舊版安裝時退回整頁重新執行與手動更新按鈕
+_STREAMLIT_FRAGMENT = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+# 每個範圍保留最近幾次的重新執行耗時
+RERUN_LATENCY_HISTORY = 20
+
+def record_rerun_latency(scope, seconds):
+    """
+    記錄重新執行耗時，供比較整頁重新執行與 fragment 局部重新執行
+
+    參數:
+    scope - 範圍名稱 (整頁為 'full_rerun'，fragment 為函數名稱)
+    seconds - 耗時 (秒)
+    """
+    history = st.session_state.setdefault('rerun_latency', {}).setdefault(scope, [])
+    history.append(seconds)
+    del history[:-RERUN_LATENCY_HISTORY]
+    debug_log(f"重新執行耗時 [{scope}]: {seconds * 1000:.0f}ms", level="INFO")
+
+def dashboard_fragment(func):
+    """
+    將互動區塊包成 st.fragment：區塊內的元件變更只重新執行該區塊，
+    不會重跑整頁的CSS、側邊欄與狀態列，並記錄區塊的執行耗時
+    """
+    @functools.wraps(func)
+    def timed_section(*args, **kwargs):
+        section_start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_rerun_latency(func.__name__, time.perf_counter() - section_start)
+    
+    return _STREAMLIT_FRAGMENT(timed_section) if _STREAMLIT_FRAGMENT else timed_section
+
+def select_lazy_tab(labels, key):
+    """
+    只渲染選中頁籤的子頁籤導航
+
+    st.tabs 每次重新執行都會跑完所有 with 區塊 (每個頁籤都計算並產生圖表)，
+    改以水平選項呈現子頁籤，呼叫端只渲染選中的頁籤，選擇保存在 session_state。
+
+    參數:
+    labels - 子頁籤標題列表
+    key - 元件 key
+
+    返回:
+    選中子頁籤的索引
+    """
+    selected_label = st.radio("子頁籤", labels, horizontal=True, key=key, label_visibility="collapsed")
+    return labels.index(selected_label)
+
 def render_efficiency_dashboard(efficiency_data, processed_data=None):
+    import plotly.graph_objects as go
+    
     if efficiency_data is None:
         st.error("沒有可用的效率數據，請確保上傳了正確的檔案格式。")
         return
@@ -3741,16 +2567,16 @@ def render_efficiency_dashboard(efficiency_data, processed_data=None):
                 </div>
                 """, unsafe_allow_html=True)
     
-    # ===== 使用子頁籤整理資訊層級（精簡為2個）=====
-    subtab1, subtab2 = st.tabs([
+    # ===== 使用子頁籤整理資訊層級（精簡為2個），只計算選中的子頁籤 =====
+    efficiency_subtab = select_lazy_tab([
         "📊 檢驗效率總覽",
         "👤 能力分析"
-    ])
+    ], key="efficiency_subtab")
     
     # ==========================================
     # 第一個子頁籤：檢驗效率總覽
     # ==========================================
-    with subtab1:
+    if efficiency_subtab == 0:
         # 極值剔除設定（改為摺疊面板）
         with st.expander("🎛️ 效率分析設定", expanded=False):
         
@@ -3816,9 +2642,12 @@ def render_efficiency_dashboard(efficiency_data, processed_data=None):
                     debug_log(f"使用資料行數: {len(processed_data)}", level="INFO")
                     
                     # 使用極值剔除方法重新計算效率
-                    overall_efficiency_ranking = calculate_efficiency_with_trimming(
-                        processed_data,  # 這裡是關鍵，確保使用的是日期篩選後的數據
-                        current_trim
+                    overall_efficiency_ranking = get_versioned_metric(
+                        'efficiency_trimming', get_processed_data_version(), (current_trim,),
+                        lambda: calculate_efficiency_with_trimming(
+                            processed_data,  # 這裡是關鍵，確保使用的是日期篩選後的數據
+                            current_trim
+                        )
                     )
                     
                     # 將新計算的效率排名保存回session_state
@@ -3962,7 +2791,10 @@ def render_efficiency_dashboard(efficiency_data, processed_data=None):
             </p>
         </div>
         """, unsafe_allow_html=True)
-        
+    
+    # 人員物料類別效率分析 - 以 fragment 執行，切換檢驗員或時間粒度只重新執行本區塊
+    @dashboard_fragment
+    def render_inspector_category_section():
         # 獲取檢驗員列表
         inspector_list_for_cat = overall_efficiency_ranking['inspector'].tolist()
         
@@ -3980,10 +2812,14 @@ def render_efficiency_dashboard(efficiency_data, processed_data=None):
                 current_trim_percentage = st.session_state.get('trim_percentage', 0.0)
                 
                 # 計算該檢驗員的各物料大類別效率（套用極值剔除）
-                inspector_category_data = calculate_inspector_category_efficiency(
-                    processed_data, 
-                    selected_inspector_cat,
-                    trim_percentage=current_trim_percentage
+                inspector_category_data = get_versioned_metric(
+                    'inspector_category_efficiency', get_processed_data_version(),
+                    (selected_inspector_cat, current_trim_percentage),
+                    lambda: calculate_inspector_category_efficiency(
+                        processed_data, 
+                        selected_inspector_cat,
+                        trim_percentage=current_trim_percentage
+                    )
                 )
                 
                 # 如果有使用極值剔除，顯示提示
@@ -4475,10 +3311,13 @@ def render_efficiency_dashboard(efficiency_data, processed_data=None):
             else:
                 st.info("請先處理資料")
     
+    if efficiency_subtab == 0:
+        render_inspector_category_section()
+    
     # ==========================================
     # 第二個子頁籤：能力分析
     # ==========================================
-    with subtab2:
+    if efficiency_subtab == 1:
         st.markdown("""
         <div style="background: linear-gradient(135deg, #667eea20 0%, #764ba220 100%); padding: 15px 20px; border-radius: 8px; margin-bottom: 20px; border-left: 4px solid #667eea;">
             <p style="margin: 0; color: #333; font-size: 14px;">
@@ -4652,6 +3491,7 @@ def render_efficiency_dashboard(efficiency_data, processed_data=None):
 
 def render_category_efficiency_chart(df, category_name, max_display_value=5):
     """渲染物料類別效率圖表，包含顏色標籤"""
+    import plotly.graph_objects as go
     
     # 手動設置顏色
     colors = []
@@ -4732,51 +3572,6 @@ def render_category_efficiency_chart(df, category_name, max_display_value=5):
     return fig
 
 
-def display_category_details(df):
-    """顯示類別效率數據明細的輔助函數"""
-    # 確保所有必要的列都存在
-    if 'inspector' in df.columns and 'efficiency' in df.columns and 'record_count' in df.columns:
-        columns_to_display = ['inspector', 'efficiency', 'record_count']
-        column_names = ['檢驗員', '效率', '紀錄筆數']
-        
-        # 如果有標準工時和實際耗時的資訊，也顯示出來
-        if 'total_standard_time' in df.columns and 'total_actual_time' in df.columns:
-            columns_to_display.extend(['total_standard_time', 'total_actual_time'])
-            column_names.extend(['標準工時總和(分鐘)', '實際耗時總和(分鐘)'])
-        
-        display_df = df[columns_to_display].copy()
-        display_df.columns = column_names
-        
-        # 格式化數值
-        if '效率' in display_df.columns:
-            display_df['效率'] = display_df['效率'].round(2)
-        if '標準工時總和(分鐘)' in display_df.columns:
-            display_df['標準工時總和(分鐘)'] = display_df['標準工時總和(分鐘)'].round(0)
-        if '實際耗時總和(分鐘)' in display_df.columns:
-            display_df['實際耗時總和(分鐘)'] = display_df['實際耗時總和(分鐘)'].round(0)
-        
-        # 根據效率值添加背景色
-        def highlight_efficiency(val):
-            if val < 1:
-                # 效率<1，使用紅色漸變
-                red_intensity = max(70, 255 - int((1 - val) * 180))
-                return f'background-color: rgba({red_intensity}, 0, 0, 0.3)'
-            else:
-                # 效率>=1，使用藍色漸變
-                blue_intensity = max(70, 255 - int((val - 1) * 50))
-                return f'background-color: rgba(0, 0, {blue_intensity}, 0.3)'
-        
-        # 應用樣式
-        styled_df = display_df.style.applymap(
-            highlight_efficiency, 
-            subset=['效率']
-        )
-        
-        st.dataframe(styled_df, use_container_width=True)
-    else:
-        st.write("數據格式不正確，無法顯示詳細資訊")
-
-
 # 計算物料類別效率的獨立函數 (不影響總效率)
 def calculate_category_efficiency(processed_df, selected_categories, merge_categories):
     if processed_df is None or processed_df.empty or not selected_categories:
@@ -4873,7 +3668,9 @@ def calculate_category_efficiency(processed_df, selected_categories, merge_categ
 
 def calculate_mrb_statistics(processed_data, start_date=None, end_date=None):
     """
-    計算MRB統計數據，統一基於'MRB加時 > 0'判斷MRB狀態
+    計算MRB統計數據，統一使用MRB統計引擎的標準MRB判定
+
+    返回的 dict 除總體統計外，另含 inspector/category/daily 三張MRB率表
     """
     if processed_data is None or processed_data.empty:
         return None
@@ -4884,27 +3681,18 @@ def calculate_mrb_statistics(processed_data, start_date=None, end_date=None):
     if filtered_data.empty:
         return None
     
-    # 確保有MRB加時欄位
-    if 'MRB加時' not in filtered_data.columns:
+    # 確保有MRB相關欄位
+    if not any(col in filtered_data.columns for col in [MRB_FLAG_COLUMN, 'MRB加時', '是否為MRB']):
         return None
     
-    # 統一使用MRB加時判斷MRB狀態
-    is_mrb = filtered_data['MRB加時'] > 0
-    
-    # 計算MRB統計
-    total_count = len(filtered_data)
-    mrb_count = is_mrb.sum()
-    mrb_rate = mrb_count / total_count if total_count > 0 else 0
-    
-    return {
-        'mrb_rate': mrb_rate,
-        'mrb_count': mrb_count,
-        'total_count': total_count,
-        'filtered_data': filtered_data  # 保存過濾後的數據供後續分析
-    }
+    mrb_tables = calculate_mrb_rate_tables(filtered_data)
+    mrb_tables['filtered_data'] = filtered_data  # 保存過濾後的數據供後續分析
+    return mrb_tables
 
 def render_mrb_analysis_dashboard(processed_data, start_date=None, end_date=None):
     """顯示MRB分析儀表板，基於MRB加時判斷MRB狀態，確保每次都重新計算結果"""
+    import plotly.express as px
+    
     if processed_data is None or processed_data.empty:
         st.error("沒有可用的數據來進行MRB分析")
         return
@@ -4928,33 +3716,18 @@ def render_mrb_analysis_dashboard(processed_data, start_date=None, end_date=None
         st.warning(f"所選時間區段 ({start_date} 到 {end_date}) 內沒有數據")
         return
     
-    # 計算MRB統計
-    total_count = len(filtered_data)
-    
-    # 使用MRB加時>0來判斷MRB狀態
-    if 'MRB加時' in filtered_data.columns:
-        mrb_count = (filtered_data['MRB加時'] > 0).sum()
-    elif '是否為MRB' in filtered_data.columns:
-        # 備用方法：使用是否為MRB欄位
-        if filtered_data['是否為MRB'].dtype == 'object':
-            mrb_count = filtered_data['是否為MRB'].apply(
-                lambda x: True if str(x).upper() in ['TRUE', 'MRB'] else False
-            ).sum()
-        else:
-            mrb_count = filtered_data['是否為MRB'].sum()
-    else:
+    # 計算MRB統計 - 一次產生總體、每日、人員、類別的MRB率表
+    if not any(col in filtered_data.columns for col in [MRB_FLAG_COLUMN, 'MRB加時', '是否為MRB']):
         st.warning("數據中缺少MRB相關欄位，無法計算MRB率")
         return
     
-    mrb_rate = mrb_count / total_count if total_count > 0 else 0
+    mrb_tables = calculate_mrb_rate_tables(filtered_data)
+    mrb_rate = mrb_tables['mrb_rate']
+    mrb_count = mrb_tables['mrb_count']
+    total_count = mrb_tables['total_count']
     
     # 將計算結果保存到session state以供其他頁面使用
-    st.session_state.mrb_analysis_results = {
-        'mrb_rate': mrb_rate,
-        'mrb_count': mrb_count,
-        'total_count': total_count,
-        'filtered_data': filtered_data
-    }
+    st.session_state.mrb_analysis_results = dict(mrb_tables, filtered_data=filtered_data)
     
     # 顯示MRB統計
     col1, col2, col3 = st.columns(3)
@@ -4974,62 +3747,14 @@ def render_mrb_analysis_dashboard(processed_data, start_date=None, end_date=None
     # 確保日期欄位
     date_column = '檢驗日期' if '檢驗日期' in filtered_data.columns else '日期'
     if date_column in filtered_data.columns:
-        # 將日期轉換為datetime
-        filtered_data[date_column] = pd.to_datetime(filtered_data[date_column])
-        
-        # 按日期分組計算MRB率
-        daily_stats = []
-        for date, group in filtered_data.groupby(pd.Grouper(key=date_column, freq='D')):
-            if len(group) > 0:  # 跳過沒有數據的日期
-                # 使用MRB加時>0判斷MRB
-                if 'MRB加時' in group.columns:
-                    group_mrb_count = (group['MRB加時'] > 0).sum()
-                elif '是否為MRB' in group.columns:
-                    group_mrb_count = group['是否為MRB'].sum()
-                else:
-                    continue
-                    
-                group_total = len(group)
-                group_mrb_rate = group_mrb_count / group_total
-                
-                daily_stats.append({
-                    '日期': date,
-                    'MRB率': group_mrb_rate,
-                    'MRB數量': group_mrb_count,
-                    '總筆數': group_total
-                })
-        
-        # 繪製趨勢圖
-        if daily_stats:
-            daily_df = pd.DataFrame(daily_stats)
-            
-            fig = px.line(
-                daily_df,
-                x='日期',
-                y='MRB率',
-                markers=True,
-                labels={'日期': '日期', 'MRB率': 'MRB率'},
-                title="每日MRB率趨勢",
-                height=400
-            )
-            
-            # 添加MRB數量作為懸浮提示，使用自定義格式
-            fig.update_traces(
-                hovertemplate='日期: %{x}<br>MRB率: %{y:.2%}<br>MRB數量: %{text}<br>總筆數: %{customdata}',
-                text=daily_df['MRB數量'],
-                customdata=daily_df['總筆數']
-            )
-            
-            # 設置Y軸為百分比格式
-            fig.update_layout(
-                yaxis=dict(
-                    tickformat=".0%",
-                    title="MRB率"
-                ),
-                xaxis_title="日期"
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
+        # 每日MRB率表 (已跳過沒有數據的日期)
+        daily_df = mrb_tables['daily'].rename(columns={'總檢驗筆數': '總筆數'})
+        
+        # 繪製趨勢圖 (依日期跨度自動改用週/月粒度，避免長區間送出過多點)
+        if not daily_df.empty:
+            granularity = select_trend_granularity("mrb_trend_granularity")
+            trend_df, period = bucket_mrb_trend(daily_df, granularity)
+            st.plotly_chart(build_mrb_trend_figure(trend_df, period), use_container_width=True)
         else:
             st.info("沒有足夠的數據來繪製趨勢圖")
     
@@ -5039,30 +3764,11 @@ def render_mrb_analysis_dashboard(processed_data, start_date=None, end_date=None
     # 按檢驗員分組計算MRB率
     inspector_column = '處理後檢驗員' if '處理後檢驗員' in filtered_data.columns else '檢驗員'
     if inspector_column in filtered_data.columns:
-        inspector_stats = []
-        for inspector, group in filtered_data.groupby(inspector_column):
-            inspector_total = len(group)
-            # 使用MRB加時>0判斷MRB
-            if 'MRB加時' in group.columns:
-                inspector_mrb_count = (group['MRB加時'] > 0).sum()
-            elif '是否為MRB' in group.columns:
-                inspector_mrb_count = group['是否為MRB'].sum()
-            else:
-                continue
-                
-            inspector_mrb_rate = inspector_mrb_count / inspector_total if inspector_total > 0 else 0
-            
-            inspector_stats.append({
-                '檢驗員': inspector,
-                'MRB數量': inspector_mrb_count,
-                '總檢驗筆數': inspector_total,
-                'MRB率': inspector_mrb_rate
-            })
+        # 檢驗員MRB率表 (已按MRB率排序)
+        inspector_df = mrb_tables['inspector']
         
         # 繪製條形圖
-        if inspector_stats:
-            inspector_df = pd.DataFrame(inspector_stats)
-            inspector_df = inspector_df.sort_values('MRB率', ascending=False)
+        if not inspector_df.empty:
             
             fig = px.bar(
                 inspector_df,
@@ -5108,30 +3814,11 @@ def render_mrb_analysis_dashboard(processed_data, start_date=None, end_date=None
     if '類別' in filtered_data.columns:
         st.subheader("物料類別MRB率📈")
         
-        category_stats = []
-        for category, group in filtered_data.groupby('類別'):
-            category_total = len(group)
-            # 使用MRB加時>0判斷MRB
-            if 'MRB加時' in group.columns:
-                category_mrb_count = (group['MRB加時'] > 0).sum()
-            elif '是否為MRB' in group.columns:
-                category_mrb_count = group['是否為MRB'].sum()
-            else:
-                continue
-                
-            category_mrb_rate = category_mrb_count / category_total if category_total > 0 else 0
-            
-            category_stats.append({
-                '物料類別': category,
-                'MRB數量': category_mrb_count,
-                '總檢驗筆數': category_total,
-                'MRB率': category_mrb_rate
-            })
+        # 物料類別MRB率表 (已按MRB率排序)
+        category_df = mrb_tables['category']
         
         # 繪製條形圖
-        if category_stats:
-            category_df = pd.DataFrame(category_stats)
-            category_df = category_df.sort_values('MRB率', ascending=False)
+        if not category_df.empty:
             
             fig = px.bar(
                 category_df,
@@ -5178,14 +3865,8 @@ def calculate_overall_mrb_rate(data):
     計算並顯示總體MRB率
     """
     total_count = len(data)
-    # 確保將MRB欄位轉換為布林值
-    if data['是否為MRB'].dtype == 'object':
-        mrb_count = data['是否為MRB'].apply(
-            lambda x: True if isinstance(x, str) and x.lower() in ['true', 'mrb'] else 
-                       (True if x is True else False)
-        ).sum()
-    else:
-        mrb_count = data['是否為MRB'].sum()
+    # 使用標準MRB判定
+    mrb_count = int(derive_mrb_flag(data).sum())
     
     mrb_rate = mrb_count / total_count if total_count > 0 else 0
     
@@ -5212,61 +3893,23 @@ def plot_daily_mrb_trend(data):
         st.warning("數據中缺少日期欄位，無法繪製趨勢圖")
         return
     
-    # 將日期轉換為datetime
-    data[date_column] = pd.to_datetime(data[date_column])
-    
-    # 按日期分組計算MRB率
-    daily_stats = []
-    for date, group in data.groupby(pd.Grouper(key=date_column, freq='D')):
-        if len(group) > 0:  # 跳過沒有數據的日期
-            mrb_count = group['是否為MRB'].sum()
-            total_count = len(group)
-            mrb_rate = mrb_count / total_count
-            daily_stats.append({
-                '日期': date,
-                'MRB率': mrb_rate,
-                'MRB數量': mrb_count,
-                '總筆數': total_count
-            })
+    # 按日期分組計算MRB率 (跳過沒有數據的日期)
+    daily_df = calculate_mrb_rate_tables(data)['daily'].rename(columns={'總檢驗筆數': '總筆數'})
     
-    if not daily_stats:
+    if daily_df.empty:
         st.info("所選時間區段內沒有每日MRB數據")
         return
     
-    daily_df = pd.DataFrame(daily_stats)
-    
-    # 繪製折線圖
-    fig = px.line(
-        daily_df,
-        x='日期',
-        y='MRB率',
-        markers=True,
-        labels={'日期': '日期', 'MRB率': 'MRB率'},
-        title="每日MRB率趨勢",
-        height=400
-    )
-    
-    # 添加MRB數量作為懸浮提示
-    fig.update_traces(
-        hovertemplate='日期: %{x}<br>MRB率: %{y:.2%}<br>MRB數量: %{customdata[0]}<br>總筆數: %{customdata[1]}',
-        customdata=daily_df[['MRB數量', '總筆數']].values
-    )
-    
-    # 設置Y軸為百分比格式
-    fig.update_layout(
-        yaxis=dict(
-            tickformat=".0%",
-            title="MRB率"
-        ),
-        xaxis_title="日期"
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
+    # 繪製折線圖 (依日期跨度自動改用週/月粒度)
+    trend_df, period = bucket_mrb_trend(daily_df)
+    st.plotly_chart(build_mrb_trend_figure(trend_df, period), use_container_width=True)
 
 def show_inspector_mrb_rates(data):
     """
     顯示IQC人員MRB率
     """
+    import plotly.express as px
+    
     st.subheader("IQC人員MRB率")
     
     # 確保有檢驗員欄位
@@ -5275,23 +3918,8 @@ def show_inspector_mrb_rates(data):
         st.warning("數據中缺少檢驗員欄位，無法顯示人員MRB率")
         return
     
-    # 計算每位檢驗員的MRB率
-    mrb_stats = []
-    for inspector, group in data.groupby(inspector_column):
-        total_count = len(group)
-        mrb_count = group['是否為MRB'].sum()
-        mrb_rate = mrb_count / total_count if total_count > 0 else 0
-        
-        mrb_stats.append({
-            '檢驗員': inspector,
-            'MRB數量': mrb_count,
-            '總檢驗筆數': total_count,
-            'MRB率': mrb_rate
-        })
-    
-    # 轉換為DataFrame並按MRB率排序
-    mrb_rate_df = pd.DataFrame(mrb_stats)
-    mrb_rate_df = mrb_rate_df.sort_values('MRB率', ascending=False)
+    # 計算每位檢驗員的MRB率 (已按MRB率排序)
+    mrb_rate_df = calculate_mrb_rate_table(data, inspector_column, '檢驗員')
     
     # 創建MRB率條形圖
     fig = px.bar(
@@ -5346,6 +3974,8 @@ def show_material_category_mrb_rates(data):
     """
     顯示物料類別MRB率
     """
+    import plotly.express as px
+    
     st.subheader("物料類別MRB率")
     
     # 確保有類別欄位
@@ -5353,24 +3983,8 @@ def show_material_category_mrb_rates(data):
         st.warning("數據中缺少'類別'欄位，無法顯示物料類別MRB率")
         return
     
-    # 計算每個物料類別的MRB率
-    category_stats = []
-    for category, group in data.groupby('類別'):
-        if pd.notna(category) and category != '':  # 排除空類別
-            total_count = len(group)
-            mrb_count = group['是否為MRB'].sum()
-            mrb_rate = mrb_count / total_count if total_count > 0 else 0
-            
-            category_stats.append({
-                '物料類別': category,
-                'MRB數量': mrb_count,
-                '總檢驗筆數': total_count,
-                'MRB率': mrb_rate
-            })
-    
-    # 轉換為DataFrame並按MRB率排序
-    cat_mrb_rate_df = pd.DataFrame(category_stats)
-    cat_mrb_rate_df = cat_mrb_rate_df.sort_values('MRB率', ascending=False)
+    # 計算每個物料類別的MRB率 (排除空類別，已按MRB率排序)
+    cat_mrb_rate_df = calculate_mrb_rate_tables(data)['category']
     
     # 創建MRB率條形圖
     fig = px.bar(
@@ -5488,68 +4102,59 @@ def calculate_capability_metrics(processed_data, efficiency_data, workload_data,
     5. 配合度 (Support): 額外任務佔比
     """
     try:
-        # 取得所有檢驗員列表
-        inspectors = processed_data['處理後檢驗員'].unique()
-        
-        capability_list = []
-        
-        for inspector in inspectors:
-            inspector_data = processed_data[processed_data['處理後檢驗員'] == inspector]
-            
-            # 1. 速度 - 加權效率（總標準工時/總實際耗時）- 與檢驗效率監控一致
-            total_standard_time = inspector_data['處理後檢驗標準工時'].sum() if '處理後檢驗標準工時' in inspector_data.columns else 0
-            total_actual_time = inspector_data['檢驗耗時'].sum() if '檢驗耗時' in inspector_data.columns else 0
-            if total_actual_time > 0.1:
-                speed = min(total_standard_time / total_actual_time, 20)  # 上限20
-            else:
-                speed = 1.0
-            
-            # 2. 嚴謹度 - MRB開立率
-            total_lots = len(inspector_data)
-            # MRB狀態欄位值為 'MRB' 或 'Normal inspection'
-            mrb_lots = len(inspector_data[inspector_data['MRB狀態'] == 'MRB']) if 'MRB狀態' in inspector_data.columns else 0
-            rigor = (mrb_lots / total_lots * 100) if total_lots > 0 else 0
-            
-            # 3. 穩定度 - 效率標準差的倒數（標準化到0-100）
-            efficiency_std = inspector_data['效率比值'].std() if '效率比值' in inspector_data.columns else 0.5
-            # 避免除以零，標準差越小穩定度越高
-            stability = 100 / (1 + efficiency_std * 2) if efficiency_std > 0 else 100
-            
-            # 4. 負載力 - 總檢驗工時佔比
-            inspector_hours = inspector_data['處理後檢驗標準工時'].sum() if '處理後檢驗標準工時' in inspector_data.columns else 0
-            total_hours = processed_data['處理後檢驗標準工時'].sum() if '處理後檢驗標準工時' in processed_data.columns else 1
-            capacity = (inspector_hours / total_hours * 100) if total_hours > 0 else 0
-            
-            # 5. 配合度 - 額外任務時間佔比
-            support = 0
-            if additional_tasks_data is not None and not additional_tasks_data.empty:
-                inspector_col = 'inspector' if 'inspector' in additional_tasks_data.columns else '檢驗員'
-                if inspector_col in additional_tasks_data.columns:
-                    inspector_tasks = additional_tasks_data[additional_tasks_data[inspector_col] == inspector]
-                    time_col = 'total_time' if 'total_time' in additional_tasks_data.columns else '總時間'
-                    if time_col in inspector_tasks.columns:
-                        inspector_task_time = inspector_tasks[time_col].sum()
-                        total_task_time = additional_tasks_data[time_col].sum()
-                        support = (inspector_task_time / total_task_time * 100) if total_task_time > 0 else 0
-            
-            # 計算檢驗批數
-            lot_count = total_lots
-            
-            capability_list.append({
-                '檢驗員': inspector,
-                '檢驗批數': lot_count,
-                '速度': round(speed, 2),
-                '嚴謹度': round(rigor, 1),
-                '穩定度': round(stability, 1),
-                '負載力': round(capacity, 1),
-                '配合度': round(support, 1),
-                'MRB批數': mrb_lots,
-                '效率標準差': round(efficiency_std, 3) if efficiency_std else 0,
-                '總標準工時': round(total_standard_time, 0),
-                '總實際耗時': round(total_actual_time, 0)
-            })
+        has_efficiency_ratio = '效率比值' in processed_data.columns
+        
+        # 與四象限分析共用的檢驗員彙總 (單次 groupby)，維持資料中檢驗員出現順序
+        # 2. 嚴謹度使用MRB統計引擎的標準MRB判定
+        inspector_stats = calculate_inspector_quality_stats(processed_data).set_index('處理後檢驗員')
+        inspector_stats = inspector_stats.reindex(processed_data['處理後檢驗員'].dropna().unique())
+        grouped = pd.DataFrame({
+            'total_lots': inspector_stats['檢驗批數'],
+            'total_standard_time': inspector_stats['總標準工時'],
+            'total_actual_time': inspector_stats['總實際耗時'],
+            'mrb_lots': inspector_stats['MRB批數'].astype(int),
+            'efficiency_std': inspector_stats['效率標準差']
+        })
         
-        capability_df = pd.DataFrame(capability_list)
+        # 1. 速度 - 加權效率（總標準工時/總實際耗時）- 與檢驗效率監控一致，上限20
+        speed = (grouped['total_standard_time'] / grouped['total_actual_time']).clip(upper=20)
+        speed = speed.where(grouped['total_actual_time'] > 0.1, 1.0)
+        
+        # 2. 嚴謹度 - MRB開立率
+        rigor = grouped['mrb_lots'] / grouped['total_lots'] * 100
+        
+        # 3. 穩定度 - 效率標準差的倒數（標準化到0-100），標準差越小穩定度越高
+        efficiency_std = grouped['efficiency_std'] if has_efficiency_ratio else pd.Series(0.5, index=grouped.index)
+        stability = (100 / (1 + efficiency_std * 2)).where(efficiency_std > 0, 100)
+        
+        # 4. 負載力 - 總檢驗工時佔比 (團隊總工時只計算一次)
+        total_hours = pd.to_numeric(processed_data['處理後檢驗標準工時'], errors='coerce').sum()
+        capacity = grouped['total_standard_time'] / total_hours * 100 if total_hours > 0 else pd.Series(0.0, index=grouped.index)
+        
+        # 5. 配合度 - 額外任務時間佔比
+        support = pd.Series(0.0, index=grouped.index)
+        if additional_tasks_data is not None and not additional_tasks_data.empty:
+            inspector_col = 'inspector' if 'inspector' in additional_tasks_data.columns else '檢驗員'
+            time_col = 'total_time' if 'total_time' in additional_tasks_data.columns else '總時間'
+            if inspector_col in additional_tasks_data.columns and time_col in additional_tasks_data.columns:
+                task_time = additional_tasks_data.groupby(inspector_col)[time_col].sum()
+                total_task_time = task_time.sum()
+                if total_task_time > 0:
+                    support = (task_time.reindex(grouped.index, fill_value=0) / total_task_time * 100)
+        
+        capability_df = pd.DataFrame({
+            '檢驗員': grouped.index,
+            '檢驗批數': grouped['total_lots'].to_numpy(),
+            '速度': speed.round(2).to_numpy(),
+            '嚴謹度': rigor.round(1).to_numpy(),
+            '穩定度': stability.round(1).to_numpy(),
+            '負載力': capacity.round(1).to_numpy(),
+            '配合度': support.round(1).to_numpy(),
+            'MRB批數': grouped['mrb_lots'].to_numpy(),
+            '效率標準差': efficiency_std.round(3).to_numpy(),
+            '總標準工時': grouped['total_standard_time'].round(0).to_numpy(),
+            '總實際耗時': grouped['total_actual_time'].round(0).to_numpy()
+        })
         
         # 計算綜合評分（加權平均，標準化到0-100）
         if not capability_df.empty:
@@ -5570,7 +4175,7 @@ def calculate_capability_metrics(processed_data, efficiency_data, workload_data,
             ).round(1)
             
             # 評級
-            capability_df['評級'] = capability_df['綜合評分'].apply(get_capability_grade)
+            capability_df['評級'] = get_capability_grade(capability_df['綜合評分'])
         
         return capability_df
         
@@ -5580,34 +4185,50 @@ def calculate_capability_metrics(processed_data, efficiency_data, workload_data,
 
 
 def normalize_score(series, higher_better=True):
-    """將數值標準化到 0-100 範圍"""
-    if series.max() == series.min():
-        return pd.Series([50] * len(series))
+    """將數值向量化標準化到 0-100 範圍"""
+    series_min = series.min()
+    series_max = series.max()
+    if series_max == series_min:
+        return pd.Series(50.0, index=series.index)
     
     if higher_better:
-        normalized = (series - series.min()) / (series.max() - series.min()) * 100
+        normalized = (series - series_min) / (series_max - series_min) * 100
     else:
-        normalized = (series.max() - series) / (series.max() - series.min()) * 100
+        normalized = (series_max - series) / (series_max - series_min) * 100
     
     return normalized.round(1)
 
 
+# 綜合評分門檻與對應評級 (由高到低)
+CAPABILITY_GRADES = [
+    (80, "⭐⭐⭐⭐⭐ 卓越"),
+    (65, "⭐⭐⭐⭐ 優秀"),
+    (50, "⭐⭐⭐ 良好"),
+    (35, "⭐⭐ 待提升")
+]
+
 def get_capability_grade(score):
-    """根據綜合評分給予評級"""
-    if score >= 80:
-        return "⭐⭐⭐⭐⭐ 卓越"
-    elif score >= 65:
-        return "⭐⭐⭐⭐ 優秀"
-    elif score >= 50:
-        return "⭐⭐⭐ 良好"
-    elif score >= 35:
-        return "⭐⭐ 待提升"
-    else:
-        return "⭐ 需關注"
+    """根據綜合評分給予評級，支援單一數值或整個 Series"""
+    if isinstance(score, pd.Series):
+        return pd.Series(
+            np.select(
+                [score >= threshold for threshold, _ in CAPABILITY_GRADES],
+                [grade for _, grade in CAPABILITY_GRADES],
+                default="⭐ 需關注"
+            ),
+            index=score.index
+        )
+    
+    for threshold, grade in CAPABILITY_GRADES:
+        if score >= threshold:
+            return grade
+    return "⭐ 需關注"
 
 
 def render_team_capability_matrix(capability_data):
     """渲染團隊能力熱力圖矩陣"""
+    import plotly.graph_objects as go
+    
     st.subheader("📊 團隊能力矩陣")
     st.markdown("一眼看出每位成員的能力強弱項，顏色越深表現越好")
     
@@ -5713,6 +4334,8 @@ def render_team_capability_matrix(capability_data):
 
 def render_individual_radar_chart(capability_data, processed_data):
     """渲染個人雷達圖分析"""
+    import plotly.graph_objects as go
+    
     st.subheader("🎯 個人能力雷達圖")
     
     # 選擇檢驗員
@@ -5896,8 +4519,11 @@ def render_individual_radar_chart(capability_data, processed_data):
             st.markdown("</div>", unsafe_allow_html=True)
 
 
+@dashboard_fragment
 def render_capability_trend(processed_data, workload_data):
     """渲染能力趨勢追蹤"""
+    import plotly.express as px
+    
     st.subheader("📈 效率趨勢追蹤")
     st.markdown("追蹤檢驗員的效率變化趨勢")
     
@@ -5963,21 +4589,17 @@ def render_capability_trend(processed_data, workload_data):
         st.info("請選擇至少一位檢驗員")
         return
     
-    # 準備趨勢數據
-    trend_data = processed_data[processed_data['處理後檢驗員'].isin(selected_inspectors)].copy()
-    
-    if '檢驗日期' not in trend_data.columns:
+    if '檢驗日期' not in processed_data.columns:
         st.warning("缺少日期欄位，無法繪製趨勢圖")
         return
     
-    trend_data['檢驗日期'] = pd.to_datetime(trend_data['檢驗日期'])
-    
-    # 按週計算平均效率
-    trend_data['週'] = trend_data['檢驗日期'].dt.to_period('W').dt.start_time
-    
-    weekly_efficiency = trend_data.groupby(['處理後檢驗員', '週']).agg({
-        '效率比值': 'mean'
-    }).reset_index()
+    # 按週計算平均效率 - 所有檢驗員的週趨勢只計算一次，之後僅篩選選取的人員
+    weekly_table = get_efficiency_trend_table(processed_data, 'W')
+    weekly_efficiency = weekly_table[weekly_table['inspector'].isin(selected_inspectors)].rename(columns={
+        'inspector': '處理後檢驗員',
+        'date': '週',
+        'avg_efficiency_ratio': '效率比值'
+    })[['處理後檢驗員', '週', '效率比值']]
     
     # 創建趨勢圖
     fig_trend = px.line(
@@ -6046,59 +4668,36 @@ def render_capability_trend(processed_data, workload_data):
             st.plotly_chart(fig_workload, use_container_width=True)
 
 
-def render_workload_dashboard(workload_data):
-    if workload_data is None or workload_data.empty:
-        st.error("沒有可用的工作負載數據，請確保上傳了正確的檔案格式或檢查過濾條件。")
-        return
-    
-    # 過濾工作負載數據 - 排除指定檢驗員
-    workload_data = filter_excluded_inspectors(workload_data, inspector_column='inspector')
-    
-    if workload_data.empty:
-        st.warning("過濾後沒有可用的工作負載數據。")
-        return
-    
-    st.header("⏱️ IQC人員工作負載監控")
+def build_workload_heatmap_figure(workload_data):
+    """
+    建立IQC人員工作負載指數熱力圖，依日期跨度自動以日/週/月為單位
+
+    參數:
+    workload_data - 已排除指定檢驗員的工作負載數據
+
+    返回:
+    Plotly Figure
+    """
+    import plotly.express as px
     
-    # 使用熱力圖顯示工作負載指數趨勢
-    st.subheader("IQC人員工作負載指數趨勢 (使用標準檢驗工時計算)")
+    workload_data = workload_data.copy()
     
-    # 將數據整理成熱力圖所需格式
     # 將日期轉為日期時間類型
     workload_data['date'] = pd.to_datetime(workload_data['date'])
     
-    # 檢查日期範圍，如果超過2個月則以週為單位顯示
-    date_range = (workload_data['date'].max() - workload_data['date'].min()).days
-    use_weekly_view = date_range > 60  # 超過60天（約2個月）使用週視圖
+    # 依日期跨度自動選擇粒度：60天內以日、一年內以週、更長以月為單位顯示
+    period = choose_time_bucket(workload_data['date'])
+    workload_data['period_start'] = _period_start(workload_data['date'], period)
     
-    if use_weekly_view:
-        # 創建週標識，格式為"年-週號"
-        workload_data['week'] = workload_data['date'].dt.strftime('%Y-%U')
-        # 取每週的第一天作為標籤
-        week_start_dates = workload_data.groupby('week')['date'].min().reset_index()
-        week_mapping = dict(zip(week_start_dates['week'], week_start_dates['date']))
-        
-        # 使用週分組創建透視表
-        pivot_data = workload_data.groupby(['inspector', 'week'])['workload_index'].mean().unstack(fill_value=0)
-        
-        # 按週開始日期對列進行排序
-        week_order = sorted(week_mapping.items(), key=lambda x: x[1])
-        ordered_weeks = [w[0] for w in week_order]
-        pivot_data = pivot_data[ordered_weeks]
-        
-        # 創建X軸標籤（週開始日期的月/日格式）
-        x_labels = [week_mapping[week].strftime('%m/%d') for week in ordered_weeks]
-    else:
-        # 正常日期視圖的透視表
-        pivot_data = workload_data.pivot_table(
-            index='inspector', 
-            columns='date', 
-            values='workload_index',
-            aggfunc='mean'  # 如果同一天有多個值，取平均值
-        ).fillna(0)
-        
-        # 使用日期作為X軸標籤
-        x_labels = pivot_data.columns.strftime('%m/%d')
+    pivot_data = workload_data.pivot_table(
+        index='inspector', 
+        columns='period_start', 
+        values='workload_index',
+        aggfunc='mean'  # 同一期間有多個值時取平均值
+    ).fillna(0)
+    
+    # 使用期間開始日期作為X軸標籤
+    x_labels = pivot_data.columns.strftime('%Y/%m' if period == 'M' else '%m/%d')
     
     # 重新排序行，按平均工作負載降序
     row_means = pivot_data.mean(axis=1)
@@ -6131,7 +4730,29 @@ def render_workload_dashboard(workload_data):
         margin=dict(l=50, r=50, t=50, b=50)
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+def render_workload_dashboard(workload_data):
+    import plotly.express as px
+    
+    if workload_data is None or workload_data.empty:
+        st.error("沒有可用的工作負載數據，請確保上傳了正確的檔案格式或檢查過濾條件。")
+        return
+    
+    # 過濾工作負載數據 - 排除指定檢驗員
+    workload_data = filter_excluded_inspectors(workload_data, inspector_column='inspector')
+    
+    if workload_data.empty:
+        st.warning("過濾後沒有可用的工作負載數據。")
+        return
+    
+    st.header("⏱️ IQC人員工作負載監控")
+    
+    # 使用熱力圖顯示工作負載指數趨勢
+    st.subheader("IQC人員工作負載指數趨勢 (使用標準檢驗工時計算)")
+    
+    # 熱力圖依資料版本快取，其他元件觸發的重新執行不必重建
+    plot_cached_plotly('workload_heatmap', (), lambda: build_workload_heatmap_figure(workload_data), use_container_width=True)
     
     # 顯示各檢驗員的平均工作負載
     st.subheader("各檢驗員平均工作負載⏳ ")
@@ -6717,29 +5338,9 @@ def render_category_mrb_rate_chart(cat_mrb_rate_df):
 
 
 # 4. 修改時間分配概覽，使其默認摺疊
-def render_time_allocation_dashboard(time_allocation_data):
-    if time_allocation_data is None or time_allocation_data.empty:
-        st.error("沒有可用的時間分配數據，請確保上傳了正確的檔案格式或檢查過濾條件。")
-        return
-    
-    # 過濾時間分配數據 - 排除指定檢驗員
-    time_allocation_data = filter_excluded_inspectors(time_allocation_data, inspector_column='inspector')
-    
-    if time_allocation_data.empty:
-        st.warning("過濾後沒有可用的時間分配數據。")
-        return
-    
-    st.header("⚖️ IQC人員時間分配監控")
-    
-    # 檢查資料結構，確認有必要的欄位
-    required_cols = ['inspector', 'inspection_ratio', 'additional_task_ratio', 'task_detail_ratios']
-    for col in required_cols:
-        if col not in time_allocation_data.columns:
-            st.error(f"時間分配數據缺少必要欄位: {col}")
-            return
-    
-    # 1. 首先顯示額外任務時間比例排名 (由高到低)
-    st.subheader("額外任務時間比例排名🔖")
+def build_additional_task_ranking_figure(time_allocation_data):
+    """建立各檢驗員額外任務時間比例排名條形圖"""
+    import plotly.express as px
     
     # 計算和準備數據
     additional_task_ranking = time_allocation_data[['inspector', 'additional_task_ratio', 'total_time']].copy()
@@ -6766,13 +5367,45 @@ def render_time_allocation_dashboard(time_allocation_data):
         height=400
     )
     
-    # 添加文字標籤
-    fig_ranking.update_traces(
-        texttemplate='%{y:.1%}',
-        textposition='outside'
-    )
+    # 添加文字標籤
+    fig_ranking.update_traces(
+        texttemplate='%{y:.1%}',
+        textposition='outside'
+    )
+    
+    return fig_ranking
+
+def render_time_allocation_dashboard(time_allocation_data):
+    import plotly.express as px
+    
+    if time_allocation_data is None or time_allocation_data.empty:
+        st.error("沒有可用的時間分配數據，請確保上傳了正確的檔案格式或檢查過濾條件。")
+        return
+    
+    # 過濾時間分配數據 - 排除指定檢驗員
+    time_allocation_data = filter_excluded_inspectors(time_allocation_data, inspector_column='inspector')
+    
+    if time_allocation_data.empty:
+        st.warning("過濾後沒有可用的時間分配數據。")
+        return
+    
+    st.header("⚖️ IQC人員時間分配監控")
+    
+    # 檢查資料結構，確認有必要的欄位
+    required_cols = ['inspector', 'inspection_ratio', 'additional_task_ratio']
+    for col in required_cols:
+        if col not in time_allocation_data.columns:
+            st.error(f"時間分配數據缺少必要欄位: {col}")
+            return
+    
+    # 1. 首先顯示額外任務時間比例排名 (由高到低)
+    st.subheader("額外任務時間比例排名🔖")
     
-    st.plotly_chart(fig_ranking, use_container_width=True)
+    plot_cached_plotly(
+        'additional_task_ranking', (),
+        lambda: build_additional_task_ranking_figure(time_allocation_data),
+        use_container_width=True
+    )
     
     # 2. 讓使用者選擇人員後才顯示個人時間分配比例
     st.subheader("個人時間分配比例詳情👥 ")
@@ -6815,42 +5448,31 @@ def render_time_allocation_dashboard(time_allocation_data):
         # 顯示額外任務細項分配
         st.write("額外任務細項分配：")
         
-        if isinstance(inspector_data['task_detail_ratios'], dict) and inspector_data['task_detail_ratios']:
-            task_details = []
-            
-            for task_type, ratio in inspector_data['task_detail_ratios'].items():
-                task_details.append({
-                    'task_type': task_type,
-                    'ratio': ratio
-                })
-            
-            task_df = pd.DataFrame(task_details)
-            
-            if not task_df.empty:
-                # 顯示額外任務細項餅圖
-                fig_detail = px.pie(
-                    task_df,
-                    values='ratio',
-                    names='task_type',
-                    title="額外任務細項分配",
-                    color_discrete_sequence=px.colors.qualitative.Pastel
-                )
-                
-                fig_detail.update_traces(
-                    textinfo='percent+label',
-                    hoverinfo='label+percent'
-                )
-                
-                st.plotly_chart(fig_detail, use_container_width=True)
-                
-                # 顯示額外任務詳細數據
-                with st.expander(f"{selected_inspector} 額外任務詳細數據"):
-                    detail_df = task_df.copy()
-                    detail_df['ratio'] = (detail_df['ratio'] * 100).round(1).astype(str) + '%'
-                    detail_df.columns = ['任務類型', '佔總時間比例']
-                    st.dataframe(detail_df, use_container_width=True)
-            else:
-                st.write("沒有額外任務記錄")
+        task_df = get_inspector_task_ratios(inspector_data)
+        
+        if not task_df.empty:
+            # 顯示額外任務細項餅圖
+            fig_detail = px.pie(
+                task_df,
+                values='ratio',
+                names='task_type',
+                title="額外任務細項分配",
+                color_discrete_sequence=px.colors.qualitative.Pastel
+            )
+            
+            fig_detail.update_traces(
+                textinfo='percent+label',
+                hoverinfo='label+percent'
+            )
+            
+            st.plotly_chart(fig_detail, use_container_width=True)
+            
+            # 顯示額外任務詳細數據
+            with st.expander(f"{selected_inspector} 額外任務詳細數據"):
+                detail_df = task_df.copy()
+                detail_df['ratio'] = (detail_df['ratio'] * 100).round(1).astype(str) + '%'
+                detail_df.columns = ['任務類型', '佔總時間比例']
+                st.dataframe(detail_df, use_container_width=True)
         else:
             st.write("沒有額外任務記錄")
     else:
@@ -6894,6 +5516,8 @@ def render_workload_monitor_dashboard(processed_data, additional_tasks_monitor_d
     工作負載監控儀表板 - 管理者導向
     聚焦：工作負載分配是否均衡、各人員負載一覽
     """
+    import plotly.graph_objects as go
+    
     st.header("⏱️ 工作負載監控")
     
     # ===== 指標說明區 =====
@@ -7069,70 +5693,74 @@ def render_workload_monitor_dashboard(processed_data, additional_tasks_monitor_d
     # 按總工時排序
     sorted_stats = inspector_stats.sort_values('總工時(hr)', ascending=True)
     
-    fig_main = go.Figure()
-    
-    # 檢驗時間（藍色）
-    fig_main.add_trace(go.Bar(
-        y=sorted_stats['檢驗員'],
-        x=sorted_stats['檢驗時間(hr)'],
-        name='IQC檢驗時間',
-        orientation='h',
-        marker_color='#42a5f5',
-        text=sorted_stats['檢驗時間(hr)'].apply(lambda x: f'{x:.1f}h'),
-        textposition='inside',
-        textfont=dict(color='white', size=11),
-        hovertemplate='<b>%{y}</b><br>IQC檢驗: %{x:.1f}小時<extra></extra>'
-    ))
-    
-    # 額外任務時間（橙黃色）
-    fig_main.add_trace(go.Bar(
-        y=sorted_stats['檢驗員'],
-        x=sorted_stats['額外任務(hr)'],
-        name='額外任務',
-        orientation='h',
-        marker_color='#ffb74d',
-        text=sorted_stats['額外任務(hr)'].apply(lambda x: f'{x:.1f}h' if x > 0.5 else ''),
-        textposition='inside',
-        textfont=dict(color='white', size=11),
-        hovertemplate='<b>%{y}</b><br>額外任務: %{x:.1f}小時<extra></extra>'
-    ))
-    
-    # 在右側標註批數
-    for i, row in sorted_stats.iterrows():
-        fig_main.add_annotation(
-            y=row['檢驗員'],
-            x=row['總工時(hr)'] + 0.3,
-            text=f"📦{row['檢驗批數']}批",
-            showarrow=False,
-            font=dict(size=10, color='#555'),
-            xanchor='left'
+    # 人員負載總覽圖依資料版本快取，其他元件觸發的重新執行不必重建
+    def build_workload_overview_figure():
+        fig_main = go.Figure()
+        
+        # 檢驗時間（藍色）
+        fig_main.add_trace(go.Bar(
+            y=sorted_stats['檢驗員'],
+            x=sorted_stats['檢驗時間(hr)'],
+            name='IQC檢驗時間',
+            orientation='h',
+            marker_color='#42a5f5',
+            text=sorted_stats['檢驗時間(hr)'].apply(lambda x: f'{x:.1f}h'),
+            textposition='inside',
+            textfont=dict(color='white', size=11),
+            hovertemplate='<b>%{y}</b><br>IQC檢驗: %{x:.1f}小時<extra></extra>'
+        ))
+        
+        # 額外任務時間（橙黃色）
+        fig_main.add_trace(go.Bar(
+            y=sorted_stats['檢驗員'],
+            x=sorted_stats['額外任務(hr)'],
+            name='額外任務',
+            orientation='h',
+            marker_color='#ffb74d',
+            text=sorted_stats['額外任務(hr)'].apply(lambda x: f'{x:.1f}h' if x > 0.5 else ''),
+            textposition='inside',
+            textfont=dict(color='white', size=11),
+            hovertemplate='<b>%{y}</b><br>額外任務: %{x:.1f}小時<extra></extra>'
+        ))
+        
+        # 在右側標註批數
+        for i, row in sorted_stats.iterrows():
+            fig_main.add_annotation(
+                y=row['檢驗員'],
+                x=row['總工時(hr)'] + 0.3,
+                text=f"📦{row['檢驗批數']}批",
+                showarrow=False,
+                font=dict(size=10, color='#555'),
+                xanchor='left'
+            )
+        
+        # 團隊平均線
+        fig_main.add_vline(
+            x=team_avg_total_hr,
+            line_dash="dash",
+            line_color="#e53935",
+            annotation_text=f"平均 {team_avg_total_hr:.1f}h",
+            annotation_position="top",
+            annotation_font_color="#e53935"
         )
-    
-    # 團隊平均線
-    fig_main.add_vline(
-        x=team_avg_total_hr,
-        line_dash="dash",
-        line_color="#e53935",
-        annotation_text=f"平均 {team_avg_total_hr:.1f}h",
-        annotation_position="top",
-        annotation_font_color="#e53935"
-    )
-    
-    fig_main.update_layout(
-        barmode='stack',
-        height=max(350, len(sorted_stats) * 32),
-        margin=dict(l=10, r=80, t=10, b=40),
-        xaxis_title="工時（小時）",
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="center",
-            x=0.5
+        
+        fig_main.update_layout(
+            barmode='stack',
+            height=max(350, len(sorted_stats) * 32),
+            margin=dict(l=10, r=80, t=10, b=40),
+            xaxis_title="工時（小時）",
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="center",
+                x=0.5
+            )
         )
-    )
+        
+        return fig_main
     
-    st.plotly_chart(fig_main, use_container_width=True)
+    plot_cached_plotly('workload_overview', (), build_workload_overview_figure, use_container_width=True)
     
     # 圖例說明
     st.markdown("""
@@ -7153,69 +5781,73 @@ def render_workload_monitor_dashboard(processed_data, additional_tasks_monitor_d
     median_time = inspector_stats['檢驗時間(hr)'].median()
     median_eff = inspector_stats['效率'].median()
     
-    # 創建象限圖
-    fig_quad = go.Figure()
-    
-    # 根據象限配色
-    def get_quadrant_color(row):
-        high_load = row['檢驗時間(hr)'] >= median_time
-        high_eff = row['效率'] >= median_eff
-        if high_load and high_eff:
-            return '#4caf50'  # 高效高產 - 綠色（績優）
-        elif high_load and not high_eff:
-            return '#f44336'  # 高負低效 - 紅色（需關注）
-        elif not high_load and high_eff:
-            return '#2196f3'  # 低負高效 - 藍色（可增量）
-        else:
-            return '#ff9800'  # 低負低效 - 橙色（待觀察）
-    
-    colors = inspector_stats.apply(get_quadrant_color, axis=1).tolist()
-    
-    fig_quad.add_trace(go.Scatter(
-        x=inspector_stats['檢驗時間(hr)'],
-        y=inspector_stats['效率'],
-        mode='markers+text',
-        marker=dict(
-            size=inspector_stats['檢驗批數'] / inspector_stats['檢驗批數'].max() * 40 + 15,
-            color=colors,
-            opacity=0.7,
-            line=dict(width=1, color='white')
-        ),
-        text=inspector_stats['檢驗員'],
-        textposition='top center',
-        textfont=dict(size=9),
-        hovertemplate='<b>%{text}</b><br>檢驗時間: %{x:.1f}hr<br>效率: %{y:.2f}<br>批數: %{customdata}<extra></extra>',
-        customdata=inspector_stats['檢驗批數']
-    ))
-    
-    # 添加象限分界線
-    fig_quad.add_hline(y=median_eff, line_dash="dot", line_color="#999", line_width=1)
-    fig_quad.add_vline(x=median_time, line_dash="dot", line_color="#999", line_width=1)
-    
-    # 象限標籤
-    x_range = inspector_stats['檢驗時間(hr)'].max() - inspector_stats['檢驗時間(hr)'].min()
-    y_range = inspector_stats['效率'].max() - inspector_stats['效率'].min()
-    
-    annotations = [
-        dict(x=median_time + x_range*0.25, y=inspector_stats['效率'].max(), 
-             text="高效高產", showarrow=False, font=dict(color='#4caf50', size=11, family='Arial Black')),
-        dict(x=median_time + x_range*0.25, y=inspector_stats['效率'].min(), 
-             text="高負低效", showarrow=False, font=dict(color='#f44336', size=11, family='Arial Black')),
-        dict(x=inspector_stats['檢驗時間(hr)'].min(), y=inspector_stats['效率'].max(), 
-             text="可增量", showarrow=False, font=dict(color='#2196f3', size=11, family='Arial Black')),
-        dict(x=inspector_stats['檢驗時間(hr)'].min(), y=inspector_stats['效率'].min(), 
-             text="待觀察", showarrow=False, font=dict(color='#ff9800', size=11, family='Arial Black'))
-    ]
-    
-    fig_quad.update_layout(
-        height=400,
-        margin=dict(l=10, r=10, t=10, b=40),
-        xaxis_title="檢驗時間（小時）",
-        yaxis_title="效率",
-        annotations=annotations
-    )
+    # 象限圖依資料版本快取
+    def build_workload_quadrant_figure():
+        # 創建象限圖
+        fig_quad = go.Figure()
+        
+        # 根據象限配色
+        def get_quadrant_color(row):
+            high_load = row['檢驗時間(hr)'] >= median_time
+            high_eff = row['效率'] >= median_eff
+            if high_load and high_eff:
+                return '#4caf50'  # 高效高產 - 綠色（績優）
+            elif high_load and not high_eff:
+                return '#f44336'  # 高負低效 - 紅色（需關注）
+            elif not high_load and high_eff:
+                return '#2196f3'  # 低負高效 - 藍色（可增量）
+            else:
+                return '#ff9800'  # 低負低效 - 橙色（待觀察）
+        
+        colors = inspector_stats.apply(get_quadrant_color, axis=1).tolist()
+        
+        fig_quad.add_trace(go.Scatter(
+            x=inspector_stats['檢驗時間(hr)'],
+            y=inspector_stats['效率'],
+            mode='markers+text',
+            marker=dict(
+                size=inspector_stats['檢驗批數'] / inspector_stats['檢驗批數'].max() * 40 + 15,
+                color=colors,
+                opacity=0.7,
+                line=dict(width=1, color='white')
+            ),
+            text=inspector_stats['檢驗員'],
+            textposition='top center',
+            textfont=dict(size=9),
+            hovertemplate='<b>%{text}</b><br>檢驗時間: %{x:.1f}hr<br>效率: %{y:.2f}<br>批數: %{customdata}<extra></extra>',
+            customdata=inspector_stats['檢驗批數']
+        ))
+        
+        # 添加象限分界線
+        fig_quad.add_hline(y=median_eff, line_dash="dot", line_color="#999", line_width=1)
+        fig_quad.add_vline(x=median_time, line_dash="dot", line_color="#999", line_width=1)
+        
+        # 象限標籤
+        x_range = inspector_stats['檢驗時間(hr)'].max() - inspector_stats['檢驗時間(hr)'].min()
+        y_range = inspector_stats['效率'].max() - inspector_stats['效率'].min()
+        
+        annotations = [
+            dict(x=median_time + x_range*0.25, y=inspector_stats['效率'].max(), 
+                 text="高效高產", showarrow=False, font=dict(color='#4caf50', size=11, family='Arial Black')),
+            dict(x=median_time + x_range*0.25, y=inspector_stats['效率'].min(), 
+                 text="高負低效", showarrow=False, font=dict(color='#f44336', size=11, family='Arial Black')),
+            dict(x=inspector_stats['檢驗時間(hr)'].min(), y=inspector_stats['效率'].max(), 
+                 text="可增量", showarrow=False, font=dict(color='#2196f3', size=11, family='Arial Black')),
+            dict(x=inspector_stats['檢驗時間(hr)'].min(), y=inspector_stats['效率'].min(), 
+                 text="待觀察", showarrow=False, font=dict(color='#ff9800', size=11, family='Arial Black'))
+        ]
+        
+        fig_quad.update_layout(
+            height=400,
+            margin=dict(l=10, r=10, t=10, b=40),
+            xaxis_title="檢驗時間（小時）",
+            yaxis_title="效率",
+            annotations=annotations
+        )
+        
+        return fig_quad
     
-    st.plotly_chart(fig_quad, use_container_width=True)
+    plot_cached_plotly('workload_quadrant', (), build_workload_quadrant_figure, use_container_width=True)
     
     # 圖例說明
     st.markdown("""
@@ -7375,6 +6007,8 @@ def merge_efficiency_and_additional(processed_data, additional_tasks_data, effic
 
 # 保留原有函數作為備用（可移除）
 def render_additional_tasks_dashboard(additional_tasks_monitor_data):
+    import plotly.express as px
+    
     if additional_tasks_monitor_data is None or additional_tasks_monitor_data.empty:
         st.error("沒有可用的額外任務數據，請確保上傳了正確的檔案格式或檢查過濾條件。")
         return
@@ -7587,6 +6221,8 @@ def render_status():
 
 def render_calculation_details():
     """顯示所有計算詳情，方便檢查計算過程是否正確"""
+    import plotly.express as px
+    
     st.header("計算詳情檢查")
     st.markdown("此頁面顯示所有計算中間結果，方便檢查計算過程是否正確。")
     
@@ -7608,42 +6244,24 @@ def render_calculation_details():
     with tabs[0]:
         st.subheader("處理後的原始資料")
         if st.session_state.processed_data is not None and not st.session_state.processed_data.empty:
-            # 新增篩選功能
-            inspector_filter = st.selectbox(
-                "選擇檢驗員",
-                options=["全部"] + sorted(st.session_state.processed_data["處理後檢驗員"].unique().tolist()),
-                index=0
-            )
-            
-            category_filter = st.selectbox(
-                "選擇物料類別",
-                options=["全部"] + sorted(st.session_state.processed_data["類別"].unique().tolist()),
-                index=0
-            )
-            
-            df_filtered = st.session_state.processed_data.copy()
-            
-            if inspector_filter != "全部":
-                df_filtered = df_filtered[df_filtered["處理後檢驗員"] == inspector_filter]
-            
-            if category_filter != "全部":
-                df_filtered = df_filtered[df_filtered["類別"] == category_filter]
+            processed_data = st.session_state.processed_data
             
-            # 顯示關鍵欄位
+            # 篩選、排序與分頁在伺服器端以位置索引完成，不複製整份資料
             key_columns = [
                 '處理後檢驗員', '料號', '類別', '抽樣數量', '檢驗日期',
                 '處理後檢驗標準工時', '檢驗耗時', '效率比值', '抽樣狀態'
             ]
+            positions = render_data_explorer(
+                processed_data,
+                "calc_raw_data",
+                default_columns=key_columns,
+                filter_columns={'處理後檢驗員': '檢驗員', '類別': '物料類別'}
+            )
             
-            # 確保所有列都存在
-            existing_columns = [col for col in key_columns if col in df_filtered.columns]
-            
-            st.dataframe(df_filtered[existing_columns])
-            
-            st.metric("總筆數", len(df_filtered))
+            st.metric("總筆數", len(positions))
             
-            if len(df_filtered) > 0:
-                st.metric("平均效率比值", round(df_filtered["效率比值"].mean(), 2))
+            if len(positions) > 0 and "效率比值" in processed_data.columns:
+                st.metric("平均效率比值", round(processed_data["效率比值"].iloc[positions].mean(), 2))
             
         else:
             st.info("沒有可用的處理資料")
@@ -7664,7 +6282,7 @@ def render_calculation_details():
                 # 確保所有列都存在
                 existing_pcb_columns = [col for col in pcb_columns if col in qb_data.columns]
                 
-                st.dataframe(qb_data[existing_pcb_columns])
+                render_paginated_dataframe(qb_data[existing_pcb_columns], "calc_qb_data")
                 
                 if st.session_state.pcb_spec_data is not None and not st.session_state.pcb_spec_data.empty:
                     st.subheader("PCB建檔明細")
@@ -7672,7 +6290,7 @@ def render_calculation_details():
                 
                 if st.session_state.pcb_standard_time_data is not None and not st.session_state.pcb_standard_time_data.empty:
                     st.subheader("PCB標準工時對應表")
-                    st.dataframe(st.session_state.pcb_standard_time_data)
+                    render_paginated_dataframe(st.session_state.pcb_standard_time_data, "calc_pcb_standard_time")
             else:
                 st.info("沒有發現QB類型料號")
         else:
@@ -7752,7 +6370,7 @@ def render_calculation_details():
             if selected_inspector != "全部":
                 filtered_workload = workload_df[workload_df["檢驗員"] == selected_inspector]
             
-            st.dataframe(filtered_workload)
+            render_paginated_dataframe(filtered_workload, "calc_workload")
             
             # 計算並顯示統計資訊
             if not filtered_workload.empty:
@@ -7772,87 +6390,28 @@ def render_calculation_details():
         st.subheader("時間分配計算詳情")
         
         if 'time_allocation_data' in st.session_state and not st.session_state.time_allocation_data.empty:
-            time_allocation_df = st.session_state.time_allocation_data.copy()
+            time_allocation_df = st.session_state.time_allocation_data
             
-            # 這個數據框架含有字典類型的列，需要特殊處理
-            if 'task_detail_ratios' in time_allocation_df.columns:
-                # 顯示原始數據（含字典）
-                st.subheader("原始時間分配數據")
-                
-                # 將字典列轉換為字符串以顯示
-                time_allocation_df['task_detail_ratios'] = time_allocation_df['task_detail_ratios'].apply(
-                    lambda x: str(x) if isinstance(x, dict) else str(x)
+            base_columns = {
+                'inspector': '檢驗員',
+                'inspection_time': '檢驗時間(分鐘)',
+                'additional_task_time': '額外任務時間(分鐘)',
+                'total_time': '總時間(分鐘)',
+                'inspection_ratio': '檢驗時間比例',
+                'additional_task_ratio': '額外任務時間比例'
+            }
+            valid_columns = [col for col in base_columns if col in time_allocation_df.columns]
+            display_df = time_allocation_df[valid_columns].rename(columns=base_columns)
+            
+            # 任務細項比例已是寬表欄位 (任務__<任務類型>)，直接併入顯示
+            task_ratio_table = get_task_ratio_table(time_allocation_df)
+            if not task_ratio_table.empty:
+                st.subheader("時間分配與任務細項比例")
+                display_df = display_df.join(
+                    task_ratio_table.rename(columns=lambda col: f"任務比例_{col[len(TASK_RATIO_PREFIX):]}")
                 )
-                
-                # 重命名欄位
-                renamed_df = time_allocation_df.rename(columns={
-                    'inspector': '檢驗員',
-                    'inspection_time': '檢驗時間(分鐘)',
-                    'additional_task_time': '額外任務時間(分鐘)',
-                    'total_time': '總時間(分鐘)',
-                    'inspection_ratio': '檢驗時間比例',
-                    'additional_task_ratio': '額外任務時間比例',
-                    'task_detail_ratios': '任務細項比例(字典)'
-                })
-                
-                st.dataframe(renamed_df)
-                
-                # 展開任務細項數據
-                st.subheader("展開後的任務細項數據")
-                expanded_df = time_allocation_df.copy()
-                
-                # 為每個檢驗員創建展開的任務細項
-                all_task_types = set()
-                for idx, row in time_allocation_df.iterrows():
-                    if isinstance(row['task_detail_ratios'], str):
-                        try:
-                            # 嘗試將字符串轉回字典
-                            task_dict = eval(row['task_detail_ratios'])
-                            if isinstance(task_dict, dict):
-                                for task_type, ratio in task_dict.items():
-                                    all_task_types.add(task_type)
-                                    expanded_df.at[idx, f'任務比例_{task_type}'] = ratio
-                        except:
-                            pass
-                
-                # 重命名基本欄位
-                base_columns = {
-                    'inspector': '檢驗員',
-                    'inspection_time': '檢驗時間(分鐘)',
-                    'additional_task_time': '額外任務時間(分鐘)',
-                    'total_time': '總時間(分鐘)',
-                    'inspection_ratio': '檢驗時間比例',
-                    'additional_task_ratio': '額外任務時間比例'
-                }
-                
-                # 只選擇存在的列進行重命名
-                valid_columns = [col for col in base_columns.keys() if col in expanded_df.columns]
-                for col in valid_columns:
-                    expanded_df.rename(columns={col: base_columns[col]}, inplace=True)
-                
-                # 刪除原始字典列
-                if 'task_detail_ratios' in expanded_df.columns:
-                    expanded_df = expanded_df.drop(columns=['task_detail_ratios'])
-                
-                task_columns = [col for col in expanded_df.columns if col.startswith('任務比例_')]
-                display_columns = ['檢驗員', '檢驗時間(分鐘)', '額外任務時間(分鐘)', 
-                                   '總時間(分鐘)', '檢驗時間比例', '額外任務時間比例'] + task_columns
-                
-                # 只選擇存在的列
-                valid_display_columns = [col for col in display_columns if col in expanded_df.columns]
-                st.dataframe(expanded_df[valid_display_columns])
-            else:
-                # 如果沒有任務細項，直接顯示基本時間分配
-                renamed_df = time_allocation_df.rename(columns={
-                    'inspector': '檢驗員',
-                    'inspection_time': '檢驗時間(分鐘)',
-                    'additional_task_time': '額外任務時間(分鐘)',
-                    'total_time': '總時間(分鐘)',
-                    'inspection_ratio': '檢驗時間比例',
-                    'additional_task_ratio': '額外任務時間比例'
-                })
-                
-                st.dataframe(renamed_df)
+            
+            render_paginated_dataframe(display_df, "calc_time_allocation")
         else:
             st.info("沒有可用的時間分配數據")
     
@@ -7878,7 +6437,7 @@ def render_calculation_details():
             if selected_inspector != "全部":
                 filtered_tasks = tasks_df[tasks_df["檢驗員"] == selected_inspector]
             
-            st.dataframe(filtered_tasks)
+            render_paginated_dataframe(filtered_tasks, "calc_additional_tasks")
             
             # 按任務類型分組統計
             task_summary = tasks_df.groupby('任務類型')['總時間(分鐘)'].sum().reset_index()
@@ -7922,18 +6481,17 @@ def render_calculation_details():
             return
         
         # 計算總體MRB率
-        total_count = len(df)
-        mrb_count = df['是否為MRB'].sum() if df['是否為MRB'].dtype != 'object' else df['是否為MRB'].apply(
-            lambda x: True if str(x).upper() == 'TRUE' or x == 'MRB' else False
-        ).sum()
+        mrb_tables = calculate_mrb_rate_tables(df)
+        total_count = mrb_tables['total_count']
+        mrb_count = mrb_tables['mrb_count']
         
-        overall_mrb_rate = mrb_count / total_count if total_count > 0 else 0
+        overall_mrb_rate = mrb_tables['mrb_rate']
         
         # 顯示總體MRB率
         st.metric("總體MRB率", f"{overall_mrb_rate:.2%}", f"{mrb_count} MRB / {total_count} 總筆數")
         
         # 按檢驗員分組計算MRB率
-        mrb_rate_df = calculate_mrb_rates(df)
+        mrb_rate_df = mrb_tables['inspector']
         
         # 顯示每個檢驗員的MRB率
         st.subheader("各檢驗員MRB率")
@@ -7956,24 +6514,8 @@ def render_calculation_details():
         st.subheader("按物料類別分析MRB率")
         
         if '類別' in df.columns:
-            category_stats = []
-            
-            for category, group in df.groupby('類別'):
-                cat_total = len(group)
-                cat_mrb = group['是否為MRB'].sum() if group['是否為MRB'].dtype != 'object' else group['是否為MRB'].apply(
-                    lambda x: True if str(x).upper() == 'TRUE' or x == 'MRB' else False
-                ).sum()
-                cat_mrb_rate = cat_mrb / cat_total if cat_total > 0 else 0
-                
-                category_stats.append({
-                    '物料類別': category,
-                    'MRB數量': cat_mrb,
-                    '總檢驗筆數': cat_total,
-                    'MRB率': cat_mrb_rate
-                })
-            
-            cat_df = pd.DataFrame(category_stats)
-            cat_df = cat_df.sort_values('MRB率', ascending=False)
+            cat_df_for_chart = mrb_tables['category']
+            cat_df = cat_df_for_chart.copy()
             
             # 格式化MRB率為百分比
             cat_df['MRB率'] = cat_df['MRB率'].apply(lambda x: f"{x:.2%}")
@@ -7981,7 +6523,6 @@ def render_calculation_details():
             st.dataframe(cat_df, use_container_width=True)
             
             # 創建物料類別MRB率條形圖
-            cat_df_for_chart = pd.DataFrame(category_stats)
             fig = px.bar(
                 cat_df_for_chart.sort_values('MRB率', ascending=False),
                 x='物料類別',
@@ -7998,257 +6539,532 @@ def render_calculation_details():
         else:
             st.info("數據中缺少'類別'欄位，無法按物料類別分析MRB率")
 
-def export_processed_data():
+# ==================== 背景計算程序 ====================
+# 計算程序數 (指標計算與匯出檔案產生共用)
+COMPUTE_PROCESS_WORKERS = 2
+# 指標計算狀態的自動更新間隔 (秒)
+COMPUTE_POLL_SECONDS = 0.5
+# 已完成但沒有工作階段取回結果的工作保留秒數
+COMPUTE_JOB_TTL_SECONDS = 600
+
+def _new_compute_executor():
     """
-    匯出處理後的所有相關資料，並確保中文正確顯示和MRB狀態正確顯示
+    建立計算程序池並預先載入計算核心，無法建立時返回 None
+    
+    介面程序已有多個執行緒，以 spawn 建立程序；打包後的執行檔不使用程序池。
+    spawn 建立的程序會匯入本腳本但不執行介面 (見「設置頁面配置」說明)。
     """
+    if getattr(sys, 'frozen', False):
+        return None
     try:
-        # 檢查是否有可用數據
-        if st.session_state.processed_data is None:
-            st.error("沒有可用的處理數據，請先上傳和處理文件")
-            return
-
-        # 创建匯出目錄
-        import os
-        export_dir = "iqc_export_data"
-        if not os.path.exists(export_dir):
-            os.makedirs(export_dir)
-        
-        # 1. 處理後的原始資料並修正MRB狀態
-        processed_df = st.session_state.processed_data.copy()
-        
-        # 修正MRB狀態 - 使用MRB加時判斷
-        processed_df['是否為MRB'] = processed_df['MRB加時'] > 0
-        processed_df['是否為MRB'] = processed_df['是否為MRB'].apply(lambda x: "TRUE" if x else "FALSE")
-        processed_df['MRB狀態'] = processed_df['MRB加時'].apply(lambda x: "MRB" if x > 0 else "Normal inspection")
-        
-        # 確保MRB訊息也與狀態一致
-        processed_df.loc[processed_df['MRB加時'] > 0, 'MRB訊息'] = "有MRB標記"
-        
-        # 顯示MRB狀態統計供測試
-        mrb_true_count = (processed_df['是否為MRB'] == "TRUE").sum()
-        mrb_status_mrb_count = (processed_df['MRB狀態'] == "MRB").sum()
-        mrb_time_count = (processed_df['MRB加時'] > 0).sum()
-        
-        debug_log(f"匯出前MRB狀態檢查: 是否為MRB=TRUE: {mrb_true_count}, MRB狀態=MRB: {mrb_status_mrb_count}, MRB加時>0: {mrb_time_count}", level="INFO")
-        
-        # 将布尔值转换为文字显示
-        processed_df['MRB狀態'] = processed_df['MRB加時'].apply(
-            lambda x: "MRB" if x > 0 else "Normal inspection"
+        executor = ProcessPoolExecutor(
+            max_workers=COMPUTE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
         )
-        
-        # 确保所有必要列字段都存在
-        essential_columns = [
-            '處理後檢驗員', '料號', '類別', '抽樣數量', '檢驗日期',
-            '處理後檢驗標準工時', '檢驗耗時', '效率比值', '抽樣狀態', 
-            '檢驗開始時間', '是否為MRB', 'MRB狀態', 'MRB訊息'
-        ]
-        
-        # 添加PCB相關欄位，如果存在的話
-        pcb_columns = ['基礎標準工時', 'MRB加時']
-        for col in pcb_columns:
-            if col in processed_df.columns:
-                essential_columns.append(col)
-        
-        # 如果有M列字段，也保留它以便参考
-        if 'M' in processed_df.columns:
-            essential_columns.append('M')
-        
-        # 确保所有必要列字段都存在，如果不存在则跳过
-        valid_columns = [col for col in essential_columns if col in processed_df.columns]
-        filtered_df = processed_df[valid_columns].copy()
-
-        # 2. 效率数据
-        efficiency_df = pd.DataFrame()
-        if 'efficiency_data' in st.session_state and 'overall_efficiency_ranking' in st.session_state.efficiency_data:
-            efficiency_df = st.session_state.efficiency_data['overall_efficiency_ranking'].copy()
-            # 重命名列字段，使其更易理解
-            if 'inspector' in efficiency_df.columns:
-                efficiency_df.rename(columns={
-                    'inspector': '檢驗員',
-                    'efficiency': '效率指標',
-                    'total_standard_time': '標準工時總和(分鐘)',
-                    'total_actual_time': '實際耗時總和(分鐘)',
-                    'record_count': '記錄筆數'
-                }, inplace=True)
-
-        # 3. 物料类别效率数据
-        category_efficiency_dfs = {}
-        if 'efficiency_data' in st.session_state and 'category_efficiency_data' in st.session_state.efficiency_data:
-            category_data = st.session_state.efficiency_data['category_efficiency_data']
-            for category, data in category_data.items():
-                if data:  # 确保有数据
-                    cat_df = pd.DataFrame(data)
-                    # 重命名列字段
-                    if 'inspector' in cat_df.columns:
-                        cat_df.rename(columns={
-                            'inspector': '檢驗員',
-                            'efficiency': '效率指標',
-                            'record_count': '記錄筆數',
-                            'total_standard_time': '標準工時總和(分鐘)',
-                            'total_actual_time': '實際耗時總和(分鐘)'
-                        }, inplace=True)
-                    category_efficiency_dfs[category] = cat_df
-
-        # 4. 工作负载数据
-        workload_df = pd.DataFrame()
-        if 'workload_data' in st.session_state and not st.session_state.workload_data.empty:
-            workload_df = st.session_state.workload_data.copy()
-            # 重命名列字段
-            workload_df.rename(columns={
-                'date': '日期',
-                'inspector': '檢驗員',
-                'inspection_time': '檢驗時間(分鐘)',
-                'additional_task_time': '額外任務時間(分鐘)',
-                'total_time': '總時間(分鐘)',
-                'workload_index': '工作負載指數',
-                'work_period': '工作時段',
-                'inspection_count': '檢驗次數'
-            }, inplace=True)
+        # 先啟動程序並載入計算核心，第一次計算不必等待
+        for _ in range(COMPUTE_PROCESS_WORKERS):
+            executor.submit(importlib.import_module, 'iqc_engine')
+        return executor
+    except Exception as e:
+        debug_log(f"無法建立計算程序池，改在介面程序計算: {e}", level="WARNING")
+        return None
 
-        # 5. 时间分配数据
-        time_allocation_df = pd.DataFrame()
-        if 'time_allocation_data' in st.session_state and not st.session_state.time_allocation_data.empty:
-            time_allocation_df = st.session_state.time_allocation_data.copy()
-            # 这个数据框架含有字典类型的列，需要特殊处理
-            if 'task_detail_ratios' in time_allocation_df.columns:
-                # 将字典类型的列展开成多个列
-                for idx, row in time_allocation_df.iterrows():
-                    if isinstance(row['task_detail_ratios'], dict):
-                        for task_type, ratio in row['task_detail_ratios'].items():
-                            col_name = f'任務__{task_type}'
-                            time_allocation_df.at[idx, col_name] = ratio
-                
-                # 删除原始字典列
-                time_allocation_df = time_allocation_df.drop(columns=['task_detail_ratios'])
-            
-            # 重命名列字段
-            new_columns = {
-                'inspector': '檢驗員',
-                'inspection_time': '檢驗時間(分鐘)',
-                'additional_task_time': '額外任務時間(分鐘)',
-                'total_time': '總時間(分鐘)',
-                'inspection_ratio': '檢驗時間比例',
-                'additional_task_ratio': '額外任務時間比例'
+@st.cache_resource(show_spinner=False)
+def _get_compute_pool():
+    """
+    程序層級的計算程序池，所有工作階段共用
+    
+    指標計算與匯出檔案在獨立程序中執行，不佔用介面程序的 GIL，
+    計算期間所有工作階段的元件操作都不受影響。
+    jobs 以工作代碼為鍵，工作階段只在 session_state 保存工作代碼。
+    """
+    return {
+        'executor': _new_compute_executor(),
+        'manager': None,
+        'jobs': {},
+        'lock': threading.Lock()
+    }
+
+def submit_compute_task(fn, *args):
+    """
+    將計算交給計算程序池，返回 Future；程序池無法使用時在目前執行緒計算並返回已完成的 Future
+    
+    fn 與參數需可 pickle：使用 iqc_engine 的函數，不可使用介面腳本中定義的函數。
+    """
+    pool = _get_compute_pool()
+    for _ in range(2):
+        executor = pool['executor']
+        if executor is None:
+            break
+        try:
+            return executor.submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # 計算程序異常結束 (例如記憶體不足) 後程序池無法再使用，重新建立一次
+            debug_log(f"計算程序池無法使用，重新建立: {e}", level="WARNING")
+            with pool['lock']:
+                if pool['executor'] is executor:
+                    pool['executor'] = _new_compute_executor()
+    
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def new_compute_progress_state():
+    """建立計算程序可寫入進度的 dict (使用程序池時為 Manager().dict()，跨程序共用)"""
+    pool = _get_compute_pool()
+    if pool['executor'] is None:
+        return {}
+    with pool['lock']:
+        if pool['manager'] is None:
+            pool['manager'] = multiprocessing.get_context('spawn').Manager()
+    return pool['manager'].dict()
+
+@st.cache_resource(show_spinner=False)
+def _get_private_dataset_cache_dir():
+    """未設定 IQC_DATASET_CACHE_DIR 時，計算程序讀取資料集用的暫存目錄 (只有擁有者可存取，程序結束時刪除)"""
+    path = tempfile.mkdtemp(prefix="iqc_dataset_cache_")
+    atexit.register(shutil.rmtree, path, True)
+    return path
+
+def get_job_dataset_source():
+    """
+    取得計算程序讀取目前資料集的來源，工作只傳送 (快取目錄, 檔案雜湊) 而不是整份資料
+
+    資料集尚未寫入磁碟快取時先寫入 (每份資料集一次)。
+    沒有使用計算程序池，或目前資料不是共用資料集 (版本不符) 時返回 None，改為直接傳送資料。
+
+    返回:
+    (cache_dir, fingerprint) 或 None
+    """
+    if _get_compute_pool()['executor'] is None:
+        return None
+    
+    fingerprint = st.session_state.get('shared_dataset_key')
+    registry = _get_shared_dataset_registry()
+    with registry['lock']:
+        entry = registry['entries'].get(fingerprint)
+    if entry is None or entry['dataset'].get('data_version') != st.session_state.get('data_version'):
+        return None
+    
+    cache_dir = iqc_engine.get_dataset_cache_dir() or _get_private_dataset_cache_dir()
+    if not iqc_engine.ensure_cached_dataset(cache_dir, fingerprint, entry['dataset']):
+        return None
+    return cache_dir, fingerprint
+
+def get_compute_job(job_id):
+    """取得指標計算工作 (不存在時返回 None)"""
+    pool = _get_compute_pool()
+    with pool['lock']:
+        return pool['jobs'].get(job_id)
+
+def _prune_compute_jobs(pool):
+    """移除已完成但超過 COMPUTE_JOB_TTL_SECONDS 仍沒有工作階段取回的工作 (需持有鎖)"""
+    now = time.time()
+    for job_id in list(pool['jobs']):
+        job = pool['jobs'][job_id]
+        if job['future'] is not None and job['future'].done() and now - job['submitted_at'] > COMPUTE_JOB_TTL_SECONDS:
+            del pool['jobs'][job_id]
+
+def _release_compute_job(job_id):
+    """
+    解除目前工作階段對指標計算工作的引用；沒有工作階段需要時移除工作
+    
+    返回:
+    已移除的工作，其他工作階段仍需要時為 None
+    """
+    pool = _get_compute_pool()
+    session_id = _get_session_id()
+    with pool['lock']:
+        job = pool['jobs'].get(job_id)
+        if job is None:
+            return None
+        job['sessions'].discard(session_id)
+        if job['sessions']:
+            return None
+        del pool['jobs'][job_id]
+    return job
+
+def cancel_metrics_job():
+    """
+    取消目前工作階段的指標計算工作
+    
+    尚未開始的工作直接取消；已在計算程序中執行的工作無法中斷，完成後結果不再使用。
+    其他工作階段正在等待相同的計算時保留工作。
+    """
+    session_job = st.session_state.get('metrics_job')
+    if session_job is None:
+        return
+    del st.session_state['metrics_job']
+    
+    job = _release_compute_job(session_job['id'])
+    if job is not None and job['future'] is not None and job['future'].cancel():
+        debug_log(f"已取消尚未開始的指標計算工作 {session_job['id']}", level="INFO")
+
+def start_metrics_job(kind, start_date, end_date, started_at=None):
+    """
+    提交指標計算工作 (calculate_all_metrics，含 PCB 標準工時合併)，工作代碼存入 session_state
+    
+    相同資料版本與日期範圍已有結果時直接套用；其他工作階段正在計算相同範圍時共用同一個工作。
+    目前工作階段原本的工作 (例如舊日期範圍) 會先取消。
+    
+    參數:
+    kind - 'process' (處理上傳檔案後的首次計算) 或 'filter' (應用日期篩選)
+    start_date, end_date - 日期範圍
+    started_at - 開始處理的時間，用於顯示用時，預設為現在
+    
+    返回:
+    已套用結果時為 True，工作在背景計算中時為 False
+    """
+    cancel_metrics_job()
+    
+    data_version = st.session_state.get('data_version')
+    date_params = (str(start_date), str(end_date))
+    cached = peek_shared_metric(data_version, date_params)
+    if cached:
+        apply_metrics_result(kind, cached, data_version, start_date, end_date)
+        return True
+    
+    # 相同資料版本與日期範圍的計算共用同一個工作；尚未有資料版本時每次都是新工作
+    if data_version is not None:
+        job_id = hashlib.sha1(repr((data_version, date_params)).encode('utf-8')).hexdigest()[:16]
+    else:
+        job_id = os.urandom(8).hex()
+    
+    pool = _get_compute_pool()
+    with pool['lock']:
+        _prune_compute_jobs(pool)
+        job = pool['jobs'].get(job_id)
+        created = job is None
+        if created:
+            job = {
+                'future': None,
+                'data_version': data_version,
+                'date_params': date_params,
+                'sessions': set(),
+                'submitted_at': time.time()
             }
-            # 只重命名存在的列
-            valid_renames = {k: v for k, v in new_columns.items() if k in time_allocation_df.columns}
-            time_allocation_df.rename(columns=valid_renames, inplace=True)
+            pool['jobs'][job_id] = job
+        job['sessions'].add(_get_session_id())
+    
+    st.session_state.metrics_job = {
+        'id': job_id,
+        'kind': kind,
+        'start_date': start_date,
+        'end_date': end_date,
+        'started_at': started_at if started_at is not None else time.time()
+    }
+    
+    if created:
+        # 計算程序由磁碟快取讀取資料集；無法使用時才把資料傳給計算程序
+        source = get_job_dataset_source()
+        if source is not None:
+            task = (iqc_engine.calculate_cached_dataset_metrics, *source)
+        else:
+            task = (
+                calculate_all_metrics,
+                st.session_state.iqc_report_data,
+                st.session_state.pcb_spec_data,
+                st.session_state.pcb_standard_time_data,
+                st.session_state.additional_tasks_data
+            )
+        # 計算核心以 report_error 回報的錯誤經由 Future 傳回，由 _apply_finished_metrics_job 顯示
+        job['future'] = submit_compute_task(iqc_engine.run_with_reported_errors, *task, start_date, end_date)
+        debug_log(f"已提交指標計算工作 {job_id}: {start_date} 到 {end_date}", level="INFO")
+    
+    # 程序池無法使用時已在目前程序算完，直接套用
+    if job['future'] is not None and job['future'].done():
+        session_job = st.session_state.metrics_job
+        del st.session_state['metrics_job']
+        return _apply_finished_metrics_job(session_job, job)
+    return False
+
+def _apply_finished_metrics_job(session_job, job):
+    """
+    取回已完成工作的結果並套用，失敗時顯示錯誤 (呼叫前需已從 session_state 移除工作代碼)
+    
+    返回:
+    已套用結果時為 True
+    """
+    _release_compute_job(session_job['id'])
+    try:
+        result = job['future'].result()
+        error_msg = None if result else "計算指標時出錯: 沒有取得計算結果"
+    except iqc_engine.ReportedError as e:
+        # 計算核心回報的錯誤訊息 (已含錯誤說明與追蹤)
+        error_msg = str(e)
+    except Exception as e:
+        error_msg = f"計算指標時出錯: {str(e)}\n{traceback.format_exc()}"
+    
+    if error_msg is not None:
+        debug_log(error_msg, level="ERROR")
+        st.error(error_msg)
+        st.session_state.processing_error = error_msg
+        return False
+    
+    # 結果放入共用指標快取，其他工作階段與之後相同的日期範圍直接取用
+    metrics = get_shared_metric(job['data_version'], job['date_params'], lambda: result)
+    apply_metrics_result(session_job['kind'], metrics, job['data_version'], session_job['start_date'], session_job['end_date'])
+    return True
 
-        # 6. 额外任务数据
-        additional_tasks_df = pd.DataFrame()
-        if 'additional_tasks_monitor_data' in st.session_state and not st.session_state.additional_tasks_monitor_data.empty:
-            additional_tasks_df = st.session_state.additional_tasks_monitor_data.copy()
-            # 重命名列字段
-            additional_tasks_df.rename(columns={
-                'inspector': '檢驗員',
-                'task_type': '任務類型',
-                'total_time': '總時間(分鐘)'
-            }, inplace=True)
-
-        # 创建一个Excel文件，包含所有数据表
-        excel_buffer = io.BytesIO()
-        
-        with pd.ExcelWriter(excel_buffer, engine='xlsxwriter', engine_kwargs={'options': {'encoding': 'utf-8'}}) as writer:
-            # 1. 处理后的原始数据
-            filtered_df.to_excel(writer, sheet_name='處理後資料', index=False)
-            
-            # 2. 效率数据
-            if not efficiency_df.empty:
-                efficiency_df.to_excel(writer, sheet_name='整體效率排名', index=False)
-            
-            # 3. 物料类别效率数据
-            for category, df in category_efficiency_dfs.items():
-                # 确保工作表名称有效（最多31个字符）
-                sheet_name = f"類別效率_{category}"
-                if len(sheet_name) > 31:
-                    sheet_name = sheet_name[:28] + "..."
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-            # 4. 工作负载数据
-            if not workload_df.empty:
-                workload_df.to_excel(writer, sheet_name='工作負載數據', index=False)
-            
-            # 5. 时间分配数据
-            if not time_allocation_df.empty:
-                time_allocation_df.to_excel(writer, sheet_name='時間分配數據', index=False)
-            
-            # 6. 额外任务数据
-            if not additional_tasks_df.empty:
-                additional_tasks_df.to_excel(writer, sheet_name='額外任務數據', index=False)
-            
-            # 7. MRB 统计数据 - 完全移除比例計算
-            # 完全删除原来的MRB统计代码
-            if '是否為MRB' in filtered_df.columns:
-                # 直接删除这部分，不再计算MRB比例
+def collect_metrics_job():
+    """
+    檢查目前工作階段的指標計算工作，需在日期元件建立前呼叫 (main 開頭)
+    
+    日期範圍在計算途中變更時，取消原工作並以新範圍重新提交；
+    工作完成時套用結果，失敗時顯示錯誤。
+    
+    返回:
+    本次已套用結果時為 True
+    """
+    session_job = st.session_state.get('metrics_job')
+    if session_job is None:
+        return False
+    
+    current_range = (st.session_state.get('start_date'), st.session_state.get('end_date'))
+    if current_range != (session_job['start_date'], session_job['end_date']):
+        debug_log(f"計算途中變更日期範圍，改以 {current_range[0]} 到 {current_range[1]} 重新計算", level="INFO")
+        return start_metrics_job(session_job['kind'], current_range[0], current_range[1], session_job['started_at'])
+    
+    job = get_compute_job(session_job['id'])
+    if job is None:
+        del st.session_state['metrics_job']
+        return False
+    if job['future'] is None or not job['future'].done():
+        return False
+    
+    del st.session_state['metrics_job']
+    if not _apply_finished_metrics_job(session_job, job):
+        return False
+    
+    processing_time = time.time() - session_job['started_at']
+    debug_log(f"指標計算完成，處理時間: {processing_time:.2f}秒", level="INFO")
+    if session_job['kind'] == 'process':
+        st.toast(f"資料處理完成！用時 {processing_time:.2f} 秒")
+    else:
+        st.toast(f"已成功應用日期篩選：{session_job['start_date']} 到 {session_job['end_date']}")
+    return True
+
+def render_metrics_progress():
+    """
+    顯示背景指標計算狀態；支援 fragment 時每隔 COMPUTE_POLL_SECONDS 只更新狀態區塊，
+    計算完成後整頁重新執行以套用結果
+    """
+    session_job = st.session_state.get('metrics_job')
+    if session_job is None:
+        return
+    
+    def metrics_progress():
+        job = get_compute_job(session_job['id'])
+        if job is None or (job['future'] is not None and job['future'].done()):
+            st.rerun()
+        elapsed = time.time() - session_job['started_at']
+        st.info(f"⏳ 計算指標中 ({session_job['start_date']} ~ {session_job['end_date']})，已用時 {elapsed:.0f} 秒；計算期間仍可操作頁面")
+    
+    if _STREAMLIT_FRAGMENT is not None:
+        try:
+            _STREAMLIT_FRAGMENT(run_every=COMPUTE_POLL_SECONDS)(metrics_progress)()
+            return
+        except TypeError:
+            # 舊版 fragment 不支援 run_every
+            pass
+    
+    metrics_progress()
+    st.button("更新計算狀態", key="metrics_progress_refresh", use_container_width=True)
+
+# ==================== 背景匯出工作 ====================
+# 同時執行的匯出工作數
+EXPORT_JOB_WORKERS = 2
+# 保留的匯出成品數，超過時刪除最舊的已完成成品
+EXPORT_ARTIFACT_MAX = 8
+# 匯出進度的自動更新間隔 (秒)
+EXPORT_POLL_SECONDS = 1.0
+# 匯出所需的 session_state 資料
+EXPORT_STATE_KEYS = ['processed_data', 'efficiency_data', 'workload_data', 'time_allocation_data', 'additional_tasks_monitor_data']
+
+@st.cache_resource(show_spinner=False)
+def _get_export_job_registry():
+    """
+    程序層級的匯出工作登錄表，所有工作階段共用
+
+    jobs 以 (資料版本, 匯出格式) 為鍵，保存工作狀態、進度與完成後的成品路徑；
+    相同資料版本與日期範圍再次匯出時直接提供已完成的成品。
+    """
+    return {
+        'executor': ThreadPoolExecutor(max_workers=EXPORT_JOB_WORKERS, thread_name_prefix='iqc_export'),
+        'jobs': OrderedDict(),
+        'lock': threading.Lock()
+    }
+
+def get_export_artifact_key(export_format):
+    """
+    匯出成品的快取鍵：資料版本 (含日期範圍) + 匯出格式
+
+    尚未有資料版本時改以工作階段區分，同一工作階段內仍可重複下載。
+    """
+    data_version = get_processed_data_version()
+    if data_version is None:
+        return ('session', _get_session_id(), export_format)
+    return (data_version, export_format)
+
+def get_export_job(artifact_key):
+    """取得匯出工作 (不存在時返回 None)"""
+    registry = _get_export_job_registry()
+    with registry['lock']:
+        job = registry['jobs'].get(artifact_key)
+        if job is not None:
+            registry['jobs'].move_to_end(artifact_key)
+        return job
+
+def _run_export_job(job, task):
+    """
+    在背景執行緒等待計算程序產生匯出檔案，期間將計算程序回報的進度複製到工作狀態
+    
+    檔案先寫入暫存檔，完成後才改名為成品路徑 (見 iqc_engine.write_export_file)。
+    
+    參數:
+    job - 匯出工作
+    task - (函數, 參數...)，之後再加上成品路徑、匯出格式與進度 dict 交給計算程序
+    """
+    iqc_engine.set_background_thread(True)
+    
+    try:
+        progress_state = new_compute_progress_state()
+        future = submit_compute_task(*task, job['path'], job['format'], progress_state)
+        while not wait([future], timeout=EXPORT_POLL_SECONDS / 2).done:
+            job['progress'] = progress_state.get('progress', job['progress'])
+            job['stage'] = progress_state.get('stage', job['stage'])
+        future.result()
+        job['progress'] = 1.0
+        job['stage'] = "完成"
+        job['status'] = 'done'
+    except Exception as e:
+        job['error'] = f"{str(e)}\n{traceback.format_exc()}"
+        job['status'] = 'error'
+    finally:
+        job['finished_at'] = time.time()
+        iqc_engine.set_background_thread(False)
+
+def _evict_export_artifacts(registry):
+    """保留最近使用的 EXPORT_ARTIFACT_MAX 個成品，刪除較舊的已完成/失敗工作及其檔案"""
+    finished = [key for key, job in registry['jobs'].items() if job['status'] != 'running']
+    for key in finished[:max(0, len(registry['jobs']) - EXPORT_ARTIFACT_MAX)]:
+        job = registry['jobs'].pop(key)
+        if os.path.exists(job['path']):
+            try:
+                os.remove(job['path'])
+            except OSError:
                 pass
 
-            # 如果需要將所有MRB相關資料列匯出，可以使用以下代碼
-            # 创建一个包含所有需要的列的副本
-            if 'MRB狀態' in filtered_df.columns and 'MRB訊息' in filtered_df.columns:
-                # 只保留四個MRB相關欄位
-                mrb_cols = ['MRB狀態', 'MRB訊息']
-                
-                # 確認基礎標準工時和MRB加時欄位是否存在
-                if '基礎標準工時' in filtered_df.columns:
-                    mrb_cols.append('基礎標準工時')
-                if 'MRB加時' in filtered_df.columns:
-                    mrb_cols.append('MRB加時')
-                
-                # 將選定的MRB欄位匯出到Excel中的"MRB數據"工作表
-                try:
-                    if len(mrb_cols) > 0:
-                        # 只選擇需要的列
-                        mrb_data = filtered_df[mrb_cols]
-                        # 寫入Excel
-                        mrb_data.to_excel(writer, sheet_name='MRB數據', index=False)
-                        debug_log(f"成功匯出 {len(mrb_data)} 筆MRB相關資料")
-                except Exception as e:
-                    debug_log(f"匯出MRB資料時發生錯誤: {str(e)}", level="ERROR")
-                                    
-            # 獲取workbook和worksheet进行格式设置
-            workbook = writer.book
-            worksheet = writer.sheets['處理後資料']
-            
-            # 设置条件格式以高亮MRB记录
-            if '是否為MRB' in filtered_df.columns:
-                # 找到MRB列的索引
-                mrb_col_idx = list(filtered_df.columns).index('是否為MRB')
-                col_letter = chr(65 + mrb_col_idx)  # 将列索引转为Excel列字母
-                
-                # 添加条件格式来高亮MRB记录 - 修改為比較字串"TRUE"
-                worksheet.conditional_format(f"{col_letter}2:{col_letter}{len(filtered_df)+1}", {
-                    'type': 'cell',
-                    'criteria': 'equal to',
-                    'value': '"TRUE"',  # 修改這裡，使用字串值
-                    'format': workbook.add_format({'bg_color': '#FFC7CE'})
-                })
-            
-            # 設置列寬，特別是MRB相關列
-            worksheet.set_column('A:Z', 15)  # 默認列寬
-            
-            # 為MRB消息列設置更寬的列寬
-            if 'MRB訊息' in filtered_df.columns:
-                mrb_msg_col_idx = list(filtered_df.columns).index('MRB訊息')
-                col_letter = chr(65 + mrb_msg_col_idx)
-                worksheet.set_column(f"{col_letter}:{col_letter}", 40)  # 更寬的列寬
-        
-        excel_data = excel_buffer.getvalue()
-        
-        # 下載按鈕
-        st.download_button(
-            label="下載完整Excel報告 (整體計算後結果)",
-            data=excel_data,
-            file_name="IQC完整數據報告.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-        
-        debug_log("匯出功能執行完成")
+def start_export_job(artifact_key, export_format):
+    """
+    提交背景匯出工作；相同鍵的工作正在執行或已完成時直接沿用
+
+    工作內容 (資料集來源，或無法使用時的資料快照) 在腳本執行緒中決定後才交給背景執行緒。
+
+    返回:
+    工作 dict (status: running/done/error, progress, stage, path, error)
+    """
+    registry = _get_export_job_registry()
+    with registry['lock']:
+        job = registry['jobs'].get(artifact_key)
+        if job is not None and job['status'] != 'error':
+            return job
         
-    except Exception as e:
-        error_msg = f"匯出資料時出錯: {str(e)}\n{traceback.format_exc()}"
-        debug_log(error_msg)
-        st.error(error_msg)
+        export_dir = "iqc_export_data"
+        os.makedirs(export_dir, exist_ok=True)
+        artifact_name = hashlib.sha1(repr(artifact_key).encode('utf-8')).hexdigest()[:16]
+        job = {
+            'format': export_format,
+            'path': os.path.join(export_dir, f"iqc_report_{artifact_name}{EXPORT_FORMATS[export_format][1]}"),
+            'status': 'running',
+            'progress': 0.0,
+            'stage': "排隊中",
+            'error': None,
+            'created_at': time.time(),
+            'finished_at': None
+        }
+        registry['jobs'][artifact_key] = job
+        _evict_export_artifacts(registry)
+    
+    # 計算程序由磁碟快取讀取資料集並重新計算目前套用範圍的指標；無法使用時傳送目前的計算結果
+    source = get_job_dataset_source()
+    if source is not None:
+        task = (
+            iqc_engine.write_cached_dataset_export, *source,
+            st.session_state.get('filtered_start_date'), st.session_state.get('filtered_end_date')
+        )
+    else:
+        task = (iqc_engine.write_export_file, {key: st.session_state.get(key) for key in EXPORT_STATE_KEYS})
+    registry['executor'].submit(_run_export_job, job, task)
+    debug_log(f"已提交背景匯出工作: {artifact_key}", level="INFO")
+    return job
+
+def render_export_progress(artifact_key):
+    """
+    顯示匯出進度；支援 fragment 時每隔 EXPORT_POLL_SECONDS 只更新進度區塊，
+    工作結束後整頁重新執行以顯示下載按鈕
+    """
+    def export_progress():
+        job = get_export_job(artifact_key)
+        if job is None or job['status'] != 'running':
+            st.rerun()
+        st.progress(job['progress'], text=f"匯出中：{job['stage']} ({job['progress']:.0%})")
+    
+    if _STREAMLIT_FRAGMENT is not None:
+        try:
+            _STREAMLIT_FRAGMENT(run_every=EXPORT_POLL_SECONDS)(export_progress)()
+            return
+        except TypeError:
+            # 舊版 fragment 不支援 run_every
+            pass
+    
+    export_progress()
+    st.button("更新匯出進度", key="export_progress_refresh", use_container_width=True)
+
+def render_export_panel():
+    """
+    側邊欄的匯出區塊：報表在背景產生，儀表板仍可操作；
+    同一資料版本與日期範圍的成品會保留，重複下載不必重新產生
+    """
+    format_options = [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or parquet_available()]
+    export_format = st.radio(
+        "匯出格式",
+        format_options,
+        format_func=lambda fmt: EXPORT_FORMATS[fmt][0],
+        key="export_panel_format"
+    )
+    artifact_key = get_export_artifact_key(export_format)
+    job = get_export_job(artifact_key)
+    
+    if job is not None and job['status'] == 'running':
+        render_export_progress(artifact_key)
+        return
+    
+    if job is not None and job['status'] == 'done' and os.path.exists(job['path']):
+        _, extension, mime = EXPORT_FORMATS[export_format]
+        with open(job['path'], 'rb') as export_file:
+            st.download_button(
+                label="💾 下載匯出Excel報表" if export_format == 'xlsx' else "💾 下載匯出壓縮檔",
+                data=export_file,
+                file_name=f"IQC完整數據報告{extension}",
+                mime=mime,
+                key="export_download_button",
+                use_container_width=True
+            )
+        return
+    
+    if job is not None and job['status'] == 'error':
+        st.error(f"匯出資料時出錯: {job['error']}")
+    
+    if st.button("💾 產生匯出報表", key="export_data_button", use_container_width=True):
+        if st.session_state.get('processed_data') is None:
+            st.error("沒有可用的處理數據，請先上傳和處理文件")
+            return
+        start_export_job(artifact_key, export_format)
+        st.rerun()
 
 # 3. 添加一個調試函數，用於檢查MRB狀態
 def debug_mrb_status():
@@ -8644,6 +7460,9 @@ def create_sidebar():
             st.write("結束日期")
             end_date = st.date_input("", value=None, key="end_date", label_visibility="collapsed")
         
+        # 背景指標計算狀態 (處理檔案或應用日期篩選後，計算期間仍可操作頁面)
+        render_metrics_progress()
+        
         # 檔案已處理後的選項
         if 'files_uploaded' in st.session_state and st.session_state.files_uploaded:
             # 應用日期篩選按鈕
@@ -8654,54 +7473,26 @@ def create_sidebar():
             )
             
             if filter_button:
-                with st.spinner("應用日期篩選中..."):
-                    try:
-                        debug_log(f"應用日期篩選：從 {start_date} 到 {end_date}", level="INFO")
-                        
-                        # 關鍵修改：清除所有與分析相關的緩存結果
-                        cache_keys = [
-                            'mrb_analysis_results',       # MRB分析結果
-                            'trimmed_avg_efficiency',     # 剔除極值後的效率
-                            'trimmed_record_stats',       # 剔除記錄統計
-                            'category_efficiency_data',   # 類別效率數據
-                            'has_applied_selection'       # 應用選擇標記
-                        ]
+                try:
+                    debug_log(f"應用日期篩選：從 {start_date} 到 {end_date}", level="INFO")
                         
-                        for key in cache_keys:
-                            if key in st.session_state:
-                                del st.session_state[key]
-                                debug_log(f"已清除緩存：{key}", level="INFO")
+                    # 重新計算所有指標：相同資料版本與日期範圍直接取用快取，
+                    # 否則交給計算程序，完成前仍顯示原本的數據
+                    if start_metrics_job('filter', start_date, end_date):
+                        debug_log("日期篩選已應用，所有數據已更新", level="INFO")
+                        st.success(f"已成功應用日期篩選：{start_date} 到 {end_date}")
                         
-                        # 重新計算所有指標
-                        metrics = calculate_all_metrics(
-                            st.session_state.iqc_report_data,
-                            st.session_state.pcb_spec_data,
-                            st.session_state.pcb_standard_time_data,
-                            st.session_state.additional_tasks_data,
-                            start_date,
-                            end_date
-                        )
+                        # 強制重新運行以確保UI更新
+                        st.rerun()
                         
-                        if metrics:
-                            # 更新所有數據
-                            st.session_state.processed_data = metrics['processed_data']
-                            st.session_state.efficiency_data = metrics['efficiency_data']
-                            st.session_state.workload_data = metrics['workload_data']
-                            st.session_state.time_allocation_data = metrics['time_allocation_data']
-                            st.session_state.additional_tasks_monitor_data = metrics['additional_tasks_monitor_data']
-                            
-                            # 立即進行一次頁面刷新以確保所有數據都被更新
-                            debug_log("日期篩選已應用，所有數據已更新", level="INFO")
-                            st.success(f"已成功應用日期篩選：{start_date} 到 {end_date}")
-                            
-                            # 可選：強制重新運行以確保UI更新
-                            st.rerun()
-                    
-                    except Exception as e:
-                        error_msg = f"應用篩選時出錯: {str(e)}\n{traceback.format_exc()}"
-                        debug_log(error_msg, level="ERROR")
-                        st.error(error_msg)
-                        st.session_state.processing_error = error_msg
+                except Exception as e:
+                    error_msg = f"應用篩選時出錯: {str(e)}\n{traceback.format_exc()}"
+                    debug_log(error_msg, level="ERROR")
+                    st.error(error_msg)
+                    st.session_state.processing_error = error_msg
+            
+            # 匯出報表 (背景產生，完成後提供下載)
+            render_export_panel()
         
         # 視覺分隔線
         st.markdown("<hr style='margin: 25px 0; border: none; height: 1px; background-color: #eee;'>", unsafe_allow_html=True)
@@ -8835,193 +7626,6 @@ def create_sidebar():
         components.html(guide_button_html, height=65)
 
 
-# 改进后的文件分类函数
-def classify_files(files):
-    """
-    根据文件名和内容智能分类上传的文件
-    返回四组文件：IQC Report, PCB建檔明細, PCB標準工時對應表, IQC額外任務紀錄清單
-    """
-    debug_log(f"开始分类 {len(files)} 个文件")
-    
-    iqc_report_files = []
-    pcb_specs_files = []
-    pcb_standard_time_files = []
-    additional_tasks_files = []
-    
-    # 打印所有上传的文件名，便于调试
-    file_names = [f.name for f in files]
-    debug_log(f"所有上传文件: {file_names}")
-    
-    # 更完整的关键词匹配规则
-    iqc_report_keywords = ['iqc', 'report', '報告', '檢驗報告', '檢驗', 'inspector']
-    pcb_specs_keywords = ['pcb', '建檔', '明細', 'spec', '建立規格']
-    pcb_std_time_keywords = ['標準工時', 'standard', 'time', '對應表', '工時']
-    additional_tasks_keywords = ['額外', '任務', 'task', '清單', '紀錄', '工作事項']
-    
-    # 精确匹配特定文件名
-    pcb_std_time_exact = ['pcb標準工時對應表.xlsx', 'pcb標準工時對應表.xls']
-    additional_tasks_exact = ['iqc額外任務紀錄清單.xlsx', 'iqc額外任務紀錄清單.xls']
-    
-    for file in files:
-        # 保存原始文件指针位置
-        file_position = file.tell()
-        
-        filename = file.name
-        filename_lower = filename.lower()
-        file_classified = False
-        
-        # 1. 首先尝试精确匹配文件名
-        if any(exact_name.lower() == filename_lower for exact_name in pcb_std_time_exact):
-            pcb_standard_time_files.append(file)
-            debug_log(f"文件 {filename} 通过精确匹配被识别为 PCB標準工時對應表")
-            file_classified = True
-        
-        elif any(exact_name.lower() == filename_lower for exact_name in additional_tasks_exact):
-            additional_tasks_files.append(file)
-            debug_log(f"文件 {filename} 通过精确匹配被识别为 IQC額外任務紀錄清單")
-            file_classified = True
-            
-        # 2. 如果没有精确匹配成功，尝试关键词匹配
-        elif not file_classified:
-            # PCB标准工时关键词优先级高于其他类型
-            if any(keyword in filename_lower for keyword in pcb_std_time_keywords):
-                pcb_standard_time_files.append(file)
-                debug_log(f"文件 {filename} 通过关键词被识别为 PCB標準工時對應表")
-                file_classified = True
-                
-            elif any(keyword in filename_lower for keyword in additional_tasks_keywords):
-                additional_tasks_files.append(file)
-                debug_log(f"文件 {filename} 通过关键词被识别为 IQC額外任務紀錄清單")
-                file_classified = True
-                
-            elif any(keyword in filename_lower for keyword in pcb_specs_keywords):
-                pcb_specs_files.append(file)
-                debug_log(f"文件 {filename} 通过关键词被识别为 PCB建檔明細")
-                file_classified = True
-                
-            elif any(keyword in filename_lower for keyword in iqc_report_keywords) or 'iqc report' in filename_lower:
-                iqc_report_files.append(file)
-                debug_log(f"文件 {filename} 通过关键词被识别为 IQC Report")
-                file_classified = True
-        
-        # 3. 如果仍然未识别，尝试读取内容
-        if not file_classified:
-            try:
-                # 重置文件指针
-                file.seek(0)
-                
-                # 读取Excel文件的表头来识别文件类型
-                df = pd.read_excel(file, nrows=5)
-                columns = [str(col).lower() for col in df.columns]
-                debug_log(f"文件 {filename} 的表头: {columns[:10]}")
-                
-                # 判断是否为PCB标准工时对应表
-                if any(keyword in ','.join(columns) for keyword in ['面積範圍', '面积范围', '壓合總孔數', '压合总孔数', 'pcb標準工時']):
-                    pcb_standard_time_files.append(file)
-                    debug_log(f"文件 {filename} 通过内容被识别为 PCB標準工時對應表")
-                
-                # 判断是否为IQC额外任务记录清单
-                elif any(keyword in ','.join(columns) for keyword in ['姓名', '用時(分鐘)', '用时(分钟)', '工作事項分類', '工作事项分类']):
-                    additional_tasks_files.append(file)
-                    debug_log(f"文件 {filename} 通过内容被识别为 IQC額外任務紀錄清單")
-                
-                # 判断是否为PCB建档明细
-                elif any(keyword in ','.join(columns) for keyword in ['料號', '料号', '壓合孔數', '压合孔数', '版長', '版长', '版寬', '版宽']):
-                    pcb_specs_files.append(file)
-                    debug_log(f"文件 {filename} 通过内容被识别为 PCB建檔明細")
-                
-                # 判断是否为IQC Report
-                elif any(keyword in ','.join(columns) for keyword in ['inspector', '檢驗員', '检验员', '檢驗人員', '检验人员', 'mrb']):
-                    iqc_report_files.append(file)
-                    debug_log(f"文件 {filename} 通过内容被识别为 IQC Report")
-                
-                else:
-                    # 如果仍然无法识别，根据特定线索进一步判断
-                    if '工時' in filename_lower or '工时' in filename_lower or 'time' in filename_lower:
-                        pcb_standard_time_files.append(file)
-                        debug_log(f"文件 {filename} 通过额外规则被识别为 PCB標準工時對應表")
-                    elif '任務' in filename_lower or '任务' in filename_lower or 'task' in filename_lower:
-                        additional_tasks_files.append(file)
-                        debug_log(f"文件 {filename} 通过额外规则被识别为 IQC額外任務紀錄清單")
-                    else:
-                        # 最后的默认分类
-                        iqc_report_files.append(file)
-                        debug_log(f"文件 {filename} 无法确定类型，默认识别为 IQC Report")
-                
-            except Exception as e:
-                debug_log(f"尝试读取文件 {filename} 内容时出错: {str(e)}")
-                # 如果读取失败，尝试最后一次通过文件名判断
-                if any(term in filename_lower for term in ['工時', '工时', 'time']):
-                    pcb_standard_time_files.append(file)
-                    debug_log(f"文件 {filename} 读取失败，通过文件名判断为 PCB標準工時對應表")
-                elif any(term in filename_lower for term in ['任務', '任务', 'task']):
-                    additional_tasks_files.append(file)
-                    debug_log(f"文件 {filename} 读取失败，通过文件名判断为 IQC額外任務紀錄清單")
-                else:
-                    # 如果还是不能确定，默认为IQC Report
-                    iqc_report_files.append(file)
-                    debug_log(f"文件 {filename} 读取失败，默认识别为 IQC Report")
-            
-        # 重置文件指针回原位置
-        file.seek(file_position)
-    
-    # 检查特定类型文件是否缺失，如果用户明确上传了文件但未被正确识别，强制分类
-    if not pcb_standard_time_files and any('工時' in f.name.lower() or '工时' in f.name.lower() or 'time' in f.name.lower() for f in files):
-        for file in files:
-            if ('工時' in file.name.lower() or '工时' in file.name.lower() or 'time' in file.name.lower()) and file not in pcb_standard_time_files:
-                pcb_standard_time_files.append(file)
-                debug_log(f"强制将文件 {file.name} 识别为 PCB標準工時對應表")
-                # 从其他类别中移除(如果存在)
-                if file in iqc_report_files: iqc_report_files.remove(file)
-                if file in pcb_specs_files: pcb_specs_files.remove(file)
-                if file in additional_tasks_files: additional_tasks_files.remove(file)
-    
-    if not additional_tasks_files and any('任務' in f.name.lower() or '任务' in f.name.lower() or 'task' in f.name.lower() for f in files):
-        for file in files:
-            if ('任務' in file.name.lower() or '任务' in file.name.lower() or 'task' in file.name.lower()) and file not in additional_tasks_files:
-                additional_tasks_files.append(file)
-                debug_log(f"强制将文件 {file.name} 识别为 IQC額外任務紀錄清單")
-                # 从其他类别中移除(如果存在)
-                if file in iqc_report_files: iqc_report_files.remove(file)
-                if file in pcb_specs_files: pcb_specs_files.remove(file)
-                if file in pcb_standard_time_files: pcb_standard_time_files.remove(file)
-    
-    # 再次检查，如果仍然缺少特定类型，尝试从未分类文件或多余的IQC Report文件中找出可能的匹配
-    remaining_files = [f for f in files if f not in iqc_report_files and f not in pcb_specs_files and 
-                       f not in pcb_standard_time_files and f not in additional_tasks_files]
-    
-    if not pcb_standard_time_files and remaining_files:
-        # 从剩余文件中添加第一个作为PCB标准工时对应表
-        pcb_standard_time_files.append(remaining_files[0])
-        debug_log(f"未找到PCB標準工時對應表，强制将文件 {remaining_files[0].name} 识别为此类型")
-        remaining_files.pop(0)
-    
-    if not additional_tasks_files and remaining_files:
-        # 从剩余文件中添加第一个作为IQC额外任务记录清单
-        additional_tasks_files.append(remaining_files[0])
-        debug_log(f"未找到IQC額外任務紀錄清單，强制将文件 {remaining_files[0].name} 识别为此类型")
-        remaining_files.pop(0)
-    
-    # 最后一次检查，如果仍然缺少，且IQC Report有多个，则将其中一个重新分类
-    if not pcb_standard_time_files and len(iqc_report_files) > 1:
-        file = iqc_report_files.pop() # 移除最后一个IQC Report
-        pcb_standard_time_files.append(file)
-        debug_log(f"未找到PCB標準工時對應表，从IQC Report中重新分类文件 {file.name}")
-    
-    if not additional_tasks_files and len(iqc_report_files) > 1:
-        file = iqc_report_files.pop() # 移除最后一个IQC Report
-        additional_tasks_files.append(file)
-        debug_log(f"未找到IQC額外任務紀錄清單，从IQC Report中重新分类文件 {file.name}")
-    
-    # 输出最终分类结果
-    debug_log(f"文件分类完成: IQC Report({len(iqc_report_files)}), PCB建檔明細({len(pcb_specs_files)}), " +
-             f"PCB標準工時對應表({len(pcb_standard_time_files)}), IQC額外任務紀錄清單({len(additional_tasks_files)})")
-    
-    debug_log(f"PCB標準工時對應表: {[f.name for f in pcb_standard_time_files]}")
-    debug_log(f"IQC額外任務紀錄清單: {[f.name for f in additional_tasks_files]}")
-    
-    return iqc_report_files, pcb_specs_files, pcb_standard_time_files, additional_tasks_files
-
 # 自定義進度條函數
 def custom_progress_bar():
     """創建自定義進度條，返回更新函數和容器"""
@@ -9079,6 +7683,9 @@ def process_files_button_click(uploaded_files, start_date, end_date):
     spinner = custom_spinner("正在處理資料，請稍候...")
     
     try:
+        # 先啟動計算程序，解析檔案期間同時載入計算核心
+        _get_compute_pool()
+        
         # 自動識別分類檔案
         iqc_report_files, pcb_specs_files, pcb_standard_time_files, additional_tasks_files = classify_files(uploaded_files)
         
@@ -9100,36 +7707,58 @@ def process_files_button_click(uploaded_files, start_date, end_date):
         # 優化數據處理，使用性能模式設定
         high_performance = st.session_state.get('performance_mode', False)
         
-        # 逐步處理各檔案類型，更新進度條
-        update_progress(10)
-        iqc_report_data = process_multiple_iqc_reports_optimized(
-            iqc_report_files
-        ) if iqc_report_files else None
-
-        update_progress(40)
-        pcb_spec_data = process_multiple_pcb_specs(
-            pcb_specs_files
-        ) if pcb_specs_files else None
-
-        update_progress(60)
-        pcb_standard_time_data = process_multiple_pcb_standard_times(
-            pcb_standard_time_files
-        ) if pcb_standard_time_files else None
-
-        update_progress(80)
-        additional_tasks_data = process_multiple_additional_tasks(
-            additional_tasks_files
-        ) if additional_tasks_files else None
+        def parse_uploaded_files():
+            # 逐步處理各檔案類型，更新進度條
+            update_progress(10)
+            iqc_report_data = process_multiple_iqc_reports_optimized(
+                iqc_report_files
+            ) if iqc_report_files else None
+            if iqc_report_data is None:
+                return None
+
+            update_progress(40)
+            pcb_spec_data = process_multiple_pcb_specs(
+                pcb_specs_files
+            ) if pcb_specs_files else None
+
+            update_progress(60)
+            pcb_standard_time_data = process_multiple_pcb_standard_times(
+                pcb_standard_time_files
+            ) if pcb_standard_time_files else None
+
+            update_progress(80)
+            additional_tasks_data = process_multiple_additional_tasks(
+                additional_tasks_files
+            ) if additional_tasks_files else None
+            
+            return {
+                'iqc_report_data': iqc_report_data,
+                'pcb_spec_data': pcb_spec_data,
+                'pcb_standard_time_data': pcb_standard_time_data,
+                'additional_tasks_data': additional_tasks_data,
+                # 於 ingest 時計算一次資料版本代碼，後續指標快取不必再雜湊整個 DataFrame
+                'data_version': compute_data_version(
+                    iqc_report_data, pcb_spec_data, pcb_standard_time_data, additional_tasks_data
+                )
+            }
+        
+        # 相同檔案內容在所有工作階段只解析一次，共用同一份資料集
+        shared_dataset = acquire_shared_dataset(compute_upload_fingerprint(uploaded_files), parse_uploaded_files)
         
         # 檢查是否所有必要數據都已處理
-        if iqc_report_data is None:
+        if shared_dataset is None:
             st.error("無法處理IQC Report數據，請檢查上傳的檔案")
             # 清除進度條和spinner
             progress_container.empty()
             spinner.empty()
             return False
         
-        # 存儲處理後的數據
+        iqc_report_data = shared_dataset['iqc_report_data']
+        pcb_spec_data = shared_dataset['pcb_spec_data']
+        pcb_standard_time_data = shared_dataset['pcb_standard_time_data']
+        additional_tasks_data = shared_dataset['additional_tasks_data']
+        
+        # 存儲處理後的數據 (與其他工作階段共用同一物件)
         st.session_state.iqc_report_data = iqc_report_data
         st.session_state.pcb_spec_data = pcb_spec_data
         st.session_state.pcb_standard_time_data = pcb_standard_time_data
@@ -9142,33 +7771,21 @@ def process_files_button_click(uploaded_files, start_date, end_date):
         
         debug_log("檔案處理完成，計算指標", level="INFO")
         
-        # 使用優化後的函數計算指標
-        metrics = calculate_all_metrics(
-            iqc_report_data,
-            pcb_spec_data,
-            pcb_standard_time_data,
-            additional_tasks_data,
-            start_date,
-            end_date
-        )
+        st.session_state.data_version = shared_dataset['data_version']
+        
+        # 計算指標：相同資料版本與日期範圍直接取用快取，否則交給計算程序，
+        # 完成後於下一次重新執行時套用 (見 collect_metrics_job)
+        metrics_ready = start_metrics_job('process', start_date, end_date, start_time)
         
         update_progress(100)
         
-        if metrics:
-            st.session_state.processed_data = metrics['processed_data']
-            st.session_state.efficiency_data = metrics['efficiency_data']
-            st.session_state.workload_data = metrics['workload_data']
-            st.session_state.time_allocation_data = metrics['time_allocation_data']
-            st.session_state.additional_tasks_monitor_data = metrics['additional_tasks_monitor_data']
-            st.session_state.files_uploaded = True
-            
-            # 確保初始沒有選擇的物料類別
-            st.session_state.selected_material_categories = []
-            
-            # 保存日期篩選狀態
-            st.session_state.start_date = start_date
-            st.session_state.end_date = end_date
+        if not metrics_ready and st.session_state.get('metrics_job') is not None:
+            debug_log("檔案處理完成，指標於背景計算中", level="INFO")
+            progress_container.empty()
+            spinner.empty()
+            return True
             
+        if metrics_ready:
             end_time = time.time()  # 記錄處理結束時間
             processing_time = end_time - start_time
             debug_log(f"指標計算完成，處理時間: {processing_time:.2f}秒", level="INFO")
@@ -9259,6 +7876,7 @@ def render_settings_panel():
                 std_time_counts = std_time_counts.sort_values('標準工時')
                 
                 # 創建分佈圖
+                import plotly.express as px
                 fig = px.bar(
                     std_time_counts,
                     x='標準工時',
@@ -9299,9 +7917,10 @@ def render_settings_panel():
             st.session_state.debug_info['logs'] = []
         st.sidebar.success("已清理所有日誌")
 
+@st.cache_data(show_spinner=False)
 def get_base64_of_bin_file(bin_file):
     """
-    將二進制文件轉換為base64編碼的字符串
+    將二進制文件轉換為base64編碼的字符串 (依路徑快取，同一圖片只讀取與編碼一次)
     
     參數:
     bin_file (str): 二進制文件的路徑
@@ -9322,8 +7941,7 @@ def show_cover_page():
     封面頁面 - Shader Lines 動態效果 + IQC 文字
     """
     # 检查URL参数
-    params = st.experimental_get_query_params()
-    if "enter_clicked" in params:
+    if "enter_clicked" in st.query_params:
         st.session_state.show_cover = False
         st.rerun()
     
@@ -9727,6 +8345,225 @@ def show_cover_page():
 # 異常行為偵測模組 (Anomaly Detection Module)
 # ============================================================
 
+# ==================== 異常偵測引擎 ====================
+# 極速檢驗異常等級 (由嚴重到輕微)
+FLASH_ANOMALY_LEVELS = ['🔴 極度可疑', '🟠 可疑', '🟡 相對異常']
+FLASH_NORMAL_LEVEL = '✅ 正常'
+
+def calculate_efficiency_ratio(df):
+    """
+    向量化計算單批效率比值 (標準工時 / 實際耗時，耗時為0時效率為0)
+
+    參數:
+    df - 含 處理後檢驗標準工時、檢驗耗時 的DataFrame
+
+    返回:
+    效率比值 Series
+    """
+    standard_time = pd.to_numeric(df['處理後檢驗標準工時'], errors='coerce').fillna(0)
+    actual_time = pd.to_numeric(df['檢驗耗時'], errors='coerce').fillna(0)
+    return (standard_time / actual_time.where(actual_time > 0)).fillna(0)
+
+def prepare_anomaly_frame(processed_data):
+    """
+    計算異常偵測所需、與閾值無關的中間欄位
+
+    包含：效率比值、有MRB、大類別、類別平均效率 (groupby().transform)。
+    閾值調整時只需重新執行最後的比較，不必重算這些欄位。
+
+    參數:
+    processed_data - 處理後的檢驗資料
+
+    返回:
+    已排除指定檢驗員、含中間欄位的DataFrame
+    """
+    analysis_df = filter_excluded_inspectors(processed_data)
+    if analysis_df is None or analysis_df.empty:
+        return analysis_df
+    
+    analysis_df = analysis_df.copy()
+    analysis_df['處理後檢驗標準工時'] = pd.to_numeric(analysis_df['處理後檢驗標準工時'], errors='coerce').fillna(0)
+    analysis_df['檢驗耗時'] = pd.to_numeric(analysis_df['檢驗耗時'], errors='coerce').fillna(0)
+    if '效率比值' not in analysis_df.columns:
+        analysis_df['效率比值'] = calculate_efficiency_ratio(analysis_df)
+    
+    analysis_df['有MRB'] = derive_mrb_flag(analysis_df)
+    analysis_df['大類別'] = map_main_category(analysis_df['類別'], unknown_label='其他', keep_unmapped=False)
+    # 類別缺值時以1.0作為群體平均效率
+    analysis_df['類別平均效率'] = analysis_df.groupby('類別')['效率比值'].transform('mean').fillna(1.0)
+    
+    return analysis_df
+
+def get_anomaly_frame(processed_data):
+    """取得異常偵測中間欄位，同一份資料只計算一次"""
+    return get_session_cached(
+        'anomaly_frame_cache',
+        'anomaly_frame',
+        processed_data,
+        lambda: prepare_anomaly_frame(processed_data)
+    )
+
+def classify_flash_anomalies(analysis_df, extreme_threshold, suspicious_threshold, relative_threshold):
+    """
+    以 np.select 向量化判定極速檢驗異常等級
+
+    參數:
+    analysis_df - prepare_anomaly_frame 的結果
+    extreme_threshold - 極度可疑閾值 (效率 >=)
+    suspicious_threshold - 可疑閾值 (效率 >=)
+    relative_threshold - 相對異常倍數 (效率 >= 類別平均 ×)
+
+    返回:
+    異常等級 Series
+    """
+    efficiency = analysis_df['效率比值']
+    category_avg = analysis_df['類別平均效率']
+    return pd.Series(
+        np.select(
+            [
+                efficiency >= extreme_threshold,
+                efficiency >= suspicious_threshold,
+                (category_avg > 0) & (efficiency >= category_avg * relative_threshold)
+            ],
+            FLASH_ANOMALY_LEVELS,
+            default=FLASH_NORMAL_LEVEL
+        ),
+        index=analysis_df.index
+    )
+
+def find_turtle_anomalies(analysis_df, low_efficiency_threshold, min_time_threshold):
+    """
+    篩選無效工時：效率低 + 無MRB + 耗時夠長
+
+    參數:
+    analysis_df - prepare_anomaly_frame 的結果
+    low_efficiency_threshold - 低效率閾值 (效率 <)
+    min_time_threshold - 最小耗時 (分鐘 >=)
+
+    返回:
+    布林遮罩 Series
+    """
+    efficiency = analysis_df['效率比值']
+    return (
+        (efficiency < low_efficiency_threshold) &
+        (efficiency > 0) &  # 排除0效率（可能是數據問題）
+        (~analysis_df['有MRB']) &
+        (analysis_df['檢驗耗時'] >= min_time_threshold)
+    )
+
+# ==================== 穩健異常評分 ====================
+# 修正Z分數常數：0.6745 × (x - 中位數) / MAD，|分數| > 3.5 一般視為離群值
+ROBUST_Z_SCALE = 0.6745
+ROBUST_Z_THRESHOLD = 3.5
+# 基準至少需要的樣本數，不足時退回較粗的基準
+ROBUST_MIN_SAMPLES = 5
+
+def _median_and_mad(values, keys):
+    """
+    向量化計算各組的中位數、MAD (中位數絕對偏差) 與樣本數，並對齊回原資料列
+
+    參數:
+    values - 數值 Series
+    keys - 分組鍵 Series
+
+    返回:
+    (中位數 Series, MAD Series, 樣本數 Series)
+    """
+    grouped = values.groupby(keys)
+    median = grouped.transform('median')
+    mad = (values - median).abs().groupby(keys).transform('median')
+    count = grouped.transform('count')
+    return median, mad, count
+
+def _rolling_median_and_mad(values, keys, dates, window_days):
+    """
+    向量化計算各組在時間視窗 (含當日往前 window_days 天) 內的滾動中位數與MAD
+
+    滾動MAD以「與滾動中位數的絕對偏差」再取滾動中位數近似。
+
+    參數:
+    values - 數值 Series
+    keys - 分組鍵 Series
+    dates - 日期 Series (datetime)
+    window_days - 視窗天數
+
+    返回:
+    (滾動中位數 Series, 滾動MAD Series, 視窗樣本數 Series)，索引與 values 相同
+    """
+    frame = pd.DataFrame({'key': keys, 'date': dates, 'value': values}).sort_values(['key', 'date'], kind='mergesort')
+    window = f'{int(window_days)}D'
+    
+    # rolling 逐列前進，同一天的紀錄中較早的列看不到當天較晚的列，結果會隨輸入順序改變；
+    # 改取每組每日最後一列的結果 (已含當日所有紀錄) 給當天所有紀錄
+    def rolling_by_day(column, how):
+        # 分組鍵與日期皆已排序，groupby().rolling() 的輸出順序與 frame 一致
+        rolling = getattr(frame.set_index('date').groupby('key', sort=True)[column].rolling(window), how)()
+        by_row = pd.Series(rolling.to_numpy(), index=frame.index)
+        return by_row.groupby([frame['key'], frame['date']], sort=False).transform('last')
+    
+    median = rolling_by_day('value', 'median')
+    count = rolling_by_day('value', 'count')
+    
+    frame['deviation'] = (frame['value'] - median).abs()
+    mad = rolling_by_day('deviation', 'median')
+    
+    result = pd.DataFrame({'median': median, 'mad': mad, 'count': count}, index=frame.index).reindex(values.index)
+    return result['median'], result['mad'], result['count']
+
+def calculate_robust_anomaly_scores(analysis_df, window_days=30, min_samples=ROBUST_MIN_SAMPLES):
+    """
+    以穩健基準 (中位數/MAD) 為每一批計算類Z分數，供跨類別排序異常
+
+    基準優先順序：料號 → 類別滾動視窗 → 類別整體，樣本數不足或MAD為0時退回下一層。
+    分數為正表示比基準快 (疑似極速)，為負表示比基準慢 (疑似無效工時)。
+    效率為0的紀錄 (多為資料問題) 不計分。
+
+    參數:
+    analysis_df - prepare_anomaly_frame 的結果
+    window_days - 類別滾動基準的視窗天數
+    min_samples - 基準至少需要的樣本數
+
+    返回:
+    DataFrame，索引與 analysis_df 相同，含 基準來源、基準效率、基準MAD、穩健分數
+    """
+    valid_mask = (analysis_df['效率比值'] > 0) & analysis_df['檢驗日期'].notna()
+    valid_df = analysis_df[valid_mask]
+    efficiency = valid_df['效率比值']
+    categories = valid_df['類別'].fillna('')
+    
+    part_median, part_mad, part_count = _median_and_mad(efficiency, valid_df['料號'].fillna(''))
+    rolling_median, rolling_mad, rolling_count = _rolling_median_and_mad(
+        efficiency, categories, pd.to_datetime(valid_df['檢驗日期'], errors='coerce'), window_days
+    )
+    category_median, category_mad, _ = _median_and_mad(efficiency, categories)
+    
+    use_part = (part_count >= min_samples) & (part_mad > 0)
+    use_rolling = ~use_part & (rolling_count >= min_samples) & (rolling_mad > 0)
+    
+    baseline = np.select([use_part, use_rolling], [part_median, rolling_median], default=category_median)
+    baseline_mad = np.select([use_part, use_rolling], [part_mad, rolling_mad], default=category_mad)
+    baseline_source = np.select([use_part, use_rolling], ['料號', f'類別{int(window_days)}日'], default='類別')
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(baseline_mad > 0, ROBUST_Z_SCALE * (efficiency - baseline) / baseline_mad, np.nan)
+    
+    result = pd.DataFrame({
+        '基準來源': baseline_source,
+        '基準效率': baseline,
+        '基準MAD': baseline_mad,
+        '穩健分數': scores
+    }, index=valid_df.index)
+    return result.reindex(analysis_df.index)
+
+def get_robust_anomaly_scores(processed_data, window_days=30, min_samples=ROBUST_MIN_SAMPLES):
+    """取得穩健異常分數，同一份資料與參數只計算一次"""
+    return get_session_cached(
+        'robust_anomaly_cache',
+        (window_days, min_samples),
+        processed_data,
+        lambda: calculate_robust_anomaly_scores(get_anomaly_frame(processed_data), window_days, min_samples)
+    )
+
 def render_anomaly_detection_dashboard(processed_data, efficiency_data):
     """
     異常行為偵測儀表板
@@ -9734,14 +8571,17 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
     - 無效工時警示：效率過低且無MRB
     - 群體相對異常：比同類別群體快太多
     """
+    import plotly.express as px
+    import plotly.graph_objects as go
+    
     if processed_data is None or processed_data.empty:
         st.error("沒有可用的數據進行異常偵測分析")
         return
     
-    # 過濾數據
-    filtered_data = filter_excluded_inspectors(processed_data)
+    # 過濾數據並取得快取的中間欄位 (效率比值、有MRB、大類別、類別平均效率)
+    filtered_data = get_anomaly_frame(processed_data)
     
-    if filtered_data.empty:
+    if filtered_data is None or filtered_data.empty:
         st.warning("篩選後無數據可供分析")
         return
     
@@ -9755,17 +8595,19 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
     </div>
     """, unsafe_allow_html=True)
     
-    # ===== 使用子頁籤分類 =====
-    anomaly_tab1, anomaly_tab2, anomaly_tab3 = st.tabs([
+    # ===== 使用子頁籤分類，只計算選中的子頁籤；各子頁籤以 fragment 執行，調整閾值只重新執行該子頁籤 =====
+    anomaly_subtab = select_lazy_tab([
         "⚡ 極速檢驗警示",
         "🐢 無效工時警示",
-        "📊 標準工時偏差分析"
-    ])
+        "📊 標準工時偏差分析",
+        "📐 穩健異常評分"
+    ], key="anomaly_subtab")
     
     # ==========================================
     # Tab 1: 極速檢驗警示 (The "Flash" Alert)
     # ==========================================
-    with anomaly_tab1:
+    @dashboard_fragment
+    def render_flash_alert_section():
         st.subheader("⚡ 極速檢驗警示 (Flash Alert)")
         
         st.markdown("""
@@ -9795,40 +8637,12 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
                 help="效率超過該類別群體平均的N倍視為相對異常"
             )
         
-        # 計算效率（如果尚未計算）
-        analysis_df = filtered_data.copy()
-        
-        # 確保效率欄位存在
-        if '效率比值' not in analysis_df.columns:
-            analysis_df['處理後檢驗標準工時'] = pd.to_numeric(analysis_df['處理後檢驗標準工時'], errors='coerce').fillna(0)
-            analysis_df['檢驗耗時'] = pd.to_numeric(analysis_df['檢驗耗時'], errors='coerce').fillna(0)
-            analysis_df['效率比值'] = analysis_df.apply(
-                lambda row: row['處理後檢驗標準工時'] / row['檢驗耗時'] if row['檢驗耗時'] > 0 else 0, 
-                axis=1
-            )
-        
-        # 計算各類別的群體平均效率
-        category_avg_efficiency = analysis_df.groupby('類別')['效率比值'].mean().to_dict()
-        
-        # 標記異常
-        def classify_flash_anomaly(row):
-            eff = row['效率比值']
-            category = row['類別']
-            cat_avg = category_avg_efficiency.get(category, 1.0)
-            
-            if eff >= extreme_threshold:
-                return '🔴 極度可疑'
-            elif eff >= suspicious_threshold:
-                return '🟠 可疑'
-            elif cat_avg > 0 and eff >= cat_avg * relative_threshold:
-                return '🟡 相對異常'
-            else:
-                return '✅ 正常'
-        
-        analysis_df['異常等級'] = analysis_df.apply(classify_flash_anomaly, axis=1)
+        # 標記異常 - 只重新執行與閾值相關的比較
+        analysis_df = filtered_data
+        anomaly_levels = classify_flash_anomalies(analysis_df, extreme_threshold, suspicious_threshold, relative_threshold)
         
         # 篩選出異常紀錄
-        flash_anomalies = analysis_df[analysis_df['異常等級'] != '✅ 正常'].copy()
+        flash_anomalies = analysis_df[anomaly_levels != FLASH_NORMAL_LEVEL].assign(異常等級=anomaly_levels)
         
         if not flash_anomalies.empty:
             # 統計各等級數量
@@ -9854,13 +8668,13 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
             # 按人員統計異常次數
             st.write("**📊 各人員極速檢驗次數統計**")
             
-            inspector_anomaly_stats = flash_anomalies.groupby('處理後檢驗員').agg(
-                極度可疑=('異常等級', lambda x: (x == '🔴 極度可疑').sum()),
-                可疑=('異常等級', lambda x: (x == '🟠 可疑').sum()),
-                相對異常=('異常等級', lambda x: (x == '🟡 相對異常').sum()),
-                總異常筆數=('異常等級', 'count'),
-                涉及類別數=('類別', 'nunique')
-            ).reset_index().sort_values('總異常筆數', ascending=False)
+            level_counts = pd.crosstab(flash_anomalies['處理後檢驗員'], flash_anomalies['異常等級']).reindex(
+                columns=FLASH_ANOMALY_LEVELS, fill_value=0
+            )
+            level_counts.columns = ['極度可疑', '可疑', '相對異常']
+            level_counts['總異常筆數'] = level_counts.sum(axis=1)
+            level_counts['涉及類別數'] = flash_anomalies.groupby('處理後檢驗員')['類別'].nunique()
+            inspector_anomaly_stats = level_counts.rename_axis('處理後檢驗員').reset_index().sort_values('總異常筆數', ascending=False)
             
             # 橫向條形圖
             fig_flash = go.Figure()
@@ -9902,18 +8716,6 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
             st.markdown("---")
             st.write("**🔎 個人極速檢驗詳細分析**")
             
-            # 映射大類別函數
-            def get_main_category(sub_cat):
-                if pd.isna(sub_cat):
-                    return "其他"
-                for main, subs in MATERIAL_CATEGORY_MAPPING.items():
-                    if sub_cat in subs:
-                        return main
-                return "其他"
-            
-            # 添加大類別欄位
-            flash_anomalies['大類別'] = flash_anomalies['類別'].apply(get_main_category)
-            
             # 取得有異常的人員清單
             anomaly_inspectors = inspector_anomaly_stats['處理後檢驗員'].tolist()
             
@@ -10033,7 +8835,8 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
     # ==========================================
     # Tab 2: 無效工時警示 (The "Turtle" Alert)
     # ==========================================
-    with anomaly_tab2:
+    @dashboard_fragment
+    def render_turtle_alert_section():
         st.subheader("🐢 無效工時警示 (Turtle Alert)")
         
         st.markdown("""
@@ -10057,43 +8860,10 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
                 help="只分析耗時超過此值的紀錄（排除極短檢驗）"
             )
         
-        # 確保MRB欄位存在
-        analysis_df2 = filtered_data.copy()
-        
-        # 計算效率
-        if '效率比值' not in analysis_df2.columns:
-            analysis_df2['處理後檢驗標準工時'] = pd.to_numeric(analysis_df2['處理後檢驗標準工時'], errors='coerce').fillna(0)
-            analysis_df2['檢驗耗時'] = pd.to_numeric(analysis_df2['檢驗耗時'], errors='coerce').fillna(0)
-            analysis_df2['效率比值'] = analysis_df2.apply(
-                lambda row: row['處理後檢驗標準工時'] / row['檢驗耗時'] if row['檢驗耗時'] > 0 else 0, 
-                axis=1
-            )
-        
-        # 判斷是否有MRB
-        def check_has_mrb(row):
-            # 檢查多種可能的MRB欄位
-            mrb_cols = ['MRB加時', '是否為MRB', 'MRB', 'M']
-            for col in mrb_cols:
-                if col in row.index:
-                    val = row[col]
-                    if pd.notna(val):
-                        if isinstance(val, (int, float)) and val > 0:
-                            return True
-                        if isinstance(val, str) and val.upper() in ['TRUE', 'MRB', 'Y', 'YES', '是']:
-                            return True
-                        if val is True:
-                            return True
-            return False
-        
-        analysis_df2['有MRB'] = analysis_df2.apply(check_has_mrb, axis=1)
-        
-        # 篩選無效工時：效率低 + 無MRB + 耗時夠長
-        turtle_anomalies = analysis_df2[
-            (analysis_df2['效率比值'] < low_efficiency_threshold) &
-            (analysis_df2['效率比值'] > 0) &  # 排除0效率（可能是數據問題）
-            (~analysis_df2['有MRB']) &
-            (analysis_df2['檢驗耗時'] >= min_time_threshold)
-        ].copy()
+        # 篩選無效工時：效率低 + 無MRB + 耗時夠長 (有MRB、效率比值為快取的中間欄位)
+        turtle_anomalies = filtered_data[
+            find_turtle_anomalies(filtered_data, low_efficiency_threshold, min_time_threshold)
+        ]
         
         if not turtle_anomalies.empty:
             # 統計
@@ -10147,18 +8917,6 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
             st.markdown("---")
             st.write("**🔎 個人無效工時詳細分析**")
             
-            # 映射大類別函數
-            def get_main_cat_turtle(sub_cat):
-                if pd.isna(sub_cat):
-                    return "其他"
-                for main, subs in MATERIAL_CATEGORY_MAPPING.items():
-                    if sub_cat in subs:
-                        return main
-                return "其他"
-            
-            # 添加大類別欄位
-            turtle_anomalies['大類別'] = turtle_anomalies['類別'].apply(get_main_cat_turtle)
-            
             # 取得有異常的人員清單
             turtle_inspectors = turtle_stats['處理後檢驗員'].tolist()
             
@@ -10254,7 +9012,8 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
     # ==========================================
     # Tab 3: 標準工時偏差分析
     # ==========================================
-    with anomaly_tab3:
+    @dashboard_fragment
+    def render_standard_time_bias_section():
         st.subheader("📊 標準工時合理性分析 (Standard Time Bias)")
         
         st.markdown("""
@@ -10267,33 +9026,12 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
         # 選擇分析維度
         bias_mode = st.radio("分析維度:", ["物料大類別", "物料子類別"], horizontal=True, key="bias_mode_radio")
         
-        # 準備數據
-        bias_df = filtered_data.copy()
-        
-        # 計算效率
-        if '效率比值' not in bias_df.columns:
-            bias_df['處理後檢驗標準工時'] = pd.to_numeric(bias_df['處理後檢驗標準工時'], errors='coerce').fillna(0)
-            bias_df['檢驗耗時'] = pd.to_numeric(bias_df['檢驗耗時'], errors='coerce').fillna(0)
-            bias_df['效率比值'] = bias_df.apply(
-                lambda row: row['處理後檢驗標準工時'] / row['檢驗耗時'] if row['檢驗耗時'] > 0 else 0, 
-                axis=1
-            )
+        # 準備數據 - 限制效率範圍避免極值影響
+        bias_df = filtered_data[(filtered_data['效率比值'] > 0) & (filtered_data['效率比值'] < 10)]
         
-        # 限制效率範圍避免極值影響
-        bias_df = bias_df[(bias_df['效率比值'] > 0) & (bias_df['效率比值'] < 10)]
-        
-        if bias_mode == "物料大類別":
-            # 映射大類別
-            def get_main_cat(sub):
-                if pd.isna(sub):
-                    return "其他"
-                for main, subs in MATERIAL_CATEGORY_MAPPING.items():
-                    if sub in subs:
-                        return main
-                return "其他"
-            bias_df['分析類別'] = bias_df['類別'].apply(get_main_cat)
-        else:
-            bias_df['分析類別'] = bias_df['類別']
+        # 大類別已於中間欄位預先映射
+        analysis_column = '大類別' if bias_mode == "物料大類別" else '類別'
+        bias_df = bias_df.assign(分析類別=bias_df[analysis_column])
         
         # 過濾掉樣本太少的類別
         cat_counts = bias_df['分析類別'].value_counts()
@@ -10404,31 +9142,8 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
             st.markdown("---")
             st.write("**📋 物料類別效率明細資料**")
             
-            # 準備完整的類別數據（不受箱型圖過濾影響）
-            detail_df = filtered_data.copy()
-            
-            # 計算效率
-            if '效率比值' not in detail_df.columns:
-                detail_df['處理後檢驗標準工時'] = pd.to_numeric(detail_df['處理後檢驗標準工時'], errors='coerce').fillna(0)
-                detail_df['檢驗耗時'] = pd.to_numeric(detail_df['檢驗耗時'], errors='coerce').fillna(0)
-                detail_df['效率比值'] = detail_df.apply(
-                    lambda row: row['處理後檢驗標準工時'] / row['檢驗耗時'] if row['檢驗耗時'] > 0 else 0, 
-                    axis=1
-                )
-            
-            # 過濾異常效率
-            detail_df = detail_df[(detail_df['效率比值'] > 0) & (detail_df['效率比值'] < 10)]
-            
-            # 映射大類別
-            def get_main_cat_detail(sub):
-                if pd.isna(sub):
-                    return "其他"
-                for main, subs in MATERIAL_CATEGORY_MAPPING.items():
-                    if sub in subs:
-                        return main
-                return "其他"
-            
-            detail_df['大類別'] = detail_df['類別'].apply(get_main_cat_detail)
+            # 準備完整的類別數據（不受箱型圖過濾影響），過濾異常效率
+            detail_df = filtered_data[(filtered_data['效率比值'] > 0) & (filtered_data['效率比值'] < 10)]
             
             # === 物料大類別明細 ===
             with st.expander("📊 物料大類別效率明細", expanded=True):
@@ -10573,7 +9288,152 @@ def render_anomaly_detection_dashboard(processed_data, efficiency_data):
                 with summary_cols[3]:
                     slight_tight = len(sub_cat_detail[sub_cat_detail['判定'] == '🟡 略緊'])
                     st.metric("🟡 略緊", f"{slight_tight} 類")
+    
+    # ==========================================
+    # Tab 4: 穩健異常評分 (Robust Score)
+    # ==========================================
+    @dashboard_fragment
+    def render_robust_score_section():
+        st.subheader("📐 穩健異常評分 (Robust Score)")
+        
+        st.markdown("""
+        <div style="background-color: #e8f4fd; border-left: 4px solid #2196f3; padding: 12px; border-radius: 4px; margin-bottom: 15px;">
+            <strong>判定邏輯：</strong> 以料號、類別滾動視窗或類別整體的<strong>中位數與MAD</strong>作為基準，計算修正Z分數 = 0.6745 × (效率 − 基準) ÷ MAD。
+            分數不受極端值與效率上限影響，可跨類別直接排序。正分代表比基準快，負分代表比基準慢。
+        </div>
+        """, unsafe_allow_html=True)
+        
+        col_robust1, col_robust2, col_robust3 = st.columns(3)
+        with col_robust1:
+            robust_window_days = st.number_input(
+                "📅 類別滾動視窗 (天)",
+                min_value=7, max_value=180, value=30, step=1,
+                help="類別基準使用檢驗日往前N天內的紀錄"
+            )
+        with col_robust2:
+            robust_min_samples = st.number_input(
+                "🔢 基準最少樣本數",
+                min_value=3, max_value=50, value=ROBUST_MIN_SAMPLES, step=1,
+                help="料號或視窗樣本數不足時退回較粗的類別基準"
+            )
+        with col_robust3:
+            robust_threshold = st.number_input(
+                "🚩 異常分數閾值 (|分數| >)",
+                min_value=1.0, max_value=10.0, value=ROBUST_Z_THRESHOLD, step=0.5,
+                help="修正Z分數絕對值超過此值視為異常 (常用3.5)"
+            )
+        
+        robust_scores = get_robust_anomaly_scores(processed_data, int(robust_window_days), int(robust_min_samples))
+        scored_df = filtered_data.join(robust_scores)
+        robust_anomalies = scored_df[scored_df['穩健分數'].abs() > robust_threshold]
+        
+        if robust_anomalies.empty:
+            st.success(f"✅ 沒有穩健分數超過 {robust_threshold} 的紀錄")
+        else:
+            fast_count = int((robust_anomalies['穩健分數'] > 0).sum())
+            slow_count = int((robust_anomalies['穩健分數'] < 0).sum())
+            scored_count = int(scored_df['穩健分數'].notna().sum())
+            
+            col_rstat1, col_rstat2, col_rstat3 = st.columns(3)
+            with col_rstat1:
+                st.metric("⚡ 過快 (正分)", f"{fast_count} 筆")
+            with col_rstat2:
+                st.metric("🐢 過慢 (負分)", f"{slow_count} 筆")
+            with col_rstat3:
+                robust_rate = len(robust_anomalies) / scored_count * 100 if scored_count > 0 else 0
+                st.metric("異常率", f"{robust_rate:.1f}%")
+            
+            st.markdown("---")
+            
+            # 各人員異常統計
+            st.write("**📊 各人員穩健異常統計**")
+            robust_inspector_stats = robust_anomalies.assign(
+                過快=robust_anomalies['穩健分數'] > 0,
+                過慢=robust_anomalies['穩健分數'] < 0,
+                絕對分數=robust_anomalies['穩健分數'].abs()
+            ).groupby('處理後檢驗員').agg(
+                異常筆數=('穩健分數', 'size'),
+                過快筆數=('過快', 'sum'),
+                過慢筆數=('過慢', 'sum'),
+                最大絕對分數=('絕對分數', 'max')
+            ).reset_index().sort_values('異常筆數', ascending=False)
+            robust_inspector_stats['最大絕對分數'] = robust_inspector_stats['最大絕對分數'].round(1)
+            st.dataframe(robust_inspector_stats, use_container_width=True, hide_index=True)
+            
+            # 依絕對分數排序的異常明細
+            st.write("**📋 異常明細 (依絕對分數排序，前200筆)**")
+            ranked_anomalies = robust_anomalies.reindex(
+                robust_anomalies['穩健分數'].abs().sort_values(ascending=False).index
+            ).head(200)
+            detail_cols = ['處理後檢驗員', '檢驗日期', '料號', '類別', '效率比值', '基準來源', '基準效率', '穩健分數']
+            show_robust_df = ranked_anomalies[[col for col in detail_cols if col in ranked_anomalies.columns]].copy()
+            if '檢驗日期' in show_robust_df.columns:
+                show_robust_df['檢驗日期'] = pd.to_datetime(show_robust_df['檢驗日期'], errors='coerce').dt.strftime('%Y-%m-%d')
+            for col in ['效率比值', '基準效率', '穩健分數']:
+                show_robust_df[col] = show_robust_df[col].round(2)
+            st.dataframe(show_robust_df, use_container_width=True, hide_index=True)
+    
+    anomaly_sections = [
+        render_flash_alert_section,
+        render_turtle_alert_section,
+        render_standard_time_bias_section,
+        render_robust_score_section
+    ]
+    anomaly_sections[anomaly_subtab]()
+
+
+# ==================== 檢驗員品質/速度統計 ====================
+def calculate_inspector_quality_stats(df):
+    """
+    向量化計算每位檢驗員的品質與速度彙總 (四象限分析與能力矩陣共用)
 
+    參數:
+    df - 檢驗資料，需含 處理後檢驗員、處理後檢驗標準工時、檢驗耗時
+
+    返回:
+    DataFrame，每位檢驗員一列：檢驗批數、MRB批數、平均效率、中位數效率、效率標準差、
+    總標準工時、總實際耗時、涉及類別數、加權效率 (上限20)、MRB開立率 (%)
+    """
+    stats_frame = pd.DataFrame({
+        '處理後檢驗員': df['處理後檢驗員'],
+        '標準工時': pd.to_numeric(df['處理後檢驗標準工時'], errors='coerce'),
+        '實際耗時': pd.to_numeric(df['檢驗耗時'], errors='coerce'),
+        '有MRB': df['有MRB'] if '有MRB' in df.columns else derive_mrb_flag(df),
+        '效率比值': (
+            pd.to_numeric(df['效率比值'], errors='coerce')
+            if '效率比值' in df.columns else calculate_efficiency_ratio(df)
+        ),
+        '類別': df['類別'] if '類別' in df.columns else np.nan
+    })
+    
+    inspector_stats = stats_frame.groupby('處理後檢驗員').agg(
+        檢驗批數=('處理後檢驗員', 'size'),
+        MRB批數=('有MRB', 'sum'),
+        平均效率=('效率比值', 'mean'),
+        中位數效率=('效率比值', 'median'),
+        效率標準差=('效率比值', 'std'),
+        總標準工時=('標準工時', 'sum'),
+        總實際耗時=('實際耗時', 'sum'),
+        涉及類別數=('類別', 'nunique')
+    ).reset_index()
+    
+    # 加權效率（加總後再除，與檢驗效率監控一致），上限20
+    total_actual_time = inspector_stats['總實際耗時']
+    inspector_stats['加權效率'] = (
+        inspector_stats['總標準工時'] / total_actual_time.where(total_actual_time > 0)
+    ).clip(upper=20).fillna(0)
+    inspector_stats['MRB開立率'] = inspector_stats['MRB批數'] / inspector_stats['檢驗批數'] * 100
+    
+    return inspector_stats
+
+def get_inspector_quality_stats(processed_data):
+    """取得已排除指定檢驗員的檢驗員品質/速度統計，同一份資料只計算一次"""
+    return get_session_cached(
+        'inspector_quality_cache',
+        'inspector_stats',
+        processed_data,
+        lambda: calculate_inspector_quality_stats(get_anomaly_frame(processed_data))
+    )
 
 def render_quality_speed_matrix(processed_data, efficiency_data):
     """
@@ -10587,14 +9447,17 @@ def render_quality_speed_matrix(processed_data, efficiency_data):
     - 左上 (低效率/高MRB): 苦幹實幹型
     - 左下 (低效率/低MRB): 需輔導區
     """
+    import plotly.express as px
+    import plotly.graph_objects as go
+    
     if processed_data is None or processed_data.empty:
         st.error("沒有可用的數據進行四象限分析")
         return
     
-    # 過濾數據
-    filtered_data = filter_excluded_inspectors(processed_data)
+    # 過濾數據並取得快取的中間欄位 (與異常偵測共用)
+    filtered_data = get_anomaly_frame(processed_data)
     
-    if filtered_data.empty:
+    if filtered_data is None or filtered_data.empty:
         st.warning("篩選後無數據可供分析")
         return
     
@@ -10609,61 +9472,18 @@ def render_quality_speed_matrix(processed_data, efficiency_data):
     </div>
     """, unsafe_allow_html=True)
     
-    # 準備數據
-    analysis_df = filtered_data.copy()
-    
-    # 計算效率比值
-    if '效率比值' not in analysis_df.columns:
-        analysis_df['處理後檢驗標準工時'] = pd.to_numeric(analysis_df['處理後檢驗標準工時'], errors='coerce').fillna(0)
-        analysis_df['檢驗耗時'] = pd.to_numeric(analysis_df['檢驗耗時'], errors='coerce').fillna(0)
-        analysis_df['效率比值'] = analysis_df.apply(
-            lambda row: row['處理後檢驗標準工時'] / row['檢驗耗時'] if row['檢驗耗時'] > 0 else 0, 
-            axis=1
-        )
-    
-    # 判斷是否有MRB
-    def check_has_mrb_matrix(row):
-        mrb_cols = ['MRB加時', '是否為MRB', 'MRB', 'M']
-        for col in mrb_cols:
-            if col in row.index:
-                val = row[col]
-                if pd.notna(val):
-                    if isinstance(val, (int, float)) and val > 0:
-                        return True
-                    if isinstance(val, str) and val.upper() in ['TRUE', 'MRB', 'Y', 'YES', '是']:
-                        return True
-                    if val is True:
-                        return True
-        return False
-    
-    analysis_df['有MRB'] = analysis_df.apply(check_has_mrb_matrix, axis=1)
-    
-    # 按人員彙總統計
-    inspector_stats = analysis_df.groupby('處理後檢驗員').agg(
-        檢驗批數=('料號', 'count'),
-        MRB批數=('有MRB', 'sum'),
-        平均效率=('效率比值', 'mean'),
-        中位數效率=('效率比值', 'median'),
-        總標準工時=('處理後檢驗標準工時', 'sum'),
-        總實際耗時=('檢驗耗時', 'sum'),
-        涉及類別數=('類別', 'nunique')
-    ).reset_index()
-    
-    # 計算加權效率（加總後再除，與檢驗效率監控一致）
-    inspector_stats['加權效率'] = inspector_stats.apply(
-        lambda row: min(row['總標準工時'] / row['總實際耗時'], 20) if row['總實際耗時'] > 0 else 0,
-        axis=1
-    ).round(2)
+    # 準備數據 - 效率比值、有MRB、大類別已於中間欄位計算
+    analysis_df = filtered_data
     
-    # 計算 MRB 開立率
-    inspector_stats['MRB開立率'] = (inspector_stats['MRB批數'] / inspector_stats['檢驗批數'] * 100).round(2)
-    inspector_stats['平均效率'] = inspector_stats['平均效率'].round(2)
-    inspector_stats['中位數效率'] = inspector_stats['中位數效率'].round(2)
+    # 按人員彙總統計 (快取，調整篩選條件不需重算)
+    inspector_stats = get_inspector_quality_stats(processed_data)
     
     # 過濾掉樣本太少的人員（至少5筆檢驗紀錄）
     min_samples = st.slider("最小樣本數篩選", min_value=1, max_value=50, value=5, 
                            help="只顯示檢驗批數超過此數量的人員")
-    inspector_stats = inspector_stats[inspector_stats['檢驗批數'] >= min_samples]
+    inspector_stats = inspector_stats[inspector_stats['檢驗批數'] >= min_samples].round({
+        '加權效率': 2, 'MRB開立率': 2, '平均效率': 2, '中位數效率': 2
+    })
     
     if inspector_stats.empty:
         st.warning(f"沒有檢驗批數超過 {min_samples} 的人員數據")
@@ -10674,20 +9494,13 @@ def render_quality_speed_matrix(processed_data, efficiency_data):
     mrb_rate_median = inspector_stats['MRB開立率'].median()
     
     # 分類象限（使用加權效率）
-    def classify_quadrant(row):
-        eff = row['加權效率']
-        mrb = row['MRB開立率']
-        
-        if eff >= efficiency_median and mrb >= mrb_rate_median:
-            return '🥇 金牌檢驗員'
-        elif eff >= efficiency_median and mrb < mrb_rate_median:
-            return '🔍 高效但寬鬆'
-        elif eff < efficiency_median and mrb >= mrb_rate_median:
-            return '💪 苦幹實幹型'
-        else:
-            return '📚 需輔導區'
-    
-    inspector_stats['象限分類'] = inspector_stats.apply(classify_quadrant, axis=1)
+    high_efficiency = inspector_stats['加權效率'] >= efficiency_median
+    high_mrb_rate = inspector_stats['MRB開立率'] >= mrb_rate_median
+    inspector_stats['象限分類'] = np.select(
+        [high_efficiency & high_mrb_rate, high_efficiency, high_mrb_rate],
+        ['🥇 金牌檢驗員', '🔍 高效但寬鬆', '💪 苦幹實幹型'],
+        default='📚 需輔導區'
+    )
     
     # 顏色映射
     color_map = {
@@ -10900,20 +9713,8 @@ def render_quality_speed_matrix(processed_data, efficiency_data):
             st.plotly_chart(fig_hist, use_container_width=True)
         
         with col_cat:
-            # 按類別統計 MRB 率
-            # 映射大類別
-            def get_main_cat_qsm(sub):
-                if pd.isna(sub):
-                    return "其他"
-                for main, subs in MATERIAL_CATEGORY_MAPPING.items():
-                    if sub in subs:
-                        return main
-                return "其他"
-            
-            person_detail_copy = person_detail.copy()
-            person_detail_copy['大類別'] = person_detail_copy['類別'].apply(get_main_cat_qsm)
-            
-            cat_stats = person_detail_copy.groupby('大類別').agg(
+            # 按類別統計 MRB 率 (大類別已於中間欄位預先映射)
+            cat_stats = person_detail.groupby('大類別').agg(
                 批數=('料號', 'count'),
                 MRB數=('有MRB', 'sum'),
                 平均效率=('效率比值', 'mean'),
@@ -10923,10 +9724,9 @@ def render_quality_speed_matrix(processed_data, efficiency_data):
             
             cat_stats['MRB率'] = (cat_stats['MRB數'] / cat_stats['批數'] * 100).round(1)
             # 計算加權效率
-            cat_stats['加權效率'] = cat_stats.apply(
-                lambda row: min(row['總標準工時'] / row['總實際耗時'], 20) if row['總實際耗時'] > 0 else 0,
-                axis=1
-            ).round(2)
+            cat_stats['加權效率'] = (
+                cat_stats['總標準工時'] / cat_stats['總實際耗時'].where(cat_stats['總實際耗時'] > 0)
+            ).clip(upper=20).fillna(0).round(2)
             cat_stats = cat_stats.sort_values('批數', ascending=True)
             
             fig_cat = go.Figure()
@@ -11034,6 +9834,12 @@ def main():
     # 添加標題和描述
     st.title("IQC 效率管理系統")
     st.markdown("透過數據量化分析，分析IQC檢驗效率、工作負載、時間管理分配，從而協助提升IQC效能與品質水平。")
+    # 記錄本工作階段仍在使用共用資料集
+    touch_shared_dataset()
+    
+    # 套用已完成的背景指標計算 (需在日期元件建立前)
+    collect_metrics_job()
+    
     # 建立側邊欄
     create_sidebar()
     
@@ -11047,16 +9853,8 @@ def main():
     
     # 如果檔案已上傳，顯示儀表板
     if st.session_state.files_uploaded:
-        # 預先計算MRB統計數據，確保一致性
-        if 'processed_data' in st.session_state and st.session_state.processed_data is not None:
-            if 'mrb_analysis_results' not in st.session_state:
-                mrb_results = calculate_mrb_statistics(
-                    st.session_state.processed_data,
-                    st.session_state.get('start_date'),
-                    st.session_state.get('end_date')
-                )
-                if mrb_results:
-                    st.session_state.mrb_analysis_results = mrb_results
+        # MRB統計不再於每次重新執行時預先計算：目前四個頁籤都不使用 mrb_analysis_results，
+        # 由 MRB 分析儀表板在開啟時自行計算並保存
         
         # ===== macOS 風格 Dock 導航（使用 Streamlit 按鈕）=====
         # 初始化當前選中的 tab
@@ -11583,4 +10381,5 @@ if __name__ == "__main__":
         
         # 运行主程序
         main()
+        record_rerun_latency('full_rerun', time.perf_counter() - SCRIPT_RUN_START)
 
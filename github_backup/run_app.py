@@ -1,34 +1,269 @@
 """
 IQC 效率管理系統 - 啟動器
-自動啟動 Streamlit 應用並開啟瀏覽器
+自動啟動 Streamlit 應用，確認服務就緒後再開啟瀏覽器
+
+參數:
+    --no-prewarm  不預先載入計算模組 (預設會在服務啟動時先載入 pandas、計算核心與圖表套件)
+    --workers N   啟動 N 個 Streamlit 工作程序，由本機負載平衡器固定分配瀏覽器 (預設 1)
+    --address     多工作程序時負載平衡器的監聽位址 (預設 localhost，全廠區使用時設為 0.0.0.0)
+    --cache-dir   多工作程序共用的解析資料磁碟快取目錄 (預設 iqc_cache)
 """
 
+import argparse
 import subprocess
 import sys
 import os
+import threading
 import webbrowser
 import time
 import socket
+import urllib.request
+import urllib.error
+
+# 服務就緒檢查 (Streamlit 健康檢查端點，舊版為 /healthz)
+HEALTH_PATHS = ['/_stcore/health', '/healthz']
+HEALTH_TIMEOUT = 60
+HEALTH_INITIAL_DELAY = 0.1
+HEALTH_MAX_DELAY = 1.0
+
+# 預先載入的模組：第一次開啟頁面與第一次顯示圖表時不必再等待載入
+PREWARM_MODULES = ['pandas', 'numpy', 'iqc_engine', 'plotly.express', 'plotly.graph_objects', 'altair']
+
+# 在 Streamlit 服務程序中先載入模組，再交給 streamlit CLI 啟動 (參數沿用 streamlit run 的參數)
+PREWARM_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, {app_dir!r})
+for name in {modules!r}:
+    try:
+        __import__(name)
+    except ImportError as e:
+        print(f"   ⚠️ 預先載入 {{name}} 失敗: {{e}}")
+print(f"   ✔ 預先載入模組 ({{time.perf_counter() - start:.2f}} 秒)", flush=True)
+from streamlit.web import cli
+sys.argv = ['streamlit'] + sys.argv[1:]
+sys.exit(cli.main())
+"""
 
 def check_port_available(port):
     """檢查端口是否可用"""
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(0.5)
     result = sock.connect_ex(('localhost', port))
     sock.close()
     return result != 0
 
 def find_available_port(start_port=8501, max_attempts=10):
     """找到可用的端口"""
-    for port in range(start_port, start_port + max_attempts):
-        if check_port_available(port):
-            return port
-    return start_port
+    return find_available_ports(1, start_port, max_attempts)[0]
+
+def find_available_ports(count, start_port=8501, max_attempts=10):
+    """
+    找到 count 個連續的可用端口
+    
+    返回:
+    端口列表；找不到時返回從 start_port 起的 count 個端口
+    """
+    for first_port in range(start_port, start_port + max_attempts):
+        ports = list(range(first_port, first_port + count))
+        if all(check_port_available(port) for port in ports):
+            return ports
+    return list(range(start_port, start_port + count))
+
+def check_health(port, timeout=1.0):
+    """
+    呼叫 Streamlit 健康檢查端點
+    
+    返回:
+    服務就緒時為 True
+    """
+    for path in HEALTH_PATHS:
+        try:
+            with urllib.request.urlopen(f'http://localhost:{port}{path}', timeout=timeout) as response:
+                if response.status == 200:
+                    return True
+        except urllib.error.HTTPError as e:
+            # 端點不存在 (舊版 Streamlit)，改試下一個
+            if e.code == 404:
+                continue
+            return False
+        except (urllib.error.URLError, OSError):
+            return False
+    return False
+
+def wait_for_server_ready(port, process, timeout=HEALTH_TIMEOUT):
+    """
+    以遞增的間隔輪詢健康檢查端點，直到服務就緒、程序結束或逾時
+    
+    返回:
+    'ready'、'exited' 或 'timeout'
+    """
+    deadline = time.perf_counter() + timeout
+    delay = HEALTH_INITIAL_DELAY
+    last_report = time.perf_counter()
+    
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            return 'exited'
+        if check_health(port):
+            return 'ready'
+        
+        # 每 5 秒顯示一次等待狀態
+        if time.perf_counter() - last_report >= 5:
+            print(f"   等待中... ({time.perf_counter() - deadline + timeout:.0f}/{timeout} 秒)")
+            last_report = time.perf_counter()
+        
+        time.sleep(delay)
+        delay = min(delay * 1.5, HEALTH_MAX_DELAY)
+    return 'timeout'
+
+def build_streamlit_command(app_path, port, prewarm):
+    """
+    組合啟動 Streamlit 的命令
+    
+    參數:
+    app_path - 主程式路徑
+    port - 使用的端口
+    prewarm - 是否在服務程序中預先載入模組
+    """
+    # 在打包環境中，使用絕對路徑啟動 streamlit
+    if getattr(sys, 'frozen', False):
+        # 打包環境：直接使用 streamlit 可執行檔
+        streamlit_script = os.path.join(os.path.dirname(sys.executable), 'streamlit.exe')
+        if not os.path.exists(streamlit_script):
+            # 如果找不到，嘗試用模組方式
+            streamlit_script = sys.executable
+            cmd = [streamlit_script, '-m', 'streamlit', 'run', app_path]
+        else:
+            cmd = [streamlit_script, 'run', app_path]
+    elif prewarm:
+        # 開發環境：先載入模組再啟動 streamlit
+        script = PREWARM_SCRIPT.format(app_dir=os.path.dirname(app_path), modules=PREWARM_MODULES)
+        cmd = [sys.executable, '-c', script, 'run', app_path]
+    else:
+        # 開發環境
+        cmd = [sys.executable, '-m', 'streamlit', 'run', app_path]
+    
+    # 添加參數
+    cmd.extend([
+        f'--server.port={port}',
+        '--server.headless=true',
+        '--browser.gatherUsageStats=false',
+        '--server.fileWatcherType=none',
+        '--theme.base=light',
+        '--server.address=localhost'
+    ])
+    return cmd
+
+def open_browser_and_wait(url, processes, timings, stage_start):
+    """開啟瀏覽器、顯示啟動時間分析，並保持運行直到所有服務程序結束或使用者中斷"""
+    # 自動開啟瀏覽器
+    print(f"\n🌐 正在開啟瀏覽器...")
+    print(f"📌 網址: {url}")
+    
+    webbrowser.open(url)
+    timings.append(("開啟瀏覽器", time.perf_counter() - stage_start))
+    print_startup_summary(timings)
+    
+    print("\n" + "=" * 60)
+    print("✅ 系統已成功啟動！")
+    print("=" * 60)
+    print("\n💡 使用提示:")
+    print("   • 如果瀏覽器沒有自動開啟，請手動訪問上述網址")
+    print("   • 請勿關閉此視窗，否則系統將停止運行")
+    print("   • 關閉瀏覽器分頁不會停止系統")
+    print("   • 如需退出，請關閉此視窗或按 Ctrl+C")
+    print("\n" + "=" * 60)
+    
+    # 保持運行
+    try:
+        while any(process.poll() is None for process in processes):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        print("\n\n🛑 正在關閉系統...")
+        for process in processes:
+            process.terminate()
+        time.sleep(2)
+        print("✅ 系統已安全關閉")
+
+def run_workers(app_path, args, prewarm, timings, stage_start):
+    """
+    多工作程序模式：在連續端口啟動 N 個 Streamlit 工作程序，前面放一個固定工作階段的負載平衡器
+    
+    每個工作程序有各自的 Python 直譯器與 GIL，一位使用者的匯出或指標計算不會拖慢其他人；
+    工作程序之間以磁碟快取共用檔案解析結果。
+    """
+    import iqc_load_balancer
+    
+    ports = find_available_ports(args.workers + 1)
+    proxy_port, worker_ports = ports[0], ports[1:]
+    print(f"🔌 負載平衡器端口: {proxy_port}，工作程序端口: {', '.join(map(str, worker_ports))}")
+    timings.append(("尋找可用端口", time.perf_counter() - stage_start))
+    stage_start = time.perf_counter()
+    
+    cache_dir = os.path.abspath(args.cache_dir)
+    print(f"🗄️ 共用資料快取: {cache_dir}")
+    env = dict(os.environ, IQC_DATASET_CACHE_DIR=cache_dir)
+    
+    print(f"\n⏳ 正在啟動 {args.workers} 個 Streamlit 工作程序...")
+    processes = [
+        subprocess.Popen(build_streamlit_command(app_path, port, prewarm), env=env)
+        for port in worker_ports
+    ]
+    
+    # 等待所有工作程序就緒
+    for port, process in zip(worker_ports, processes):
+        status = wait_for_server_ready(port, process)
+        if status != 'ready':
+            print(f"\n❌ 錯誤: 端口 {port} 的工作程序{'意外終止' if status == 'exited' else '啟動超時'}")
+            for other in processes:
+                other.terminate()
+            input("\n按 Enter 鍵退出...")
+            return
+    print("✅ 所有工作程序啟動成功！")
+    timings.append((f"{args.workers} 個工作程序就緒" + (" (含預先載入模組)" if prewarm else ""), time.perf_counter() - stage_start))
+    stage_start = time.perf_counter()
+    
+    # 負載平衡器在背景執行緒執行，隨啟動器結束
+    backends = [('localhost', port) for port in worker_ports]
+    threading.Thread(
+        target=iqc_load_balancer.run_proxy, args=(args.address, proxy_port, backends), daemon=True
+    ).start()
+    
+    deadline = time.perf_counter() + 10
+    while not check_health(proxy_port) and time.perf_counter() < deadline:
+        time.sleep(0.1)
+    timings.append(("負載平衡器就緒", time.perf_counter() - stage_start))
+    stage_start = time.perf_counter()
+    
+    open_browser_and_wait(f'http://localhost:{proxy_port}', processes, timings, stage_start)
+
+def print_startup_summary(timings):
+    """顯示啟動時間分析"""
+    print("\n⏱️  啟動時間分析:")
+    for name, seconds in timings:
+        print(f"   • {name}: {seconds:.2f} 秒")
+    print(f"   • 總計: {sum(seconds for _, seconds in timings):.2f} 秒")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="IQC 效率管理系統 - 啟動器")
+    parser.add_argument('--no-prewarm', action='store_true', help="不預先載入計算模組")
+    parser.add_argument('--workers', type=int, default=1, help="Streamlit 工作程序數量 (預設 1)")
+    parser.add_argument('--address', default='localhost', help="多工作程序時負載平衡器的監聽位址 (預設 localhost)")
+    parser.add_argument('--cache-dir', default='iqc_cache', help="多工作程序共用的解析資料快取目錄 (預設 iqc_cache)")
+    return parser.parse_args(argv)
 
 def main():
+    args = parse_args()
     print("=" * 60)
     print("🚀 IQC 效率管理系統 - 啟動中...")
     print("=" * 60)
     
+    # 打包環境直接執行 streamlit，不支援預先載入
+    prewarm = not args.no_prewarm and not getattr(sys, 'frozen', False)
+    timings = []
+    stage_start = time.perf_counter()
+    
     # 取得程式所在目錄
     if getattr(sys, 'frozen', False):
         # PyInstaller 打包後的環境
@@ -49,38 +284,25 @@ def main():
     
     print(f"📂 程式路徑: {app_path}")
     
+    if args.workers > 1:
+        run_workers(app_path, args, prewarm, timings, stage_start)
+        return
+    
     # 尋找可用端口
     port = find_available_port()
     print(f"🔌 使用端口: {port}")
+    timings.append(("尋找可用端口", time.perf_counter() - stage_start))
+    stage_start = time.perf_counter()
     
     # 啟動 Streamlit
     print("\n⏳ 正在啟動 Streamlit 服務...")
     
-    # 在打包環境中，使用絕對路徑啟動 streamlit
-    if getattr(sys, 'frozen', False):
-        # 打包環境：直接使用 streamlit 可執行檔
-        streamlit_script = os.path.join(os.path.dirname(sys.executable), 'streamlit.exe')
-        if not os.path.exists(streamlit_script):
-            # 如果找不到，嘗試用模組方式
-            streamlit_script = sys.executable
-            cmd = [streamlit_script, '-m', 'streamlit', 'run', app_path]
-        else:
-            cmd = [streamlit_script, 'run', app_path]
-    else:
-        # 開發環境
-        cmd = [sys.executable, '-m', 'streamlit', 'run', app_path]
-    
-    # 添加參數
-    cmd.extend([
-        f'--server.port={port}',
-        '--server.headless=true',
-        '--browser.gatherUsageStats=false',
-        '--server.fileWatcherType=none',
-        '--theme.base=light',
-        '--server.address=localhost'
-    ])
+    cmd = build_streamlit_command(app_path, port, prewarm)
     
-    print(f"📝 執行命令: {' '.join(cmd[:3])}...")
+    if prewarm:
+        print(f"📝 執行命令: {sys.executable} -c <預先載入模組> run {app_path}...")
+    else:
+        print(f"📝 執行命令: {' '.join(cmd[:3])}...")
     
     try:
         # 不使用 PIPE，讓輸出直接顯示到控制台以便除錯
@@ -91,25 +313,23 @@ def main():
             # creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
         )
         
-        # 等待服務啟動
-        print("⏳ 等待服務啟動 (約 5-15 秒)...")
-        service_started = False
-        for i in range(15):
-            time.sleep(1)
-            # 檢查進程是否還在運行
-            if process.poll() is not None:
-                print(f"\n❌ 錯誤: Streamlit 進程意外終止 (退出碼: {process.returncode})")
-                print("💡 請檢查是否缺少相關模組或配置")
-                input("\n按 Enter 鍵退出...")
-                return
-            
-            if not check_port_available(port):
-                print("✅ 服務啟動成功！")
-                service_started = True
-                break
-            print(f"   等待中... ({i+1}/15)")
+        # 等待服務就緒 (健康檢查通過才開啟瀏覽器)
+        print("⏳ 等待服務就緒...")
+        status = wait_for_server_ready(port, process)
+        
+        # 檢查進程是否還在運行
+        if status == 'exited':
+            print(f"\n❌ 錯誤: Streamlit 進程意外終止 (退出碼: {process.returncode})")
+            print("💡 請檢查是否缺少相關模組或配置")
+            input("\n按 Enter 鍵退出...")
+            return
+        
+        timings.append(("服務就緒" + (" (含預先載入模組)" if prewarm else ""), time.perf_counter() - stage_start))
+        stage_start = time.perf_counter()
         
-        if not service_started:
+        if status == 'ready':
+            print("✅ 服務啟動成功！")
+        else:
             print("\n⚠️  警告: 服務啟動超時")
             print("💡 可能的原因:")
             print("   1. Streamlit 模組未正確打包")
@@ -123,31 +343,7 @@ def main():
                 process.terminate()
                 return
         
-        # 自動開啟瀏覽器
-        url = f'http://localhost:{port}'
-        print(f"\n🌐 正在開啟瀏覽器...")
-        print(f"📌 網址: {url}")
-        
-        webbrowser.open(url)
-        
-        print("\n" + "=" * 60)
-        print("✅ 系統已成功啟動！")
-        print("=" * 60)
-        print("\n💡 使用提示:")
-        print("   • 如果瀏覽器沒有自動開啟，請手動訪問上述網址")
-        print("   • 請勿關閉此視窗，否則系統將停止運行")
-        print("   • 關閉瀏覽器分頁不會停止系統")
-        print("   • 如需退出，請關閉此視窗或按 Ctrl+C")
-        print("\n" + "=" * 60)
-        
-        # 保持運行
-        try:
-            process.wait()
-        except KeyboardInterrupt:
-            print("\n\n🛑 正在關閉系統...")
-            process.terminate()
-            time.sleep(2)
-            print("✅ 系統已安全關閉")
+        open_browser_and_wait(f'http://localhost:{port}', [process], timings, stage_start)
     
     except FileNotFoundError:
         print("\n❌ 錯誤: 找不到 Streamlit")
@@ -0,0 +1,80 @@
+"""
+測試共用設定
+
+計算核心 (iqc_engine) 直接匯入；介面腳本中的純計算函數以 Streamlit bare mode 載入整個腳本後取用。
+"""
+
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(APP_DIR, 'iqc_monitor_Opus_testV3.py')
+
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import iqc_engine
+from iqc_batch_report import ExcelInput
+
+@pytest.fixture(scope='session')
+def app():
+    """載入介面腳本 (bare mode，不啟動伺服器)，返回腳本模組"""
+    spec = importlib.util.spec_from_file_location('iqc_app', APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def write_raw_inputs(directory, rows=800, seed=0):
+    """
+    產生與實際上傳檔案格式相同的 IQC Report 與額外任務紀錄清單 Excel
+
+    返回:
+    檔案路徑列表
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 40, rows), unit='D')
+    iqc = pd.DataFrame({
+        '檢驗員': [f'WYLZ{i}(人員{i})' for i in rng.integers(0, 8, rows)],
+        '檢驗日期': dates,
+        '料號': [f'P{x}' for x in rng.integers(0, 120, rows)],
+        '類別': rng.choice(['NC', 'WA', 'XZ', 'QB', 'IC'], rows),
+        '抽樣狀態': '正常',
+        '抽樣數量': rng.integers(1, 50, rows),
+        '異常問題匯總': np.where(rng.random(rows) < 0.08, '外觀異常', ''),
+        '檢驗標準工時': rng.gamma(2, 15, rows).round(1),
+        '檢驗耗時': rng.gamma(2, 16, rows).round(1),
+        '檢驗開始時間': dates + pd.to_timedelta(rng.integers(480, 1000, rows), unit='min'),
+    })
+    task_rows = rows // 10
+    tasks = pd.DataFrame({
+        '日期': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 40, task_rows), unit='D'),
+        '姓名': [f'人員{i}' for i in rng.integers(0, 8, task_rows)],
+        '工作事項分類': rng.choice(['會議', '5S', '教育訓練'], task_rows),
+        '用時(分鐘)': rng.integers(5, 120, task_rows),
+    })
+    
+    paths = [os.path.join(directory, 'IQC Report 2025.xlsx'), os.path.join(directory, 'IQC額外任務紀錄清單.xlsx')]
+    iqc.to_excel(paths[0], index=False)
+    tasks.to_excel(paths[1], index=False)
+    return paths
+
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory):
+    """以計算核心解析測試檔案，返回與介面共用資料集相同格式的 dict"""
+    paths = write_raw_inputs(str(tmp_path_factory.mktemp('raw_inputs')))
+    iqc_files, pcb_spec_files, pcb_std_files, task_files = iqc_engine.classify_files([ExcelInput(path) for path in paths])
+    
+    iqc_report_data = iqc_engine.process_multiple_iqc_reports_optimized(iqc_files)
+    additional_tasks_data = iqc_engine.process_multiple_additional_tasks(task_files)
+    return {
+        'iqc_report_data': iqc_report_data,
+        'pcb_spec_data': None,
+        'pcb_standard_time_data': None,
+        'additional_tasks_data': additional_tasks_data,
+        'data_version': iqc_engine.compute_data_version(iqc_report_data, None, None, additional_tasks_data),
+    }
@@ -0,0 +1,39 @@
+"""介面腳本的穩健異常分數 (calculate_robust_anomaly_scores) 測試"""
+
+import numpy as np
+import pandas as pd
+
+def make_analysis_frame(rows=2000, seed=0):
+    """產生 prepare_anomaly_frame 格式的測試資料：日期沒有時間部分，同一類別同一天有多筆"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '效率比值': rng.gamma(2.0, 0.6, rows).round(3),
+        '檢驗日期': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 60, rows), unit='D'),
+        '類別': rng.choice(['CAP', 'RES', 'IC', 'PCB'], rows),
+        '料號': rng.choice([f'P{i:03d}' for i in range(300)], rows),
+    })
+
+def test_rolling_window_matches_brute_force(app):
+    frame = make_analysis_frame(rows=600)
+    median, _, count = app._rolling_median_and_mad(frame['效率比值'], frame['類別'], frame['檢驗日期'], 30)
+    
+    for index, row in frame.sample(80, random_state=1).iterrows():
+        # 含當日往前 30 天，當天的所有紀錄都在視窗內
+        window = frame[
+            (frame['類別'] == row['類別'])
+            & (frame['檢驗日期'] <= row['檢驗日期'])
+            & (frame['檢驗日期'] > row['檢驗日期'] - pd.Timedelta(days=30))
+        ]
+        assert count[index] == len(window)
+        assert np.isclose(median[index], window['效率比值'].median())
+
+def test_scores_do_not_depend_on_row_order(app):
+    frame = make_analysis_frame()
+    expected = app.calculate_robust_anomaly_scores(frame)
+    
+    shuffled = frame.sample(frac=1, random_state=7)
+    result = app.calculate_robust_anomaly_scores(shuffled).reindex(frame.index)
+    
+    pd.testing.assert_frame_equal(result, expected)
+    # 類別滾動基準確實有被使用 (否則排序問題不會出現在分數上)
+    assert (expected['基準來源'] == '類別30日').any()
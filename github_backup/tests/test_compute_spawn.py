@@ -0,0 +1,30 @@
+"""計算程序 (spawn) 不重新執行介面腳本的測試"""
+
+import sys
+import types
+
+import streamlit as st
+
+from conftest import APP_PATH
+
+def report_child_state():
+    """在計算程序中執行，返回主模組路徑與工作階段狀態鍵"""
+    main = sys.modules.get('__mp_main__')
+    return getattr(main, '__file__', None), sorted(st.session_state.keys())
+
+def test_compute_processes_do_not_run_interface(app, monkeypatch):
+    # 與 Streamlit 相同：以名為 __main__、沒有 __spec__ 的模組執行介面腳本
+    streamlit_main = types.ModuleType('__main__')
+    streamlit_main.__file__ = APP_PATH
+    monkeypatch.setitem(sys.modules, '__main__', streamlit_main)
+    
+    executor = app._new_compute_executor()
+    assert executor is not None
+    try:
+        main_file, session_keys = executor.submit(report_child_state).result(timeout=120)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    
+    # 計算程序匯入介面腳本只取得定義，不設定頁面與工作階段狀態
+    assert main_file == APP_PATH
+    assert session_keys == []
@@ -0,0 +1,248 @@
+"""介面腳本中統計與圖表輔助函數與原本計算結果的一致性測試"""
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import iqc_engine
+
+START_DATE = dt.date(2025, 1, 5)
+END_DATE = dt.date(2025, 1, 25)
+
+# ==================== 原本逐列計算的參考實作 ====================
+
+def reference_mrb_rate_table(df, group_column, label):
+    """原本MRB儀表板逐組以 MRB加時 > 0 計算MRB率 (跳過空白分組)"""
+    rows = []
+    for key, group in df.groupby(group_column):
+        if pd.isna(key) or key == '':
+            continue
+        mrb_count = (group['MRB加時'] > 0).sum()
+        rows.append({label: key, 'MRB數量': mrb_count, '總檢驗筆數': len(group), 'MRB率': mrb_count / len(group)})
+    # 原本以非穩定排序依MRB率排序；同MRB率時依分組鍵排列後比較
+    return pd.DataFrame(rows).sort_values('MRB率', ascending=False, kind='stable').reset_index(drop=True)
+
+def reference_daily_mrb(df):
+    """原本每日MRB趨勢：依日分組並跳過沒有數據的日期"""
+    data = df.copy()
+    data['檢驗日期'] = pd.to_datetime(data['檢驗日期'])
+    rows = []
+    for date, group in data.groupby(pd.Grouper(key='檢驗日期', freq='D')):
+        if len(group) > 0:
+            mrb_count = (group['MRB加時'] > 0).sum()
+            rows.append({'日期': date, 'MRB數量': mrb_count, '總檢驗筆數': len(group), 'MRB率': mrb_count / len(group)})
+    return pd.DataFrame(rows)
+
+def reference_normalize_score(series):
+    if series.max() == series.min():
+        return pd.Series([50] * len(series))
+    return ((series - series.min()) / (series.max() - series.min()) * 100).round(1)
+
+def reference_capability_grade(score):
+    for threshold, grade in [(80, "⭐⭐⭐⭐⭐ 卓越"), (65, "⭐⭐⭐⭐ 優秀"), (50, "⭐⭐⭐ 良好"), (35, "⭐⭐ 待提升")]:
+        if score >= threshold:
+            return grade
+    return "⭐ 需關注"
+
+def reference_capability_metrics(processed_data, additional_tasks_data):
+    """原本 calculate_capability_metrics 逐位檢驗員篩選計算"""
+    capability_list = []
+    for inspector in processed_data['處理後檢驗員'].unique():
+        inspector_data = processed_data[processed_data['處理後檢驗員'] == inspector]
+        
+        total_standard_time = inspector_data['處理後檢驗標準工時'].sum()
+        total_actual_time = inspector_data['檢驗耗時'].sum()
+        speed = min(total_standard_time / total_actual_time, 20) if total_actual_time > 0.1 else 1.0
+        
+        total_lots = len(inspector_data)
+        mrb_lots = len(inspector_data[inspector_data['MRB狀態'] == 'MRB'])
+        rigor = (mrb_lots / total_lots * 100) if total_lots > 0 else 0
+        
+        efficiency_std = inspector_data['效率比值'].std()
+        stability = 100 / (1 + efficiency_std * 2) if efficiency_std > 0 else 100
+        
+        total_hours = processed_data['處理後檢驗標準工時'].sum()
+        capacity = (total_standard_time / total_hours * 100) if total_hours > 0 else 0
+        
+        inspector_tasks = additional_tasks_data[additional_tasks_data['inspector'] == inspector]
+        total_task_time = additional_tasks_data['total_time'].sum()
+        support = (inspector_tasks['total_time'].sum() / total_task_time * 100) if total_task_time > 0 else 0
+        
+        capability_list.append({
+            '檢驗員': inspector,
+            '檢驗批數': total_lots,
+            '速度': round(speed, 2),
+            '嚴謹度': round(rigor, 1),
+            '穩定度': round(stability, 1),
+            '負載力': round(capacity, 1),
+            '配合度': round(support, 1),
+            'MRB批數': mrb_lots,
+            '效率標準差': round(efficiency_std, 3) if efficiency_std else 0,
+            '總標準工時': round(total_standard_time, 0),
+            '總實際耗時': round(total_actual_time, 0)
+        })
+    
+    capability_df = pd.DataFrame(capability_list)
+    for column in ['速度', '嚴謹度', '負載力', '配合度']:
+        capability_df[f'{column}_標準化'] = reference_normalize_score(capability_df[column])
+    capability_df['穩定度_標準化'] = capability_df['穩定度']
+    capability_df['綜合評分'] = (
+        capability_df['速度_標準化'] * 0.30 +
+        capability_df['嚴謹度_標準化'] * 0.25 +
+        capability_df['穩定度_標準化'] * 0.20 +
+        capability_df['負載力_標準化'] * 0.15 +
+        capability_df['配合度_標準化'] * 0.10
+    ).round(1)
+    capability_df['評級'] = capability_df['綜合評分'].apply(reference_capability_grade)
+    return capability_df
+
+def reference_quality_stats(filtered_data):
+    """原本四象限分析逐列判定MRB後的檢驗員彙總"""
+    analysis_df = filtered_data.copy()
+    
+    def check_has_mrb(row):
+        for col in ['MRB加時', '是否為MRB', 'MRB', 'M']:
+            if col in row.index and pd.notna(row[col]):
+                value = row[col]
+                if isinstance(value, (int, float)) and value > 0:
+                    return True
+                if isinstance(value, str) and value.upper() in ['TRUE', 'MRB', 'Y', 'YES', '是']:
+                    return True
+                if value is True:
+                    return True
+        return False
+    
+    analysis_df['有MRB'] = analysis_df.apply(check_has_mrb, axis=1)
+    inspector_stats = analysis_df.groupby('處理後檢驗員').agg(
+        檢驗批數=('料號', 'count'),
+        MRB批數=('有MRB', 'sum'),
+        平均效率=('效率比值', 'mean'),
+        中位數效率=('效率比值', 'median'),
+        總標準工時=('處理後檢驗標準工時', 'sum'),
+        總實際耗時=('檢驗耗時', 'sum'),
+        涉及類別數=('類別', 'nunique')
+    ).reset_index()
+    inspector_stats['加權效率'] = inspector_stats.apply(
+        lambda row: min(row['總標準工時'] / row['總實際耗時'], 20) if row['總實際耗時'] > 0 else 0, axis=1
+    ).round(2)
+    inspector_stats['MRB開立率'] = (inspector_stats['MRB批數'] / inspector_stats['檢驗批數'] * 100).round(2)
+    inspector_stats['平均效率'] = inspector_stats['平均效率'].round(2)
+    inspector_stats['中位數效率'] = inspector_stats['中位數效率'].round(2)
+    return inspector_stats
+
+def reference_lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets 的原始逐桶寫法 (Steinarsson)"""
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    sampled = [0]
+    anchor = 0
+    for i in range(threshold - 2):
+        avg_start = int(np.floor((i + 1) * every)) + 1
+        avg_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_x = np.mean(x[avg_start:avg_end])
+        avg_y = np.mean(y[avg_start:avg_end])
+        
+        range_start = int(np.floor(i * every)) + 1
+        range_end = int(np.floor((i + 1) * every)) + 1
+        best_area, best_point = -1, range_start
+        for point in range(range_start, range_end):
+            area = abs((x[anchor] - avg_x) * (y[point] - y[anchor]) - (x[anchor] - x[point]) * (avg_y - y[anchor])) * 0.5
+            if area > best_area:
+                best_area, best_point = area, point
+        sampled.append(best_point)
+        anchor = best_point
+    sampled.append(n - 1)
+    return np.array(sampled)
+
+# ==================== 測試 ====================
+
+@pytest.fixture(scope='module')
+def metrics(dataset):
+    return iqc_engine.calculate_all_metrics(
+        dataset['iqc_report_data'], dataset['pcb_spec_data'], dataset['pcb_standard_time_data'],
+        dataset['additional_tasks_data'], START_DATE, END_DATE
+    )
+
+@pytest.fixture(scope='module')
+def processed(metrics):
+    processed_data = metrics['processed_data']
+    assert (processed_data['MRB加時'] > 0).any()
+    return processed_data
+
+def test_mrb_rate_tables_match_per_group_loops(app, processed):
+    tables = app.calculate_mrb_rate_tables(processed)
+    
+    mrb_count = (processed['MRB加時'] > 0).sum()
+    assert (tables['mrb_count'], tables['total_count']) == (mrb_count, len(processed))
+    assert tables['mrb_rate'] == pytest.approx(mrb_count / len(processed))
+    
+    pd.testing.assert_frame_equal(
+        tables['inspector'], reference_mrb_rate_table(processed, '處理後檢驗員', '檢驗員'), check_dtype=False
+    )
+    pd.testing.assert_frame_equal(
+        tables['category'], reference_mrb_rate_table(processed, '類別', '物料類別'), check_dtype=False
+    )
+    pd.testing.assert_frame_equal(tables['daily'], reference_daily_mrb(processed), check_dtype=False)
+
+def test_mrb_rate_tables_empty_input(app):
+    tables = app.calculate_mrb_rate_tables(pd.DataFrame())
+    assert (tables['mrb_rate'], tables['mrb_count'], tables['total_count']) == (0, 0, 0)
+    assert tables['inspector'].empty and tables['daily'].empty
+
+def test_capability_metrics_match_per_inspector_loop(app, metrics, processed):
+    tasks = metrics['additional_tasks_monitor_data']
+    result = app.calculate_capability_metrics(processed, None, None, None, tasks)
+    expected = reference_capability_metrics(processed, tasks)
+    pd.testing.assert_frame_equal(result, expected[list(result.columns)], check_dtype=False)
+
+def test_quality_stats_match_row_wise_mrb_check(app, processed):
+    filtered = iqc_engine.filter_excluded_inspectors(processed)
+    expected = reference_quality_stats(filtered)
+    
+    result = app.calculate_inspector_quality_stats(filtered)
+    for column in ['平均效率', '中位數效率', '加權效率', 'MRB開立率']:
+        result[column] = result[column].round(2)
+    pd.testing.assert_frame_equal(result[list(expected.columns)], expected, check_dtype=False)
+
+@pytest.mark.parametrize('n, threshold', [(1000, 200), (997, 13), (5000, 37), (250, 200)])
+def test_lttb_matches_reference(app, n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.sort(rng.random(n)) * 1000
+    y = np.cumsum(rng.normal(size=n))
+    
+    result = app.lttb_downsample(x, y, threshold)
+    np.testing.assert_array_equal(result, reference_lttb(x, y, threshold))
+
+def test_lttb_keeps_short_series_and_dates(app):
+    np.testing.assert_array_equal(app.lttb_downsample(np.arange(5), np.arange(5), 10), np.arange(5))
+    
+    dates = pd.Series(pd.date_range('2025-01-01', periods=500, freq='h'))
+    values = np.sin(np.arange(500) / 20)
+    result = app.lttb_downsample(dates, values, 50)
+    np.testing.assert_array_equal(result, reference_lttb(dates.astype('int64').to_numpy(dtype=float), values, 50))
+
+def test_filter_sort_positions_matches_dataframe_filter(app, processed):
+    inspector = processed['處理後檢驗員'].iloc[0]
+    category = processed['類別'].iloc[0]
+    
+    # 原本的資料瀏覽：依序以等值條件篩選，保持原順序
+    expected = processed[processed['處理後檢驗員'] == inspector]
+    expected = expected[expected['類別'] == category]
+    positions = app.filter_sort_positions(processed, {'處理後檢驗員': inspector, '類別': category, '料號': None})
+    pd.testing.assert_frame_equal(processed.iloc[positions], expected)
+    
+    # 排序與 sort_values (穩定排序、空值在後) 相同
+    data = processed.copy()
+    data.loc[data.index[::7], '效率比值'] = np.nan
+    for ascending in (True, False):
+        positions = app.filter_sort_positions(data, {'處理後檢驗員': inspector}, '效率比值', ascending)
+        expected = data[data['處理後檢驗員'] == inspector].sort_values(
+            '效率比值', ascending=ascending, kind='stable', na_position='last'
+        )
+        pd.testing.assert_frame_equal(data.iloc[positions], expected)
+    
+    # 混合型別欄位改以字串排序
+    mixed = pd.DataFrame({'value': [3, 'b', 1, 'a']})
+    assert mixed['value'].iloc[app.filter_sort_positions(mixed, sort_by='value')].tolist() == [1, 3, 'a', 'b']
@@ -0,0 +1,110 @@
+"""匯出檔案與原本 pandas ExcelWriter 匯出結果的一致性測試"""
+
+import datetime as dt
+import io
+import os
+import zipfile
+
+import pandas as pd
+import pytest
+
+import iqc_engine
+
+START_DATE = dt.date(2025, 1, 5)
+END_DATE = dt.date(2025, 1, 25)
+
+def reference_processed_sheet(processed_data):
+    """原本 export_processed_data 產生「處理後資料」工作表的方式"""
+    processed_df = processed_data.copy()
+    processed_df['是否為MRB'] = (processed_df['MRB加時'] > 0).apply(lambda x: "TRUE" if x else "FALSE")
+    processed_df['MRB狀態'] = processed_df['MRB加時'].apply(lambda x: "MRB" if x > 0 else "Normal inspection")
+    processed_df.loc[processed_df['MRB加時'] > 0, 'MRB訊息'] = "有MRB標記"
+    
+    essential_columns = [
+        '處理後檢驗員', '料號', '類別', '抽樣數量', '檢驗日期',
+        '處理後檢驗標準工時', '檢驗耗時', '效率比值', '抽樣狀態',
+        '檢驗開始時間', '是否為MRB', 'MRB狀態', 'MRB訊息', '基礎標準工時', 'MRB加時', 'M'
+    ]
+    return processed_df[[col for col in essential_columns if col in processed_df.columns]]
+
+def write_reference_workbook(sheets, path):
+    """原本以 pd.ExcelWriter + to_excel 寫出所有工作表"""
+    with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+        for sheet_name, df in sheets.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+def read_workbook(path):
+    return pd.read_excel(path, sheet_name=None)
+
+@pytest.fixture(scope='module')
+def export_state(dataset):
+    return iqc_engine.calculate_all_metrics(
+        dataset['iqc_report_data'], dataset['pcb_spec_data'], dataset['pcb_standard_time_data'],
+        dataset['additional_tasks_data'], START_DATE, END_DATE
+    )
+
+@pytest.fixture(scope='module')
+def sheets(export_state):
+    return iqc_engine.collect_export_sheets(export_state)
+
+def test_processed_sheet_matches_previous_export(export_state, sheets):
+    expected = reference_processed_sheet(export_state['processed_data'])
+    assert (expected['是否為MRB'] == "TRUE").any()
+    pd.testing.assert_frame_equal(sheets['處理後資料'], expected)
+    assert list(sheets)[:2] == ['處理後資料', '整體效率排名']
+
+def test_streaming_workbook_matches_excel_writer(tmp_path, sheets):
+    streaming_path = str(tmp_path / 'streaming.xlsx')
+    reference_path = str(tmp_path / 'reference.xlsx')
+    progress = []
+    
+    iqc_engine.write_streaming_workbook(sheets, streaming_path, progress=lambda fraction, stage: progress.append(fraction))
+    write_reference_workbook(sheets, reference_path)
+    
+    result = read_workbook(streaming_path)
+    expected = read_workbook(reference_path)
+    assert list(result) == list(expected) == list(sheets)
+    for sheet_name in expected:
+        pd.testing.assert_frame_equal(result[sheet_name], expected[sheet_name], obj=sheet_name)
+    assert progress == sorted(progress) and progress[-1] == pytest.approx(0.9)
+
+@pytest.mark.parametrize('export_format', ['csv', 'parquet'])
+def test_zip_export_contains_every_sheet(tmp_path, sheets, export_format):
+    if export_format == 'parquet' and not iqc_engine.parquet_available():
+        pytest.skip("未安裝 Parquet 引擎")
+    path = str(tmp_path / f'export_{export_format}.zip')
+    
+    iqc_engine.write_zip_export(sheets, path, export_format, max_workers=3)
+    
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        assert names == [f'{sheet_name}.{export_format}' for sheet_name in sheets]
+        for (sheet_name, df), name in zip(sheets.items(), names):
+            content = io.BytesIO(archive.read(name))
+            if export_format == 'csv':
+                assert content.read(3) == b'\xef\xbb\xbf'
+                pd.testing.assert_frame_equal(
+                    pd.read_csv(content, encoding='utf-8-sig'),
+                    pd.read_csv(io.StringIO(df.to_csv(index=False))),
+                    obj=sheet_name
+                )
+            else:
+                pd.testing.assert_frame_equal(pd.read_parquet(content), df.reset_index(drop=True), obj=sheet_name)
+
+def test_write_export_file_replaces_partial_file(tmp_path, export_state, sheets):
+    path = str(tmp_path / 'report.xlsx')
+    progress_state = {}
+    
+    assert iqc_engine.write_export_file(export_state, path, 'xlsx', progress_state) == path
+    assert progress_state == {'progress': 1.0, 'stage': "完成"}
+    assert not os.path.exists(path + '.part')
+    assert list(read_workbook(path)) == list(sheets)
+
+def test_write_export_file_removes_partial_file_on_error(tmp_path, export_state):
+    path = str(tmp_path / 'broken.xlsx')
+    # 工作表名稱不能含 [ ]，寫到一半時失敗
+    state = dict(export_state, efficiency_data={'category_efficiency_data': {'[無效]': [{'inspector': '甲'}]}})
+    
+    with pytest.raises(Exception, match='Invalid Excel character'):
+        iqc_engine.write_export_file(state, path, 'xlsx')
+    assert os.listdir(str(tmp_path)) == []
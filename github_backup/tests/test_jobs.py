@@ -0,0 +1,64 @@
+"""計算程序工作 (iqc_engine.jobs) 與資料集磁碟快取測試"""
+
+import datetime as dt
+import os
+
+import pandas as pd
+import pytest
+
+import iqc_engine
+
+START_DATE = dt.date(2025, 1, 5)
+END_DATE = dt.date(2025, 1, 25)
+
+def compute_reference_metrics(dataset):
+    return iqc_engine.calculate_all_metrics(
+        dataset['iqc_report_data'], dataset['pcb_spec_data'], dataset['pcb_standard_time_data'],
+        dataset['additional_tasks_data'], START_DATE, END_DATE
+    )
+
+def test_ensure_cached_dataset_writes_once(tmp_path, dataset):
+    cache_dir = str(tmp_path / 'cache')
+    assert iqc_engine.ensure_cached_dataset(cache_dir, 'abc', dataset)
+    path = os.path.join(cache_dir, 'dataset_abc.pkl')
+    os.utime(path, (0, 0))
+    
+    # 已存在時只更新修改時間，不重新寫入
+    assert iqc_engine.ensure_cached_dataset(cache_dir, 'abc', None)
+    assert os.path.getmtime(path) > 0
+    assert os.stat(cache_dir).st_mode & 0o777 == 0o700
+
+def test_cached_dataset_metrics_match_direct_calculation(tmp_path, dataset):
+    cache_dir = str(tmp_path / 'cache')
+    iqc_engine.ensure_cached_dataset(cache_dir, 'abc', dataset)
+    
+    result = iqc_engine.calculate_cached_dataset_metrics(cache_dir, 'abc', START_DATE, END_DATE)
+    expected = compute_reference_metrics(dataset)
+    
+    pd.testing.assert_frame_equal(result['processed_data'], expected['processed_data'])
+    pd.testing.assert_frame_equal(result['workload_data'], expected['workload_data'])
+    pd.testing.assert_frame_equal(
+        result['efficiency_data']['overall_efficiency_ranking'],
+        expected['efficiency_data']['overall_efficiency_ranking']
+    )
+
+def test_cached_dataset_export_matches_direct_export(tmp_path, dataset):
+    cache_dir = str(tmp_path / 'cache')
+    iqc_engine.ensure_cached_dataset(cache_dir, 'abc', dataset)
+    progress = {}
+    
+    path = iqc_engine.write_cached_dataset_export(
+        cache_dir, 'abc', START_DATE, END_DATE, str(tmp_path / 'cached.xlsx'), 'xlsx', progress
+    )
+    reference = iqc_engine.write_export_file(compute_reference_metrics(dataset), str(tmp_path / 'direct.xlsx'), 'xlsx')
+    
+    assert progress == {'progress': 1.0, 'stage': "完成"}
+    result_sheets = pd.read_excel(path, sheet_name=None)
+    expected_sheets = pd.read_excel(reference, sheet_name=None)
+    assert list(result_sheets) == list(expected_sheets)
+    for name, frame in expected_sheets.items():
+        pd.testing.assert_frame_equal(result_sheets[name], frame)
+
+def test_missing_cached_dataset_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        iqc_engine.calculate_cached_dataset_metrics(str(tmp_path), 'missing')
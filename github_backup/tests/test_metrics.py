@@ -0,0 +1,234 @@
+"""計算核心指標與原本逐列計算結果的一致性測試"""
+
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+import iqc_engine
+
+START_DATE = dt.date(2025, 1, 5)
+END_DATE = dt.date(2025, 1, 25)
+
+# ==================== 原本逐列計算的參考實作 ====================
+
+def reference_time_allocation(processed_df, tasks_df):
+    """原本 calculate_time_allocation_metrics 的逐列累加 (已依日期篩選的資料)"""
+    by_inspector = {}
+    
+    def entry(inspector):
+        return by_inspector.setdefault(inspector, {'inspection_time': 0, 'additional_task_time': 0, 'details': {}})
+    
+    for _, row in processed_df.iterrows():
+        inspector = row['處理後檢驗員'] if pd.notna(row['處理後檢驗員']) else 'Unknown'
+        try:
+            inspection_time = float(row['檢驗耗時']) if pd.notna(row['檢驗耗時']) else 0
+        except (ValueError, TypeError):
+            inspection_time = 0
+        entry(inspector)['inspection_time'] += inspection_time
+    
+    for _, row in tasks_df.iterrows():
+        inspector = row['姓名'] if pd.notna(row['姓名']) else 'Unknown'
+        task_type = row['工作事項分類'] if pd.notna(row['工作事項分類']) else 'Other'
+        try:
+            task_time = int(row['用時(分鐘)']) if pd.notna(row['用時(分鐘)']) else 0
+        except (ValueError, TypeError):
+            task_time = 0
+        data = entry(inspector)
+        data['additional_task_time'] += task_time
+        data['details'][task_type] = data['details'].get(task_type, 0) + task_time
+    
+    rows = []
+    for inspector, data in by_inspector.items():
+        total_time = data['inspection_time'] + data['additional_task_time']
+        row = {
+            'inspector': inspector,
+            'inspection_time': data['inspection_time'],
+            'additional_task_time': data['additional_task_time'],
+            'total_time': total_time,
+            'inspection_ratio': data['inspection_time'] / total_time if total_time > 0 else 1.0,
+            'additional_task_ratio': data['additional_task_time'] / total_time if total_time > 0 else 0.0,
+        }
+        # 原本匯出時依序展開 task_detail_ratios 字典為 任務__ 欄位
+        for task_type, task_time in data['details'].items():
+            row[f'{iqc_engine.TASK_RATIO_PREFIX}{task_type}'] = task_time / total_time if total_time > 0 else 0
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def reference_additional_tasks(tasks_df):
+    """原本 calculate_additional_tasks_metrics 的逐列累加"""
+    summary = {}
+    for _, row in tasks_df.iterrows():
+        inspector = row['姓名'] if pd.notna(row['姓名']) else 'Unknown'
+        task_type = row['工作事項分類'] if pd.notna(row['工作事項分類']) else 'Other'
+        try:
+            task_time = int(row['用時(分鐘)']) if pd.notna(row['用時(分鐘)']) else 0
+        except (ValueError, TypeError):
+            task_time = 0
+        tasks = summary.setdefault(inspector, {})
+        tasks[task_type] = tasks.get(task_type, 0) + task_time
+    return pd.DataFrame([
+        {'inspector': inspector, 'task_type': task_type, 'total_time': total_time}
+        for inspector, tasks in summary.items() for task_type, total_time in tasks.items()
+    ])
+
+def reference_workload(processed_df, tasks_df):
+    """
+    原本 calculate_workload_metrics 的逐列合併 (已依日期篩選的資料)
+
+    最早/最晚時間取同一筆開始時間的小時+分鐘 (原本小時與分鐘分別取最小值)。
+    """
+    df = processed_df.copy()
+    df['formatted_date'] = pd.to_datetime(df['檢驗日期']).dt.strftime('%Y-%m-%d')
+    start_time = pd.to_datetime(df['檢驗開始時間'])
+    df['start_hour'] = start_time.dt.hour + start_time.dt.minute / 60
+    
+    rows = {}
+    for (date, inspector), group in df.groupby(['formatted_date', '處理後檢驗員']):
+        earliest, latest = group['start_hour'].min(), group['start_hour'].max()
+        if pd.notna(earliest) and pd.notna(latest) and latest - earliest > 0:
+            work_period = f"{earliest:.1f}时 - {latest:.1f}时 (跨{latest - earliest:.1f}小时)"
+        else:
+            work_period = f"{earliest:.1f}时" if pd.notna(earliest) else "無法分析"
+        rows[(date, inspector)] = {
+            'date': date, 'inspector': inspector,
+            'inspection_standard_time': group['處理後檢驗標準工時'].sum(),
+            'additional_task_time': 0,
+            'inspection_count': len(group),
+            'work_period': work_period
+        }
+    
+    tasks = tasks_df.copy()
+    tasks['formatted_date'] = pd.to_datetime(tasks['日期']).dt.strftime('%Y-%m-%d')
+    for (date, inspector), group in tasks.groupby(['formatted_date', '姓名']):
+        row = rows.setdefault((date, inspector), {
+            'date': date, 'inspector': inspector, 'inspection_standard_time': 0,
+            'inspection_count': 0, 'work_period': "無工作時段"
+        })
+        row['additional_task_time'] = group['用時(分鐘)'].sum()
+    
+    workload_df = pd.DataFrame(list(rows.values()))
+    workload_df['total_time'] = workload_df['inspection_standard_time'] + workload_df['additional_task_time']
+    workload_df['workload_index'] = workload_df['total_time'] / 480
+    return workload_df
+
+def reference_task_ratio_expansion(time_allocation_df):
+    """原本匯出時以 iterrows/at[] 展開 task_detail_ratios 字典"""
+    expanded = time_allocation_df.copy()
+    for idx, row in time_allocation_df.iterrows():
+        if isinstance(row['task_detail_ratios'], dict):
+            for task_type, ratio in row['task_detail_ratios'].items():
+                expanded.at[idx, f'{iqc_engine.TASK_RATIO_PREFIX}{task_type}'] = ratio
+    return expanded.drop(columns=['task_detail_ratios'])
+
+# ==================== 測試 ====================
+
+@pytest.fixture(scope='module')
+def processed(dataset):
+    metrics = iqc_engine.calculate_all_metrics(
+        dataset['iqc_report_data'], dataset['pcb_spec_data'], dataset['pcb_standard_time_data'],
+        dataset['additional_tasks_data'], START_DATE, END_DATE
+    )
+    return metrics['processed_data']
+
+@pytest.fixture(scope='module')
+def tasks(dataset):
+    tasks_df = dataset['additional_tasks_data'].copy()
+    # 加入只有額外任務、缺少姓名與分類、無法轉換用時的記錄
+    extra = tasks_df.head(4).copy()
+    extra['姓名'] = ['只有任務', None, '只有任務', 'WYLZ1']
+    extra['工作事項分類'] = [None, '會議', '會議', '全新任務']
+    extra['用時(分鐘)'] = ['abc', 12.7, None, 30]
+    tasks_df = pd.concat([extra, tasks_df], ignore_index=True)
+    return iqc_engine.filter_by_date_range(tasks_df, START_DATE, END_DATE)
+
+def test_time_allocation_matches_row_by_row(processed, tasks):
+    result = iqc_engine.calculate_time_allocation_metrics(processed, tasks, START_DATE, END_DATE)
+    expected = reference_time_allocation(processed, tasks)
+    
+    # 原本字典沒有的任務類型在展開後為空值，寬表欄位為0
+    task_columns = [col for col in expected.columns if col.startswith(iqc_engine.TASK_RATIO_PREFIX)]
+    expected[task_columns] = expected[task_columns].fillna(0.0)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+def test_additional_tasks_matches_row_by_row(tasks):
+    result = iqc_engine.calculate_additional_tasks_metrics(tasks, START_DATE, END_DATE)
+    pd.testing.assert_frame_equal(result, reference_additional_tasks(tasks), check_dtype=False)
+
+def test_workload_matches_row_by_row(processed, tasks):
+    # 原本的合併不處理缺少姓名或無法轉換的用時，只比較一般記錄
+    tasks = tasks[tasks['姓名'].notna() & pd.to_numeric(tasks['用時(分鐘)'], errors='coerce').notna()].copy()
+    tasks['用時(分鐘)'] = tasks['用時(分鐘)'].astype(float)
+    result = iqc_engine.calculate_workload_metrics(processed, tasks, START_DATE, END_DATE)
+    expected = reference_workload(processed, tasks)
+    
+    # 原本依日期做非穩定排序，同一天內的順序不固定，比較前依日期與檢驗員排序
+    def by_key(df):
+        return df.sort_values(['date', 'inspector']).reset_index(drop=True)
+    
+    assert (result['date'].to_numpy()[:-1] <= result['date'].to_numpy()[1:]).all()
+    pd.testing.assert_frame_equal(by_key(result), by_key(expected)[list(result.columns)], check_dtype=False)
+
+def test_mrb_flag_matches_mrb_add_time(processed):
+    # 處理後資料：與原本MRB儀表板及匯出的 MRB加時 > 0 判定相同
+    assert processed[iqc_engine.MRB_FLAG_COLUMN].any()
+    flag = iqc_engine.derive_mrb_flag(processed.drop(columns=[iqc_engine.MRB_FLAG_COLUMN]))
+    pd.testing.assert_series_equal(flag, processed['MRB加時'] > 0, check_names=False)
+
+def test_mrb_flag_without_add_time_column():
+    # 只有 是否為MRB 時，與原本 str(x).upper() in ['TRUE', 'MRB'] 的判定相同
+    values = pd.Series(['TRUE', 'FALSE', 'mrb', 'true ', None, 'Normal inspection', True, False])
+    expected = values.map(lambda x: str(x).strip().upper() in ['TRUE', 'MRB'])
+    flag = iqc_engine.derive_mrb_flag(pd.DataFrame({'是否為MRB': values}))
+    assert flag.tolist() == expected.tolist()
+    
+    # 兩欄都不存在時，原始異常問題欄位有內容即為MRB
+    raw = pd.DataFrame({'異常問題匯總': ['外觀異常', '', None, ' '], 'MRB狀態': ['Normal inspection', 'MRB', None, None]})
+    assert iqc_engine.derive_mrb_flag(raw).tolist() == [True, True, False, False]
+
+def test_task_ratio_table_expands_legacy_dicts():
+    legacy = pd.DataFrame({
+        'inspector': ['甲', '乙', '丙'],
+        'inspection_ratio': [0.5, 1.0, 0.2],
+        'task_detail_ratios': [{'會議': 0.3, '5S': 0.2}, {}, {'教育訓練': 0.5, '會議': 0.3}]
+    }, index=[3, 1, 2])
+    expected = reference_task_ratio_expansion(legacy)
+    task_columns = [col for col in expected.columns if col.startswith(iqc_engine.TASK_RATIO_PREFIX)]
+    
+    # 原本沒有記錄的任務類型為空值，寬表為0；欄位順序相同
+    result = iqc_engine.get_task_ratio_table(legacy)
+    pd.testing.assert_frame_equal(result, expected[task_columns].fillna(0.0))
+    
+    # 已是寬表時直接取出 任務__ 欄位
+    wide = pd.concat([legacy.drop(columns=['task_detail_ratios']), result], axis=1)
+    pd.testing.assert_frame_equal(iqc_engine.get_task_ratio_table(wide), result)
+
+def test_data_version_tracks_content(dataset):
+    iqc_df = dataset['iqc_report_data']
+    tasks_df = dataset['additional_tasks_data']
+    version = iqc_engine.compute_data_version(iqc_df, None, None, tasks_df)
+    
+    # 相同內容 (含複本) 得到相同版本，與 dataset 建立時計算的版本一致
+    assert version == dataset['data_version']
+    assert iqc_engine.compute_data_version(iqc_df.copy(), None, None, tasks_df.copy()) == version
+    assert len(version) == 16
+    
+    changed = iqc_df.copy()
+    changed.iloc[0, changed.columns.get_loc('檢驗耗時')] += 1
+    renamed = iqc_df.rename(columns={'檢驗耗時': '耗時'})
+    variants = [
+        (changed, None, None, tasks_df),
+        (renamed, None, None, tasks_df),
+        (iqc_df.iloc[::-1], None, None, tasks_df),
+        (iqc_df, tasks_df, None, None),
+        (iqc_df, None, None, None),
+    ]
+    versions = {iqc_engine.compute_data_version(*frames) for frames in variants}
+    assert version not in versions
+    assert len(versions) == len(variants)
+
+def test_data_version_handles_unhashable_cells():
+    frame = pd.DataFrame({'a': [1, 2], 'details': [{'x': 1}, ['y']]})
+    version = iqc_engine.compute_data_version(frame)
+    assert version == iqc_engine.compute_data_version(frame.copy())
+    assert version != iqc_engine.compute_data_version(frame.assign(details=[{'x': 2}, ['y']]))